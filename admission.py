@@ -0,0 +1,287 @@
+# admission.py
+# Admission control for /chat: token-bucket rate limits per client IP and per API key,
+# a bounded number of concurrent LLM calls, and a wait queue that sheds requests to the
+# keyword fallback when they could not get an answer before their deadline.
+#
+# Limits are per process (each gunicorn worker has its own) and can be changed at
+# runtime with AdmissionController.configure() (exposed on /admin/admission).
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+import telemetry
+
+# Requests per second and burst allowed per client IP
+ADMISSION_IP_RATE = float(os.getenv('ADMISSION_IP_RATE', 2))
+ADMISSION_IP_BURST = float(os.getenv('ADMISSION_IP_BURST', 10))
+# Requests per second and burst allowed per API key (shared by every IP using the key)
+ADMISSION_KEY_RATE = float(os.getenv('ADMISSION_KEY_RATE', 20))
+ADMISSION_KEY_BURST = float(os.getenv('ADMISSION_KEY_BURST', 60))
+# Upstream LLM calls in flight at once, and requests allowed to wait for a slot
+ADMISSION_LLM_CONCURRENCY = int(os.getenv('ADMISSION_LLM_CONCURRENCY', 8))
+ADMISSION_QUEUE_SIZE = int(os.getenv('ADMISSION_QUEUE_SIZE', 16))
+# Time budget for a chat request; kept under gunicorn's 30s worker timeout
+ADMISSION_DEADLINE_SECONDS = float(os.getenv('ADMISSION_DEADLINE_SECONDS', 20))
+# LLM latency assumed before any call has completed (seconds)
+ADMISSION_INITIAL_LATENCY = float(os.getenv('ADMISSION_INITIAL_LATENCY', 3.0))
+# Buckets kept per limiter; the least recently seen clients are dropped beyond this
+ADMISSION_MAX_CLIENTS = int(os.getenv('ADMISSION_MAX_CLIENTS', 10000))
+# Reverse proxies in front of the app (Render's load balancer is one); the client IP is
+# taken from X-Forwarded-For that many entries from the right, so clients can't spoof it
+ADMISSION_PROXY_HOPS = int(os.getenv('ADMISSION_PROXY_HOPS', 1))
+
+
+def client_address(remote_addr: Optional[str], forwarded_for: Optional[str],
+                   hops: int = ADMISSION_PROXY_HOPS) -> Optional[str]:
+    forwarded = [part.strip() for part in (forwarded_for or '').split(',') if part.strip()]
+    if hops > 0 and len(forwarded) >= hops:
+        return forwarded[-hops]
+    return remote_addr
+
+
+class TokenBucket:
+    """rate tokens per second up to burst; each request takes one"""
+
+    def __init__(self, burst: float, now: Optional[float] = None):
+        self.tokens = burst
+        self.updated = time.monotonic() if now is None else now
+
+    def take(self, rate: float, burst: float, now: float) -> Tuple[bool, float]:
+        """(allowed, seconds until a token is available)"""
+        self.tokens = min(burst, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True, 0.0
+        return False, (1 - self.tokens) / rate if rate > 0 else 60.0
+
+
+class RateLimiter:
+    """Token buckets keyed by client; rate and burst apply to every key and can be changed live"""
+
+    def __init__(self, name: str, rate: float, burst: float, max_clients: int = ADMISSION_MAX_CLIENTS):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def check(self, key: str) -> Tuple[bool, float]:
+        if self.rate <= 0:
+            return True, 0.0  # Disabled
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = TokenBucket(self.burst, now)
+                if len(self.buckets) > self.max_clients:
+                    self.buckets.popitem(last=False)
+            else:
+                self.buckets.move_to_end(key)
+            return bucket.take(self.rate, self.burst, now)
+
+    def configure(self, rate: Optional[float] = None, burst: Optional[float] = None):
+        with self.lock:
+            if rate is not None:
+                self.rate = float(rate)
+            if burst is not None:
+                self.burst = float(burst)
+
+    def get_state(self) -> Dict:
+        with self.lock:
+            return {'rate': self.rate, 'burst': self.burst, 'clients': len(self.buckets)}
+
+
+class LLMGate:
+    """Bounded concurrency for upstream LLM calls with a deadline-aware wait queue.
+
+    A free slot is always taken (the call's own timeout is cut to the
+    deadline). Otherwise a request waits only if the queue has room and,
+    going by the recent LLM latency, it can still be answered before its
+    deadline; if not it is shed straight away so the caller serves the fallback.
+    """
+
+    def __init__(self, concurrency: int = ADMISSION_LLM_CONCURRENCY, queue_size: int = ADMISSION_QUEUE_SIZE):
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.in_flight = 0
+        self.waiting = 0
+        self.latency = ADMISSION_INITIAL_LATENCY
+        self.condition = threading.Condition()
+        self.stats = {'admitted': 0, 'queued': 0, 'shed_queue_full': 0, 'shed_deadline': 0, 'shed_timeout': 0,
+                      'background': 0}
+
+    def _expected_wait(self) -> float:
+        """Time until a slot frees up for a request joining the back of the queue"""
+        if self.in_flight < self.concurrency and not self.waiting:
+            return 0.0
+        rounds = (self.waiting + 1) / max(self.concurrency, 1)
+        return rounds * self.latency
+
+    def _shed(self, reason: str) -> str:
+        self.stats[f'shed_{reason}'] += 1
+        telemetry.registry.inc('farmdepot_admission_shed_total', 1,
+                               'Chat requests answered by the fallback instead of the LLM', reason=reason)
+        return reason
+
+    def _publish(self):
+        telemetry.registry.set_gauge('farmdepot_llm_in_flight', self.in_flight, 'Upstream LLM calls in progress')
+        telemetry.registry.set_gauge('farmdepot_llm_queue_depth', self.waiting, 'Chat requests waiting for an LLM slot')
+
+    def acquire(self, deadline: Optional[float] = None) -> Optional[str]:
+        """Take a slot; returns None when admitted, else why the request was shed"""
+        with self.condition:
+            now = time.monotonic()
+            if self.in_flight < self.concurrency and not self.waiting:
+                self.in_flight += 1
+                self.stats['admitted'] += 1
+                self._publish()
+                return None
+            if self.waiting >= self.queue_size:
+                return self._shed('queue_full')
+            if deadline is not None and now + self._expected_wait() + self.latency > deadline:
+                return self._shed('deadline')
+
+            self.waiting += 1
+            self.stats['queued'] += 1
+            self._publish()
+            try:
+                while self.in_flight >= self.concurrency:
+                    # Give up once there is no longer time for the call itself
+                    remaining = None if deadline is None else deadline - self.latency - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return self._shed('timeout')
+                    self.condition.wait(remaining)
+                self.in_flight += 1
+                self.stats['admitted'] += 1
+                return None
+            finally:
+                self.waiting -= 1
+                self._publish()
+
+    def try_acquire(self, headroom: int = 0) -> bool:
+        """Take a slot for background work only if nobody waits and headroom slots stay free"""
+        with self.condition:
+            if self.waiting or self.in_flight + headroom >= self.concurrency:
+                return False
+            self.in_flight += 1
+            self.stats['background'] += 1
+            self._publish()
+            return True
+
+    def release(self, latency: Optional[float] = None):
+        with self.condition:
+            self.in_flight -= 1
+            if latency is not None:
+                # Smoothed latency drives the deadline estimates
+                self.latency = 0.8 * self.latency + 0.2 * latency
+            self._publish()
+            self.condition.notify()
+
+    def configure(self, concurrency: Optional[int] = None, queue_size: Optional[int] = None):
+        with self.condition:
+            if concurrency is not None:
+                self.concurrency = int(concurrency)
+            if queue_size is not None:
+                self.queue_size = int(queue_size)
+            # A raised limit admits waiters now rather than at the next release
+            self.condition.notify_all()
+
+    def get_state(self) -> Dict:
+        with self.condition:
+            return {'concurrency': self.concurrency, 'queue_size': self.queue_size, 'in_flight': self.in_flight,
+                    'waiting': self.waiting, 'latency_estimate_s': round(self.latency, 3), **self.stats}
+
+
+class AdmissionController:
+    """Rate limits at the door, then the LLM gate for requests that need the model"""
+
+    def __init__(self):
+        self.ip_limiter = RateLimiter('ip', ADMISSION_IP_RATE, ADMISSION_IP_BURST)
+        self.key_limiter = RateLimiter('api_key', ADMISSION_KEY_RATE, ADMISSION_KEY_BURST)
+        self.gate = LLMGate()
+        self.deadline_seconds = ADMISSION_DEADLINE_SECONDS
+        self._publish_limits()
+
+    def check(self, ip: Optional[str], api_key: Optional[str] = None) -> Optional[Tuple[str, float]]:
+        """None if the client may proceed, else (limit name, retry-after seconds)"""
+        checks = [(self.ip_limiter, ip)]
+        if api_key:
+            checks.append((self.key_limiter, api_key))
+        for limiter, key in checks:
+            if key is None:
+                continue
+            allowed, retry_after = limiter.check(key)
+            if not allowed:
+                telemetry.registry.inc('farmdepot_admission_rejected_total', 1,
+                                       'Chat requests rejected by rate limits', limit=limiter.name)
+                return limiter.name, retry_after
+        return None
+
+    def deadline(self, start: Optional[float] = None) -> float:
+        """Monotonic deadline for a request that started at start (now by default)"""
+        return (time.monotonic() if start is None else start) + self.deadline_seconds
+
+    @contextmanager
+    def llm_slot(self, deadline: Optional[float] = None):
+        """Yields True with an LLM slot held, or False when the request was shed"""
+        shed = self.gate.acquire(deadline)
+        if shed:
+            yield False
+            return
+        start = time.monotonic()
+        try:
+            yield True
+        finally:
+            self.gate.release(time.monotonic() - start)
+
+    @contextmanager
+    def idle_llm_slot(self, headroom: int = 0):
+        """Yields True with an LLM slot held if one is idle, else False at once (never queues)"""
+        if not self.gate.try_acquire(headroom):
+            yield False
+            return
+        start = time.monotonic()
+        try:
+            yield True
+        finally:
+            self.gate.release(time.monotonic() - start)
+
+    def configure(self, **limits) -> Dict:
+        """Change limits at runtime; keys as returned under 'limits' by get_state()"""
+        unknown = set(limits) - {'ip_rate', 'ip_burst', 'key_rate', 'key_burst', 'llm_concurrency',
+                                 'queue_size', 'deadline_seconds'}
+        if unknown:
+            raise ValueError(f"unknown admission settings: {', '.join(sorted(unknown))}")
+        self.ip_limiter.configure(limits.get('ip_rate'), limits.get('ip_burst'))
+        self.key_limiter.configure(limits.get('key_rate'), limits.get('key_burst'))
+        self.gate.configure(limits.get('llm_concurrency'), limits.get('queue_size'))
+        if limits.get('deadline_seconds') is not None:
+            self.deadline_seconds = float(limits['deadline_seconds'])
+        self._publish_limits()
+        return self.get_state()
+
+    def _publish_limits(self):
+        for name, value in self.limits().items():
+            telemetry.registry.set_gauge('farmdepot_admission_limit', value, 'Current admission limits', limit=name)
+
+    def limits(self) -> Dict[str, float]:
+        return {
+            'ip_rate': self.ip_limiter.rate, 'ip_burst': self.ip_limiter.burst,
+            'key_rate': self.key_limiter.rate, 'key_burst': self.key_limiter.burst,
+            'llm_concurrency': self.gate.concurrency, 'queue_size': self.gate.queue_size,
+            'deadline_seconds': self.deadline_seconds,
+        }
+
+    def get_state(self) -> Dict:
+        return {
+            'limits': self.limits(),
+            'ip': self.ip_limiter.get_state(),
+            'api_key': self.key_limiter.get_state(),
+            'llm': self.gate.get_state(),
+        }
@@ -1,21 +1,33 @@
 # advanced_tts_handler.py
+import io
 import os
-import tempfile
 import requests
 import json
 from typing import Optional, Dict, Any
-from gtts import gTTS
-import azure.cognitiveservices.speech as speechsdk
-from google.cloud import texttospeech
-import boto3
-from pydub import AudioSegment
-import pygame
+from xml.sax.saxutils import escape
 import time
+import telemetry
+import model_host
+import text_prep_cache
+from lazy_imports import lazy_import, module_available
+from engine_registry import default_registry
+from client_pool import ClientPool, SharedClient, TTS_CLIENT_POOL_SIZE
+from audio_buffer import AudioBuffer, read_body
+
+# Engine SDKs are imported on first use, and only by engines that are configured
+speechsdk = lazy_import('azure.cognitiveservices.speech')
+texttospeech = lazy_import('google.cloud.texttospeech')
+boto3 = lazy_import('boto3')
+botocore_config = lazy_import('botocore.config')
+botocore_exceptions = lazy_import('botocore.exceptions')
+google_exceptions = lazy_import('google.api_core.exceptions')
+gtts = lazy_import('gtts')
+pygame = lazy_import('pygame')
 
 class AdvancedTTSHandler:
     """Advanced TTS handler with specialized engines for Nigerian languages"""
     
-    def __init__(self):
+    def __init__(self, registry=None, text_prep=None):
         self.engines = {
             'azure': AzureTTSEngine(),
             'google_cloud': GoogleCloudTTSEngine(),
@@ -33,38 +45,74 @@ class AdvancedTTSHandler:
             'yoruba': ['azure', 'native_speech', 'elevenlabs', 'google_cloud', 'gtts']
         }
         
-        pygame.mixer.init()
+        self.registry = registry or default_registry
+        for name, engine in self.engines.items():
+            self.registry.register(name, engine)
+        
+        # Answers are rewritten to SSML once and reused for every engine and repeat
+        self.text_prep = text_prep or text_prep_cache.load_default()
+        
+        self.mixer_ready = False
     
-    def synthesize_speech(self, text: str, language: str = 'english', voice_style: str = 'neutral') -> Optional[str]:
+    def warm_up(self, languages=None):
+        """Open client connections for configured engines so the first clip skips connection setup"""
+        for name, engine in self.engines.items():
+            if hasattr(engine, 'warm') and self.registry.is_available(name):
+                try:
+                    engine.warm(languages)
+                except Exception as e:
+                    print(f"TTS engine {name} warm-up failed: {e}")
+    
+    def synthesize_speech(self, text: str, language: str = 'english', voice_style: str = 'neutral') -> Optional[AudioBuffer]:
         """Synthesize speech using the best available engine for the language"""
         
         if language not in self.engine_priority:
             language = 'english'
         
-        # Try engines in priority order
-        for engine_name in self.engine_priority[language]:
+        # SSML engines get the prepared fragment; the rest speak the answer as written
+        prepared = self.text_prep.prepare(text, language, voice_style) if self.text_prep else None
+        ssml = prepared.ssml if prepared else escape(text)
+        
+        # Try engines in order of observed cost; ejected engines are skipped until re-probed
+        for engine_name in self.registry.order(language, self.engine_priority[language]):
             engine = self.engines.get(engine_name)
-            if engine and engine.is_available():
+            with telemetry.span('tts_engine_selection', engine=engine_name):
+                available = engine is not None and self.registry.is_available(engine_name, language)
+            if available:
+                start = time.perf_counter()
                 try:
-                    audio_file = engine.synthesize(text, language, voice_style)
-                    if audio_file:
-                        return audio_file
+                    with telemetry.span('tts_synthesis', engine=engine_name, language=language):
+                        audio = engine.synthesize(ssml if getattr(engine, 'accepts_ssml', False) else text,
+                                                  language, voice_style)
                 except Exception as e:
                     print(f"TTS Engine {engine_name} failed: {e}")
-                    continue
+                    audio = None
+                self.registry.record(engine_name, language, bool(audio), time.perf_counter() - start)
+                if audio:
+                    return audio
         
         # If all engines fail, return None
         print(f"All TTS engines failed for language: {language}")
         return None
     
-    def play_audio(self, audio_file: str) -> bool:
-        """Play audio file"""
+    def play_audio(self, audio) -> bool:
+        """Play an AudioBuffer, in-memory audio (bytes or memoryview) or an audio file path"""
         try:
-            pygame.mixer.music.load(audio_file)
-            pygame.mixer.music.play()
-            
-            while pygame.mixer.music.get_busy():
-                time.sleep(0.1)
+            with telemetry.span('playback'):
+                if not self.mixer_ready:
+                    pygame.mixer.init()
+                    self.mixer_ready = True
+                if isinstance(audio, (bytes, bytearray, memoryview)):
+                    audio = AudioBuffer.from_bytes(audio)
+                if isinstance(audio, AudioBuffer):
+                    # The name hint tells SDL which container the file object holds
+                    pygame.mixer.music.load(audio.as_file(), audio.extension)
+                else:
+                    pygame.mixer.music.load(audio)
+                pygame.mixer.music.play()
+                
+                while pygame.mixer.music.get_busy():
+                    time.sleep(0.1)
             
             return True
         except Exception as e:
@@ -75,9 +123,16 @@ class AdvancedTTSHandler:
 class AzureTTSEngine:
     """Azure Cognitive Services TTS - Best for Nigerian languages"""
     
+    sdk_module = 'azure.cognitiveservices.speech'
+    # synthesize() takes an SSML fragment (escaped text and inline markup)
+    accepts_ssml = True
+    
     def __init__(self):
         self.api_key = os.getenv('AZURE_SPEECH_KEY')
         self.region = os.getenv('AZURE_SPEECH_REGION', 'westus2')
+        # REST endpoint override (e.g. a local mock); when set, the REST API is used instead of the SDK
+        self.endpoint = os.getenv('AZURE_SPEECH_ENDPOINT')
+        self.output_format = os.getenv('AZURE_SPEECH_OUTPUT_FORMAT', 'riff-24khz-16bit-mono-pcm')
         
         # Azure voices for Nigerian languages (as of 2024)
         self.voice_mapping = {
@@ -98,42 +153,41 @@ class AzureTTSEngine:
                 'male': 'yo-NG-KunmiNeural',     # Yoruba male (if available)
             }
         }
+        
+        # Pre-opened synthesizers per voice (SDK path) and keep-alive sessions (REST path)
+        self.synthesizers = ClientPool(self._open_synthesizer, close=self._close_synthesizer)
+        self.sessions = ClientPool(lambda _: requests.Session(), close=lambda session: session.close())
     
     def is_available(self) -> bool:
-        return bool(self.api_key and self.region)
+        if not (self.api_key and self.region):
+            return False
+        # The REST path needs no SDK
+        return bool(self.endpoint) or module_available(self.sdk_module)
     
-    def synthesize(self, text: str, language: str, voice_style: str = 'neutral') -> Optional[str]:
+    def synthesize(self, text: str, language: str, voice_style: str = 'neutral') -> Optional[AudioBuffer]:
         """Synthesize speech using Azure TTS"""
         if not self.is_available():
             return None
         
+        if self.endpoint:
+            return self._synthesize_rest(text, language, voice_style)
+        
         try:
-            # Configure speech service
-            speech_config = speechsdk.SpeechConfig(subscription=self.api_key, region=self.region)
-            
             # Select voice
             voice = self._get_voice(language, 'female')  # Default to female voice
             if not voice:
                 # Fallback to English if language not supported
                 voice = self.voice_mapping['english']['female']
             
-            speech_config.speech_synthesis_voice_name = voice
-            
-            # Create synthesizer
-            synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=None)
-            
             # Generate SSML for better control
             ssml = self._generate_ssml(text, voice, voice_style)
             
-            # Synthesize
-            result = synthesizer.speak_ssml_async(ssml).get()
+            # Synthesize on a pooled synthesizer whose connection is already open
+            result = self.synthesizers.run(voice, lambda pooled: self._speak(pooled[0], ssml))
             
             if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
-                # Save audio to temp file
-                output_file = tempfile.NamedTemporaryFile(delete=False, suffix='.wav')
-                output_file.write(result.audio_data)
-                output_file.close()
-                return output_file.name
+                # RIFF output from the SDK; the buffer is a view of its PCM data
+                return AudioBuffer.from_bytes(result.audio_data)
             else:
                 print(f"Azure TTS error: {result.reason}")
                 return None
@@ -142,6 +196,69 @@ class AzureTTSEngine:
             print(f"Azure TTS synthesis error: {e}")
             return None
     
+    def _open_synthesizer(self, voice: str):
+        """Synthesizer for one voice with its service connection opened up front"""
+        speech_config = speechsdk.SpeechConfig(subscription=self.api_key, region=self.region)
+        speech_config.speech_synthesis_voice_name = voice
+        synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=None)
+        connection = speechsdk.Connection.from_speech_synthesizer(synthesizer)
+        connection.open(True)
+        return synthesizer, connection
+    
+    def _close_synthesizer(self, pooled):
+        pooled[1].close()
+    
+    def _speak(self, synthesizer, ssml: str):
+        result = synthesizer.speak_ssml_async(ssml).get()
+        if result.reason == speechsdk.ResultReason.Canceled:
+            details = result.cancellation_details
+            if details.reason == speechsdk.CancellationReason.Error:
+                # Usually a dropped connection; the pool retries once on a fresh synthesizer
+                raise ConnectionError(f"Azure synthesis canceled: {details.error_details}")
+        return result
+    
+    def warm(self, languages=None):
+        """Open a synthesizer (or HTTP connection) per language ahead of the first request"""
+        if self.endpoint:
+            # A cheap GET leaves a keep-alive connection in the pooled session
+            self.sessions.run(None, lambda session: session.get(
+                f"{self.endpoint.rstrip('/')}/cognitiveservices/voices/list",
+                headers={'Ocp-Apim-Subscription-Key': self.api_key}, timeout=5))
+            return
+        for language in languages or self.voice_mapping:
+            self.synthesizers.warm(self._get_voice(language, 'female') or self.voice_mapping['english']['female'])
+    
+    def _synthesize_rest(self, text: str, language: str, voice_style: str) -> Optional[AudioBuffer]:
+        """Synthesize through the Speech REST API at AZURE_SPEECH_ENDPOINT"""
+        try:
+            voice = self._get_voice(language, 'female') or self.voice_mapping['english']['female']
+            
+            def post(session):
+                response = session.post(
+                    f"{self.endpoint.rstrip('/')}/cognitiveservices/v1",
+                    data=self._generate_ssml(text, voice, voice_style).encode('utf-8'),
+                    headers={
+                        'Ocp-Apim-Subscription-Key': self.api_key,
+                        'Content-Type': 'application/ssml+xml',
+                        'X-Microsoft-OutputFormat': self.output_format,
+                        'User-Agent': 'farmdepot-tts'
+                    },
+                    timeout=30,
+                    stream=True
+                )
+                return response.status_code, read_body(response)
+            
+            status, body = self.sessions.run(None, post)
+            if status != 200:
+                print(f"Azure TTS REST error: {status}")
+                return None
+            
+            return AudioBuffer.from_bytes(body)
+            
+        except Exception as e:
+            print(f"Azure TTS REST synthesis error: {e}")
+            return None
+    
     def _get_voice(self, language: str, gender: str = 'female') -> Optional[str]:
         """Get appropriate voice for language and gender"""
         if language in self.voice_mapping:
@@ -176,22 +293,26 @@ class AzureTTSEngine:
 class GoogleCloudTTSEngine:
     """Google Cloud Text-to-Speech - Good multilingual support"""
     
+    sdk_module = 'google.cloud.texttospeech'
+    
     def __init__(self):
         self.credentials_path = os.getenv('GOOGLE_CLOUD_CREDENTIALS_PATH')
         if self.credentials_path:
             os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = self.credentials_path
+        
+        # The gRPC client is thread-safe; one channel serves every request
+        self.client = SharedClient(lambda: texttospeech.TextToSpeechClient())
     
     def is_available(self) -> bool:
-        return bool(self.credentials_path and os.path.exists(self.credentials_path))
+        return bool(self.credentials_path and os.path.exists(self.credentials_path)
+                    and module_available(self.sdk_module))
     
-    def synthesize(self, text: str, language: str, voice_style: str = 'neutral') -> Optional[str]:
+    def synthesize(self, text: str, language: str, voice_style: str = 'neutral') -> Optional[AudioBuffer]:
         """Synthesize speech using Google Cloud TTS"""
         if not self.is_available():
             return None
         
         try:
-            client = texttospeech.TextToSpeechClient()
-            
             # Configure input
             synthesis_input = texttospeech.SynthesisInput(text=text)
             
@@ -211,23 +332,25 @@ class GoogleCloudTTSEngine:
             )
             
             # Perform synthesis
-            response = client.synthesize_speech(
-                input=synthesis_input,
-                voice=voice,
-                audio_config=audio_config
-            )
+            response = self.client.run(lambda client: self._synthesize_call(
+                client, synthesis_input, voice, audio_config))
             
-            # Save audio
-            output_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp3')
-            output_file.write(response.audio_content)
-            output_file.close()
-            
-            return output_file.name
+            return AudioBuffer(response.audio_content, 'mp3')
             
         except Exception as e:
             print(f"Google Cloud TTS error: {e}")
             return None
     
+    def _synthesize_call(self, client, synthesis_input, voice, audio_config):
+        try:
+            return client.synthesize_speech(input=synthesis_input, voice=voice, audio_config=audio_config)
+        except google_exceptions.ServiceUnavailable as e:
+            # Broken channel; SharedClient rebuilds the client and retries once
+            raise ConnectionError(str(e)) from e
+    
+    def warm(self, languages=None):
+        self.client.get()
+    
     def _get_voice_params(self, language: str) -> Dict[str, Any]:
         """Get voice parameters for language"""
         voice_mapping = {
@@ -252,7 +375,7 @@ class ElevenLabsEngine:
     
     def __init__(self):
         self.api_key = os.getenv('ELEVENLABS_API_KEY')
-        self.base_url = "https://api.elevenlabs.io/v1"
+        self.base_url = os.getenv('ELEVENLABS_BASE_URL', "https://api.elevenlabs.io/v1")
         
         # Custom voice IDs (you can clone Nigerian voices)
         self.custom_voices = {
@@ -261,11 +384,19 @@ class ElevenLabsEngine:
             'igbo_female': os.getenv('ELEVENLABS_IGBO_FEMALE_ID'),
             'yoruba_female': os.getenv('ELEVENLABS_YORUBA_FEMALE_ID'),
         }
+        
+        # Keep-alive HTTP sessions, one per concurrent request
+        self.sessions = ClientPool(lambda _: requests.Session(), close=lambda session: session.close())
     
     def is_available(self) -> bool:
         return bool(self.api_key)
     
-    def synthesize(self, text: str, language: str, voice_style: str = 'neutral') -> Optional[str]:
+    def warm(self, languages=None):
+        # A cheap GET leaves a keep-alive connection in the pooled session
+        self.sessions.run(None, lambda session: session.get(
+            f"{self.base_url}/models", headers={'xi-api-key': self.api_key}, timeout=5))
+    
+    def synthesize(self, text: str, language: str, voice_style: str = 'neutral') -> Optional[AudioBuffer]:
         """Synthesize speech using ElevenLabs"""
         if not self.is_available():
             return None
@@ -298,17 +429,17 @@ class ElevenLabsEngine:
                 }
             }
             
-            # Make request
-            response = requests.post(url, json=payload, headers=headers)
+            # Make request; the body is read inside the lease so a dropped connection is retried
+            def post(session):
+                response = session.post(url, json=payload, headers=headers, timeout=30, stream=True)
+                return response.status_code, read_body(response)
             
-            if response.status_code == 200:
-                # Save audio
-                output_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp3')
-                output_file.write(response.content)
-                output_file.close()
-                return output_file.name
+            status, body = self.sessions.run(None, post)
+            
+            if status == 200:
+                return AudioBuffer(body, 'mp3')
             else:
-                print(f"ElevenLabs API error: {response.status_code}")
+                print(f"ElevenLabs API error: {status}")
                 return None
                 
         except Exception as e:
@@ -376,12 +507,21 @@ class NativeSpeechEngine:
     def is_available(self) -> bool:
         return any(path for path in self.model_paths.values() if path and os.path.exists(path))
     
-    def synthesize(self, text: str, language: str, voice_style: str = 'neutral') -> Optional[str]:
+    def synthesize(self, text: str, language: str, voice_style: str = 'neutral') -> Optional[AudioBuffer]:
         """Synthesize using local Nigerian language models"""
         model_path = self.model_paths.get(language)
         if not model_path or not os.path.exists(model_path):
             return None
         
+        # With a model host running, the models live there once instead of in every worker
+        host = model_host.default_client()
+        if host:
+            try:
+                return host.synthesize(text, language, voice_style)
+            except model_host.ModelHostError as e:
+                print(f"Native TTS error: {e}")
+                return None
+        
         try:
             # This would integrate with local TTS models
             # Implementation depends on the specific model format
@@ -390,6 +530,7 @@ class NativeSpeechEngine:
             # import your_local_tts_library
             # synthesizer = your_local_tts_library.load_model(model_path)
             # audio_data = synthesizer.synthesize(text)
+            # return AudioBuffer.from_pcm(audio_data, synthesizer.sample_rate)
             
             # For now, return None to indicate not implemented
             return None
@@ -402,43 +543,52 @@ class NativeSpeechEngine:
 class AWSPollyEngine:
     """Amazon Polly TTS"""
     
+    sdk_module = 'boto3'
+    
     def __init__(self):
         self.aws_access_key = os.getenv('AWS_ACCESS_KEY_ID')
         self.aws_secret_key = os.getenv('AWS_SECRET_ACCESS_KEY')
         self.aws_region = os.getenv('AWS_REGION', 'us-east-1')
+        
+        # boto3 clients are thread-safe and keep their own HTTP connection pool
+        self.client = SharedClient(self._create_client)
     
     def is_available(self) -> bool:
-        return bool(self.aws_access_key and self.aws_secret_key)
+        return bool(self.aws_access_key and self.aws_secret_key and module_available(self.sdk_module))
     
-    def synthesize(self, text: str, language: str, voice_style: str = 'neutral') -> Optional[str]:
-        """Synthesize speech using AWS Polly"""
-        if not self.is_available():
-            return None
-        
+    def _create_client(self):
+        return boto3.client(
+            'polly',
+            aws_access_key_id=self.aws_access_key,
+            aws_secret_access_key=self.aws_secret_key,
+            region_name=self.aws_region,
+            config=botocore_config.Config(max_pool_connections=TTS_CLIENT_POOL_SIZE * 4, tcp_keepalive=True)
+        )
+    
+    def _synthesize_call(self, polly, text: str, language: str) -> bytes:
         try:
-            polly = boto3.client(
-                'polly',
-                aws_access_key_id=self.aws_access_key,
-                aws_secret_access_key=self.aws_secret_key,
-                region_name=self.aws_region
-            )
-            
-            # Voice selection
-            voice_id = self._get_voice_id(language)
-            
             response = polly.synthesize_speech(
                 Text=text,
                 OutputFormat='mp3',
-                VoiceId=voice_id,
+                VoiceId=self._get_voice_id(language),
                 LanguageCode=self._get_language_code(language)
             )
-            
-            # Save audio
-            output_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp3')
-            output_file.write(response['AudioStream'].read())
-            output_file.close()
-            
-            return output_file.name
+            return response['AudioStream'].read()
+        except botocore_exceptions.ConnectionError as e:
+            # SharedClient rebuilds the client and retries once
+            raise ConnectionError(str(e)) from e
+    
+    def warm(self, languages=None):
+        self.client.get()
+    
+    def synthesize(self, text: str, language: str, voice_style: str = 'neutral') -> Optional[AudioBuffer]:
+        """Synthesize speech using AWS Polly"""
+        if not self.is_available():
+            return None
+        
+        try:
+            audio = self.client.run(lambda polly: self._synthesize_call(polly, text, language))
+            return AudioBuffer(audio, 'mp3')
             
         except Exception as e:
             print(f"AWS Polly error: {e}")
@@ -468,10 +618,12 @@ class AWSPollyEngine:
 class GTTSEngine:
     """Google Text-to-Speech - Free fallback option"""
     
+    sdk_module = 'gtts'
+    
     def is_available(self) -> bool:
-        return True  # Always available
+        return module_available(self.sdk_module)  # No configuration needed
     
-    def synthesize(self, text: str, language: str, voice_style: str = 'neutral') -> Optional[str]:
+    def synthesize(self, text: str, language: str, voice_style: str = 'neutral') -> Optional[AudioBuffer]:
         """Synthesize speech using gTTS"""
         try:
             # Language code mapping
@@ -484,12 +636,12 @@ class GTTSEngine:
             
             lang_code = lang_codes.get(language, 'en')
             
-            tts = gTTS(text=text, lang=lang_code, slow=False)
+            tts = gtts.gTTS(text=text, lang=lang_code, slow=False)
             
-            output_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp3')
-            tts.save(output_file.name)
+            output = io.BytesIO()
+            tts.write_to_fp(output)
             
-            return output_file.name
+            return AudioBuffer(output.getbuffer(), 'mp3')
             
         except Exception as e:
             print(f"gTTS error: {e}")
@@ -4,11 +4,19 @@ from crewai import Agent
 from crewai.tools import BaseTool
 from langchain.llms import OpenAI
 import os
-from typing import Any
+from typing import Any, Optional
+import wordpress_client
+from wordpress_sessions import session_store
+from http_cache import HTTPReadCache
+
+# Catalog reads are revalidated with ETag/Last-Modified instead of re-downloaded
+wordpress_read_cache = HTTPReadCache('wordpress', fetch=wordpress_client.request_with_retry)
 
 class WordPressInteractionTool(BaseTool):
     name: str = "wordpress_interaction"
     description: str = "Interact with WordPress website for CRUD operations"
+    # The chat session this tool acts for; a login here lets later posts use the user's account
+    session_id: Optional[str] = None
     
     def _run(self, action: str, **kwargs) -> str:
         """Execute WordPress actions like post creation, search, user registration"""
@@ -40,7 +48,7 @@ class WordPressInteractionTool(BaseTool):
         }
         
         try:
-            response = requests.get(api_endpoint, params=params)
+            response = wordpress_read_cache.get(api_endpoint, params=params)
             if response.status_code == 200:
                 posts = response.json()
                 if posts:
@@ -61,13 +69,6 @@ class WordPressInteractionTool(BaseTool):
     
     def _create_post(self, post_data: dict) -> str:
         # Implementation for creating posts via WordPress API
-        wp_url = os.getenv('WORDPRESS_URL', 'https://farmdepot.ng')
-        api_endpoint = f"{wp_url}/wp-json/wp/v2/posts"
-        
-        auth_header = {
-            'Authorization': f"Bearer {os.getenv('WORDPRESS_JWT_TOKEN')}"
-        }
-        
         post_payload = {
             'title': post_data.get('title', ''),
             'content': post_data.get('content', ''),
@@ -75,10 +76,17 @@ class WordPressInteractionTool(BaseTool):
             'categories': post_data.get('categories', [])
         }
         
+        # Post as the user who logged in during this conversation, if any
+        user_session = session_store.conversation_session(self.session_id) if self.session_id else None
+        user_token = user_session['token'] if user_session else None
+        
         try:
-            response = requests.post(api_endpoint, json=post_payload, headers=auth_header)
+            response = wordpress_client.create_post(post_payload, token=user_token or os.getenv('WORDPRESS_JWT_TOKEN'))
             if response.status_code == 201:
                 return "Post created successfully!"
+            elif user_token and response.status_code in (401, 403):
+                session_store.invalidate(user_session['username'])
+                return "Your session has expired. Please log in again"
             else:
                 return f"Failed to create post: {response.status_code}"
         except Exception as e:
@@ -96,7 +104,7 @@ class WordPressInteractionTool(BaseTool):
         }
         
         try:
-            response = requests.post(api_endpoint, json=user_payload)
+            response = requests.post(api_endpoint, json=user_payload, timeout=wordpress_client.WORDPRESS_TIMEOUT)
             if response.status_code == 201:
                 return "User registered successfully!"
             else:
@@ -105,20 +113,14 @@ class WordPressInteractionTool(BaseTool):
             return f"Registration error: {str(e)}"
     
     def _login_user(self, credentials: dict) -> str:
-        # Implementation for user login
-        wp_url = os.getenv('WORDPRESS_URL', 'https://farmdepot.ng')
-        api_endpoint = f"{wp_url}/wp-json/jwt-auth/v1/token"
-        
-        login_payload = {
-            'username': credentials.get('username', ''),
-            'password': credentials.get('password', '')
-        }
+        # Implementation for user login (reuses a cached session when still valid)
+        username = credentials.get('username', '')
+        password = credentials.get('password', '')
         
         try:
-            response = requests.post(api_endpoint, json=login_payload)
-            if response.status_code == 200:
-                token_data = response.json()
-                return f"Login successful! Token: {token_data.get('token', '')[:20]}..."
+            session = session_store.login(username, password, conversation_id=self.session_id)
+            if session:
+                return f"Login successful! Token: {session['token'][:20]}..."
             else:
                 return "Login failed: Invalid credentials"
         except Exception as e:
@@ -133,14 +135,14 @@ def get_llm():
     )
 
 # Define Agents
-def create_agents():
+def create_agents(session_id=None):
     # WordPress Navigation Agent
     wordpress_agent = Agent(
         role='WordPress Navigation Specialist',
         goal='Help users navigate the FarmDepot.ng classified ads website efficiently',
         backstory="""You are an expert in WordPress navigation and agricultural classified ads. 
                     You understand the Nigerian agricultural market and can help users find what they need on FarmDepot.ng.""",
-        tools=[WordPressInteractionTool()],
+        tools=[WordPressInteractionTool(session_id=session_id)],
         llm=get_llm(),
         verbose=True,
         allow_delegation=False
@@ -152,7 +154,7 @@ def create_agents():
         goal='Assist users in posting, searching, and managing agricultural products on the platform',
         backstory="""You specialize in agricultural products and marketplace operations. 
                     You help farmers, traders, and buyers list their products, search for items, and manage their listings.""",
-        tools=[WordPressInteractionTool()],
+        tools=[WordPressInteractionTool(session_id=session_id)],
         llm=get_llm(),
         verbose=True,
         allow_delegation=False
@@ -164,7 +166,7 @@ def create_agents():
         goal='Handle user registration, login, and account-related operations',
         backstory="""You manage user accounts and authentication processes. 
                     You help new users register, existing users log in, and resolve account-related issues.""",
-        tools=[WordPressInteractionTool()],
+        tools=[WordPressInteractionTool(session_id=session_id)],
         llm=get_llm(),
         verbose=True,
         allow_delegation=False
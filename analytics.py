@@ -0,0 +1,320 @@
+# analytics.py
+# Usage report over the compacted interaction logs (python interaction_log.py compact).
+#
+# Usage: python analytics.py [logs/compacted ...] [--since-hours 168] [--top 20]
+#
+# Every aggregate is computed on whole columns with NumPy: string columns stay as
+# dictionary codes, counts are bincounts, and percentiles per group come from one
+# sort of (group, value) pairs, so millions of records take seconds. Only the
+# distinct questions are looked at one by one, to tag them with a crop and topic.
+#
+# The report covers the language, intent, route, crop and topic mix, the most asked
+# questions, how many requests a response cache could have served at a given size
+# and TTL, and latency percentiles per stage, per route, and per engine, with the
+# TTS engine order per language the observed latencies suggest.
+
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+from typing import Dict, List, Optional, Sequence
+
+import interaction_log
+from interaction_log import Categorical, LANGUAGE_NAMES
+from lazy_imports import lazy_import
+
+np = lazy_import('numpy')
+
+PERCENTILES = (50, 90, 99)
+# Response cache sizes the hit-rate curve is reported at
+CACHE_SIZES = (100, 500, 1000, 2000, 5000, 10000, 50000)
+# Fewest samples an engine needs before its latency ranks it
+ENGINE_MIN_SAMPLES = 50
+
+
+def compacted_files(paths: Sequence[str]) -> List[str]:
+    """Compacted files named directly or found in the named directories"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for suffix in interaction_log.FORMATS.values():
+                files.extend(glob.glob(os.path.join(path, f"*{suffix}")))
+        elif os.path.isfile(path) and path.endswith(tuple(interaction_log.FORMATS.values())):
+            files.append(path)
+    return sorted(files)
+
+
+def tally(column: Categorical, mask=None, limit: Optional[int] = None) -> List[Dict]:
+    """Values of a string column by how often they occur, with their share of the rows counted"""
+    codes = column.codes if mask is None else column.codes[mask]
+    codes = codes[codes >= 0]
+    counts = np.bincount(codes, minlength=len(column.categories))
+    order = np.argsort(-counts, kind='stable')
+    order = order[counts[order] > 0][:limit]
+    total = max(int(counts.sum()), 1)
+    return [{'value': str(column.categories[i]), 'count': int(counts[i]), 'share': round(counts[i] / total, 4)}
+            for i in order]
+
+
+def grouped_percentiles(groups, values, group_count: int, percentiles: Sequence[float] = PERCENTILES):
+    """Sample count and percentiles of values per group code, with one sort for all groups
+
+    Rows whose group is -1 or whose value is NaN are skipped. Percentiles are linearly
+    interpolated, as np.percentile does; groups without samples get NaN.
+    """
+    keep = (groups >= 0) & ~np.isnan(values)
+    groups, values = groups[keep], values[keep].astype(np.float64)
+    sizes = np.bincount(groups, minlength=group_count)
+    if len(values):
+        # Sorting group * span + value orders by group, then value, in one float sort
+        low, span = values.min(), values.max() - values.min() + 1
+        values = np.sort(groups * span + (values - low)) - np.repeat(np.arange(group_count) * span, sizes) + low
+    starts = np.cumsum(sizes) - sizes
+    result = np.full((group_count, len(percentiles)), np.nan)
+    present = sizes > 0
+    for column, pct in enumerate(percentiles):
+        position = starts[present] + (sizes[present] - 1) * (pct / 100)
+        low = np.floor(position).astype(np.int64)
+        high = np.ceil(position).astype(np.int64)
+        result[present, column] = values[low] + (values[high] - values[low]) * (position - low)
+    return sizes, result
+
+
+def _recode(column: Categorical, mapping: Categorical) -> Categorical:
+    """column with each category replaced by mapping's value at the same position"""
+    codes = np.where(column.codes >= 0, mapping.codes[np.maximum(column.codes, 0)], -1)
+    return Categorical(codes.astype(np.int32), mapping.categories)
+
+
+def _latency(sizes, result, index: int) -> Dict:
+    summary = {'samples': int(sizes[index])}
+    for pct, value in zip(PERCENTILES, result[index]):
+        summary[f"p{pct:g}_ms"] = round(float(value), 1)
+    return summary
+
+
+class InteractionStats:
+    """Aggregates over the columns of one or more compacted interaction logs"""
+
+    def __init__(self, columns: Dict):
+        self.columns = columns
+        self.rows = len(columns['ts']) if columns else 0
+
+    @classmethod
+    def load(cls, paths: Sequence[str], since: Optional[float] = None) -> 'InteractionStats':
+        """Compacted files (or directories of them), keeping records at or after since (epoch seconds)"""
+        columns = interaction_log.load_columns(compacted_files(paths))
+        if columns and since is not None:
+            keep = columns['ts'] >= since
+            columns = {name: Categorical(column.codes[keep], column.categories)
+                       if isinstance(column, Categorical) else column[keep]
+                       for name, column in columns.items()}
+        return cls(columns)
+
+    def mix(self, name: str, limit: Optional[int] = None) -> List[Dict]:
+        return tally(self.columns[name], limit=limit)
+
+    def intents_by_language(self) -> Dict[str, List[Dict]]:
+        language, intent = self.columns['language'], self.columns['intent']
+        return {str(name): tally(intent, language.codes == code)
+                for code, name in enumerate(language.categories)}
+
+    def topics(self, limit: Optional[int] = None) -> Dict[str, List[Dict]]:
+        """Crops and crop/aspect topics asked about, using the prefetcher's topic rules on each distinct question"""
+        from prefetcher import TopicModel
+        model = TopicModel()
+        query = self.columns['query']
+        # Topic per distinct question, carried to the rows through their codes
+        topic = _recode(query, Categorical.encode([model.topic(text) for text in query.categories]))
+        crop = _recode(topic, Categorical.encode([name.split('/')[0] for name in topic.categories]))
+        asked = int((query.codes >= 0).sum())
+        return {'questions_naming_a_crop': round(int((topic.codes >= 0).sum()) / max(asked, 1), 4),
+                'crops': tally(crop, limit=limit), 'topics': tally(topic, limit=limit)}
+
+    def top_queries(self, limit: int = 20) -> List[Dict]:
+        """Most repeated questions by fingerprint, with one wording and language of each"""
+        fingerprint, query, language = self.columns['fingerprint'], self.columns['query'], self.columns['language']
+        valid = np.flatnonzero(fingerprint.codes >= 0)
+        counts = np.bincount(fingerprint.codes[valid], minlength=len(fingerprint.categories))
+        top = np.argsort(-counts, kind='stable')[:limit]
+        top = top[counts[top] > 0]
+        # First row of each, for its wording
+        rows = [valid[np.argmax(fingerprint.codes[valid] == code)] for code in top]
+        total = max(len(valid), 1)
+        return [{'query': str(query.categories[query.codes[row]]) if query.codes[row] >= 0 else None,
+                 'language': str(language.categories[language.codes[row]]) if language.codes[row] >= 0 else None,
+                 'count': int(counts[code]), 'share': round(counts[code] / total, 4)}
+                for code, row in zip(top, rows)]
+
+    def cache_opportunity(self, sizes: Sequence[int] = CACHE_SIZES, ttl: Optional[float] = None) -> Dict:
+        """How many answered questions repeat an earlier one, and how many of those a cache would catch
+
+        A repeat is a request whose fingerprint was seen before. The hit rate at a size
+        assumes the cache holds that many of the most asked questions; with ttl, a
+        repeat only counts if the question was last asked at most ttl seconds before.
+        """
+        from response_cache import RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL
+        ttl = RESPONSE_CACHE_TTL if ttl is None else ttl
+        fingerprint = self.columns['fingerprint']
+        valid = np.flatnonzero(fingerprint.codes >= 0)
+        requests = len(valid)
+        if not requests:
+            return {'requests': 0}
+        codes, ts = fingerprint.codes[valid], self.columns['ts'][valid]
+        # By fingerprint, then time, as one float sort (as in grouped_percentiles)
+        order = np.argsort(codes * (ts.max() - ts.min() + 1) + (ts - ts.min()))
+        codes, ts, rows = codes[order], ts[order], valid[order]
+        repeat = np.zeros(requests, dtype=bool)
+        repeat[1:] = codes[1:] == codes[:-1]
+        gaps = ts[1:][repeat[1:]] - ts[:-1][repeat[1:]]
+        within_ttl = np.zeros(requests, dtype=bool)
+        within_ttl[1:][repeat[1:]] = gaps <= ttl
+
+        route = self.columns['route']
+        llm = np.flatnonzero(route.categories == 'llm')
+        llm_rows = np.isin(route.codes[rows], llm)
+
+        # Hits when the cache holds the k most asked questions: each one's repeats
+        counts = np.bincount(codes)
+        counts = np.sort(counts[counts > 0])[::-1]
+        hits_by_size = np.cumsum(counts - 1)
+        repeats = int(hits_by_size[-1])
+        curve = {str(size): round(int(hits_by_size[min(size, len(counts)) - 1]) / requests, 4) for size in sizes}
+        needed = {f"{share:.0%}": int(np.searchsorted(hits_by_size, share * repeats) + 1)
+                  for share in (0.5, 0.8, 0.9, 0.95)} if repeats else {}
+
+        return {
+            'requests': requests,
+            'distinct_questions': int(len(counts)),
+            'served_from_cache': round(float(self.columns['cache_hit'][rows].mean()), 4),
+            'repeats': repeats,
+            'repeat_rate': round(repeats / requests, 4),
+            'repeat_rate_within_ttl': round(int(within_ttl.sum()) / requests, 4),
+            'ttl_seconds': ttl,
+            'llm_calls_on_repeats': int((llm_rows & within_ttl).sum()),
+            'llm_calls': int(llm_rows.sum()),
+            'reuse_gap_seconds': {f"p{pct:g}": round(float(value), 1)
+                                  for pct, value in zip(PERCENTILES, np.percentile(gaps, PERCENTILES))}
+            if len(gaps) else {},
+            'hit_rate_by_size': curve,
+            'configured_size': RESPONSE_CACHE_SIZE,
+            'hit_rate_at_configured_size': round(
+                int(hits_by_size[min(RESPONSE_CACHE_SIZE, len(counts)) - 1]) / requests, 4),
+            'entries_for_share_of_repeats': needed,
+        }
+
+    def stage_latency(self) -> Dict[str, Dict]:
+        """Percentiles of each pipeline stage over the requests that ran it"""
+        stages = {}
+        zero = np.zeros(self.rows, dtype=np.int32)
+        for name in self.columns:
+            if name.startswith('ms_') or name == 'total_ms':
+                sizes, result = grouped_percentiles(zero, self.columns[name], 1)
+                if sizes[0]:
+                    stages[name[3:] if name.startswith('ms_') else 'total'] = _latency(sizes, result, 0)
+        return stages
+
+    def latency_by(self, group: str, value: str, min_samples: int = 1) -> Dict[str, Dict]:
+        column = self.columns[group]
+        sizes, result = grouped_percentiles(column.codes, self.columns[value], len(column.categories))
+        return {str(name): _latency(sizes, result, index) for index, name in enumerate(column.categories)
+                if sizes[index] >= min_samples}
+
+    def engine_latency(self, min_samples: int = 1) -> Dict:
+        """TTS time per engine and language, ASR time per engine, and LLM time per model
+
+        A request's TTS time includes engines that failed before the one that spoke,
+        so an engine that often follows failures looks slower than it is.
+        """
+        engine, language = self.columns['tts_engine'], self.columns['language']
+        pairs = len(language.categories)
+        groups = np.where((engine.codes >= 0) & (language.codes >= 0), engine.codes * pairs + language.codes, -1)
+        sizes, result = grouped_percentiles(groups, self.columns['ms_tts_synthesis'],
+                                            len(engine.categories) * pairs)
+        tts = {}
+        for index in np.flatnonzero(sizes >= min_samples):
+            code = str(language.categories[index % pairs])
+            name = LANGUAGE_NAMES.get(code, code)
+            tts.setdefault(name, {})[str(engine.categories[index // pairs])] = _latency(sizes, result, index)
+        return {'tts': tts,
+                'asr': self.latency_by('asr_engine', 'ms_asr', min_samples),
+                'llm': self.latency_by('model', 'ms_llm_call', min_samples)}
+
+    def engine_priority(self, min_samples: int = ENGINE_MIN_SAMPLES,
+                        tts: Optional[Dict] = None) -> Dict[str, List[str]]:
+        """TTS engines per language, fastest p90 first, among those with enough samples.
+
+        A starting point for AdvancedTTSHandler.engine_priority: it says nothing about
+        voice quality, and engines never used (or always failing over) are absent.
+        """
+        tts = self.engine_latency(min_samples)['tts'] if tts is None else tts
+        priority = {}
+        for language, engines in tts.items():
+            ranked = [name for name in engines if engines[name]['samples'] >= min_samples]
+            if ranked:
+                priority[language] = sorted(ranked, key=lambda name: (engines[name]['p90_ms'], engines[name]['p50_ms']))
+        return priority
+
+    def notes(self) -> List[str]:
+        """Why parts of the report are empty, so an empty list isn't mistaken for no traffic"""
+        notes = []
+        if not (self.columns['intent'].codes >= 0).any():
+            notes.append("No record carries an intent, so 'intents' and 'intents_by_language' are empty. "
+                         "Intents are classified as records are written; these logs predate that or "
+                         "hold no chat or voice requests.")
+        if not (self.columns['query'].codes >= 0).any():
+            notes.append("No question text was logged (INTERACTION_LOG_QUERY_CHARS=0), so topics and "
+                         "the wording of top_queries are unavailable; counts use fingerprints.")
+        return notes
+
+    def report(self, top: int = 20) -> Dict:
+        if not self.rows:
+            return {'records': 0}
+        ts = self.columns['ts']
+        engines = self.engine_latency()
+        return {
+            'records': self.rows,
+            'from': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(float(ts.min()))),
+            'to': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(float(ts.max()))),
+            'notes': self.notes(),
+            'endpoints': self.mix('endpoint'),
+            'languages': self.mix('language'),
+            'intents': self.mix('intent'),
+            'intents_by_language': self.intents_by_language(),
+            'routes': self.mix('route'),
+            'models': self.mix('model', top),
+            **self.topics(top),
+            'top_queries': self.top_queries(top),
+            'cache': self.cache_opportunity(),
+            'latency': {'stages': self.stage_latency(),
+                        'by_route': self.latency_by('route', 'total_ms'),
+                        'engines': engines},
+            'suggested_engine_priority': self.engine_priority(tts=engines['tts']),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Usage report over compacted interaction logs')
+    parser.add_argument('paths', nargs='*', help='compacted files or directories (default: <log dir>/compacted)')
+    parser.add_argument('--since-hours', type=float, help='only records from the last N hours')
+    parser.add_argument('--top', type=int, default=20)
+    args = parser.parse_args()
+
+    paths = args.paths or [os.path.join(interaction_log.INTERACTION_LOG_DIR, 'compacted')]
+    since = time.time() - args.since_hours * 3600 if args.since_hours else None
+    files = compacted_files(paths)
+    if not files:
+        print(f"No compacted logs in {', '.join(paths)}; run python interaction_log.py compact first")
+        sys.exit(1)
+    start = time.perf_counter()
+    report = InteractionStats.load(files, since).report(args.top)
+    report['seconds'] = round(time.perf_counter() - start, 2)
+    for note in report.get('notes', []):
+        print(f"Note: {note}", file=sys.stderr)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
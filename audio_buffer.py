@@ -0,0 +1,411 @@
+# audio_buffer.py
+# In-memory audio passed between the TTS engines, the cache, transcoding and playback,
+# so a clip never touches disk between synthesis and output.
+#
+# An AudioBuffer holds either raw 16-bit PCM or an encoded container (mp3, ogg/opus,
+# wav) over any bytes-like object - a response body, a Redis value or a slice of the
+# phrase bank mmap - without copying it. WAV input is parsed in place into a PCM view.
+# Decoding and encoding go through an ffmpeg subprocess over pipes (no temp files);
+# resampling is vectorized NumPy.
+
+import io
+import os
+import shutil
+import struct
+import threading
+import subprocess
+from typing import Iterator, Optional
+
+from lazy_imports import lazy_import
+
+# Loaded on the first PCM operation; engines that only pass encoded bytes never need it
+np = lazy_import('numpy')
+
+# ffmpeg binary used for decoding and the streaming encoder
+AUDIO_FFMPEG = os.getenv('AUDIO_FFMPEG', 'ffmpeg')
+# Size of each chunk yielded by AudioBuffer.stream()
+AUDIO_CHUNK_BYTES = int(os.getenv('AUDIO_CHUNK_BYTES', 16384))
+# Default bitrates for HTTP delivery of speech
+AUDIO_BITRATES = {'opus': os.getenv('AUDIO_OPUS_BITRATE', '24k'), 'mp3': os.getenv('AUDIO_MP3_BITRATE', '48k')}
+
+CONTENT_TYPES = {
+    'wav': 'audio/wav',
+    'mp3': 'audio/mpeg',
+    'opus': 'audio/ogg; codecs=opus',
+    'webm': 'audio/webm',
+    'pcm': 'audio/L16',
+}
+
+# ffmpeg encoder arguments and container per codec (opus in Ogg, as browsers expect)
+_ENCODERS = {
+    'opus': (['-c:a', 'libopus', '-application', 'voip'], 'ogg'),
+    'mp3': (['-c:a', 'libmp3lame'], 'mp3'),
+}
+
+
+class CodecUnavailable(RuntimeError):
+    """Raised when a conversion needs ffmpeg and it is not installed"""
+
+
+def ffmpeg_available() -> bool:
+    return shutil.which(AUDIO_FFMPEG) is not None
+
+
+def sniff_codec(data) -> str:
+    """'wav', 'opus', 'mp3', 'webm' or 'pcm' (unrecognised data is treated as raw PCM)"""
+    head = bytes(data[:4])
+    if head == b'RIFF':
+        return 'wav'
+    if head == b'OggS':
+        return 'opus'
+    if head == b'\x1a\x45\xdf\xa3':
+        return 'webm'  # EBML header, as recorded by MediaRecorder in Chromium browsers
+    if head[:3] == b'ID3' or (len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0):
+        return 'mp3'
+    return 'pcm'
+
+
+def wav_header(data_length: int, sample_rate: int, channels: int = 1) -> bytes:
+    return struct.pack('<4sI4s4sIHHIIHH4sI', b'RIFF', 36 + data_length, b'WAVE', b'fmt ', 16, 1,
+                       channels, sample_rate, sample_rate * channels * 2, channels * 2, 16,
+                       b'data', data_length)
+
+
+def pcm_to_wav(pcm, sample_rate: int, channels: int = 1) -> bytes:
+    return b''.join((wav_header(len(pcm), sample_rate, channels), pcm))
+
+
+def read_body(response):
+    """Body of a requests response made with stream=True, read straight into one buffer.
+
+    response.content joins a list of 10 KB chunks, so a clip briefly exists twice;
+    with a Content-Length the body is read into a preallocated bytearray instead.
+    """
+    length = response.headers.get('Content-Length')
+    if not length or response.headers.get('Content-Encoding', 'identity') != 'identity':
+        return response.content
+    body = memoryview(bytearray(int(length)))
+    received = 0
+    while received < len(body):
+        # Bounded reads: urllib3 stages each readinto() through a temporary of the same size
+        count = response.raw.readinto(body[received:received + AUDIO_CHUNK_BYTES * 4])
+        if not count:
+            raise ConnectionError(f"connection closed after {received} of {len(body)} bytes")
+        received += count
+    return body
+
+
+class BufferReader(io.RawIOBase):
+    """Read-only, seekable file object over a memoryview (io.BytesIO would copy it)"""
+
+    def __init__(self, view: memoryview):
+        self.view = view
+        self.position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        chunk = self.view[self.position:self.position + len(target)]
+        target[:len(chunk)] = chunk
+        self.position += len(chunk)
+        return len(chunk)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.position, io.SEEK_END: len(self.view)}[whence]
+        self.position = max(0, base + offset)
+        return self.position
+
+    def tell(self) -> int:
+        return self.position
+
+
+def resample(samples: 'np.ndarray', source_rate: int, target_rate: int) -> 'np.ndarray':
+    """Resample (frames, channels) int16 audio by linear interpolation.
+
+    When downsampling, a moving average over the rate ratio is applied first so
+    content above the new Nyquist frequency doesn't fold back as aliasing.
+    """
+    if source_rate == target_rate or len(samples) == 0:
+        return samples
+    frames = samples.shape[0]
+    x = samples.astype(np.float64)
+
+    width = int(np.ceil(source_rate / target_rate))
+    if width > 1:
+        half = width // 2
+        padded = np.pad(x, ((half, width - 1 - half), (0, 0)), mode='edge')
+        sums = np.cumsum(padded, axis=0)
+        sums = np.concatenate([np.zeros((1, x.shape[1])), sums])
+        x = (sums[width:] - sums[:-width]) / width
+
+    out_frames = max(1, int(round(frames * target_rate / source_rate)))
+    positions = np.arange(out_frames) * (source_rate / target_rate)
+    left = np.minimum(positions.astype(np.int64), frames - 1)
+    right = np.minimum(left + 1, frames - 1)
+    frac = (positions - left)[:, None]
+    out = x[left] * (1 - frac) + x[right] * frac
+    return np.clip(np.rint(out), -32768, 32767).astype('<i2')
+
+
+class AudioBuffer:
+    """One clip in memory: raw 16-bit little-endian PCM or an encoded container.
+
+    data is any bytes-like object and is kept as a memoryview; nothing is copied
+    until a different representation is asked for.
+    """
+
+    __slots__ = ('data', 'codec', 'sample_rate', 'channels', 'wav')
+
+    def __init__(self, data, codec: str, sample_rate: Optional[int] = None, channels: int = 1):
+        view = data if isinstance(data, memoryview) else memoryview(data)
+        # Byte-addressed, so slicing and len() work the same for arrays and bytes
+        self.data = view if view.format == 'B' and view.ndim == 1 else view.cast('B')
+        self.codec = codec
+        self.sample_rate = sample_rate
+        self.channels = channels
+        # For PCM unwrapped from a WAV file: the original file, reused by container()
+        self.wav = None
+
+    @classmethod
+    def from_pcm(cls, pcm, sample_rate: int, channels: int = 1) -> 'AudioBuffer':
+        """PCM from bytes or an int16 array (frames or (frames, channels))"""
+        if not isinstance(pcm, (bytes, bytearray, memoryview)):
+            pcm = np.ascontiguousarray(pcm, dtype='<i2')
+            channels = pcm.shape[1] if pcm.ndim > 1 else channels
+            pcm = pcm.reshape(-1)
+        return cls(pcm, 'pcm', sample_rate, channels)
+
+    @classmethod
+    def from_wav(cls, data) -> 'AudioBuffer':
+        """PCM view of a 16-bit WAV file's data chunk (no copy)"""
+        view = data if isinstance(data, memoryview) else memoryview(data)
+        if bytes(view[:4]) != b'RIFF' or bytes(view[8:12]) != b'WAVE':
+            raise ValueError('not a WAV file')
+        position, fmt = 12, None
+        while position + 8 <= len(view):
+            chunk_id = bytes(view[position:position + 4])
+            size = struct.unpack_from('<I', view, position + 4)[0]
+            body = position + 8
+            if chunk_id == b'fmt ':
+                fmt = struct.unpack_from('<HHIIHH', view, body)
+            elif chunk_id == b'data':
+                if fmt is None:
+                    raise ValueError('WAV data chunk before fmt chunk')
+                audio_format, channels, sample_rate, _, _, bits = fmt
+                if audio_format != 1 or bits != 16:
+                    raise ValueError('only 16-bit PCM WAV is supported')
+                # Streamed WAV (ffmpeg pipes, some TTS APIs) leaves the size unset
+                end = len(view) if size in (0, 0xFFFFFFFF) else min(len(view), body + size)
+                end -= (end - body) % (2 * channels)
+                buffer = cls(view[body:end], 'pcm', sample_rate, channels)
+                if body + size == end:
+                    buffer.wav = view[:end]
+                return buffer
+            position = body + size + (size & 1)
+        raise ValueError('WAV file has no data chunk')
+
+    @classmethod
+    def from_bytes(cls, data, codec: Optional[str] = None) -> 'AudioBuffer':
+        """Encoded audio as returned by a TTS API; WAV is unwrapped to PCM"""
+        codec = codec or sniff_codec(data)
+        if codec == 'wav':
+            return cls.from_wav(data)
+        return cls(data, codec)
+
+    @property
+    def is_pcm(self) -> bool:
+        return self.codec == 'pcm'
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes
+
+    @property
+    def duration(self) -> Optional[float]:
+        """Length in seconds (PCM only; None for encoded audio)"""
+        if not self.is_pcm or not self.sample_rate:
+            return None
+        return self.nbytes / (2 * self.channels * self.sample_rate)
+
+    @property
+    def content_type(self) -> str:
+        if self.is_pcm:
+            return f"audio/L16; rate={self.sample_rate}; channels={self.channels}"
+        return CONTENT_TYPES.get(self.codec, 'application/octet-stream')
+
+    @property
+    def extension(self) -> str:
+        """File extension of container() (PCM is wrapped as WAV; opus travels in Ogg)"""
+        return {'pcm': 'wav', 'opus': 'ogg'}.get(self.codec, self.codec)
+
+    def __bool__(self) -> bool:
+        return self.nbytes > 0
+
+    def __len__(self) -> int:
+        return self.nbytes
+
+    def __bytes__(self) -> bytes:
+        return self.data.tobytes()
+
+    def __repr__(self) -> str:
+        if self.is_pcm:
+            return f"AudioBuffer(pcm, {self.sample_rate}Hz, {self.channels}ch, {self.duration:.2f}s)"
+        return f"AudioBuffer({self.codec}, {self.nbytes} bytes)"
+
+    def samples(self) -> 'np.ndarray':
+        """(frames, channels) int16 array; a view of the buffer when it is already PCM"""
+        pcm = self if self.is_pcm else self.to_pcm()
+        return np.frombuffer(pcm.data, dtype='<i2').reshape(-1, pcm.channels)
+
+    def to_float32(self, sample_rate: Optional[int] = None) -> 'np.ndarray':
+        """Mono float32 samples in [-1, 1) (the input Whisper takes instead of a file)"""
+        return self.to_pcm(sample_rate, channels=1).samples()[:, 0].astype(np.float32) / 32768.0
+
+    def to_pcm(self, sample_rate: Optional[int] = None, channels: Optional[int] = None) -> 'AudioBuffer':
+        """Decoded (and optionally resampled or downmixed) PCM"""
+        if self.is_pcm:
+            buffer = self
+        else:
+            buffer = AudioBuffer.from_wav(_run_ffmpeg(self.data, ['-f', 'wav']))
+        if channels and channels != buffer.channels:
+            frames = buffer.samples().astype(np.int32)
+            mixed = frames.mean(axis=1, keepdims=True) if channels == 1 else np.repeat(frames[:, :1], channels, axis=1)
+            buffer = AudioBuffer.from_pcm(mixed.astype('<i2'), buffer.sample_rate, channels)
+        if sample_rate and sample_rate != buffer.sample_rate:
+            buffer = buffer.resample(sample_rate)
+        return buffer
+
+    def resample(self, sample_rate: int) -> 'AudioBuffer':
+        source = self if self.is_pcm else self.to_pcm()
+        if sample_rate == source.sample_rate:
+            return source
+        return AudioBuffer.from_pcm(resample(source.samples(), source.sample_rate, sample_rate), sample_rate)
+
+    def to_wav(self) -> bytes:
+        source = self if self.is_pcm else self.to_pcm()
+        return pcm_to_wav(source.data, source.sample_rate, source.channels)
+
+    def container(self):
+        """Bytes a player or HTTP client can open on its own: WAV for PCM, the data as-is otherwise"""
+        if self.is_pcm:
+            return self.wav if self.wav is not None else self.to_wav()
+        return self.data
+
+    def as_file(self) -> BufferReader:
+        """File-like object for APIs that want one (pygame, multipart uploads)"""
+        container = self.container()
+        return BufferReader(container if isinstance(container, memoryview) else memoryview(container))
+
+    def encode(self, codec: str, bitrate: Optional[str] = None) -> 'AudioBuffer':
+        """The whole clip in another codec"""
+        if codec == self.codec:
+            return self
+        if codec == 'pcm':
+            return self.to_pcm()
+        if codec == 'wav':
+            return AudioBuffer(self.to_wav(), 'wav')
+        return AudioBuffer(b''.join(self.stream(codec, bitrate)), codec)
+
+    def stream(self, codec: str, bitrate: Optional[str] = None,
+               chunk_bytes: int = AUDIO_CHUNK_BYTES) -> Iterator[bytes]:
+        """Yield the clip encoded as codec, chunk by chunk, for HTTP delivery.
+
+        WAV and PCM need no encoder; opus and mp3 are produced by ffmpeg as the
+        PCM is fed in, so the first chunk goes out before the encode finishes.
+        """
+        if codec == self.codec or (codec == 'pcm' and self.is_pcm):
+            yield from _chunks(self.data, chunk_bytes)
+            return
+        if codec == 'wav':
+            source = self if self.is_pcm else self.to_pcm()
+            yield wav_header(source.nbytes, source.sample_rate, source.channels)
+            yield from _chunks(source.data, chunk_bytes)
+            return
+        if codec not in _ENCODERS:
+            raise ValueError(f"unsupported codec: {codec}")
+        yield from StreamingEncoder(codec, bitrate).encode(self, chunk_bytes)
+
+
+def _chunks(view: memoryview, chunk_bytes: int) -> Iterator[bytes]:
+    for start in range(0, len(view), chunk_bytes):
+        yield view[start:start + chunk_bytes].tobytes()
+
+
+def _input_args(buffer: AudioBuffer) -> list:
+    if buffer.is_pcm:
+        return ['-f', 's16le', '-ar', str(buffer.sample_rate), '-ac', str(buffer.channels)]
+    return []
+
+
+def _ffmpeg_command(input_args: list, output_args: list) -> list:
+    if not ffmpeg_available():
+        raise CodecUnavailable(f"{AUDIO_FFMPEG} not found; install ffmpeg to decode or encode compressed audio")
+    return [AUDIO_FFMPEG, '-hide_banner', '-loglevel', 'error', *input_args, '-i', 'pipe:0',
+            *output_args, 'pipe:1']
+
+
+def _run_ffmpeg(data, output_args: list) -> bytes:
+    """Decode a whole encoded clip through ffmpeg's stdin/stdout"""
+    result = subprocess.run(_ffmpeg_command([], output_args), input=data, capture_output=True, check=False)
+    if result.returncode != 0:
+        raise ValueError(f"ffmpeg failed: {result.stderr.decode(errors='replace').strip()}")
+    return result.stdout
+
+
+class StreamingEncoder:
+    """Encodes audio to opus or mp3 with ffmpeg over pipes, yielding output as it is produced"""
+
+    def __init__(self, codec: str, bitrate: Optional[str] = None, sample_rate: Optional[int] = None):
+        if codec not in _ENCODERS:
+            raise ValueError(f"unsupported codec: {codec}")
+        self.codec = codec
+        self.bitrate = bitrate or AUDIO_BITRATES[codec]
+        # Output rate; opus only runs at 48k/24k/16k/12k/8k, ffmpeg picks the nearest
+        self.sample_rate = sample_rate
+
+    def _output_args(self) -> list:
+        codec_args, container = _ENCODERS[self.codec]
+        args = codec_args + ['-b:a', self.bitrate]
+        if self.sample_rate:
+            args += ['-ar', str(self.sample_rate)]
+        return args + ['-f', container]
+
+    def encode(self, buffer: AudioBuffer, chunk_bytes: int = AUDIO_CHUNK_BYTES) -> Iterator[bytes]:
+        process = subprocess.Popen(_ffmpeg_command(_input_args(buffer), self._output_args()),
+                                   stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+        def feed():
+            try:
+                for start in range(0, len(buffer.data), chunk_bytes):
+                    process.stdin.write(buffer.data[start:start + chunk_bytes])
+            except (BrokenPipeError, ValueError):
+                pass
+            finally:
+                try:
+                    process.stdin.close()
+                except OSError:
+                    pass
+
+        writer = threading.Thread(target=feed, name='audio-encoder-feed', daemon=True)
+        writer.start()
+        try:
+            while True:
+                chunk = process.stdout.read1(chunk_bytes)
+                if not chunk:
+                    break
+                yield chunk
+            process.wait()
+            if process.returncode != 0:
+                raise ValueError(f"ffmpeg failed: {process.stderr.read().decode(errors='replace').strip()}")
+        finally:
+            # Client went away mid-stream: stop the encoder instead of letting it finish
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            writer.join()
+            process.stdout.close()
+            process.stderr.close()
@@ -0,0 +1,203 @@
+# audio_delivery.py
+# Choose the codec and bitrate of a spoken response from client hints (Accept,
+# a quality parameter, Save-Data / ECT), transcode once per variant and keep each
+# variant in the audio cache. Speech defaults to low-bitrate Opus.
+
+import os
+import time
+import threading
+from typing import Dict, Iterator, List, Mapping, Optional, Tuple
+
+import telemetry
+from audio_buffer import AudioBuffer, CONTENT_TYPES, ffmpeg_available
+
+# Quality used when the client gives no hint
+AUDIO_DEFAULT_QUALITY = os.getenv('AUDIO_DEFAULT_QUALITY', 'medium')
+# Bitrates per quality level; Opus stays intelligible for speech down to ~12 kbps
+QUALITY_BITRATES = {
+    'low': {'opus': os.getenv('AUDIO_OPUS_LOW', '12k'), 'mp3': os.getenv('AUDIO_MP3_LOW', '32k')},
+    'medium': {'opus': os.getenv('AUDIO_OPUS_MEDIUM', '20k'), 'mp3': os.getenv('AUDIO_MP3_MEDIUM', '48k')},
+    'high': {'opus': os.getenv('AUDIO_OPUS_HIGH', '32k'), 'mp3': os.getenv('AUDIO_MP3_HIGH', '64k')},
+}
+# Server preference among codecs the client accepts equally
+CODEC_PREFERENCE = ('opus', 'mp3', 'wav')
+# Effective connection types (the ECT client hint) that get the low preset
+SLOW_CONNECTIONS = ('slow-2g', '2g', '3g')
+
+MIME_CODECS = {
+    'audio/ogg': ('opus',),
+    'audio/opus': ('opus',),
+    'audio/mpeg': ('mp3',),
+    'audio/mp3': ('mp3',),
+    'audio/wav': ('wav',),
+    'audio/wave': ('wav',),
+    'audio/x-wav': ('wav',),
+    'audio/*': CODEC_PREFERENCE,
+    '*/*': CODEC_PREFERENCE,
+}
+
+
+class AudioVariant:
+    """One deliverable form of a clip: codec plus bitrate (None for WAV or an untouched source)"""
+
+    def __init__(self, codec: str, bitrate: Optional[str] = None, quality: str = AUDIO_DEFAULT_QUALITY):
+        self.codec = codec
+        self.bitrate = bitrate
+        self.quality = quality
+
+    @property
+    def key(self) -> str:
+        return f"{self.codec}-{self.bitrate or 'source'}"
+
+    @property
+    def content_type(self) -> str:
+        return CONTENT_TYPES[self.codec]
+
+    def __repr__(self) -> str:
+        return f"AudioVariant({self.key})"
+
+
+def parse_accept(header: Optional[str]) -> Dict[str, float]:
+    """codec -> q for the audio types in an Accept header (every codec at q=1 when absent)"""
+    if not header or not header.strip():
+        return {codec: 1.0 for codec in CODEC_PREFERENCE}
+    weights = {}
+    for part in header.split(','):
+        fields = [field.strip() for field in part.split(';')]
+        mime = fields[0].lower()
+        q = 1.0
+        for param in fields[1:]:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+            elif name.strip().lower() == 'codecs' and mime == 'audio/ogg' and 'opus' not in value.lower():
+                q = 0.0
+        for codec in MIME_CODECS.get(mime, ()):
+            # A specific type outranks a wildcard that names the same codec
+            if mime in ('audio/*', '*/*') and codec in weights:
+                continue
+            weights[codec] = q
+    return weights
+
+
+def requested_quality(headers: Mapping[str, str], quality: Optional[str] = None) -> str:
+    """Explicit quality parameter, else low for Save-Data or a slow ECT hint, else the default"""
+    if quality in QUALITY_BITRATES:
+        return quality
+    if headers.get('Save-Data', '').strip().lower() == 'on':
+        return 'low'
+    if headers.get('ECT', '').strip().lower() in SLOW_CONNECTIONS:
+        return 'low'
+    return AUDIO_DEFAULT_QUALITY
+
+
+def negotiate(headers: Mapping[str, str], quality: Optional[str] = None) -> List[AudioVariant]:
+    """Acceptable variants, best first (client q-value, then CODEC_PREFERENCE)"""
+    level = requested_quality(headers, quality)
+    weights = parse_accept(headers.get('Accept'))
+    codecs = sorted((codec for codec, q in weights.items() if q > 0),
+                    key=lambda codec: (-weights[codec], CODEC_PREFERENCE.index(codec)))
+    return [AudioVariant(codec, QUALITY_BITRATES[level].get(codec), level) for codec in codecs]
+
+
+def choose(variants: List[AudioVariant], source: AudioBuffer) -> Optional[AudioVariant]:
+    """First variant that can be made from source: a pass-through of its codec, WAV from PCM,
+    or anything when ffmpeg is installed"""
+    can_encode = ffmpeg_available()
+    for variant in variants:
+        if variant.codec == source.codec:
+            # Already encoded in the wanted codec; re-encoding would only lose quality
+            return AudioVariant(variant.codec, None, variant.quality)
+        if variant.codec == 'wav' and (source.is_pcm or can_encode):
+            return variant
+        if can_encode:
+            return variant
+    return None
+
+
+class VoiceDelivery:
+    """Synthesize (or look up) a response and deliver it in the negotiated variant.
+
+    The source clip comes from the phrase bank, the audio cache or the TTS
+    engines. Every transcoded variant is stored in the audio cache under its
+    own key, so each clip is encoded once per variant.
+    """
+
+    def __init__(self, tts, cache=None, bank=None):
+        self.tts = tts
+        self.cache = cache
+        self.bank = bank
+        self.lock = threading.Lock()
+        self.stats = {'variant_hits': 0, 'transcodes': 0, 'passthrough': 0, 'unacceptable': 0}
+
+    def _count(self, key: str):
+        with self.lock:
+            self.stats[key] += 1
+
+    def _cached(self, text: str, language: str, variant: Optional[str] = None) -> Optional[AudioBuffer]:
+        return self.cache.get_cached_audio(text, language, variant) if self.cache else None
+
+    def source(self, text: str, language: str, voice_style: str = 'friendly') -> Optional[AudioBuffer]:
+        if self.bank:
+            with telemetry.span('tts_synthesis', engine='phrase_bank', language=language):
+                audio = self.bank.render(text, language, voice_style)
+            if audio:
+                return audio
+        audio = self._cached(text, language)
+        if audio:
+            return audio
+        audio = self.tts.synthesize_speech(text, language, voice_style)
+        if audio and self.cache:
+            self.cache.cache_audio(text, language, audio)
+        return audio
+
+    def deliver(self, text: str, language: str, variants: List[AudioVariant],
+                voice_style: str = 'friendly') -> Optional[Tuple[Iterator[bytes], AudioVariant, Optional[float]]]:
+        """(chunks, variant, duration in seconds if known); None if synthesis failed.
+
+        Raises LookupError when no acceptable variant can be produced.
+        """
+        if not variants:
+            self._count('unacceptable')
+            raise LookupError('no acceptable audio format')
+
+        if ffmpeg_available():
+            hit = self._cached(text, language, variants[0].key)
+            if hit:
+                self._count('variant_hits')
+                return iter([bytes(hit.container())]), variants[0], None
+
+        source = self.source(text, language, voice_style)
+        if not source:
+            return None
+        variant = choose(variants, source)
+        if variant is None:
+            self._count('unacceptable')
+            raise LookupError(f"no acceptable audio format for {source.codec} source without ffmpeg")
+
+        duration = source.duration
+        if variant.codec == source.codec or (variant.codec == 'wav' and source.is_pcm):
+            self._count('passthrough')
+            return source.stream(variant.codec), variant, duration
+
+        self._count('transcodes')
+        return self._transcode(text, language, source, variant), variant, duration
+
+    def _transcode(self, text: str, language: str, source: AudioBuffer, variant: AudioVariant) -> Iterator[bytes]:
+        """Stream the encoder output to the client and cache it once it is complete"""
+        chunks = []
+        start = time.perf_counter()
+        for chunk in source.stream(variant.codec, variant.bitrate):
+            chunks.append(chunk)
+            yield chunk
+        telemetry.registry.observe('farmdepot_audio_transcode_seconds', time.perf_counter() - start,
+                                   'Time to encode a response variant', codec=variant.codec)
+        if self.cache:
+            self.cache.cache_audio(text, language, AudioBuffer(b''.join(chunks), variant.codec), variant.key)
+
+    def get_stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {**self.stats, 'ffmpeg': ffmpeg_available()}
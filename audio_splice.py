@@ -0,0 +1,226 @@
+# audio_splice.py
+# Joins pre-rendered PCM segments (template text, number and currency words) into one
+# utterance with crossfades and loudness matching, so templated responses need no synthesis
+
+import os
+import re
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from audio_buffer import AudioBuffer
+
+SPLICE_CROSSFADE_MS = float(os.getenv('SPLICE_CROSSFADE_MS', 12))
+# Pause between phrase-level segments (template text around a number or price)
+SPLICE_GAP_MS = float(os.getenv('SPLICE_GAP_MS', 60))
+# Segments are scaled to this RMS level (dBFS) before joining
+SPLICE_TARGET_DBFS = float(os.getenv('SPLICE_TARGET_DBFS', -20))
+# Amplitude below which leading/trailing samples count as silence when trimming at build time
+SILENCE_THRESHOLD = 500
+
+# Largest number rendered as a single vocabulary clip; larger values are built from groups
+VOCAB_MAX = 999
+
+# How each language says numbers and prices with the vocabulary clips:
+# scale_first puts "thousand" before its multiplier (Hausa "dubu goma", not "goma dubu"),
+# joiner links a scale group to the remainder, currency_first says "Naira" before the amount.
+NUMBER_RULES = {
+    'english': {'thousand': 'thousand', 'million': 'million', 'joiner': None,
+                'scale_first': False, 'currency': 'naira', 'currency_first': False},
+    'hausa': {'thousand': 'dubu', 'million': 'miliyan', 'joiner': 'da',
+              'scale_first': True, 'currency': 'Naira', 'currency_first': True},
+    'igbo': {'thousand': 'puku', 'million': 'nde', 'joiner': 'na',
+             'scale_first': True, 'currency': 'Naịra', 'currency_first': True},
+    'yoruba': {'thousand': 'ẹgbẹrun', 'million': 'miliọnu', 'joiner': 'ati',
+               'scale_first': True, 'currency': 'Naira', 'currency_first': True},
+}
+
+# format_price_with_currency output: "₦25,000" (English) or "Naira 25,000" / "Naịra 25,000"
+PRICE_PATTERN = re.compile(r'^(?:₦\s*|Na[iị]ra\s+)(?P<amount>\d[\d,]*)$')
+
+
+def vocabulary_texts(language: str, vocab_max: int = VOCAB_MAX) -> Dict[str, str]:
+    """Vocabulary token -> text to render for a language"""
+    rules = NUMBER_RULES.get(language, NUMBER_RULES['english'])
+    texts = {f"num/{n}": str(n) for n in range(vocab_max + 1)}
+    texts['word/thousand'] = rules['thousand']
+    texts['word/million'] = rules['million']
+    texts['word/currency'] = rules['currency']
+    if rules['joiner']:
+        texts['word/joiner'] = rules['joiner']
+    return texts
+
+
+def number_tokens(value: int, language: str, vocab_max: int = VOCAB_MAX) -> Optional[List[str]]:
+    """Vocabulary tokens that say value in the language, or None if out of range
+
+    vocab_max is the largest number the archive holds a clip for; a value whose
+    million, thousand or unit group is above it can't be said.
+    """
+    if value < 0 or value >= 10 ** 9:
+        return None
+    if value <= vocab_max:
+        return [f"num/{value}"]
+
+    rules = NUMBER_RULES.get(language, NUMBER_RULES['english'])
+    tokens = []
+    millions, rest = divmod(value, 10 ** 6)
+    thousands, units = divmod(rest, 1000)
+    if max(millions, thousands, units) > vocab_max:
+        return None
+    for count, scale in ((millions, 'word/million'), (thousands, 'word/thousand')):
+        if not count:
+            continue
+        if tokens and rules['joiner']:
+            tokens.append('word/joiner')
+        group = [f"num/{count}"]
+        tokens.extend([scale] + group if rules['scale_first'] else group + [scale])
+    if units:
+        if rules['joiner']:
+            tokens.append('word/joiner')
+        tokens.append(f"num/{units}")
+    return tokens
+
+
+def price_tokens(price, language: str, vocab_max: int = VOCAB_MAX) -> Optional[List[str]]:
+    """Tokens for a price as format_price_with_currency would print it"""
+    text = str(price).strip()
+    match = PRICE_PATTERN.match(text)
+    amount = match.group('amount') if match else text
+    digits = amount.replace(',', '')
+    if not digits.isdigit():
+        return None
+    tokens = number_tokens(int(digits), language, vocab_max)
+    if tokens is None:
+        return None
+    rules = NUMBER_RULES.get(language, NUMBER_RULES['english'])
+    return ['word/currency'] + tokens if rules['currency_first'] else tokens + ['word/currency']
+
+
+def strip_id3(data: bytes) -> bytes:
+    """Drop a leading ID3v2 tag so MP3 segments can be concatenated frame to frame"""
+    if data[:3] == b'ID3' and len(data) > 10:
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        return data[10 + size:]
+    return data
+
+
+def trim_silence(pcm: bytes, channels: int = 1, threshold: int = SILENCE_THRESHOLD) -> bytes:
+    """Drop leading and trailing near-silent frames (TTS clips carry padding that breaks joins)"""
+    samples = np.frombuffer(pcm, dtype='<i2')
+    frames = samples.reshape(-1, channels) if channels > 1 else samples[:, None]
+    loud = np.flatnonzero(np.abs(frames).max(axis=1) > threshold)
+    if loud.size == 0:
+        return b''
+    return frames[loud[0]:loud[-1] + 1].tobytes()
+
+
+def rms_dbfs(pcm) -> float:
+    samples = np.frombuffer(pcm, dtype='<i2').astype(np.float32)
+    if samples.size == 0:
+        return -120.0
+    rms = float(np.sqrt(np.mean(samples * samples)))
+    return 20 * np.log10(max(rms, 1.0) / 32768.0)
+
+
+def splice(segments: Sequence, sample_rate: int, channels: int = 1,
+           levels: Optional[Sequence[float]] = None, gaps: Optional[Sequence[bool]] = None,
+           crossfade_ms: float = SPLICE_CROSSFADE_MS, gap_ms: float = SPLICE_GAP_MS,
+           target_dbfs: float = SPLICE_TARGET_DBFS) -> bytes:
+    """Join 16-bit PCM buffers into one.
+
+    levels are each segment's RMS in dBFS (measured at build time; measured here
+    if missing) and every segment is scaled to target_dbfs. gaps[i] inserts a
+    pause before segment i; otherwise adjacent segments overlap by an
+    equal-power crossfade of crossfade_ms.
+    """
+    if not segments:
+        return b''
+    arrays = []
+    for index, segment in enumerate(segments):
+        samples = np.frombuffer(segment, dtype='<i2').astype(np.float32).reshape(-1, channels)
+        level = levels[index] if levels is not None else rms_dbfs(segment)
+        arrays.append(samples * (10 ** ((target_dbfs - level) / 20)))
+
+    fade = int(sample_rate * crossfade_ms / 1000)
+    gap = int(sample_rate * gap_ms / 1000)
+    total = sum(len(a) for a in arrays)
+    out = np.zeros((total + gap * len(arrays), channels), dtype=np.float32)
+
+    ramp = np.linspace(0, np.pi / 2, max(fade, 1), dtype=np.float32)[:, None]
+    fade_in, fade_out = np.sin(ramp), np.cos(ramp)
+
+    position = 0
+    for index, samples in enumerate(arrays):
+        if index and gaps is not None and gaps[index]:
+            position += gap
+        elif index:
+            overlap = min(fade, len(samples), position)
+            if overlap:
+                out[position - overlap:position] *= fade_out[-overlap:]
+                samples = samples.copy()
+                samples[:overlap] *= fade_in[:overlap]
+                position -= overlap
+        out[position:position + len(samples)] += samples
+        position += len(samples)
+
+    return np.clip(out[:position], -32768, 32767).astype('<i2').tobytes()
+
+
+class SpliceEngine:
+    """Builds templated utterances from a phrase bank's segment and vocabulary clips"""
+
+    def __init__(self, bank, vocab_max: Optional[int] = None):
+        self.bank = bank
+        # Numbers with a clip of their own in this archive (set by `phrase_bank.py build --vocab-max`)
+        self.vocab_max = vocab_max if vocab_max is not None else bank.index.get('vocab_max', VOCAB_MAX)
+
+    def _clip_keys(self, tokens: List[str], language: str, voice: str) -> List[str]:
+        return [f"{language}/{voice}/vocab/{token}" for token in tokens]
+
+    def join(self, keys: List[str], gaps: Optional[List[bool]] = None) -> Optional[AudioBuffer]:
+        """Archive clips joined in order; None if any clip is missing"""
+        clips = [self.bank.get(key) for key in keys]
+        if not clips or any(clip is None for clip in clips):
+            return None
+        formats = {entry['format'] for _, entry in clips}
+        if formats == {'pcm'}:
+            layouts = {(entry['sample_rate'], entry['channels']) for _, entry in clips}
+            if len(layouts) != 1:
+                return None
+            sample_rate, channels = layouts.pop()
+            pcm = splice([audio for audio, _ in clips], sample_rate, channels,
+                         levels=[entry.get('dbfs', rms_dbfs(audio)) for audio, entry in clips], gaps=gaps)
+            return AudioBuffer.from_pcm(pcm, sample_rate, channels)
+        if formats == {'mp3'}:
+            # Archive built without a decoder: frame-level concatenation, no crossfade
+            return AudioBuffer(b''.join(strip_id3(bytes(audio)) for audio, _ in clips), 'mp3')
+        return None
+
+    def render_number(self, value: int, language: str, voice: str) -> Optional[AudioBuffer]:
+        tokens = number_tokens(value, language, self.vocab_max)
+        return self.join(self._clip_keys(tokens, language, voice)) if tokens else None
+
+    def render_price(self, price, language: str, voice: str) -> Optional[AudioBuffer]:
+        tokens = price_tokens(price, language, self.vocab_max)
+        return self.join(self._clip_keys(tokens, language, voice)) if tokens else None
+
+    def render_template(self, template_id: str, template_parts, language: str, voice: str,
+                        values: Dict[str, str]) -> Optional[AudioBuffer]:
+        """Template literal segments with each field spoken as a number (or a price for 'price' fields)"""
+        keys, gaps = [], []
+        for position, (literal, field) in enumerate(template_parts):
+            if literal.strip():
+                keys.append(f"{language}/{voice}/segment/{template_id}/{position}")
+                gaps.append(True)
+            if field:
+                value = str(values.get(field, '')).replace(',', '')
+                if field == 'price':
+                    tokens = price_tokens(value, language, self.vocab_max)
+                else:
+                    tokens = number_tokens(int(value), language, self.vocab_max) if value.isdigit() else None
+                if tokens is None:
+                    return None
+                keys.extend(self._clip_keys(tokens, language, voice))
+                gaps.extend([True] + [False] * (len(tokens) - 1))
+        return self.join(keys, gaps)
@@ -0,0 +1,115 @@
+# benchmarks/bench_admission.py
+# /chat under overload, with and without admission control, against an OpenRouter
+# mock that works on --capacity requests at a time (the rest wait in line).
+#
+# Usage: python benchmarks/bench_admission.py [--clients 32] [--seconds 10] [--latency-ms 1000]
+#
+# Every client asks a question from its own IP, reads the answer for --think-ms and
+# asks again; one extra "noisy" client sends from a single IP without pausing. "unlimited" lifts every limit at runtime,
+# "admission" applies --concurrency/--queue/--deadline. A request is "late" when it
+# took longer than the deadline (the point where a real client or gunicorn gives up).
+
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import threading
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from mock_servers import MockServices, build_configs
+from run import percentile
+
+# Question numbers, unique across runs so no answer comes from the response cache
+QUESTION_IDS = itertools.count()
+
+UNLIMITED = {'ip_rate': 0, 'key_rate': 0, 'llm_concurrency': 100000, 'queue_size': 100000,
+             'deadline_seconds': 3600}
+
+
+def client_loop(app, ip, stop, results, think, noisy=False):
+    client = app.test_client()
+    while not stop.is_set():
+        n = next(QUESTION_IDS)
+        start = time.perf_counter()
+        response = client.post('/chat', json={'message': f"How do I store maize from plot {n}?", 'language': 'en'},
+                               headers={'X-Forwarded-For': ip})
+        elapsed = time.perf_counter() - start
+        route = 'rate_limited' if response.status_code == 429 else (response.get_json() or {}).get('route')
+        results.append((noisy, route, elapsed))
+        if not noisy:
+            stop.wait(think)
+
+
+def run(app, limits, clients, seconds, deadline, think):
+    app_main = sys.modules['main']
+    app_main.admission.configure(**limits)
+    results, stop = [], threading.Event()
+    threads = [threading.Thread(target=client_loop, args=(app, f"10.0.{i // 250}.{i % 250}", stop, results, think))
+               for i in range(clients)]
+    threads.append(threading.Thread(target=client_loop, args=(app, '10.9.9.9', stop, results, think, True)))
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start  # Includes draining the requests still in flight
+
+    polite = [r for r in results if not r[0]]
+    latencies = [elapsed for _, route, elapsed in polite]
+    routes = {}
+    for _, route, _ in polite:
+        routes[route] = routes.get(route, 0) + 1
+    noisy = [r for r in results if r[0]]
+    return {
+        'requests': len(polite),
+        'routes': routes,
+        'llm_answers_per_s': round(routes.get('llm', 0) / wall, 2),
+        'p50_ms': round((percentile(latencies, 50) or 0.0) * 1000, 1),
+        'p95_ms': round((percentile(latencies, 95) or 0.0) * 1000, 1),
+        'max_ms': round(max(latencies, default=0) * 1000, 1),
+        'late': sum(1 for elapsed in latencies if elapsed > deadline),
+        'noisy_client': {'requests': len(noisy),
+                         'rate_limited': sum(1 for _, route, _ in noisy if route == 'rate_limited')},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--latency-ms', type=float, default=1000)
+    parser.add_argument('--think-ms', type=float, default=1000)
+    parser.add_argument('--capacity', type=int, default=4, help='requests the mock LLM works on at once')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--queue', type=int, default=8)
+    parser.add_argument('--deadline', type=float, default=5)
+    args = parser.parse_args()
+
+    configs = build_configs(['openrouter'], latency={'*': f"fixed:{args.latency_ms}"}, seed=0,
+                            overrides={'openrouter': {'max_concurrency': args.capacity}})
+    with MockServices(configs) as mocks:
+        os.environ.update(mocks.environment())
+        import logging
+        logging.disable(logging.WARNING)
+        import main as app_main
+
+        limited = {'ip_rate': 2, 'ip_burst': 10, 'key_rate': 20, 'llm_concurrency': args.concurrency,
+                   'queue_size': args.queue, 'deadline_seconds': args.deadline}
+        results = {
+            'unlimited': run(app_main.app, UNLIMITED, args.clients, args.seconds, args.deadline, args.think_ms / 1000),
+            'admission': run(app_main.app, limited, args.clients, args.seconds, args.deadline, args.think_ms / 1000),
+        }
+
+    print(json.dumps({'benchmark': 'admission', 'clients': args.clients, 'seconds': args.seconds,
+                      'llm_latency_ms': args.latency_ms, 'llm_capacity': args.capacity,
+                      'deadline_s': args.deadline, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
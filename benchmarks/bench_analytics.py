@@ -0,0 +1,207 @@
+# benchmarks/bench_analytics.py
+# Time to build the usage report over millions of interaction records.
+#
+# Usage: python benchmarks/bench_analytics.py [--records 2000000] [--loop-records 200000]
+#
+# Synthetic records are generated column by column (Zipf-distributed questions over
+# a pool of farming questions, a language mix, routes, and lognormal stage times per
+# engine). They are written as one compacted file in the default format, then loaded
+# and reported on by analytics.py. A per-record Python loop computing the language
+# mixes, repeat count and median time per stage and per engine runs over the first
+# --loop-records rows (decoded to dicts, as read from the JSON-lines logs, untimed),
+# and its results are checked against InteractionStats on the same rows.
+
+import os
+import sys
+import json
+import time
+import tempfile
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import interaction_log
+from interaction_log import Categorical, SCHEMA
+from analytics import InteractionStats
+
+CROPS = ['maize', 'rice', 'cassava', 'yam', 'tomato', 'sorghum', 'millet', 'pepper']
+ASKS = ["How do I plant {}?", "What fertilizer should I use for {}?", "How do I control pests on {}?",
+        "When should I harvest {}?", "How do I store {} after harvest?", "What is the price of {} in Kano?",
+        "I want to buy {} seeds", "Sell 20 bags of {}"]
+LANGUAGES = (['en', 'ha', 'yo', 'ig'], [0.55, 0.25, 0.12, 0.08])
+ROUTES = (['cache', 'llm', 'knowledge_base', 'prefetch', 'fallback', 'shed'], [0.3, 0.45, 0.12, 0.05, 0.06, 0.02])
+INTENTS = (['general', 'search', 'post'], [0.7, 0.2, 0.1])
+MIX_COLUMNS = ('endpoint', 'language', 'intent', 'route', 'model')
+STAGE_COLUMNS = ['total_ms'] + [name for name, _ in SCHEMA if name.startswith('ms_')]
+ENGINE_COLUMNS = (('tts_engine', 'ms_tts_synthesis'), ('asr_engine', 'ms_asr'), ('model', 'ms_llm_call'))
+# engine -> (median ms, sigma)
+TTS_ENGINES = {'azure': (450, 0.35), 'gtts': (900, 0.5), 'phrase_bank': (3, 0.3), 'elevenlabs': (700, 0.4)}
+ASR_ENGINES = {'google': (900, 0.4), 'whisper': (2200, 0.3), 'whisper_stream': (350, 0.3)}
+
+
+def categorical(rng, count, names, probabilities=None, missing=0.0):
+    codes = rng.choice(len(names), size=count, p=probabilities).astype(np.int32)
+    if missing:
+        codes[rng.random(count) < missing] = -1
+    order = np.argsort(names)
+    # Categories are stored sorted, as Categorical.encode leaves them
+    return Categorical(np.where(codes >= 0, np.argsort(order)[np.maximum(codes, 0)], -1).astype(np.int32),
+                       np.array(names, dtype=str)[order])
+
+
+def lognormal(rng, median, sigma, count):
+    return (median * np.exp(rng.normal(0, sigma, count))).astype(np.float32)
+
+
+def synthetic_columns(count, seed=0):
+    rng = np.random.default_rng(seed)
+    questions = [ask.format(crop) for crop in CROPS for ask in ASKS]
+    questions += [f"{question} ({variant})" for variant in range(400) for question in questions[:20]]
+    # Zipf popularity over the question pool
+    weights = 1 / np.arange(1, len(questions) + 1) ** 1.1
+    query_codes = rng.choice(len(questions), size=count, p=weights / weights.sum()).astype(np.int32)
+    columns = {
+        'ts': np.sort(time.time() - 7 * 86400 * rng.random(count)),
+        'endpoint': categorical(rng, count, ['chat', 'voice_job', 'tts_synthesize'], [0.8, 0.12, 0.08]),
+        'status': np.full(count, 200, dtype=np.int16),
+        'language': categorical(rng, count, *LANGUAGES),
+        'intent': categorical(rng, count, *INTENTS),
+        'route': categorical(rng, count, *ROUTES),
+        'model': categorical(rng, count, ['meta-llama/llama-3.1-8b-instruct', 'openai/gpt-4o-mini'],
+                             [0.7, 0.3], missing=0.55),
+        'tier': categorical(rng, count, ['small', 'strong'], [0.7, 0.3], missing=0.55),
+        'session': categorical(rng, count, [f"{i:016x}" for i in range(5000)]),
+        'query': Categorical(query_codes, np.array(questions, dtype=str)),
+        'fingerprint': Categorical(query_codes, np.array([f"{i:040x}" for i in range(len(questions))])),
+        'prompt_tokens': rng.integers(80, 600, count).astype(np.int32),
+        'completion_tokens': rng.integers(40, 300, count).astype(np.int32),
+        'asr_engine': categorical(rng, count, list(ASR_ENGINES), missing=0.85),
+        'tts_engine': categorical(rng, count, list(TTS_ENGINES), [0.4, 0.3, 0.2, 0.1], missing=0.8),
+    }
+    columns['cache_hit'] = np.isin(columns['route'].codes,
+                                   np.flatnonzero(np.isin(columns['route'].categories, ['cache', 'prefetch'])))
+    for name, kind in SCHEMA:
+        if name.startswith('ms_'):
+            columns[name] = np.full(count, np.nan, dtype=np.float32)
+    columns['ms_retrieval'] = lognormal(rng, 0.3, 0.5, count)
+    llm = columns['route'].codes == np.searchsorted(columns['route'].categories, 'llm')
+    columns['ms_llm_call'][llm] = lognormal(rng, 1400, 0.5, int(llm.sum()))
+    for column, engines in (('asr', ASR_ENGINES), ('tts_synthesis', TTS_ENGINES)):
+        engine = columns['asr_engine' if column == 'asr' else 'tts_engine']
+        for code, name in enumerate(engine.categories):
+            rows = engine.codes == code
+            columns[f"ms_{column}"][rows] = lognormal(rng, *engines[name], int(rows.sum()))
+    columns['total_ms'] = np.nansum([columns[name] for name, _ in SCHEMA if name.startswith('ms_')],
+                                    axis=0).astype(np.float32)
+    return columns
+
+
+def head(columns, count):
+    return {name: Categorical(column.codes[:count], column.categories) if isinstance(column, Categorical)
+            else column[:count] for name, column in columns.items()}
+
+
+def loop_report(records):
+    """The report's counts and percentiles written the obvious way, one record at a time"""
+    mixes = {name: {} for name in MIX_COLUMNS}
+    seen, repeats, latency = set(), 0, {}
+    for record in records:
+        for name in MIX_COLUMNS:
+            value = record[name]
+            if value is not None:
+                mixes[name][value] = mixes[name].get(value, 0) + 1
+        if record['fingerprint'] is not None:
+            if record['fingerprint'] in seen:
+                repeats += 1
+            seen.add(record['fingerprint'])
+        for stage in STAGE_COLUMNS:
+            value = record[stage]
+            if value == value:
+                latency.setdefault(stage, []).append(value)
+        for engine, stage in ENGINE_COLUMNS:
+            if record[engine] is not None and record[stage] == record[stage]:
+                latency.setdefault((record[engine], stage), []).append(record[stage])
+    medians = {}
+    for key, values in latency.items():
+        values.sort()
+        medians[key] = values[len(values) // 2]
+    return mixes, repeats, medians
+
+
+def vectorized_report(stats):
+    """The same figures from InteractionStats"""
+    mixes = {name: {row['value']: row['count'] for row in stats.mix(name)} for name in MIX_COLUMNS}
+    repeats = stats.cache_opportunity()['repeats']
+    medians = {}
+    for stage, summary in stats.stage_latency().items():
+        medians['total_ms' if stage == 'total' else f"ms_{stage}"] = summary['p50_ms']
+    for engine, stage in ENGINE_COLUMNS:
+        for name, summary in stats.latency_by(engine, stage).items():
+            medians[(name, stage)] = summary['p50_ms']
+    return mixes, repeats, medians
+
+
+def as_records(columns):
+    """Rows as the dicts a loop over the JSON-lines logs would see"""
+    names = list(columns)
+    decoded = []
+    for name in names:
+        column = columns[name]
+        if isinstance(column, Categorical):
+            categories = column.categories.tolist()
+            decoded.append([None if code < 0 else categories[code] for code in column.codes.tolist()])
+        else:
+            decoded.append(column.tolist())
+    return [dict(zip(names, values)) for values in zip(*decoded)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=2000000)
+    parser.add_argument('--loop-records', type=int, default=200000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    columns = synthetic_columns(args.records)
+    generate_s = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as directory:
+        fmt = interaction_log.default_format()
+        path = os.path.join(directory, f"interactions{interaction_log.FORMATS[fmt]}")
+        interaction_log.write_columns(columns, path, fmt)
+        size = os.path.getsize(path)
+        start = time.perf_counter()
+        stats = InteractionStats.load([directory])
+        load_s = time.perf_counter() - start
+        start = time.perf_counter()
+        report = stats.report()
+        report_s = time.perf_counter() - start
+
+    # The loop baseline on a prefix, checked against the vectorized code on the same rows
+    subset = head(columns, args.loop_records)
+    records = as_records(subset)
+    start = time.perf_counter()
+    loop = loop_report(records)
+    loop_s = time.perf_counter() - start
+    start = time.perf_counter()
+    vector = vectorized_report(InteractionStats(subset))
+    vector_s = time.perf_counter() - start
+    matches = (loop[0] == vector[0] and loop[1] == vector[1] and loop[2].keys() == vector[2].keys()
+               and all(abs(vector[2][key] - value) <= 0.02 * value + 0.1 for key, value in loop[2].items()))
+
+    print(json.dumps({
+        'benchmark': 'analytics', 'records': args.records, 'format': fmt, 'file_mb': round(size / 2 ** 20, 1),
+        'generate_s': round(generate_s, 2), 'load_s': round(load_s, 2), 'report_s': round(report_s, 2),
+        'records_per_s': round(args.records / report_s),
+        'loop_baseline': {'records': args.loop_records, 'loop_s': round(loop_s, 3),
+                          'vectorized_s': round(vector_s, 3), 'speedup': round(loop_s / vector_s, 1),
+                          'results_match': matches},
+        'report_excerpt': {key: report[key] for key in ('languages', 'routes', 'suggested_engine_priority')},
+        'cache': report['cache'],
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+# benchmarks/bench_audio_delivery.py
+# Payload size and time-to-play of /api/tts/synthesize per negotiated variant on
+# 2G/3G/4G links, against the Azure REST mock (24 kHz PCM source).
+#
+# Usage: python benchmarks/bench_audio_delivery.py [--rounds 5] [--start-ms 300]
+#
+# Server time to first byte and payload size are measured through the Flask app;
+# link time is modelled from them: two round trips (TCP + request), then the bytes
+# needed to buffer --start-ms of audio (time to play) or the whole payload (download).
+# Opus/MP3 variants are produced with ffmpeg; without it they are estimated from
+# their bitrate (and the WAV response's time to first byte) and marked "estimated".
+
+import os
+import sys
+import json
+import time
+import argparse
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from mock_servers import MockServices, build_configs
+
+# name: (downlink kbit/s, round-trip ms)
+LINKS = {
+    '2g': (50, 600),
+    '3g': (400, 200),
+    '4g': (4000, 60),
+}
+
+PHRASES = [
+    "Maize is available in Kaduna for twenty five thousand naira per bag.",
+    "Your yam tubers should be stored in a cool, dry barn with good air flow.",
+    "Ana samun masara a Kaduna a farashin Naira dubu ashirin da biyar.",
+]
+
+# Container bytes before the first audio (WAV header; Ogg OpusHead + OpusTags pages)
+CONTAINER_OVERHEAD = {'wav': 44, 'opus': 900, 'mp3': 0}
+
+
+def bitrate_bps(bitrate: str) -> int:
+    return int(float(bitrate.rstrip('k')) * 1000)
+
+
+def fetch(client, text: str, accept: str, quality: str):
+    start = time.perf_counter()
+    response = client.post('/api/tts/synthesize', json={'text': text, 'quality': quality},
+                           headers={'Accept': accept}, buffered=False)
+    chunks = iter(response.response)
+    first = next(chunks, b'')
+    ttfb = time.perf_counter() - start
+    payload = len(first) + sum(len(chunk) for chunk in chunks)
+    response.close()
+    return response, ttfb, payload
+
+
+def link_times(payload: int, duration: float, codec: str, ttfb: float, link, start_ms: float):
+    kbps, rtt_ms = link
+    bytes_per_second = kbps * 1000 / 8
+    audio_rate = max(payload - CONTAINER_OVERHEAD[codec], 1) / duration
+    startup = min(payload, CONTAINER_OVERHEAD[codec] + audio_rate * start_ms / 1000)
+    setup = 2 * rtt_ms / 1000 + ttfb
+    return {
+        'time_to_play_ms': round((setup + startup / bytes_per_second) * 1000, 1),
+        'download_ms': round((setup + payload / bytes_per_second) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--start-ms', type=float, default=300,
+                        help='audio buffered before playback starts')
+    args = parser.parse_args()
+
+    configs = build_configs(['azure'], latency={'*': 'fixed:0'}, seed=0)
+    with MockServices(configs) as mocks:
+        os.environ.update(mocks.environment())
+        os.environ.setdefault('TTS_CACHE_ENABLED', 'false')
+        # Every request comes from one test client; per-client rate limits would turn them into 429s
+        os.environ['ADMISSION_IP_RATE'] = '0'
+        os.environ['ADMISSION_KEY_RATE'] = '0'
+        import logging
+        logging.disable(logging.WARNING)
+        import main as app_main
+        from audio_delivery import QUALITY_BITRATES
+
+        client = app_main.app.test_client()
+        requests = [('wav', 'audio/wav', 'high')]
+        for codec, accept in (('opus', 'audio/ogg'), ('mp3', 'audio/mpeg')):
+            for quality in QUALITY_BITRATES:
+                requests.append((codec, accept, quality))
+
+        results = {}
+        for codec, accept, quality in requests:
+            name = codec if codec == 'wav' else f"{codec}-{quality}"
+            payloads, durations, ttfbs, estimated = [], [], [], False
+            for round_index in range(args.rounds):
+                for text in PHRASES:
+                    response, ttfb, payload = fetch(client, text, accept, quality)
+                    if response.status_code == 406:
+                        # No encoder here: size the variant from its bitrate and the WAV duration
+                        wav, ttfb, _ = fetch(client, text, 'audio/wav', quality)
+                        duration = float(wav.headers['X-Audio-Duration'])
+                        payload = int(CONTAINER_OVERHEAD[codec] + duration * bitrate_bps(QUALITY_BITRATES[quality][codec]) / 8)
+                        estimated = True
+                    else:
+                        duration = float(response.headers.get('X-Audio-Duration') or 0) or None
+                        if duration is None:
+                            wav, _, _ = fetch(client, text, 'audio/wav', quality)
+                            duration = float(wav.headers['X-Audio-Duration'])
+                    payloads.append(payload)
+                    durations.append(duration)
+                    ttfbs.append(ttfb)
+
+            ttfbs.sort()
+            payload = sum(payloads) / len(payloads)
+            duration = sum(durations) / len(durations)
+            ttfb = ttfbs[len(ttfbs) // 2]
+            results[name] = {
+                'payload_bytes': round(payload),
+                'kbit_per_audio_second': round(payload * 8 / duration / 1000, 1),
+                'server_ttfb_ms': round(ttfb * 1000, 2),
+                'estimated': estimated,
+                'links': {link: link_times(payload, duration, codec, ttfb, LINKS[link], args.start_ms)
+                          for link in LINKS},
+            }
+
+        wav_payload = results['wav']['payload_bytes']
+        for name, result in results.items():
+            result['size_vs_wav'] = round(result['payload_bytes'] / wav_payload, 3)
+
+    print(json.dumps({'benchmark': 'audio_delivery', 'start_ms': args.start_ms,
+                      'delivery_stats': app_main.voice_delivery.get_stats(), 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+# benchmarks/bench_audio_pipeline.py
+# Disk churn and memory per TTS request: in-memory AudioBuffers vs the old
+# temp-file pipeline (engine writes a NamedTemporaryFile, TTSCache copies it
+# into static/tts_cache, playback reloads it from disk).
+#
+# Usage: python benchmarks/bench_audio_pipeline.py [--requests 200] [--format riff-24khz-16bit-mono-pcm]
+#
+# Each pipeline runs in its own process against the Azure REST mock so peak RSS
+# is comparable. Python allocations per request are measured with tracemalloc.
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import subprocess
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from mock_servers import MockServices, build_configs
+
+PHRASES = [
+    "Maize is available in Kaduna for twenty five thousand naira per bag, delivered within three days.",
+    "Ana samun masara a Kaduna a farashin Naira dubu ashirin da biyar.",
+    "Ọka dị na Kaduna, ọnụahịa ya bụ puku naira iri abụọ na ise.",
+    "Agbado wa ni Kaduna fun ẹgbẹrun mẹẹdọgbọn naira.",
+]
+
+
+def legacy_request(engine, text, scratch):
+    """What synthesize -> cache_audio -> play_audio did before AudioBuffer"""
+    audio = engine.synthesize(text, 'english')
+    output_file = tempfile.NamedTemporaryFile(delete=False, suffix='.wav', dir=scratch)
+    output_file.write(audio.container())
+    output_file.close()
+
+    cache_dir = os.path.join(scratch, 'tts_cache')
+    os.makedirs(cache_dir, exist_ok=True)
+    cached_file = os.path.join(cache_dir, os.path.basename(output_file.name))
+    shutil.copy2(output_file.name, cached_file)
+
+    # pygame.mixer.music.load(path) streams the file back in
+    with open(output_file.name, 'rb') as f:
+        return play(f)
+
+
+def buffer_request(engine, text, cache):
+    audio = engine.synthesize(text, 'english')
+    # TTSCache hands the clip to Redis (out of process); setex takes the view without copying
+    cache['bytes'] += len(audio.container())
+    return play(audio.as_file())
+
+
+def play(source, chunk: int = 4096) -> int:
+    """Read a file object the way SDL's decoders do, a block at a time"""
+    total = 0
+    while True:
+        block = source.read(chunk)
+        if not block:
+            return total
+        total += len(block)
+
+
+def run_pipeline(mode: str, requests: int, output_format: str):
+    scratch = tempfile.mkdtemp(prefix='bench-audio-')
+    os.environ['AZURE_SPEECH_OUTPUT_FORMAT'] = output_format
+    import advanced_tts_handler
+    from advanced_tts_handler import AzureTTSEngine
+
+    if mode == 'legacy':
+        # Old behaviour: the body was read with response.content
+        advanced_tts_handler.read_body = lambda response: response.content
+    engine = AzureTTSEngine()
+    engine.warm()
+    cache = {'bytes': 0}
+    request = (lambda text: legacy_request(engine, text, scratch)) if mode == 'legacy' \
+        else (lambda text: buffer_request(engine, text, cache))
+    request(PHRASES[0])
+
+    tracemalloc.start()
+    latencies, peaks = [], []
+    for i in range(requests):
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        request(PHRASES[i % len(PHRASES)])
+        latencies.append((time.perf_counter() - start) * 1000)
+        peaks.append(tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+
+    files, disk_bytes = 0, 0
+    for root, _, names in os.walk(scratch):
+        for name in names:
+            files += 1
+            disk_bytes += os.path.getsize(os.path.join(root, name))
+    shutil.rmtree(scratch)
+
+    latencies.sort()
+    peaks.sort()
+    return {
+        'requests': requests,
+        'files_left_on_disk': files,
+        'disk_bytes_written': disk_bytes,
+        'p50_ms': round(latencies[len(latencies) // 2], 3),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95)], 3),
+        'alloc_peak_per_request_kb': round(peaks[len(peaks) // 2] / 1024, 1),
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--format', default='riff-24khz-16bit-mono-pcm',
+                        help='X-Microsoft-OutputFormat requested from the mock')
+    parser.add_argument('--mode', choices=['legacy', 'buffer'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_pipeline(args.mode, args.requests, args.format)))
+        return
+
+    results = {}
+    configs = build_configs(['azure'], latency={'*': 'fixed:0'}, seed=0)
+    with MockServices(configs) as mocks:
+        env = {**os.environ, **mocks.environment()}
+        for mode in ('legacy', 'buffer'):
+            output = subprocess.run([sys.executable, __file__, '--mode', mode, '--requests', str(args.requests),
+                                     '--format', args.format], env=env, capture_output=True, text=True, check=True)
+            results[mode] = json.loads(output.stdout.strip().splitlines()[-1])
+
+    legacy, buffered = results['legacy'], results['buffer']
+    print(json.dumps({
+        'benchmark': 'audio_pipeline',
+        'format': args.format,
+        'results': results,
+        'alloc_peak_ratio': round(buffered['alloc_peak_per_request_kb'] / max(legacy['alloc_peak_per_request_kb'], 0.1), 3),
+        'rss_saving_kb': legacy['max_rss_kb'] - buffered['max_rss_kb'],
+        'temp_files_saved_per_request': round((legacy['files_left_on_disk'] - buffered['files_left_on_disk'])
+                                              / args.requests, 2),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+# benchmarks/bench_bulk_listings.py
+# Throughput of BulkListingPoster against the mock WordPress server in mock_servers.py.
+#
+# Usage: python benchmarks/bench_bulk_listings.py [--items 200] [--latency-ms 50]
+
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_servers import MockServices, build_configs
+
+
+def make_listings(count):
+    crops = ['maize', 'rice', 'cassava', 'yam', 'tomato', 'beans']
+    categories = ['grains', 'grains', 'roots', 'roots', 'vegetables', 'Grains & Cereals']
+    return [
+        {
+            'title': f"Fresh {crops[i % len(crops)]} lot {i}",
+            'description': f"Harvest batch {i}",
+            'price': str(10000 + i * 250),
+            'category': categories[i % len(categories)],
+            'location': 'Kaduna'
+        }
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=200)
+    parser.add_argument('--latency-ms', type=float, default=50)
+    parser.add_argument('--error-rate', type=float, default=0.05)
+    parser.add_argument('--latency', help='mock latency spec, e.g. lognormal:50,0.5 (overrides --latency-ms)')
+    parser.add_argument('--max-rps', type=float, default=0, help='mock WordPress throughput cap')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workers', default='1,4,8,16')
+    args = parser.parse_args()
+
+    configs = build_configs(['wordpress'], latency={'*': args.latency or f"fixed:{args.latency_ms}"},
+                            error_rate=args.error_rate, max_rps=args.max_rps, seed=args.seed,
+                            overrides={'wordpress': {'error_codes': (503,)}})
+    mocks = MockServices(configs).start()
+    os.environ.update(mocks.environment())
+    os.environ['WORDPRESS_BACKOFF'] = '0.01'
+
+    from bulk_listings import BulkListingPoster, IdempotencyStore
+
+    results = []
+    for workers in [int(w) for w in args.workers.split(',')]:
+        poster = BulkListingPoster(token='bench', max_workers=workers,
+                                   idempotency_store=IdempotencyStore())
+        listings = make_listings(args.items)
+
+        start = time.perf_counter()
+        report = poster.post_all(listings)
+        elapsed = time.perf_counter() - start
+
+        results.append({
+            'workers': workers,
+            'items': args.items,
+            'seconds': round(elapsed, 3),
+            'items_per_second': round(args.items / elapsed, 1),
+            'summary': report['summary']
+        })
+
+    mocks.stop()
+    print(json.dumps({'benchmark': 'bulk_listings', 'latency_ms': args.latency_ms,
+                      'error_rate': args.error_rate, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
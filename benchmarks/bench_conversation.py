@@ -0,0 +1,83 @@
+# benchmarks/bench_conversation.py
+# Prompt size and build latency over long sessions, for each conversation backend.
+#
+# Usage: python benchmarks/bench_conversation.py [--turns 50] [--sessions 20]
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conversation_store import (ConversationStore, MemoryConversationBackend,
+                                SQLiteConversationBackend, estimate_tokens)
+from run import percentile
+
+SYSTEM_PROMPT = ("You are an expert Nigerian agricultural specialist. Provide practical, actionable "
+                 "farming advice specific to Nigerian conditions.")
+
+QUESTIONS = [
+    "How do I plant maize in Kaduna this season?",
+    "What about fertilizer for it?",
+    "Which pests should I watch for and how do I control fall armyworm without expensive chemicals?",
+    "When is the best time to harvest, and how do I dry and store the grain to avoid aflatoxin?",
+    "Can I intercrop it with cowpea or soybean?",
+]
+
+ANSWER = ("For maize in Nigeria, plant at the start of the rains using improved varieties such as "
+          "SAMMAZ-15. Space rows 75cm apart and plants 25cm apart. Apply NPK 20:10:10 at planting "
+          "and top-dress with urea after four to six weeks. Keep the field weed-free for the first "
+          "six weeks and scout weekly for pests. ") * 3
+
+
+def run(store, turns, sessions):
+    prompt_tokens, build_ms = [], []
+    for s in range(sessions):
+        session_id = f"bench-{s}"
+        for t in range(turns):
+            question = QUESTIONS[t % len(QUESTIONS)]
+            start = time.perf_counter()
+            messages = store.build_messages(session_id, SYSTEM_PROMPT, question)
+            build_ms.append((time.perf_counter() - start) * 1000)
+            prompt_tokens.append(sum(estimate_tokens(m['content']) for m in messages))
+
+            store.add_turn(session_id, 'user', question)
+            store.add_turn(session_id, 'assistant', ANSWER)
+
+    # Prompt size by turn index, to show it levels off instead of growing
+    by_turn = [prompt_tokens[t::turns] for t in range(turns)]
+    return {
+        'prompt_tokens_max': max(prompt_tokens),
+        'prompt_tokens_turn_1': by_turn[0][0],
+        'prompt_tokens_turn_10': by_turn[min(9, turns - 1)][0],
+        'prompt_tokens_last_turn': by_turn[-1][0],
+        'build_ms_p50': round(percentile(build_ms, 50), 3),
+        'build_ms_p95': round(percentile(build_ms, 95), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--turns', type=int, default=50)
+    parser.add_argument('--sessions', type=int, default=20)
+    args = parser.parse_args()
+
+    results = {'memory': run(ConversationStore(MemoryConversationBackend()), args.turns, args.sessions)}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = SQLiteConversationBackend(os.path.join(tmp, 'conversations.db'))
+        results['sqlite'] = run(ConversationStore(backend), args.turns, args.sessions)
+
+    # What the prompt would cost if every turn were sent verbatim
+    unbounded = estimate_tokens(SYSTEM_PROMPT) + args.turns * (estimate_tokens(QUESTIONS[0]) + estimate_tokens(ANSWER))
+
+    print(json.dumps({'benchmark': 'conversation_store', 'turns': args.turns,
+                      'sessions': args.sessions, 'unbounded_prompt_tokens_last_turn': unbounded,
+                      'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
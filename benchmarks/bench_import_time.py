@@ -0,0 +1,125 @@
+# benchmarks/bench_import_time.py
+# Import cost of the app modules, measured with `python -X importtime` in fresh interpreters.
+#
+# Usage:
+#   python benchmarks/bench_import_time.py                  # report
+#   python benchmarks/bench_import_time.py --check          # exit 1 if a budget is exceeded
+#   python benchmarks/bench_import_time.py --save-baseline  # overwrite benchmarks/import_time_baseline.json
+#
+# Two budgets per module: cumulative import time, allowed to grow by a margin over
+# the recorded baseline, and a list of heavy SDKs that must not be imported at
+# module load (they load on first use via lazy_imports). The baseline is scaled by
+# how much slower a stdlib reference import runs on this host than where it was
+# recorded, so a slower CI machine doesn't fail the check on its own.
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+BASELINE_PATH = os.path.join(BENCH_DIR, 'import_time_baseline.json')
+
+IMPORT_MODULES = ('lazy_imports', 'multilingual_handler', 'advanced_tts_handler', 'voice_handler',
+                  'production_tts_integration', 'main')
+# Budget: the baseline's cumulative time (best of --runs) times this, and at least this many ms over it
+IMPORT_BUDGET_MARGIN = 1.5
+IMPORT_BUDGET_SLACK_MS = 10
+# Stdlib import timed alongside, to compare this host's speed with the baseline's
+REFERENCE_MODULE = 'http.client'
+
+# Never imported just by loading an app module
+HEAVY_MODULES = (
+    'azure.cognitiveservices.speech', 'google.cloud.texttospeech', 'boto3', 'botocore',
+    'pydub', 'pygame', 'whisper', 'torch', 'speech_recognition', 'gtts',
+)
+
+
+def measure_import(module: str):
+    """Import a module in a fresh interpreter; returns (cumulative_ms, imported modules, max RSS KB)"""
+    code = f"import {module}, resource; print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)"
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            cwd=ROOT, capture_output=True, text=True,
+                            env={**os.environ, 'PYTHONDONTWRITEBYTECODE': '1'})
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed: {result.stderr.strip().splitlines()[-1:]}")
+
+    cumulative_us, imported = None, set()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        parts = [part.strip() for part in line[len('import time:'):].split('|')]
+        if not parts[1].isdigit():
+            continue  # header line
+        imported.add(parts[2])
+        if parts[2] == module:
+            cumulative_us = int(parts[1])
+    return (cumulative_us or 0) / 1000.0, imported, int(result.stdout.strip().splitlines()[-1])
+
+
+def budget_ms(baseline_ms: float) -> float:
+    return round(max(baseline_ms * IMPORT_BUDGET_MARGIN, baseline_ms + IMPORT_BUDGET_SLACK_MS), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--modules', default=','.join(IMPORT_MODULES))
+    parser.add_argument('--check', action='store_true', help='exit 1 when any budget is exceeded')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true')
+    args = parser.parse_args()
+
+    baseline, reference_ms = {}, None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            recorded = json.load(f)
+        baseline, reference_ms = recorded['cumulative_ms'], recorded.get('reference_ms')
+
+    host_reference_ms = round(min(measure_import(REFERENCE_MODULE)[0] for _ in range(args.runs)), 1)
+    # Never tighter than the baseline itself on a faster host
+    host_scale = max(1.0, host_reference_ms / reference_ms) if reference_ms else 1.0
+
+    results, violations = {}, []
+    for module in [m.strip() for m in args.modules.split(',') if m.strip()]:
+        try:
+            runs = [measure_import(module) for _ in range(args.runs)]
+        except RuntimeError as e:
+            results[module] = {'skipped': str(e)}
+            continue
+
+        best_ms = min(ms for ms, _, _ in runs)
+        imported = runs[0][1]
+        heavy = sorted(name for name in HEAVY_MODULES if name in imported)
+        budget = budget_ms(baseline[module] * host_scale) if module in baseline else None
+        results[module] = {
+            'cumulative_ms': round(best_ms, 1),
+            'baseline_ms': baseline.get(module),
+            'budget_ms': budget,
+            'max_rss_kb': min(rss for _, _, rss in runs),
+            'modules_imported': len(imported),
+            'heavy_imports': heavy,
+        }
+        if budget is not None and best_ms > budget:
+            violations.append(f"{module}: {best_ms:.1f}ms > {budget}ms budget")
+        if heavy:
+            violations.append(f"{module}: imports {', '.join(heavy)} at load time")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({'python': sys.version.split()[0], 'reference_ms': host_reference_ms,
+                       'cumulative_ms': {module: result['cumulative_ms'] for module, result in results.items()
+                                         if 'cumulative_ms' in result}}, f, indent=2)
+            f.write('\n')
+
+    print(json.dumps({'benchmark': 'import_time', 'python': sys.version.split()[0],
+                      'reference_ms': host_reference_ms, 'host_scale': round(host_scale, 2),
+                      'results': results, 'violations': violations}, indent=2))
+    if violations and args.check:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+# benchmarks/bench_interaction_log.py
+# Request-path cost of the structured interaction log, and its compaction.
+#
+# Usage: python benchmarks/bench_interaction_log.py [--records 20000] [--check]
+#
+# Times InteractionLog.record() inside a trace with spans for the usual chat stages,
+# against the INFO f-string log line chat() used to write per request, with both
+# going to real files. Also reports records dropped when a burst outruns the writer
+# thread, and compaction time and size of the resulting log files in each
+# available format. --check exits non-zero if record()'s p99 exceeds
+# INTERACTION_LOG_BUDGET_US.
+
+import os
+import sys
+import json
+import time
+import random
+import logging
+import tempfile
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import telemetry
+import interaction_log
+from interaction_log import InteractionLog, INTERACTION_LOG_BUDGET_US
+from lazy_imports import module_available
+from run import percentile
+
+QUESTIONS = [
+    ("What fertilizer should I use for maize?", 'en'),
+    ("When should I harvest rice?", 'en'),
+    ("Yaya zan dasa masara?", 'ha'),
+    ("Kedu mgbe m ga-akụ ji?", 'ig'),
+    ("Bawo ni mo se le gbin agbado?", 'yo'),
+    ("How do I control pests on tomato?", 'en'),
+]
+ROUTES = ['cache', 'llm', 'llm', 'knowledge_base', 'prefetch', 'fallback']
+
+
+def request_fields(rng):
+    question, language = rng.choice(QUESTIONS)
+    route = rng.choice(ROUTES)
+    fields = {'language': language, 'query': question, 'session_id': f"session-{rng.randrange(500)}",
+              'route': route, 'fingerprint': f"{rng.getrandbits(64):016x}"}
+    if route == 'llm':
+        fields.update(model='meta-llama/llama-3.1-8b-instruct', tier='small',
+                      usage={'prompt_tokens': rng.randrange(80, 600), 'completion_tokens': rng.randrange(40, 300)})
+    return fields
+
+
+def traced(fn):
+    """Run fn inside a trace holding the spans a chat request records"""
+    token = telemetry.start_trace('chat')
+    for stage in ('admission', 'cache_lookup', 'retrieval', 'llm_call'):
+        with telemetry.span(stage, engine='openrouter' if stage == 'llm_call' else None):
+            pass
+    start = time.perf_counter()
+    fn()
+    elapsed = (time.perf_counter() - start) * 1e6
+    telemetry.finish_trace(token)
+    return elapsed
+
+
+def time_record(directory, count, rng):
+    log = InteractionLog(directory, queue_size=count + 1)
+    samples = []
+    for _ in range(count):
+        endpoint, fields = 'chat', request_fields(rng)
+        samples.append(traced(lambda: log.record(endpoint, 200, **fields)))
+    log.close()
+    return samples, log.get_stats()
+
+
+def time_info_line(directory, count, rng):
+    logger = logging.getLogger('bench.info_line')
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    handler = logging.FileHandler(os.path.join(directory, 'app.log'))
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    logger.addHandler(handler)
+    samples = []
+    for _ in range(count):
+        fields = request_fields(rng)
+        message, language, model = fields['query'], fields['language'], None
+        samples.append(traced(lambda: logger.info(
+            f"Processing message: {message} (language: {language}, model: {model or 'auto'})")))
+    logger.removeHandler(handler)
+    handler.close()
+    return samples
+
+
+def burst(directory, count, queue_size, rng):
+    """Records logged back to back with a small queue: how many the writer thread keeps up with"""
+    log = InteractionLog(directory, queue_size=queue_size)
+    for _ in range(count):
+        log.record('chat', 200, **request_fields(rng))
+    log.close()
+    return log.get_stats()
+
+
+def summary(samples):
+    return {'p50_us': percentile(samples, 50, 2), 'p99_us': percentile(samples, 99, 2),
+            'mean_us': round(sum(samples) / len(samples), 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=20000)
+    parser.add_argument('--burst-queue', type=int, default=1000)
+    parser.add_argument('--check', action='store_true', help=f"fail if p99 exceeds {INTERACTION_LOG_BUDGET_US}us")
+    args = parser.parse_args()
+    rng = random.Random(0)
+
+    with tempfile.TemporaryDirectory() as directory:
+        record_samples, record_stats = time_record(os.path.join(directory, 'timed'), args.records, rng)
+        info_samples = time_info_line(directory, args.records, rng)
+        burst_stats = burst(os.path.join(directory, 'burst'), args.records, args.burst_queue, rng)
+
+        # Compaction of the timed run's log, closed above, in every available format
+        compaction = {}
+        source = os.path.join(directory, 'timed')
+        formats = ['npz'] + (['parquet', 'arrow'] if module_available('pyarrow') else [])
+        for fmt in formats:
+            copy = os.path.join(directory, f"compact-{fmt}")
+            os.makedirs(copy)
+            for name in os.listdir(source):
+                # Renamed as a rotated file, as a live process's own file is never compacted
+                with open(os.path.join(source, name), 'rb') as src, \
+                        open(os.path.join(copy, f"{name}.1"), 'wb') as dst:
+                    dst.write(src.read())
+            result = interaction_log.compact(copy, fmt=fmt)
+            columns = interaction_log.read_columns(result['output'])
+            compaction[fmt] = {key: result[key] for key in ('records', 'source_bytes', 'output_bytes', 'seconds')}
+            compaction[fmt]['rows_read_back'] = len(columns['ts'])
+
+    record = summary(record_samples)
+    report = {
+        'benchmark': 'interaction_log', 'records': args.records, 'budget_us': INTERACTION_LOG_BUDGET_US,
+        'record': record, 'info_line': summary(info_samples),
+        'written': record_stats['records'] - record_stats['dropped'],
+        'burst': {'queue_size': args.burst_queue, 'dropped': burst_stats['dropped']},
+        'compaction': compaction,
+    }
+    print(json.dumps(report, indent=2))
+    if args.check and record['p99_us'] > INTERACTION_LOG_BUDGET_US:
+        print(f"record() p99 {record['p99_us']}us exceeds the {INTERACTION_LOG_BUDGET_US}us budget")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+# benchmarks/bench_knowledge_base.py
+# LLM calls and tokens for chat questions with and without the crop knowledge base.
+#
+# Usage: python benchmarks/bench_knowledge_base.py [--llm-ms 300] [--rounds 3]
+#
+# Questions are the benchmark corpus plus common English farming questions. Each is
+# sent through process_farming_query against the mock OpenRouter, with the response
+# cache cleared so every question reaches retrieval. Reported per mode: LLM calls,
+# prompt and completion tokens as the mock counts them (4 characters per token),
+# answers served from the knowledge base, and latency.
+
+import os
+import sys
+import json
+import time
+import argparse
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from mock_servers import MockServices, build_configs
+from run import percentile
+
+QUESTIONS = [
+    "What fertilizer should I use for maize?",
+    "When should I harvest rice?",
+    "Which maize variety is best?",
+    "How do I control pests on tomato?",
+    "How should I space my maize plants?",
+    "When should I plant cassava?",
+    "Which cassava varieties give the best yield?",
+    "How much water does rice need?",
+    "How do I raise tomato seedlings in a nursery?",
+    "How far apart should I plant cassava?",
+    "What rice variety sells best at the market?",
+    "My maize leaves have holes, is it armyworm?",
+    "How do I store yam after harvest?",
+    "What is the price of maize in Kano?",
+    "Can I grow cocoa in Kaduna?",
+    "How do I start poultry farming?",
+]
+
+
+def run(main, queries, rounds):
+    totals = {'questions': 0, 'llm_calls': 0, 'knowledge_base': 0, 'prompt_tokens': 0, 'completion_tokens': 0}
+    latency = []
+    for _ in range(rounds):
+        for query in queries:
+            main.response_cache.entries.clear()
+            call_info = {}
+            start = time.perf_counter()
+            main.process_farming_query(query['text'], query['language'], call_info=call_info)
+            latency.append((time.perf_counter() - start) * 1000)
+            totals['questions'] += 1
+            totals['knowledge_base'] += call_info.get('route') == 'knowledge_base'
+            usage = call_info.get('usage')
+            if usage:
+                totals['llm_calls'] += 1
+                totals['prompt_tokens'] += usage.get('prompt_tokens', 0)
+                totals['completion_tokens'] += usage.get('completion_tokens', 0)
+    totals['tokens'] = totals['prompt_tokens'] + totals['completion_tokens']
+    totals['prompt_tokens_per_call'] = round(totals['prompt_tokens'] / totals['llm_calls'], 1) if totals['llm_calls'] else None
+    totals['latency_ms_p50'] = percentile(latency, 50, 1)
+    totals['latency_ms_mean'] = round(sum(latency) / len(latency), 1)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--llm-ms', type=float, default=300)
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    with open(os.path.join(BENCH_DIR, 'corpus.json'), encoding='utf-8') as f:
+        corpus = json.load(f)['queries']
+    question_sets = {
+        'corpus': [{'text': q['text'], 'language': q['language']} for q in corpus],
+        'faq_en': [{'text': text, 'language': 'en'} for text in QUESTIONS],
+    }
+
+    configs = build_configs(('openrouter',), latency={'*': f"fixed:{args.llm_ms}"}, seed=0)
+    with MockServices(configs) as mocks:
+        os.environ.update(mocks.environment())
+        os.environ.pop('ROUTING_LOG_PATH', None)
+        os.environ['TRACE_SLOW_MS'] = '0'
+        os.environ['PREFETCH_ENABLED'] = 'false'
+
+        import logging
+        logging.disable(logging.WARNING)
+        import main as app
+
+        knowledge = app.crop_knowledge
+        results = {}
+        for name, queries in question_sets.items():
+            app.crop_knowledge = None
+            without = run(app, queries, args.rounds)
+            app.crop_knowledge = knowledge
+            with_kb = run(app, queries, args.rounds)
+            results[name] = {
+                'without_kb': without,
+                'with_kb': with_kb,
+                'llm_calls_ratio': round(with_kb['llm_calls'] / without['llm_calls'], 3),
+                'tokens_ratio': round(with_kb['tokens'] / without['tokens'], 3),
+            }
+
+    print(json.dumps({'benchmark': 'knowledge_base', 'llm_ms': args.llm_ms, 'rounds': args.rounds,
+                      'passages': knowledge.get_stats()['passages'], 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
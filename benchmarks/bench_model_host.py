@@ -0,0 +1,163 @@
+# benchmarks/bench_model_host.py
+# Memory of N app worker processes that each load the speech models themselves vs
+# N workers sharing one model host (model_host.py), plus the per-call cost of going
+# through the host.
+#
+# Usage: python benchmarks/bench_model_host.py [--workers 4] [--model-mb 300] [--calls 20]
+#
+# The model is synthetic so the benchmark runs without Whisper: --model-mb of float32
+# weights that are fully touched at load (as loading a checkpoint does), and
+# "inference" is a matrix product of 1024-sample frames with them. Each worker
+# transcribes --calls clips of --clip-seconds and synthesizes --calls clips of
+# --tts-seconds, then holds still while the PSS (proportional set size, which splits
+# shared pages between the processes mapping them) of every process involved is read
+# from /proc/<pid>/smaps_rollup. Linux only.
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import numpy as np
+from run import percentile
+
+RATE = 16000
+FRAME = 1024
+
+
+class SyntheticModels:
+    """A transcriber and a synthesizer over --model-mb of weights"""
+
+    def __init__(self, model_mb):
+        rows = model_mb * 1024 * 1024 // (FRAME * 4)
+        self.weights = np.random.default_rng(0).standard_normal((rows, FRAME), dtype=np.float32)
+
+    def transcribe(self, samples, language=None, prompt=''):
+        frames = samples[:len(samples) // FRAME * FRAME].reshape(-1, FRAME)
+        scores = frames @ self.weights.T
+        return ' '.join(str(i % 997) for i in scores.argmax(axis=1)[:20])
+
+    def synthesize(self, text, language, voice_style='neutral'):
+        from audio_buffer import AudioBuffer
+        seconds = float(text)
+        tone = np.sin(np.arange(int(RATE * seconds)) * 2 * np.pi * 220 / RATE) * 8000
+        return AudioBuffer.from_pcm(tone.astype('<i2'), RATE)
+
+
+def pss_mb(pid):
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            if line.startswith('Pss:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def run_host(args):
+    import model_host
+    model_host.IN_HOST = True
+    models = SyntheticModels(args.model_mb)
+    host = model_host.ModelHost(args.socket, models.transcribe, models.synthesize, concurrency=args.concurrency)
+    host.serve_forever()
+
+
+def run_worker(args):
+    """Serve the calls, print timings, then wait for the parent to measure memory"""
+    clip = (np.random.default_rng(os.getpid()).standard_normal(int(RATE * args.clip_seconds)) * 0.1).astype(np.float32)
+    if args.socket:
+        import model_host
+        client = model_host.ModelHostClient(args.socket)
+        transcribe, synthesize = client.transcribe, client.synthesize
+    else:
+        models = SyntheticModels(args.model_mb)
+        transcribe, synthesize = models.transcribe, models.synthesize
+
+    asr_ms, tts_ms, audio_bytes = [], [], 0
+    for _ in range(args.calls):
+        start = time.perf_counter()
+        transcribe(clip, 'english', '')
+        asr_ms.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        audio = synthesize(str(args.tts_seconds), 'hausa')
+        tts_ms.append((time.perf_counter() - start) * 1000)
+        audio_bytes += audio.nbytes
+    print(json.dumps({'asr_ms': asr_ms, 'tts_ms': tts_ms, 'audio_bytes': audio_bytes}), flush=True)
+    sys.stdin.readline()
+    if args.socket:
+        client.close()
+
+
+def measure(args, shared):
+    """Start the workers (and host), let them finish their calls, then read everyone's PSS"""
+    script = os.path.abspath(__file__)
+    common = ['--model-mb', str(args.model_mb), '--calls', str(args.calls),
+              '--clip-seconds', str(args.clip_seconds), '--tts-seconds', str(args.tts_seconds)]
+    host, socket_args = None, []
+    start = time.perf_counter()
+    if shared:
+        path = os.path.join(tempfile.mkdtemp(prefix='bench-model-host-'), 'models.sock')
+        host = subprocess.Popen([sys.executable, script, '--role', 'host', '--socket', path,
+                                 '--concurrency', str(args.concurrency)] + common)
+        while not os.path.exists(path):
+            if host.poll() is not None:
+                raise RuntimeError('model host exited')
+            time.sleep(0.05)
+        socket_args = ['--socket', path]
+    workers = [subprocess.Popen([sys.executable, script, '--role', 'worker'] + socket_args + common,
+                                stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+               for _ in range(args.workers)]
+    reports = [json.loads(worker.stdout.readline()) for worker in workers]
+    wall = time.perf_counter() - start
+
+    worker_pss = [pss_mb(worker.pid) for worker in workers]
+    host_pss = pss_mb(host.pid) if host else 0.0
+    for worker in workers:
+        worker.stdin.write('\n')
+        worker.stdin.flush()
+        worker.wait()
+    if host:
+        host.terminate()
+        host.wait()
+
+    asr = [ms for r in reports for ms in r['asr_ms']]
+    tts = [ms for r in reports for ms in r['tts_ms']]
+    return {
+        'total_pss_mb': round(sum(worker_pss) + host_pss, 1),
+        'per_worker_pss_mb': round(sum(worker_pss) / len(worker_pss), 1),
+        'host_pss_mb': round(host_pss, 1) if host else None,
+        'asr_ms': {'p50': percentile(asr, 50, 2), 'p95': percentile(asr, 95, 2)},
+        'tts_ms': {'p50': percentile(tts, 50, 2), 'p95': percentile(tts, 95, 2)},
+        'audio_mb_returned': round(sum(r['audio_bytes'] for r in reports) / 1e6, 1),
+        'wall_s': round(wall, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--role', choices=['bench', 'host', 'worker'], default='bench')
+    parser.add_argument('--socket')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--model-mb', type=int, default=300)
+    parser.add_argument('--calls', type=int, default=20)
+    parser.add_argument('--clip-seconds', type=float, default=5)
+    parser.add_argument('--tts-seconds', type=float, default=4)
+    parser.add_argument('--concurrency', type=int, default=1, help='model host inference slots')
+    args = parser.parse_args()
+
+    if args.role == 'host':
+        return run_host(args)
+    if args.role == 'worker':
+        return run_worker(args)
+
+    results = {'per_worker_models': measure(args, shared=False), 'model_host': measure(args, shared=True)}
+    print(json.dumps({'benchmark': 'model_host', 'workers': args.workers, 'model_mb': args.model_mb,
+                      'host_concurrency': args.concurrency, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+# benchmarks/bench_model_router.py
+# Tier mix of routed LLM calls for a stream of popular questions behind a small response cache.
+#
+# Usage: python benchmarks/bench_model_router.py [--requests 20000] [--distinct 400] [--cache-size 100] [--check]
+#
+# Questions are short stand-alone farming questions drawn with Zipf(--zipf) popularity.
+# A miss is "answered" and cached, as main.process_farming_query does, so popular
+# questions fall out of the LRU and come back again and again. Reported are the
+# cache hit rate, LLM calls per tier, and how many strong-tier calls came only from
+# the miss-history feature. --check also routes one question that was answered and
+# then expired by TTL, and exits 1 if it, or any evicted question, went to the strong tier.
+
+import os
+import sys
+import json
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model_router import ModelRouter
+from response_cache import ResponseCache, query_fingerprint
+
+CROPS = ['maize', 'rice', 'cassava', 'yam', 'tomato', 'sorghum', 'millet', 'pepper']
+ASKS = ["How do I plant {}?", "What fertilizer should I use for {}?", "When should I harvest {}?",
+        "How do I store {} after harvest?", "How much water does {} need?"]
+
+
+def questions(distinct):
+    pool = [ask.format(crop) for crop in CROPS for ask in ASKS]
+    return [pool[i % len(pool)] + ('' if i < len(pool) else f" ({i // len(pool)})") for i in range(distinct)]
+
+
+def run(router, cache, stream):
+    tiers, from_misses = {}, 0
+    for question in stream:
+        fingerprint = query_fingerprint(question, 'en')
+        if cache.get(fingerprint):
+            continue
+        decision = router.route(question, language='en', miss_count=cache.miss_count(fingerprint))
+        tiers[decision.tier] = tiers.get(decision.tier, 0) + 1
+        if decision.tier == 'strong' and decision.features['cache_misses'] > 1 \
+                and decision.features['score'] - 2 < router.strong_threshold:
+            from_misses += 1
+        cache.put(fingerprint, f"answer to {question}", model=decision.model)
+    stats = cache.get_stats()
+    return {'requests': len(stream), 'cache_hit_rate': round(stats['hits'] / max(len(stream), 1), 3),
+            'llm_calls': sum(tiers.values()), 'tiers': tiers, 'strong_from_miss_history': from_misses}
+
+
+def expired_question_tier(router):
+    """Tier for a question whose cached answer has expired: it was answered, so it should route as new"""
+    cache = ResponseCache(ttl=0)
+    question = "How do I plant maize?"
+    fingerprint = query_fingerprint(question, 'en')
+    for _ in range(3):
+        cache.get(fingerprint)
+        cache.put(fingerprint, "Plant at the start of the rains.")
+    cache.get(fingerprint)
+    return router.route(question, language='en', miss_count=cache.miss_count(fingerprint)).tier
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--distinct', type=int, default=400)
+    parser.add_argument('--cache-size', type=int, default=100)
+    parser.add_argument('--zipf', type=float, default=1.1)
+    parser.add_argument('--check', action='store_true')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    pool = questions(args.distinct)
+    weights = [1 / (rank + 1) ** args.zipf for rank in range(len(pool))]
+    stream = rng.choices(pool, weights, k=args.requests)
+
+    router = ModelRouter(log_path=None)
+    report = {'benchmark': 'model_router', 'distinct': args.distinct, 'cache_size': args.cache_size,
+              'results': run(router, ResponseCache(max_entries=args.cache_size), stream),
+              'expired_question_tier': expired_question_tier(router)}
+    print(json.dumps(report, indent=2))
+
+    if args.check and (report['expired_question_tier'] != 'fast'
+                       or report['results']['strong_from_miss_history']):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
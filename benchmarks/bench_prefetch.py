@@ -0,0 +1,171 @@
+# benchmarks/bench_prefetch.py
+# Follow-up latency with and without speculative prefetching of likely next questions.
+#
+# Usage: python benchmarks/bench_prefetch.py [--sessions 40] [--turns 4] [--llm-ms 400]
+#
+# Sessions walk a Markov chain of topics (a crop's planting -> fertilizer or pests ->
+# harvest -> storage or market), asking each topic in one of a few phrasings, with
+# --think-ms between questions. The LLM is a sleep of --llm-ms behind the admission
+# gate, with --concurrency slots. The topic model is first learned from --train
+# sessions drawn from the same chain. Reported per mode: follow-up latency, hit rate,
+# LLM calls spent and saved by prefetching, and latency of live requests, to show
+# prefetch does not take capacity they need.
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import admission as admission_module
+from admission import AdmissionController
+from response_cache import ResponseCache
+from prefetcher import Prefetcher, TopicModel
+from run import percentile
+
+CROPS = ['maize', 'rice', 'cassava', 'yam', 'tomato']
+
+# aspect -> [(next aspect, probability)]
+CHAIN = {
+    'planting': [('fertilizer', 0.6), ('pests', 0.3), ('market', 0.1)],
+    'fertilizer': [('pests', 0.5), ('harvest', 0.4), ('water', 0.1)],
+    'pests': [('harvest', 0.7), ('fertilizer', 0.3)],
+    'water': [('harvest', 1.0)],
+    'harvest': [('storage', 0.6), ('market', 0.4)],
+    'storage': [('market', 1.0)],
+    'market': [('planting', 1.0)],
+}
+
+PHRASINGS = {
+    'planting': ["How do I plant {crop}?", "When should I plant {crop}?", "how do i plant {crop}"],
+    'fertilizer': ["What fertilizer should I use for {crop}?", "Which fertilizer is best for my {crop}?"],
+    'pests': ["How do I control pests on {crop}?", "How do I control pests on my {crop}?"],
+    'water': ["How much water does {crop} need?"],
+    'harvest': ["When should I harvest {crop}?", "When do I harvest my {crop}?"],
+    'storage': ["How do I store {crop} after harvest?", "How should I store my {crop}?"],
+    'market': ["What is the market price of {crop}?", "Where can I sell {crop} at a good price?"],
+}
+
+
+def session_questions(rng, turns):
+    crop, aspect = rng.choice(CROPS), 'planting'
+    questions = []
+    for _ in range(turns):
+        questions.append(rng.choice(PHRASINGS[aspect]).format(crop=crop))
+        options, weights = zip(*CHAIN[aspect])
+        aspect = rng.choices(options, weights)[0]
+    return questions
+
+
+def run(args, sessions, model, enabled):
+    admission_module.ADMISSION_INITIAL_LATENCY = args.llm_ms / 1000
+    admission = AdmissionController()
+    admission.configure(llm_concurrency=args.concurrency)
+    cache = ResponseCache()
+    calls = {'live': 0, 'prefetch': 0}
+    lock = threading.Lock()
+
+    def generate(question, language, session_id):
+        with lock:
+            calls['prefetch'] += 1
+        time.sleep(args.llm_ms / 1000)
+        return f"Answer to {question}"
+
+    prefetcher = Prefetcher(generate, cache, admission, model=model, enabled=enabled,
+                            workers=args.workers, calls_per_minute=args.calls_per_minute,
+                            headroom=args.headroom).start()
+    first, follow_up, live = [], [], []
+
+    def ask(session_id, message, turn):
+        start = time.perf_counter()
+        response = prefetcher.take(session_id, message) if turn else None
+        if response is None:
+            with admission.llm_slot(time.monotonic() + 30) as admitted:
+                if admitted:
+                    with lock:
+                        calls['live'] += 1
+                    time.sleep(args.llm_ms / 1000)
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                live.append(elapsed)
+        else:
+            elapsed = (time.perf_counter() - start) * 1000
+        prefetcher.after_answer(session_id, message, 'en', 'prefetch' if response else 'llm')
+        with lock:
+            (follow_up if turn else first).append(elapsed)
+
+    def user(index, questions):
+        time.sleep(index * args.arrival_ms / 1000)
+        for turn, message in enumerate(questions):
+            ask(f"user-{index}", message, turn)
+            time.sleep(args.think_ms / 1000 * random.Random(index * 31 + turn).uniform(0.5, 1.5))
+
+    threads = [threading.Thread(target=user, args=(i, questions)) for i, questions in enumerate(sessions)]
+    wall = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - wall
+    prefetcher.stop()
+
+    stats = prefetcher.get_stats()
+    follow_ups = len(follow_up)
+    return {
+        'wall_s': round(wall, 2),
+        'follow_up_ms_p50': percentile(follow_up, 50, 1),
+        'follow_up_ms_p95': percentile(follow_up, 95, 1),
+        'first_question_ms_p95': percentile(first, 95, 1),
+        'live_llm_ms_p95': percentile(live, 95, 1),
+        'hit_rate': round(stats['session_hits'] / follow_ups, 3) if follow_ups else None,
+        'llm_calls_live': calls['live'],
+        'llm_calls_prefetch': calls['prefetch'],
+        'llm_calls_total': calls['live'] + calls['prefetch'],
+        'llm_calls_saved': stats['llm_calls_saved'],
+        'payoff': stats['payoff'],
+        'prefetch': {key: stats[key] for key in ('queued', 'expired', 'dropped', 'session_unused')},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sessions', type=int, default=40)
+    parser.add_argument('--turns', type=int, default=4)
+    parser.add_argument('--train', type=int, default=500, help='sessions the topic model is learned from')
+    parser.add_argument('--llm-ms', type=float, default=400)
+    parser.add_argument('--think-ms', type=float, default=1500)
+    parser.add_argument('--arrival-ms', type=float, default=600, help='gap between sessions starting')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--headroom', type=int, default=2)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--calls-per-minute', type=float, default=600)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    model = TopicModel()
+    for index in range(args.train):
+        previous = None
+        for message in session_questions(rng, args.turns):
+            topic = model.topic(message)
+            model.learn('en', previous, topic, message)
+            previous = topic
+    sessions = [session_questions(rng, args.turns) for _ in range(args.sessions)]
+
+    results = {}
+    for name, enabled in (('off', False), ('on', True)):
+        # A fresh copy per run, as live traffic keeps teaching the model
+        copy = TopicModel()
+        copy.load_dict(json.loads(json.dumps(model.to_dict())))
+        results[name] = run(args, sessions, copy, enabled)
+
+    print(json.dumps({'benchmark': 'prefetch', 'sessions': args.sessions, 'turns': args.turns,
+                      'llm_ms': args.llm_ms, 'think_ms': args.think_ms, 'concurrency': args.concurrency,
+                      'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+# benchmarks/bench_ssml_rewriter.py
+# Text-to-SSML rewriting of long LLM answers: the single-pass ssml_rewriter vs the
+# per-call regex passes ProductionVoiceHandler used before.
+#
+# Usage: python benchmarks/bench_ssml_rewriter.py [--sentences 5,20,60] [--iterations 300]
+#
+# Answers are built from the mock OpenRouter answers plus sentences with prices,
+# place names and crops. Besides time per call, "valid_ssml" counts outputs that
+# parse as XML inside a <speak> root.
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import datetime
+import xml.etree.ElementTree as ET
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from mock_servers import CANNED_ANSWERS
+from ssml_rewriter import SSMLRewriter, PRONUNCIATION_RULES_PATH
+
+EXTRA_SENTENCES = [
+    "A 50kg bag of NPK costs about $45 in Kano and 38 dollars in Kaduna.",
+    "Traders in Lagos & Ibadan pay ₦12000 for a basket of tomatoes.",
+    "Move your corn to market by truck before the rains close the roads to Abuja.",
+    "Cassava, yam and plantain do well on the ridges; keep the plantain suckers <30cm apart.",
+    "Welcome farmers: store grain in hermetic bags, not an apartment corner.",
+]
+
+
+def legacy_adapt(text, language):
+    """ProductionVoiceHandler.adapt_text_for_nigerian_context and apply_pronunciation_rules as they were"""
+    adapted_text = re.sub(r'\$(\d+)', r'₦\1', text)
+    adapted_text = re.sub(r'(\d+)\s*dollars?', r'₦\1', adapted_text, flags=re.IGNORECASE)
+    if language == 'english':
+        adaptations = {'gasoline': 'petrol', 'elevator': 'lift', 'apartment': 'flat', 'truck': 'lorry',
+                       'corn': 'maize'}
+        for american, nigerian in adaptations.items():
+            adapted_text = re.sub(rf'\b{american}\b', nigerian, adapted_text, flags=re.IGNORECASE)
+    current_hour = datetime.datetime.now().hour
+    if adapted_text.lower().startswith('welcome'):
+        greetings = {
+            'english': 'Welcome' if 6 <= current_hour < 18 else 'Good evening, welcome',
+            'hausa': 'Sannu da zuwa' if 6 <= current_hour < 18 else 'Barka da yamma, sannu da zuwa',
+        }
+        if language in greetings:
+            adapted_text = adapted_text.replace('Welcome', greetings[language], 1)
+
+    text = adapted_text
+    place_pronunciations = {'Lagos': 'LAY-gos', 'Abuja': 'ah-BOO-jah', 'Kano': 'KAH-no',
+                            'Ibadan': 'ee-bah-DAHN', 'Kaduna': 'kah-DOO-nah'}
+    for place, pronunciation in place_pronunciations.items():
+        if place in text:
+            text = text.replace(place, f'<phoneme alphabet="ipa" ph="{pronunciation}">{place}</phoneme>')
+    text = re.sub(r'₦(\d+)', r'<say-as interpret-as="currency" language="en-NG">NGN \1</say-as>', text)
+    agricultural_terms = {'cassava': 'kah-SAH-vah', 'plantain': 'PLAN-tin', 'yam': 'YAHM'}
+    for term, pronunciation in agricultural_terms.items():
+        if term in text.lower():
+            pattern = re.compile(rf'\b{term}\b', re.IGNORECASE)
+            text = pattern.sub(f'<phoneme alphabet="ipa" ph="{pronunciation}">{term}</phoneme>', text)
+    return text
+
+
+def answers(sentences, count, seed=0):
+    rng = random.Random(seed)
+    pool = [s.strip() + '.' for text in CANNED_ANSWERS.values() for s in text.split('. ') if s.strip()]
+    pool += EXTRA_SENTENCES
+    return [' '.join(rng.choice(pool) for _ in range(sentences)) for _ in range(count)]
+
+
+def valid(fragment):
+    try:
+        ET.fromstring(f'<speak>{fragment}</speak>')
+        return True
+    except ET.ParseError:
+        return False
+
+
+def measure(fn, texts, language, iterations):
+    for text in texts[:5]:
+        fn(text, language)
+    samples = []
+    for i in range(iterations):
+        start = time.perf_counter_ns()
+        fn(texts[i % len(texts)], language)
+        samples.append((time.perf_counter_ns() - start) / 1000)
+    samples.sort()
+    outputs = [fn(text, language) for text in texts]
+    return {
+        'p50_us': round(samples[len(samples) // 2], 1),
+        'p95_us': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 1),
+        'valid_ssml': f"{sum(valid(o) for o in outputs)}/{len(outputs)}",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sentences', default='5,20,60', help='sentences per answer')
+    parser.add_argument('--iterations', type=int, default=300)
+    parser.add_argument('--language', default='english')
+    args = parser.parse_args()
+
+    rewriter = SSMLRewriter.from_file(PRONUNCIATION_RULES_PATH)
+    results = {}
+    for sentences in [int(s) for s in args.sentences.split(',') if s.strip()]:
+        texts = answers(sentences, 50)
+        legacy = measure(legacy_adapt, texts, args.language, args.iterations)
+        single = measure(rewriter.rewrite, texts, args.language, args.iterations)
+        results[f"{sentences}_sentences"] = {
+            'chars': sum(map(len, texts)) // len(texts),
+            'legacy': legacy,
+            'ssml_rewriter': single,
+            'speedup': round(legacy['p50_us'] / single['p50_us'], 2),
+        }
+
+    print(json.dumps({'benchmark': 'ssml_rewriter', 'language': args.language, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+# benchmarks/bench_streaming_asr.py
+# Wait between the user stopping talking and the final transcript: streamed audio
+# with VAD and sliding-window decoding vs uploading the finished recording.
+#
+# Usage: python benchmarks/bench_streaming_asr.py [--lengths 3,8,15] [--whisper tiny]
+#
+# A synthetic utterance (word-like bursts with pauses over background noise) is sent
+# to /api/voice/streams in 100ms chunks at real-time pace. "vad_end" keeps sending
+# the silence after the speech until the VAD closes the stream; "push_to_talk" sends
+# ?end=1 as soon as the speech stops. The upload baseline sends the whole WAV over
+# --uplink-kbps, then decodes all of it. Decoding uses Whisper when --whisper is
+# given and installed, and otherwise is modelled as --decode-base-ms plus
+# --decode-rtf times the audio length (Whisper base on a small CPU is about 0.3).
+
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+RATE = 16000
+CHUNK_MS = 100
+
+
+def utterance(seconds, seed=0):
+    """16 kHz int16: 300ms of room noise, `seconds` of word-like bursts with pauses, 2s of noise"""
+    rng = np.random.default_rng(seed)
+    t = 0.3
+    signal = [rng.normal(0, 20, int(RATE * 0.3))]
+    spoken = 0.0
+    while spoken < seconds:
+        word = rng.uniform(0.2, 0.45)
+        n = int(RATE * word)
+        pitch = rng.uniform(110, 220)
+        envelope = np.sin(np.linspace(0, np.pi, n))
+        voiced = np.sin(2 * np.pi * pitch * np.arange(n) / RATE) + 0.3 * rng.normal(0, 1, n)
+        signal.append(3000 * envelope * voiced)
+        gap = rng.uniform(0.3, 0.45) if rng.random() < 0.15 else rng.uniform(0.04, 0.1)
+        signal.append(rng.normal(0, 20, int(RATE * gap)))
+        spoken += word + gap
+    speech_end = sum(len(part) for part in signal)
+    signal.append(rng.normal(0, 20, int(RATE * 2.0)))
+    audio = np.clip(np.concatenate(signal), -32768, 32767).astype('<i2')
+    return audio, speech_end
+
+
+def make_decoder(args):
+    """(transcribe(samples, language, prompt), description)"""
+    if args.whisper:
+        try:
+            import whisper
+            model = whisper.load_model(args.whisper)
+
+            def transcribe(samples, language=None, prompt=''):
+                return model.transcribe(samples, language='en', initial_prompt=prompt or None, fp16=False,
+                                        condition_on_previous_text=False)['text'].strip()
+            return transcribe, f"whisper-{args.whisper}"
+        except ImportError:
+            print(f"whisper not installed; modelling decode time instead", file=sys.stderr)
+
+    def transcribe(samples, language=None, prompt=''):
+        seconds = len(samples) / RATE
+        time.sleep(args.decode_base_ms / 1000 + args.decode_rtf * seconds)
+        return ' '.join(['word'] * max(1, int(seconds * 2.5)))
+    return transcribe, f"modelled ({args.decode_base_ms:.0f}ms + {args.decode_rtf} x audio)"
+
+
+def stream(client, audio, speech_end, push_to_talk):
+    opened = client.post('/api/voice/streams', json={'language': 'en', 'sample_rate': RATE}).get_json()
+    chunk = RATE * CHUNK_MS // 1000
+    start = time.perf_counter()
+    stopped_at, interims, first_interim = None, set(), None
+    for index, offset in enumerate(range(0, len(audio), chunk)):
+        # Real-time pacing: a chunk is sent once it has been "recorded"
+        delay = start + (offset + chunk) / RATE - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        if stopped_at is None and offset + chunk >= speech_end:
+            stopped_at = start + speech_end / RATE
+            if push_to_talk:
+                client.post(f"{opened['audio_url']}?end=1", data=audio[offset:speech_end].tobytes())
+                break
+        state = client.post(opened['audio_url'], data=audio[offset:offset + chunk].tobytes()).get_json()
+        if state['interim'] and state['interim'] not in interims:
+            interims.add(state['interim'])
+            first_interim = first_interim or time.perf_counter() - start
+        if state['state'] in ('finalizing', 'final', 'failed'):
+            break
+
+    version = -1
+    while True:
+        state = client.get(f"{opened['poll_url']}?after={version}&wait=5").get_json()
+        version = state['version']
+        if state['state'] in ('final', 'failed'):
+            break
+    done = time.perf_counter()
+    return {
+        'latency_after_speech_ms': round((done - stopped_at) * 1000, 1),
+        'final_decode_ms': state['final_decode_ms'],
+        'interims': len(interims),
+        'first_interim_s': round(first_interim, 2) if first_interim else None,
+        'state': state['state'],
+    }
+
+
+def upload(transcribe, audio, speech_end, args):
+    """Upload the recording after the user stops (uplink time modelled), then decode all of it"""
+    recording = audio[:speech_end]
+    upload_seconds = args.rtt_ms / 1000 + (len(recording) * 2 + 44) * 8 / (args.uplink_kbps * 1000)
+    start = time.perf_counter()
+    transcribe(recording.astype(np.float32) / 32768.0, 'english', '')
+    decode = time.perf_counter() - start
+    return {'latency_after_speech_ms': round((upload_seconds + decode) * 1000, 1),
+            'upload_ms': round(upload_seconds * 1000, 1), 'decode_ms': round(decode * 1000, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lengths', default='3,8,15', help='seconds of speech per utterance')
+    parser.add_argument('--whisper', help='Whisper model to decode with (e.g. tiny), if installed')
+    parser.add_argument('--decode-base-ms', type=float, default=150)
+    parser.add_argument('--decode-rtf', type=float, default=0.3)
+    parser.add_argument('--uplink-kbps', type=float, default=256)
+    parser.add_argument('--rtt-ms', type=float, default=150)
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.WARNING)
+    import main as app_main
+    from streaming_asr import StreamRegistry
+
+    transcribe, decoder = make_decoder(args)
+    app_main.voice_streams = StreamRegistry(transcribe)
+    client = app_main.app.test_client()
+
+    results = {}
+    for seconds in [float(s) for s in args.lengths.split(',') if s.strip()]:
+        audio, speech_end = utterance(seconds)
+        results[f"{seconds:g}s"] = {
+            'upload': upload(transcribe, audio, speech_end, args),
+            'stream_vad_end': stream(client, audio, speech_end, push_to_talk=False),
+            'stream_push_to_talk': stream(client, audio, speech_end, push_to_talk=True),
+        }
+
+    print(json.dumps({'benchmark': 'streaming_asr', 'decoder': decoder, 'uplink_kbps': args.uplink_kbps,
+                      'stream_stats': app_main.voice_streams.get_stats(), 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+# benchmarks/bench_text_prep.py
+# Text preparation before TTS (SSML rewriting) for a stream of
+# answers where popular ones repeat, with and without the text_prep_cache LRU.
+#
+# Usage: python benchmarks/bench_text_prep.py [--sessions 32] [--answers 200] [--distinct 150]
+#
+# --sessions threads each speak --answers answers of --sentences sentences, drawn
+# from --distinct answers with Zipf(--zipf) popularity, as cached LLM answers for
+# common questions are. Reported are the time per prepare() call and the CPU seconds
+# all sessions spent on text preparation.
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from bench_ssml_rewriter import answers
+from ssml_rewriter import SSMLRewriter
+from text_prep_cache import TextPrepCache
+from run import percentile
+
+
+def run(cache, streams):
+    samples, lock = [], threading.Lock()
+
+    def session(stream):
+        mine = []
+        for text in stream:
+            start = time.perf_counter_ns()
+            cache.prepare(text, 'english', 'friendly')
+            mine.append((time.perf_counter_ns() - start) / 1000)
+        with lock:
+            samples.extend(mine)
+
+    threads = [threading.Thread(target=session, args=(stream,)) for stream in streams]
+    cpu, wall = time.process_time(), time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {
+        'calls': len(samples),
+        'p50_us': percentile(samples, 50, 1),
+        'p95_us': percentile(samples, 95, 1),
+        'cpu_s': round(time.process_time() - cpu, 3),
+        'wall_s': round(time.perf_counter() - wall, 3),
+        'cache': cache.get_stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sessions', type=int, default=32)
+    parser.add_argument('--answers', type=int, default=200, help='answers spoken per session')
+    parser.add_argument('--distinct', type=int, default=150)
+    parser.add_argument('--sentences', type=int, default=20)
+    parser.add_argument('--zipf', type=float, default=1.1)
+    parser.add_argument('--cache-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    pool = answers(args.sentences, args.distinct)
+    weights = [1 / (rank + 1) ** args.zipf for rank in range(len(pool))]
+    rng = random.Random(0)
+    streams = [rng.choices(pool, weights, k=args.answers) for _ in range(args.sessions)]
+
+    rewriter = SSMLRewriter.from_file()
+    results = {
+        'uncached': run(TextPrepCache(rewriter, max_entries=0), streams),
+        'cached': run(TextPrepCache(rewriter, max_entries=args.cache_size), streams),
+    }
+    print(json.dumps({'benchmark': 'text_prep', 'sessions': args.sessions, 'answers_per_session': args.answers,
+                      'distinct_answers': args.distinct, 'sentences': args.sentences,
+                      'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
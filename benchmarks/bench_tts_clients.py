@@ -0,0 +1,84 @@
+# benchmarks/bench_tts_clients.py
+# Per-clip TTS latency with pooled keep-alive clients vs a new client per call,
+# against the ElevenLabs and Azure REST mocks in mock_servers.py.
+#
+# Usage: python benchmarks/bench_tts_clients.py [--clips 200] [--threads 4] [--latency-ms 20]
+#
+# Loopback connections are cheap, so the saving here is a lower bound on what
+# TLS to a real region costs.
+
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_servers import MockServices, build_configs
+
+PHRASES = [
+    "Maize is available in Kaduna for twenty five thousand naira per bag.",
+    "Ana samun masara a Kaduna.",
+    "Ọka dị na Kaduna.",
+    "Agbado wa ni Kaduna.",
+]
+
+
+def run_clips(engine, clips: int, threads: int):
+    def one(i):
+        start = time.perf_counter()
+        audio = engine.synthesize(PHRASES[i % len(PHRASES)], 'english')
+        return time.perf_counter() - start, bool(audio)
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(one, range(clips)))
+    latencies = sorted(elapsed * 1000 for elapsed, _ in results)
+    return {
+        'clips': clips,
+        'failures': sum(1 for _, ok in results if not ok),
+        'p50_ms': round(latencies[len(latencies) // 2], 3),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95)], 3),
+        'mean_ms': round(sum(latencies) / len(latencies), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clips', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    args = parser.parse_args()
+
+    configs = build_configs(['elevenlabs', 'azure'], latency={'*': f"fixed:{args.latency_ms}"}, seed=0)
+    with MockServices(configs) as mocks:
+        os.environ.update(mocks.environment())
+        from advanced_tts_handler import AzureTTSEngine, ElevenLabsEngine
+
+        results = {}
+        for name, engine_class in (('elevenlabs', ElevenLabsEngine), ('azure_rest', AzureTTSEngine)):
+            # Old behaviour: nothing kept between calls, so each clip opens a new connection
+            per_call = engine_class()
+            per_call.sessions.max_idle = 0
+            run_clips(per_call, 5, 1)
+            per_call_result = run_clips(per_call, args.clips, args.threads)
+
+            pooled = engine_class()
+            pooled.warm()
+            run_clips(pooled, 5, 1)
+            pooled_result = run_clips(pooled, args.clips, args.threads)
+            pooled_result['pool'] = pooled.sessions.get_stats()
+
+            results[name] = {
+                'per_call_client': per_call_result,
+                'pooled_client': pooled_result,
+                'p50_saving_ms': round(per_call_result['p50_ms'] - pooled_result['p50_ms'], 3),
+            }
+
+    print(json.dumps({'benchmark': 'tts_clients', 'threads': args.threads,
+                      'mock_latency_ms': args.latency_ms, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+# benchmarks/bench_voice_jobs.py
+# Concurrent voice uploads handled synchronously (ASR, LLM and TTS inside the upload
+# request, as /voice did) vs queued as voice jobs and long-polled for results.
+#
+# Usage: python benchmarks/bench_voice_jobs.py [--clients 16] [--uploads 2] [--workers 1,2,4,8]
+#
+# The LLM and TTS calls go to the OpenRouter and Azure mocks; intent parsing is the
+# real MultilingualHandler. Speech recognition is modelled as --asr-ms of work per
+# upload (Whisper and Google recognition are not load-tested here). Every HTTP
+# request holds one of --web-threads server threads, like a gunicorn gthread worker,
+# and "over_proxy_timeout" counts requests that ran longer than --proxy-timeout.
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from mock_servers import MockServices, build_configs
+from run import percentile
+
+QUESTIONS = [
+    ("How do I control fall armyworm on my maize farm?", 'english'),
+    ("Yaya zan shuka masara a lokacin damina?", 'hausa'),
+    ("Kedu ka m ga-esi chekwaa ji m?", 'igbo'),
+    ("Bawo ni mo se le gbin agbado?", 'yoruba'),
+]
+
+
+def summarize(samples):
+    return {'p50_s': percentile(samples, 50, 3), 'p95_s': percentile(samples, 95, 3)}
+
+
+def make_uploads(count):
+    """Distinct short WAV recordings, and the question each one stands for"""
+    import numpy as np
+    from audio_buffer import pcm_to_wav
+    uploads = {}
+    for index in range(count):
+        pcm = np.zeros(16000, dtype='<i2')
+        pcm[:4] = np.frombuffer(index.to_bytes(8, 'little'), dtype='<i2')
+        uploads[pcm_to_wav(pcm.tobytes(), 16000)] = QUESTIONS[index % len(QUESTIONS)]
+    return uploads
+
+
+def build_pipeline(app_main, uploads, asr_seconds):
+    from voice_jobs import VoicePipeline
+    from multilingual_handler import MultilingualHandler
+    multilingual = MultilingualHandler()
+
+    def transcribe(data):
+        time.sleep(asr_seconds)
+        return uploads[bytes(data)][0]
+
+    def answer(text, language, session_id, call_info):
+        return app_main.process_farming_query(text, app_main.CHAT_LANGUAGES.get(language, language),
+                                              session_id=session_id, call_info=call_info)
+
+    def speak(text, language):
+        return app_main.get_voice_delivery().source(text, language)
+
+    return VoicePipeline(transcribe, multilingual.parse_multilingual_command, answer, speak)
+
+
+class WebServer:
+    """Threads a gunicorn gthread worker has for requests; each request holds one"""
+
+    def __init__(self, threads):
+        self.slots = threading.Semaphore(threads)
+        self.durations = []
+
+    def handle(self, call):
+        with self.slots:
+            start = time.perf_counter()
+            result = call()
+            self.durations.append(time.perf_counter() - start)
+            return result
+
+
+def run_clients(clients, uploads_per_client, upload_list, client_fn):
+    results, threads = [], []
+    start = time.perf_counter()
+    for c in range(clients):
+        mine = upload_list[c * uploads_per_client:(c + 1) * uploads_per_client]
+        threads.append(threading.Thread(target=lambda mine=mine: [results.append(client_fn(u)) for u in mine]))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - start
+
+
+def run_sync(pipeline, upload_list, args):
+    server = WebServer(args.web_threads)
+
+    def handle(data):
+        call_info = {}
+        text = pipeline.transcribe(data)
+        parsed = pipeline.understand(text)
+        response = pipeline.answer(text, parsed['detected_language'], None, call_info)
+        return pipeline.speak(response, parsed['detected_language'])
+
+    def client(data):
+        start = time.perf_counter()
+        audio = server.handle(lambda: handle(data))
+        elapsed = time.perf_counter() - start
+        return {'transcript': elapsed, 'response': elapsed, 'audio': elapsed, 'ok': bool(audio)}
+
+    results, wall = run_clients(args.clients, args.uploads, upload_list, client)
+    return report(results, wall, server, args.proxy_timeout)
+
+
+def run_jobs(app_main, pipeline, upload_list, workers, args):
+    from voice_jobs import VoiceJobStore, VoiceJobWorkers
+    tmp = tempfile.mkdtemp(prefix='bench-voice-jobs-')
+    store = VoiceJobStore(os.path.join(tmp, 'voice_jobs.db'))
+    app_main.voice_jobs = VoiceJobWorkers(store, pipeline, workers).start()
+    server = WebServer(args.web_threads)
+    client = app_main.app.test_client()
+
+    def upload(data):
+        start = time.perf_counter()
+        submitted = server.handle(lambda: client.post('/api/voice/jobs', data=data,
+                                                      content_type='audio/wav').get_json())
+        times, version = {'submit': time.perf_counter() - start}, -1
+        while True:
+            job = server.handle(lambda: client.get(
+                f"/api/voice/jobs/{submitted['job_id']}?after={version}&wait={args.poll_wait}").get_json())
+            version = job['version']
+            now = time.perf_counter() - start
+            if job['transcript'] and 'transcript' not in times:
+                times['transcript'] = now
+            if job['response'] and 'response' not in times:
+                times['response'] = now
+            if job['status'] in ('done', 'failed'):
+                times['audio'] = now
+                times['ok'] = bool(job.get('audio_url'))
+                return times
+
+    results, wall = run_clients(args.clients, args.uploads, upload_list, upload)
+    app_main.voice_jobs.stop()
+    app_main.voice_jobs = None
+    result = report(results, wall, server, args.proxy_timeout)
+    result['submit'] = summarize([r['submit'] for r in results])
+    return result
+
+
+def report(results, wall, server, proxy_timeout):
+    return {
+        'uploads': len(results),
+        'failed': sum(1 for r in results if not r['ok']),
+        'uploads_per_s': round(len(results) / wall, 2),
+        'time_to_transcript': summarize([r['transcript'] for r in results if 'transcript' in r]),
+        'time_to_text_answer': summarize([r['response'] for r in results if 'response' in r]),
+        'time_to_audio': summarize([r['audio'] for r in results]),
+        'longest_http_request_s': round(max(server.durations), 3),
+        'over_proxy_timeout': sum(1 for d in server.durations if d > proxy_timeout),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--uploads', type=int, default=2, help='uploads per client, back to back')
+    parser.add_argument('--workers', default='1,2,4,8', help='voice job worker threads to try')
+    parser.add_argument('--asr-ms', type=float, default=1500)
+    parser.add_argument('--llm-ms', type=float, default=2000)
+    parser.add_argument('--tts-ms', type=float, default=300)
+    parser.add_argument('--web-threads', type=int, default=8)
+    parser.add_argument('--poll-wait', type=float, default=10)
+    parser.add_argument('--proxy-timeout', type=float, default=30)
+    args = parser.parse_args()
+
+    configs = build_configs(['openrouter', 'azure'], seed=0, latency={'openrouter': f"fixed:{args.llm_ms}",
+                                                                      'azure': f"fixed:{args.tts_ms}"})
+    with MockServices(configs) as mocks:
+        os.environ.update(mocks.environment())
+        os.environ.setdefault('TTS_CACHE_ENABLED', 'false')
+        import logging
+        logging.disable(logging.WARNING)
+        import main as app_main
+        # Every upload is a new question, so the LLM is not skipped by the response cache
+        app_main.response_cache.max_entries = 0
+        app_main.admission.configure(ip_rate=0, key_rate=0, llm_concurrency=64, queue_size=64,
+                                     deadline_seconds=3600)
+
+        uploads = make_uploads(args.clients * args.uploads)
+        upload_list = list(uploads)
+        pipeline = build_pipeline(app_main, uploads, args.asr_ms / 1000)
+        results = {'sync': run_sync(pipeline, upload_list, args)}
+        for workers in [int(w) for w in args.workers.split(',') if w.strip()]:
+            results[f"jobs_{workers}_workers"] = run_jobs(app_main, pipeline, upload_list, workers, args)
+
+    print(json.dumps({'benchmark': 'voice_jobs', 'clients': args.clients, 'uploads_per_client': args.uploads,
+                      'stage_ms': {'asr': args.asr_ms, 'llm': args.llm_ms, 'tts': args.tts_ms},
+                      'web_threads': args.web_threads, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
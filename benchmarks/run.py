@@ -0,0 +1,280 @@
+# benchmarks/run.py
+# Reproducible micro/macro benchmarks for the chat and voice hot paths.
+#
+# Usage:
+#   python benchmarks/run.py                         # run all, print JSON
+#   python benchmarks/run.py --only micro            # micro or macro only
+#   python benchmarks/run.py --save-baseline         # overwrite benchmarks/baseline.json
+#   python benchmarks/run.py --fail-on-regression    # exit 1 if p50 regressed past --threshold
+#
+# External services are replaced by the local mocks in mock_servers.py (fixed
+# latency, no injected errors, seeded), so results depend only on this code and
+# the machine running it.
+
+import os
+import io
+import sys
+import json
+import math
+import time
+import wave
+import struct
+import random
+import platform
+import argparse
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from mock_servers import MockServices, build_configs
+
+BASELINE_PATH = os.path.join(BENCH_DIR, 'baseline.json')
+
+
+def load_corpus():
+    with open(os.path.join(BENCH_DIR, 'corpus.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def make_audio_fixture(text: str, sample_rate: int = 16000) -> bytes:
+    """Deterministic speech-length WAV for a transcript: tone bursts per word with short gaps"""
+    rng = random.Random(text)
+    frames = []
+    for word in text.split():
+        freq = 120 + rng.random() * 180
+        for n in range(int(sample_rate * 0.06 * max(2, len(word)))):
+            sample = 0.3 * math.sin(2 * math.pi * freq * n / sample_rate) + 0.02 * (rng.random() - 0.5)
+            frames.append(int(sample * 32767))
+        frames.extend([0] * int(sample_rate * 0.08))
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(struct.pack(f'<{len(frames)}h', *frames))
+    return buffer.getvalue()
+
+
+def percentile(values, pct, digits=None):
+    """Nearest-rank percentile of values (None when empty), rounded to digits if given"""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    value = ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+    return round(value, digits) if digits is not None else value
+
+
+def measure(fn, iterations: int, warmup: int):
+    """Call fn(i) repeatedly; returns latency percentiles in microseconds"""
+    for i in range(warmup):
+        fn(i)
+    samples = []
+    for i in range(iterations):
+        start = time.perf_counter_ns()
+        fn(i)
+        samples.append((time.perf_counter_ns() - start) / 1000)
+    return {
+        'iterations': iterations,
+        'p50_us': percentile(samples, 50, 2),
+        'p95_us': percentile(samples, 95, 2),
+        'mean_us': round(sum(samples) / len(samples), 2),
+    }
+
+
+def micro_benchmarks(corpus, iterations, warmup):
+    import main
+    from multilingual_handler import MultilingualHandler
+
+    queries = corpus['queries']
+    multilingual = MultilingualHandler()
+    results = {}
+
+    results['parse_multilingual_command'] = measure(
+        lambda i: multilingual.parse_multilingual_command(queries[i % len(queries)]['text']),
+        iterations, warmup)
+
+    results['generate_fallback_response'] = measure(
+        lambda i: main.generate_fallback_response(queries[i % len(queries)]['text'],
+                                                  queries[i % len(queries)]['language']),
+        iterations, warmup)
+
+    def uncached_query(i):
+        main.response_cache.entries.clear()
+        query = queries[i % len(queries)]
+        main.process_farming_query(query['text'], query['language'])
+
+    results['process_farming_query_uncached'] = measure(uncached_query, iterations, warmup)
+
+    results['process_farming_query_cached'] = measure(
+        lambda i: main.process_farming_query(queries[i % len(queries)]['text'],
+                                             queries[i % len(queries)]['language']),
+        iterations, warmup)
+
+    tts, reason = tts_handler()
+    if tts:
+        phrases = corpus['tts_phrases']
+        results['synthesize_speech'] = measure(
+            lambda i: tts.synthesize_speech(phrases[i % len(phrases)]['text'],
+                                            phrases[i % len(phrases)]['lang_name']),
+            max(1, iterations // 10), min(warmup, 2))
+    else:
+        results['synthesize_speech'] = {'skipped': reason}
+
+    return results
+
+
+def macro_benchmarks(corpus, iterations, warmup):
+    import main
+    from multilingual_handler import MultilingualHandler
+
+    queries = corpus['queries']
+    client = main.app.test_client()
+    results = {}
+
+    def chat(i):
+        main.response_cache.entries.clear()
+        query = queries[i % len(queries)]
+        response = client.post('/chat', json={'message': query['text'], 'language': query['language']})
+        assert response.status_code == 200, response.status_code
+
+    results['chat_endpoint'] = measure(chat, iterations, warmup)
+
+    # Voice pipeline: audio fixture -> ASR -> intent -> answer -> TTS
+    multilingual = MultilingualHandler()
+    recognizer, asr_reason = asr_backend()
+    tts, tts_reason = tts_handler()
+    fixtures = [make_audio_fixture(query['text']) for query in queries]
+    skipped = {}
+    if not recognizer:
+        skipped['asr'] = asr_reason
+    if not tts:
+        skipped['tts'] = tts_reason
+
+    def voice(i):
+        query = queries[i % len(queries)]
+        text = query['text']
+        if recognizer:
+            # Synthetic tones carry no words; the transcript stands in for the ASR output
+            recognizer(fixtures[i % len(fixtures)])
+        parsed = multilingual.parse_multilingual_command(text)
+        main.response_cache.entries.clear()
+        answer = main.process_farming_query(text, query['language'])
+        if tts:
+            tts.synthesize_speech(answer[:200], parsed['detected_language'])
+
+    results['voice_pipeline'] = measure(voice, max(1, iterations // 10), min(warmup, 2))
+    if skipped:
+        results['voice_pipeline']['skipped_stages'] = skipped
+
+    return results
+
+
+_tts_cache = {}
+
+
+def tts_handler():
+    if 'handler' not in _tts_cache:
+        try:
+            from advanced_tts_handler import AdvancedTTSHandler
+            _tts_cache['handler'] = (AdvancedTTSHandler(), None)
+        except Exception as e:
+            _tts_cache['handler'] = (None, f"TTS unavailable: {type(e).__name__}: {e}")
+    return _tts_cache['handler']
+
+
+def asr_backend():
+    try:
+        import whisper
+        model = whisper.load_model(os.getenv('BENCH_WHISPER_MODEL', 'tiny'))
+    except Exception as e:
+        return None, f"Whisper unavailable: {type(e).__name__}: {e}"
+
+    from audio_buffer import AudioBuffer
+
+    def transcribe(wav_bytes):
+        return model.transcribe(AudioBuffer.from_wav(wav_bytes).to_float32(16000))['text']
+
+    return transcribe, None
+
+
+def compare(results, baseline, threshold):
+    """Flag benchmarks whose p50 grew by more than threshold (fraction) over the baseline"""
+    regressions, comparisons = [], {}
+    for group, benches in results.items():
+        for name, current in benches.items():
+            previous = baseline.get('results', {}).get(group, {}).get(name)
+            if not previous or 'p50_us' not in previous or 'p50_us' not in current:
+                continue
+            ratio = current['p50_us'] / previous['p50_us'] if previous['p50_us'] else float('inf')
+            comparisons[f"{group}.{name}"] = round(ratio, 3)
+            if ratio > 1 + threshold:
+                regressions.append({'benchmark': f"{group}.{name}", 'baseline_p50_us': previous['p50_us'],
+                                    'current_p50_us': current['p50_us'], 'ratio': round(ratio, 3)})
+    return comparisons, regressions
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--only', choices=['micro', 'macro'])
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--stub-latency-ms', type=float, default=0.0)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed p50 slowdown before flagging a regression (0.25 = 25%%)')
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+
+    configs = build_configs(('openrouter', 'wordpress', 'elevenlabs', 'azure'),
+                            latency={'*': f"fixed:{args.stub_latency_ms}"}, seed=0)
+    with MockServices(configs) as mocks:
+        os.environ.update(mocks.environment())
+        # Keep benchmark runs from writing routing logs, interaction logs or traces
+        os.environ.pop('ROUTING_LOG_PATH', None)
+        os.environ['INTERACTION_LOG_ENABLED'] = 'false'
+        os.environ['TRACE_SLOW_MS'] = '0'
+        # Every request comes from one test client; per-client rate limits would turn them into 429s
+        os.environ['ADMISSION_IP_RATE'] = '0'
+        os.environ['ADMISSION_KEY_RATE'] = '0'
+
+        import logging
+        logging.disable(logging.WARNING)
+
+        results = {}
+        if args.only in (None, 'micro'):
+            results['micro'] = micro_benchmarks(corpus, args.iterations, args.warmup)
+        if args.only in (None, 'macro'):
+            results['macro'] = macro_benchmarks(corpus, args.iterations, args.warmup)
+
+    report = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'stub_latency_ms': args.stub_latency_ms,
+        'results': results,
+    }
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        report['vs_baseline'], regressions = compare(results, baseline, args.threshold)
+        report['regressions'] = regressions
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+
+    print(json.dumps(report, indent=2))
+
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main_cli()
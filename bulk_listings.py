@@ -0,0 +1,290 @@
+# bulk_listings.py
+# Bulk ingestion of product listings (CSV/JSON) into WordPress
+
+import os
+import re
+import csv
+import io
+import json
+import math
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple, Any
+
+import wordpress_client
+from multilingual_handler import MultilingualHandler
+
+# Bulk posting limits
+BULK_MAX_ITEMS = int(os.getenv('BULK_MAX_ITEMS', 500))
+BULK_MAX_WORKERS = int(os.getenv('BULK_MAX_WORKERS', 4))
+# Highest listing price accepted, in Naira
+BULK_MAX_PRICE = float(os.getenv('BULK_MAX_PRICE', 100_000_000))
+
+REQUIRED_FIELDS = ('title', 'price', 'category')
+
+# Currency marks and thousands separators allowed around a price: "₦25,000", "NGN 25000", "25000 naira"
+_PRICE_DECORATION = re.compile(r'(?i)ngn|na[iị]ra|₦|[,\s]')
+
+
+def parse_price(value: Any) -> Optional[float]:
+    """A listing price as a number, or None if it isn't a positive amount up to BULK_MAX_PRICE"""
+    try:
+        price = float(_PRICE_DECORATION.sub('', str(value)))
+    except ValueError:
+        return None
+    if not math.isfinite(price) or price <= 0 or price > BULK_MAX_PRICE:
+        return None
+    return price
+
+
+def parse_listings(body: str, content_type: str = 'application/json') -> List[Dict]:
+    """Parse a batch of listings from a JSON or CSV request body"""
+    if 'csv' in (content_type or '').lower():
+        reader = csv.DictReader(io.StringIO(body))
+        return [
+            {(key or '').strip().lower(): (value or '').strip() for key, value in row.items()}
+            for row in reader
+        ]
+
+    data = json.loads(body)
+    if isinstance(data, dict):
+        data = data.get('listings', [])
+    if not isinstance(data, list):
+        raise ValueError("Expected a list of listings or an object with a 'listings' list")
+    return data
+
+
+class BatchTooLarge(ValueError):
+    """A batch holds more than BULK_MAX_ITEMS listings"""
+
+
+class CategoryMapper:
+    """Map category names in any supported language to WordPress category IDs"""
+
+    def __init__(self, multilingual: MultilingualHandler):
+        self.lookup = {}
+        for language, categories in multilingual.translations['product_categories'].items():
+            for key, display_name in categories.items():
+                self.lookup[key.lower()] = key
+                self.lookup[display_name.lower()] = key
+
+        # e.g. WORDPRESS_CATEGORY_IDS='{"grains": 12, "roots": 14}'
+        try:
+            self.category_ids = json.loads(os.getenv('WORDPRESS_CATEGORY_IDS', '{}'))
+        except ValueError:
+            print("Invalid WORDPRESS_CATEGORY_IDS, ignoring category IDs")
+            self.category_ids = {}
+
+    def resolve(self, category: str) -> Optional[str]:
+        """Return the canonical category key, or None if the category is unknown"""
+        return self.lookup.get(str(category).strip().lower())
+
+    def wordpress_ids(self, category_key: str) -> List[int]:
+        category_id = self.category_ids.get(category_key)
+        return [int(category_id)] if category_id is not None else []
+
+
+class IdempotencyStore:
+    """Remember which listings were already posted so re-submitted batches don't duplicate posts
+
+    A key is reserved before its listing is posted, so a concurrent submission of the
+    same listing sees it in flight instead of posting it again.
+    """
+
+    IN_FLIGHT = {'status': 'in_flight'}
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self.lock:
+            return self.entries.get(key)
+
+    def reserve(self, key: str) -> Optional[Dict]:
+        """Mark key in flight and return None, or return what the key already holds"""
+        with self.lock:
+            previous = self.entries.get(key)
+            if previous is None:
+                self.entries[key] = self.IN_FLIGHT
+            return previous
+
+    def release(self, key: str):
+        """Drop a reservation whose post failed, so a later submission can retry it"""
+        with self.lock:
+            if self.entries.get(key) is self.IN_FLIGHT:
+                del self.entries[key]
+
+    def put(self, key: str, result: Dict):
+        with self.lock:
+            self.entries[key] = result
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+def listing_idempotency_key(listing: Dict) -> str:
+    """Stable key for a listing: client-supplied, or a hash of its identifying fields"""
+    if listing.get('idempotency_key'):
+        return str(listing['idempotency_key'])
+
+    fields = [str(listing.get(name, '')).strip().lower()
+              for name in ('title', 'price', 'category', 'location', 'contact')]
+    return hashlib.sha256('|'.join(fields).encode('utf-8')).hexdigest()[:32]
+
+
+class BulkListingPoster:
+    """Validate listings and post them to WordPress through a bounded worker pool"""
+
+    def __init__(self, token: str, max_workers: int = None,
+                 max_retries: Optional[int] = None, language: str = 'english',
+                 idempotency_store: Optional[IdempotencyStore] = None):
+        # The posting user's JWT; listings are created under their account
+        self.token = token
+        self.max_workers = max(1, max_workers or BULK_MAX_WORKERS)
+        self.max_retries = max_retries
+        self.language = language
+        self.multilingual = default_multilingual
+        self.categories = default_categories
+        self.idempotency_store = idempotency_store or default_idempotency_store
+
+    def validate(self, raw: Any) -> Tuple[Optional[Dict], List[str]]:
+        """Validate one listing and build its WordPress post payload"""
+        if not isinstance(raw, dict):
+            return None, ["Listing must be an object"]
+
+        errors = [f"Missing required field: {name}" for name in REQUIRED_FIELDS
+                  if not str(raw.get(name, '')).strip()]
+        if errors:
+            return None, errors
+
+        language = raw.get('language') or self.language
+        price = parse_price(raw['price'])
+        if price is None:
+            errors.append(f"Invalid price: {raw['price']} (must be a positive amount up to {BULK_MAX_PRICE:,.0f})")
+
+        category_key = self.categories.resolve(raw['category'])
+        if not category_key:
+            errors.append(f"Unknown category: {raw['category']}")
+
+        if errors:
+            return None, errors
+
+        formatted_price = self.multilingual.format_price_with_currency(str(price), language)
+        category_name = self.multilingual.translations['product_categories']['english'][category_key]
+        content_lines = [
+            str(raw.get('description', '')).strip(),
+            f"Price: {formatted_price}",
+            f"Category: {category_name}",
+        ]
+        if raw.get('location'):
+            content_lines.append(f"Location: {raw['location']}")
+        if raw.get('contact'):
+            content_lines.append(f"Contact: {raw['contact']}")
+
+        listing = {
+            'idempotency_key': listing_idempotency_key(raw),
+            'payload': {
+                'title': str(raw['title']).strip(),
+                'content': '\n'.join(line for line in content_lines if line),
+                'status': 'publish',
+                'categories': self.categories.wordpress_ids(category_key)
+            }
+        }
+        return listing, []
+
+    def _post_one(self, index: int, listing: Dict, session) -> Dict:
+        key = listing['idempotency_key']
+        previous = self.idempotency_store.reserve(key)
+        if previous is IdempotencyStore.IN_FLIGHT:
+            return {'index': index, 'idempotency_key': key, 'status': 'duplicate', 'in_flight': True}
+        if previous:
+            return {**previous, 'index': index, 'status': 'duplicate'}
+
+        result = {'index': index, 'idempotency_key': key}
+        try:
+            retry_kwargs = {}
+            if self.max_retries is not None:
+                retry_kwargs['max_retries'] = self.max_retries
+            response = wordpress_client.create_post(
+                listing['payload'],
+                token=self.token,
+                idempotency_key=key,
+                session=session,
+                **retry_kwargs
+            )
+            result['attempts'] = getattr(response, 'attempts', 1)
+            if response.status_code == 201:
+                result['status'] = 'created'
+                result['post_id'] = response.json().get('id')
+                self.idempotency_store.put(key, result)
+            else:
+                result['status'] = 'failed'
+                result['error'] = f"WordPress returned {response.status_code}"
+        except Exception as e:
+            result['status'] = 'failed'
+            result['error'] = str(e)
+        finally:
+            # A no-op after success; otherwise a later submission may try the listing again
+            self.idempotency_store.release(key)
+
+        return result
+
+    def post_all(self, raw_listings: List[Any]) -> Dict:
+        """Post a batch of listings and return a per-item result report"""
+        if len(raw_listings) > BULK_MAX_ITEMS:
+            raise BatchTooLarge(f"Batch too large: {len(raw_listings)} listings (max {BULK_MAX_ITEMS})")
+
+        results = [None] * len(raw_listings)
+        futures = []
+        batch_keys = {}
+        # More workers than the shared session pools connections for get a session of their own
+        session = (wordpress_client.create_session(pool_size=self.max_workers)
+                   if self.max_workers > BULK_MAX_WORKERS else default_session)
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for index, raw in enumerate(raw_listings):
+                    listing, errors = self.validate(raw)
+                    if errors:
+                        results[index] = {'index': index, 'status': 'invalid', 'errors': errors}
+                    elif listing['idempotency_key'] in batch_keys:
+                        # Same listing twice in one batch: only post the first copy
+                        results[index] = {
+                            'index': index,
+                            'status': 'duplicate',
+                            'idempotency_key': listing['idempotency_key'],
+                            'duplicate_of': batch_keys[listing['idempotency_key']]
+                        }
+                    else:
+                        batch_keys[listing['idempotency_key']] = index
+                        futures.append(executor.submit(self._post_one, index, listing, session))
+
+                for future in futures:
+                    result = future.result()
+                    results[result['index']] = result
+        finally:
+            if session is not default_session:
+                session.close()
+
+        summary = {}
+        for result in results:
+            summary[result['status']] = summary.get(result['status'], 0) + 1
+
+        return {
+            'total': len(results),
+            'summary': summary,
+            'items': results
+        }
+
+
+# Shared across requests so a retried upload is recognised within this process
+default_idempotency_store = IdempotencyStore()
+
+# Built once per process and shared by every batch
+default_multilingual = MultilingualHandler()
+default_categories = CategoryMapper(default_multilingual)
+default_session = wordpress_client.create_session(pool_size=BULK_MAX_WORKERS)
@@ -0,0 +1,142 @@
+# client_pool.py
+# Long-lived SDK/HTTP clients for the TTS engines, with reconnect on stale connections
+
+import os
+import threading
+from collections import defaultdict, deque
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple, Type
+
+# Idle clients kept per key (voice, endpoint); extra clients are closed on release
+TTS_CLIENT_POOL_SIZE = int(os.getenv('TTS_CLIENT_POOL_SIZE', 4))
+
+
+class ClientPool:
+    """Pool of clients that must not be shared between threads at the same time.
+
+    Each run() leases one idle client for its key (or builds one), so a
+    connection opened once serves many clips. If a reused client fails with
+    one of retry_on, it is closed and the call is retried once on a fresh
+    client; that covers connections the server dropped while idle.
+    """
+
+    def __init__(self, factory: Callable[[Hashable], Any], close: Optional[Callable[[Any], None]] = None,
+                 max_idle: int = TTS_CLIENT_POOL_SIZE, retry_on: Tuple[Type[BaseException], ...] = (OSError,)):
+        self.factory = factory
+        self.close_client = close
+        self.max_idle = max_idle
+        self.retry_on = retry_on
+        self.idle = defaultdict(deque)
+        self.lock = threading.Lock()
+        self.stats = {'created': 0, 'reused': 0, 'reconnects': 0, 'closed': 0}
+
+    def _count(self, key: str):
+        with self.lock:
+            self.stats[key] += 1
+
+    def _acquire(self, key: Hashable) -> Tuple[Any, bool]:
+        with self.lock:
+            if self.idle[key]:
+                self.stats['reused'] += 1
+                return self.idle[key].pop(), True
+        client = self.factory(key)
+        self._count('created')
+        return client, False
+
+    def _release(self, key: Hashable, client: Any):
+        with self.lock:
+            if len(self.idle[key]) < self.max_idle:
+                self.idle[key].append(client)
+                return
+        self._close(client)
+
+    def _close(self, client: Any):
+        self._count('closed')
+        if self.close_client:
+            try:
+                self.close_client(client)
+            except Exception:
+                pass
+
+    def run(self, key: Hashable, fn: Callable[[Any], Any]) -> Any:
+        """Call fn(client) with a pooled client for key"""
+        client, reused = self._acquire(key)
+        try:
+            result = fn(client)
+        except self.retry_on:
+            self._close(client)
+            if not reused:
+                raise
+            self._count('reconnects')
+            client = self.factory(key)
+            self._count('created')
+            try:
+                result = fn(client)
+            except BaseException:
+                self._close(client)
+                raise
+        except BaseException:
+            self._close(client)
+            raise
+        self._release(key, client)
+        return result
+
+    def warm(self, key: Hashable, count: int = 1):
+        """Open clients ahead of the first request"""
+        for _ in range(count):
+            client = self.factory(key)
+            self._count('created')
+            self._release(key, client)
+
+    def clear(self):
+        with self.lock:
+            clients = [client for idle in self.idle.values() for client in idle]
+            self.idle.clear()
+        for client in clients:
+            self._close(client)
+
+    def get_stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {**self.stats, 'idle': sum(len(idle) for idle in self.idle.values())}
+
+
+class SharedClient:
+    """One lazily built client shared by all threads (for thread-safe SDK clients).
+
+    The client is rebuilt once when a call fails with one of retry_on.
+    """
+
+    def __init__(self, factory: Callable[[], Any], retry_on: Tuple[Type[BaseException], ...] = (OSError,)):
+        self.factory = factory
+        self.retry_on = retry_on
+        self.client = None
+        self.lock = threading.Lock()
+        self.stats = {'created': 0, 'reconnects': 0}
+
+    def get(self) -> Any:
+        client = self.client
+        if client is None:
+            with self.lock:
+                if self.client is None:
+                    self.client = self.factory()
+                    self.stats['created'] += 1
+                client = self.client
+        return client
+
+    def reset(self, stale: Any = None):
+        with self.lock:
+            if stale is None or self.client is stale:
+                self.client = None
+
+    def run(self, fn: Callable[[Any], Any]) -> Any:
+        client = self.get()
+        try:
+            return fn(client)
+        except self.retry_on:
+            self.reset(client)
+            with self.lock:
+                self.stats['reconnects'] += 1
+            return fn(self.get())
+
+    def get_stats(self) -> Dict[str, int]:
+        with self.lock:
+            return dict(self.stats)
@@ -0,0 +1,259 @@
+# conversation_store.py
+# Per-session conversation memory with a token-budgeted prompt builder
+
+import os
+import re
+import time
+import sqlite3
+import threading
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Tuple
+
+# Recent turns kept verbatim per session; older turns are folded into a summary
+CONVERSATION_MAX_TURNS = int(os.getenv('CONVERSATION_MAX_TURNS', 8))
+# Prompt budget (system + summary + history + current message), in estimated tokens
+CONVERSATION_TOKEN_BUDGET = int(os.getenv('CONVERSATION_TOKEN_BUDGET', 1200))
+CONVERSATION_SUMMARY_TOKENS = int(os.getenv('CONVERSATION_SUMMARY_TOKENS', 200))
+CONVERSATION_MAX_SESSIONS = int(os.getenv('CONVERSATION_MAX_SESSIONS', 5000))
+CONVERSATION_IDLE_TTL = int(os.getenv('CONVERSATION_IDLE_TTL', 6 * 3600))
+# SQLite backend: delete turns and summaries idle past CONVERSATION_IDLE_TTL every this many appends per process
+CONVERSATION_PRUNE_EVERY = int(os.getenv('CONVERSATION_PRUNE_EVERY', 500))
+
+SENTENCE_END = re.compile(r'(?<=[.!?])\s')
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) good enough for budgeting"""
+    return len(text) // 4 + 1
+
+
+def summarize_turn(role: str, content: str, max_chars: int = 120) -> str:
+    """One-line extractive summary of a turn: its first sentence, truncated"""
+    text = ' '.join(content.split())
+    first_sentence = SENTENCE_END.split(text, 1)[0]
+    if len(first_sentence) > max_chars:
+        first_sentence = first_sentence[:max_chars].rsplit(' ', 1)[0] + '...'
+    prefix = 'User asked' if role == 'user' else 'You answered'
+    return f"{prefix}: {first_sentence}"
+
+
+class MemoryConversationBackend:
+    """In-process storage: bounded number of sessions, each a ring buffer of turns"""
+
+    def __init__(self, max_turns: int = CONVERSATION_MAX_TURNS,
+                 max_sessions: int = CONVERSATION_MAX_SESSIONS, idle_ttl: int = CONVERSATION_IDLE_TTL):
+        self.max_turns = max_turns
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _session(self, session_id: str) -> Dict:
+        session = self.sessions.get(session_id)
+        if session is None or time.time() - session['updated_at'] > self.idle_ttl:
+            session = {'summary': [], 'turns': deque(maxlen=self.max_turns), 'updated_at': time.time()}
+            self.sessions[session_id] = session
+        self.sessions.move_to_end(session_id)
+        while len(self.sessions) > self.max_sessions:
+            self.sessions.popitem(last=False)
+        return session
+
+    def load(self, session_id: str) -> Tuple[List[str], List[Tuple[str, str]]]:
+        with self.lock:
+            session = self._session(session_id)
+            return list(session['summary']), list(session['turns'])
+
+    def append(self, session_id: str, role: str, content: str) -> List[Tuple[str, str]]:
+        """Add a turn; returns turns pushed out of the ring buffer"""
+        with self.lock:
+            session = self._session(session_id)
+            turns = session['turns']
+            evicted = [turns[0]] if len(turns) == turns.maxlen else []
+            turns.append((role, content))
+            session['updated_at'] = time.time()
+            return evicted
+
+    def set_summary(self, session_id: str, summary: List[str]):
+        with self.lock:
+            self._session(session_id)['summary'] = summary
+
+    def clear(self, session_id: str):
+        with self.lock:
+            self.sessions.pop(session_id, None)
+
+
+class SQLiteConversationBackend:
+    """Local-disk storage shared by all workers on the host"""
+
+    def __init__(self, path: str, max_turns: int = CONVERSATION_MAX_TURNS,
+                 idle_ttl: int = CONVERSATION_IDLE_TTL, prune_every: int = CONVERSATION_PRUNE_EVERY):
+        self.path = path
+        self.max_turns = max_turns
+        self.idle_ttl = idle_ttl
+        self.prune_every = prune_every
+        self.appends = 0
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+        conn = self._conn()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS turns (
+                session_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (session_id, seq)
+            );
+            CREATE INDEX IF NOT EXISTS turns_created_at ON turns (created_at);
+            CREATE TABLE IF NOT EXISTS summaries (
+                session_id TEXT PRIMARY KEY,
+                summary TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+        """)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn = conn
+        return conn
+
+    def load(self, session_id: str) -> Tuple[List[str], List[Tuple[str, str]]]:
+        conn = self._conn()
+        cutoff = time.time() - self.idle_ttl
+        turns = conn.execute(
+            'SELECT role, content FROM turns WHERE session_id = ? AND created_at > ? ORDER BY seq',
+            (session_id, cutoff)
+        ).fetchall()
+        row = conn.execute(
+            'SELECT summary FROM summaries WHERE session_id = ? AND updated_at > ?',
+            (session_id, cutoff)
+        ).fetchone()
+        summary = row[0].split('\n') if row and row[0] else []
+        return summary, [(role, content) for role, content in turns]
+
+    def append(self, session_id: str, role: str, content: str) -> List[Tuple[str, str]]:
+        """Add a turn; returns turns pushed out of the ring buffer"""
+        conn = self._conn()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute(
+                'INSERT INTO turns (session_id, seq, role, content, created_at) '
+                'VALUES (?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM turns WHERE session_id = ?), ?, ?, ?)',
+                (session_id, session_id, role, content, time.time())
+            )
+            evicted = conn.execute(
+                'SELECT seq, role, content FROM turns WHERE session_id = ? ORDER BY seq DESC LIMIT -1 OFFSET ?',
+                (session_id, self.max_turns)
+            ).fetchall()
+            if evicted:
+                conn.execute(
+                    'DELETE FROM turns WHERE session_id = ? AND seq <= ?',
+                    (session_id, max(seq for seq, _, _ in evicted))
+                )
+
+        if self.prune_every > 0:
+            with self.lock:
+                self.appends += 1
+                due = self.appends % self.prune_every == 0
+            if due:
+                self.prune()
+        return [(role, content) for _, role, content in sorted(evicted)]
+
+    def prune(self) -> int:
+        """Delete turns and summaries of sessions idle past idle_ttl; returns the rows removed"""
+        conn = self._conn()
+        cutoff = time.time() - self.idle_ttl
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            removed = conn.execute('DELETE FROM turns WHERE created_at <= ?', (cutoff,)).rowcount
+            removed += conn.execute('DELETE FROM summaries WHERE updated_at <= ?', (cutoff,)).rowcount
+        return removed
+
+    def set_summary(self, session_id: str, summary: List[str]):
+        self._conn().execute(
+            'INSERT OR REPLACE INTO summaries (session_id, summary, updated_at) VALUES (?, ?, ?)',
+            (session_id, '\n'.join(summary), time.time())
+        )
+
+    def clear(self, session_id: str):
+        conn = self._conn()
+        conn.execute('DELETE FROM turns WHERE session_id = ?', (session_id,))
+        conn.execute('DELETE FROM summaries WHERE session_id = ?', (session_id,))
+
+
+class ConversationStore:
+    """Keeps recent turns per session and builds prompts that fit a token budget"""
+
+    def __init__(self, backend=None, token_budget: int = CONVERSATION_TOKEN_BUDGET,
+                 summary_tokens: int = CONVERSATION_SUMMARY_TOKENS):
+        self.backend = backend or MemoryConversationBackend()
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+
+    def add_turn(self, session_id: str, role: str, content: str):
+        """Record a turn, folding anything that leaves the ring buffer into the summary"""
+        evicted = self.backend.append(session_id, role, content)
+        if not evicted:
+            return
+
+        summary, _ = self.backend.load(session_id)
+        summary.extend(summarize_turn(r, c) for r, c in evicted)
+
+        # Keep the most recent summary lines that fit the summary budget
+        kept, used = [], 0
+        for line in reversed(summary):
+            cost = estimate_tokens(line)
+            if used + cost > self.summary_tokens:
+                break
+            kept.append(line)
+            used += cost
+        self.backend.set_summary(session_id, list(reversed(kept)))
+
+    def has_history(self, session_id: Optional[str]) -> bool:
+        """Whether the session has earlier turns that would shape the answer"""
+        if not session_id:
+            return False
+        summary, turns = self.backend.load(session_id)
+        return bool(summary or turns)
+
+    def build_messages(self, session_id: Optional[str], system_prompt: str, message: str,
+                       token_budget: Optional[int] = None) -> List[Dict[str, str]]:
+        """Chat messages for the LLM: system prompt, summary, as many recent turns as fit, and the question"""
+        budget = token_budget or self.token_budget
+        current = {'role': 'user', 'content': f"Question: {message}"}
+
+        if not session_id:
+            return [{'role': 'system', 'content': system_prompt}, current]
+
+        summary, turns = self.backend.load(session_id)
+        system_content = system_prompt
+        if summary:
+            system_content += "\n\nEarlier in this conversation:\n" + '\n'.join(summary)
+
+        remaining = budget - estimate_tokens(system_content) - estimate_tokens(current['content'])
+        history = []
+        for role, content in reversed(turns):
+            cost = estimate_tokens(content)
+            if cost > remaining:
+                break
+            history.append({'role': role, 'content': content})
+            remaining -= cost
+
+        return [{'role': 'system', 'content': system_content}] + list(reversed(history)) + [current]
+
+    def clear(self, session_id: str):
+        self.backend.clear(session_id)
+
+
+def create_conversation_store() -> ConversationStore:
+    """Build the store configured by CONVERSATION_BACKEND (memory or sqlite)"""
+    backend_name = os.getenv('CONVERSATION_BACKEND', 'memory').lower()
+    if backend_name == 'sqlite':
+        path = os.getenv('CONVERSATION_DB_PATH', 'conversations.db')
+        return ConversationStore(SQLiteConversationBackend(path))
+    return ConversationStore(MemoryConversationBackend())
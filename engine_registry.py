@@ -0,0 +1,252 @@
+# engine_registry.py
+# Cached availability, rolling success/latency stats and ejection of failing TTS engines
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+import telemetry
+
+logger = logging.getLogger(__name__)
+
+# How long an is_available() answer is trusted
+ENGINE_AVAILABILITY_TTL = float(os.getenv('ENGINE_AVAILABILITY_TTL', 300))
+# Consecutive failures (per engine and language) before ejection
+ENGINE_EJECT_AFTER = int(os.getenv('ENGINE_EJECT_AFTER', 3))
+# First ejection period; doubles on each failed re-probe up to the max
+ENGINE_EJECT_SECONDS = float(os.getenv('ENGINE_EJECT_SECONDS', 30))
+ENGINE_EJECT_MAX_SECONDS = float(os.getenv('ENGINE_EJECT_MAX_SECONDS', 900))
+ENGINE_STATS_WINDOW = int(os.getenv('ENGINE_STATS_WINDOW', 50))
+# Samples needed before observed stats override the configured priority
+ENGINE_MIN_SAMPLES = int(os.getenv('ENGINE_MIN_SAMPLES', 5))
+# Latency assumed for engines without enough samples (seconds)
+ENGINE_DEFAULT_LATENCY = float(os.getenv('ENGINE_DEFAULT_LATENCY', 1.0))
+# Cost multiplier per step down the configured priority list (stands in for voice quality)
+ENGINE_RANK_PENALTY = float(os.getenv('ENGINE_RANK_PENALTY', 0.5))
+
+PROBE_TEXT = {
+    'english': 'Hello',
+    'hausa': 'Sannu',
+    'igbo': 'Ndewo',
+    'yoruba': 'Bawo',
+}
+
+
+class EngineStats:
+    """Rolling window of outcomes for one engine and language"""
+
+    def __init__(self, window: int = ENGINE_STATS_WINDOW):
+        self.samples = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.eject_seconds = ENGINE_EJECT_SECONDS
+
+    def record(self, success: bool, latency: float):
+        self.samples.append((success, latency))
+        self.consecutive_failures = 0 if success else self.consecutive_failures + 1
+
+    @property
+    def success_rate(self) -> float:
+        if not self.samples:
+            return 1.0
+        return sum(1 for success, _ in self.samples if success) / len(self.samples)
+
+    @property
+    def latency_p50(self) -> Optional[float]:
+        latencies = sorted(latency for success, latency in self.samples if success)
+        return latencies[len(latencies) // 2] if latencies else None
+
+    def ejected(self, now: float) -> bool:
+        return self.ejected_until > now
+
+
+class EngineRegistry:
+    """Tracks engine health and decides the order engines are tried in.
+
+    Engines are ejected per language after ENGINE_EJECT_AFTER consecutive
+    failures; a background thread re-probes them once the ejection period ends.
+    """
+
+    def __init__(self, probe_interval: float = 5.0):
+        self.engines = {}
+        self.availability = {}
+        self.stats = {}
+        self.priorities = {}
+        self.lock = threading.Lock()
+        self.probe_interval = probe_interval
+        self.prober = None
+
+    def register(self, name: str, engine, probe: Optional[Callable[[str], bool]] = None):
+        """Add an engine; probe(language) -> bool overrides the default synthesize-based probe"""
+        with self.lock:
+            self.engines[name] = {'engine': engine, 'probe': probe}
+            self.availability.pop(name, None)
+
+    def _stats(self, name: str, language: str) -> EngineStats:
+        key = (name, language)
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = EngineStats()
+        return stats
+
+    def is_available(self, name: str, language: Optional[str] = None) -> bool:
+        """Cached engine.is_available(), and False while ejected for the language"""
+        now = time.time()
+        with self.lock:
+            entry = self.engines.get(name)
+            if entry is None:
+                return False
+            if language and self._stats(name, language).ejected(now):
+                return False
+            cached = self.availability.get(name)
+        if cached and now - cached[1] < ENGINE_AVAILABILITY_TTL:
+            return cached[0]
+
+        try:
+            available = bool(entry['engine'].is_available())
+        except Exception as e:
+            logger.warning(f"Availability check for {name} failed: {e}")
+            available = False
+        with self.lock:
+            self.availability[name] = (available, now)
+        return available
+
+    def record(self, name: str, language: str, success: bool, latency: float):
+        """Record one synthesis outcome; ejects the engine for this language after repeated failures"""
+        with self.lock:
+            stats = self._stats(name, language)
+            stats.record(success, latency)
+            eject = not success and stats.consecutive_failures >= ENGINE_EJECT_AFTER and not stats.ejected(time.time())
+            if eject:
+                stats.ejected_until = time.time() + stats.eject_seconds
+            elif success:
+                stats.eject_seconds = ENGINE_EJECT_SECONDS
+
+        telemetry.registry.inc('farmdepot_tts_engine_requests_total', 1, 'TTS synthesis attempts by outcome',
+                               engine=name, language=language, outcome='success' if success else 'failure')
+        if eject:
+            logger.warning(f"Ejecting TTS engine {name} for {language} for {stats.eject_seconds:.0f}s "
+                           f"after {stats.consecutive_failures} consecutive failures")
+            telemetry.registry.inc('farmdepot_tts_engine_ejections_total', 1, 'TTS engine ejections',
+                                   engine=name, language=language)
+            self._start_prober()
+
+    def order(self, language: str, priority: List[str]) -> List[str]:
+        """Engines for a language, cheapest expected cost first.
+
+        Cost is p50 latency divided by success rate, scaled up for engines lower in
+        the configured priority so a lower-quality voice has to be clearly faster
+        or more reliable to move ahead. Ejected and known-unavailable engines go last.
+        """
+        now = time.time()
+        with self.lock:
+            self.priorities[language] = list(priority)
+            costs = []
+            for rank, name in enumerate(priority):
+                stats = self.stats.get((name, language))
+                if stats and len(stats.samples) >= ENGINE_MIN_SAMPLES:
+                    latency = stats.latency_p50 or ENGINE_DEFAULT_LATENCY
+                    cost = latency / max(stats.success_rate, 0.05)
+                else:
+                    cost = ENGINE_DEFAULT_LATENCY
+                cost *= 1 + rank * ENGINE_RANK_PENALTY
+                cached = self.availability.get(name)
+                sidelined = bool(stats and stats.ejected(now)) or (cached is not None and not cached[0])
+                costs.append((sidelined, cost, rank, name))
+        return [name for _, _, _, name in sorted(costs)]
+
+    def probe(self, name: str, language: str) -> bool:
+        """Check an ejected engine with a short synthesis (or its registered probe)"""
+        entry = self.engines.get(name)
+        if entry is None:
+            return False
+        start = time.perf_counter()
+        try:
+            if entry['probe']:
+                ok = bool(entry['probe'](language))
+            else:
+                engine = entry['engine']
+                ok = bool(engine.is_available() and engine.synthesize(PROBE_TEXT.get(language, 'Hello'), language))
+        except Exception as e:
+            logger.debug(f"Probe of {name} ({language}) failed: {e}")
+            ok = False
+        latency = time.perf_counter() - start
+
+        with self.lock:
+            stats = self._stats(name, language)
+            self.availability.pop(name, None)
+            if ok:
+                stats.ejected_until = 0.0
+                stats.eject_seconds = ENGINE_EJECT_SECONDS
+                stats.record(True, latency)
+            else:
+                stats.eject_seconds = min(stats.eject_seconds * 2, ENGINE_EJECT_MAX_SECONDS)
+                stats.ejected_until = time.time() + stats.eject_seconds
+        logger.info(f"Probe of TTS engine {name} for {language}: {'restored' if ok else 'still failing'}")
+        return ok
+
+    def _due_probes(self):
+        now = time.time()
+        with self.lock:
+            ejected = [(key, stats) for key, stats in self.stats.items() if stats.ejected_until]
+        return [key for key, stats in ejected if not stats.ejected(now)], bool(ejected)
+
+    def _probe_loop(self):
+        while True:
+            due, any_ejected = self._due_probes()
+            for name, language in due:
+                self.probe(name, language)
+            if not any_ejected:
+                with self.lock:
+                    # Re-check under the lock so a concurrent ejection restarts the prober
+                    if not any(stats.ejected_until for stats in self.stats.values()):
+                        self.prober = None
+                        return
+            time.sleep(self.probe_interval)
+
+    def _start_prober(self):
+        with self.lock:
+            if self.prober is not None:
+                return
+            self.prober = threading.Thread(target=self._probe_loop, name='tts-engine-prober', daemon=True)
+        self.prober.start()
+
+    def get_state(self) -> Dict:
+        """Availability, per-language stats and current order, for /health"""
+        now = time.time()
+        with self.lock:
+            names = list(self.engines)
+            availability = dict(self.availability)
+            stats = dict(self.stats)
+            priorities = dict(self.priorities)
+
+        engines = {}
+        for name in names:
+            cached = availability.get(name)
+            languages = {}
+            for (engine_name, language), s in stats.items():
+                if engine_name != name:
+                    continue
+                p50 = s.latency_p50
+                languages[language] = {
+                    'samples': len(s.samples),
+                    'success_rate': round(s.success_rate, 3),
+                    'latency_p50_ms': round(p50 * 1000, 1) if p50 is not None else None,
+                    'consecutive_failures': s.consecutive_failures,
+                    'ejected_for_seconds': round(max(0.0, s.ejected_until - now), 1),
+                }
+            engines[name] = {
+                'available': cached[0] if cached else None,
+                'checked_seconds_ago': round(now - cached[1], 1) if cached else None,
+                'languages': languages,
+            }
+        return {
+            'engines': engines,
+            'order': {language: self.order(language, priority) for language, priority in priorities.items()},
+        }
+
+
+default_registry = EngineRegistry()
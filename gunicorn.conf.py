@@ -0,0 +1,42 @@
+# gunicorn.conf.py
+# Gunicorn loads this file automatically. Settings stay on the command line (Procfile,
+# render.yaml); this only adds hooks. When MODEL_HOST_SOCKET is set, the model host
+# (model_host.py) is started before the workers fork and stopped with the master, so
+# Whisper and the local TTS models are loaded once per machine instead of per worker.
+
+import os
+import sys
+import time
+import subprocess
+
+# Seconds to wait for the model host to load its models before starting workers anyway
+MODEL_HOST_START_TIMEOUT = float(os.getenv('MODEL_HOST_START_TIMEOUT', 180))
+
+_model_host = None
+
+
+def on_starting(server):
+    global _model_host
+    path = os.getenv('MODEL_HOST_SOCKET')
+    if not path:
+        return
+    if os.path.exists(path):
+        os.unlink(path)
+    _model_host = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                 'model_host.py'), 'serve', '--socket', path])
+    deadline = time.monotonic() + MODEL_HOST_START_TIMEOUT
+    while not os.path.exists(path) and _model_host.poll() is None and time.monotonic() < deadline:
+        time.sleep(0.2)
+    if os.path.exists(path):
+        server.log.info("Model host %s serving on %s", _model_host.pid, path)
+    else:
+        server.log.warning("Model host not ready on %s; voice requests will fail until it is", path)
+
+
+def on_exit(server):
+    if _model_host and _model_host.poll() is None:
+        _model_host.terminate()
+        try:
+            _model_host.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            _model_host.kill()
@@ -0,0 +1,216 @@
+# http_cache.py
+# Conditional-GET read cache for upstream REST APIs (WordPress, OpenRouter)
+
+import os
+import copy
+import json
+import time
+import hashlib
+import threading
+import requests
+from collections import OrderedDict
+from typing import Optional, Dict, Callable
+
+# Defaults, overridable per cache instance
+HTTP_CACHE_MAX_BYTES = int(os.getenv('HTTP_CACHE_MAX_BYTES', 8 * 1024 * 1024))
+HTTP_CACHE_TTL = int(os.getenv('HTTP_CACHE_TTL', 60))
+HTTP_CACHE_STALE_TTL = int(os.getenv('HTTP_CACHE_STALE_TTL', 300))
+
+
+class CachedResponse:
+    """Stored GET response with its validators"""
+
+    def __init__(self, status_code: int, content: bytes, headers: Dict[str, str],
+                 max_age: float, stale_ttl: float):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers
+        self.etag = headers.get('ETag')
+        self.last_modified = headers.get('Last-Modified')
+        self.max_age = max_age
+        self.stale_ttl = stale_ttl
+        self.stored_at = time.time()
+        self.from_cache = False
+
+    @property
+    def size(self) -> int:
+        return len(self.content)
+
+    def age(self) -> float:
+        return time.time() - self.stored_at
+
+    def is_fresh(self) -> bool:
+        return self.age() < self.max_age
+
+    def is_usable_stale(self) -> bool:
+        return self.age() < self.max_age + self.stale_ttl
+
+    def served_from_cache(self) -> 'CachedResponse':
+        """Shallow copy flagged as a cache hit (the stored entry is shared between threads)"""
+        view = copy.copy(self)
+        view.from_cache = True
+        return view
+
+    def json(self):
+        return json.loads(self.content)
+
+    @property
+    def text(self) -> str:
+        return self.content.decode('utf-8', errors='replace')
+
+
+def _parse_cache_control(value: str) -> Dict[str, Optional[str]]:
+    directives = {}
+    for part in (value or '').split(','):
+        part = part.strip().lower()
+        if not part:
+            continue
+        name, _, arg = part.partition('=')
+        directives[name.strip()] = arg.strip().strip('"') or None
+    return directives
+
+
+def _seconds(value: Optional[str], default: float) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class HTTPReadCache:
+    """Bounded LRU cache of GET responses with ETag/Last-Modified revalidation
+    and stale-while-revalidate"""
+
+    def __init__(self, name: str, max_bytes: int = HTTP_CACHE_MAX_BYTES,
+                 default_ttl: float = HTTP_CACHE_TTL, stale_ttl: float = HTTP_CACHE_STALE_TTL,
+                 max_entry_bytes: Optional[int] = None, fetch: Optional[Callable] = None):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes or max_bytes // 4
+        self.default_ttl = default_ttl
+        self.stale_ttl = stale_ttl
+        self.fetch = fetch or (lambda method, url, **kwargs: requests.request(method, url, **kwargs))
+
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.refreshing = set()
+        self.stats = {'hits': 0, 'stale_hits': 0, 'revalidated': 0, 'misses': 0,
+                      'errors_served_stale': 0, 'bytes_saved': 0}
+
+    def _key(self, url: str, params: Optional[Dict], headers: Optional[Dict]) -> str:
+        # Credentials are part of the key so one user's response is never served to another
+        auth = (headers or {}).get('Authorization', '')
+        raw = json.dumps([url, sorted((params or {}).items()), auth], default=str)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _store(self, key: str, entry: CachedResponse):
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old:
+                self.total_bytes -= old.size
+            if entry.size > self.max_entry_bytes:
+                return
+            self.entries[key] = entry
+            self.total_bytes += entry.size
+            while self.total_bytes > self.max_bytes and self.entries:
+                _, evicted = self.entries.popitem(last=False)
+                self.total_bytes -= evicted.size
+
+    def _count(self, stat: str, amount: int = 1):
+        with self.lock:
+            self.stats[stat] += amount
+
+    def _fetch(self, key: str, url: str, params: Optional[Dict], headers: Optional[Dict],
+               timeout: float, cached: Optional[CachedResponse]):
+        """Fetch from upstream, conditionally when we hold validators"""
+        request_headers = dict(headers or {})
+        if cached is not None:
+            if cached.etag:
+                request_headers['If-None-Match'] = cached.etag
+            if cached.last_modified:
+                request_headers['If-Modified-Since'] = cached.last_modified
+
+        response = self.fetch('GET', url, params=params, headers=request_headers, timeout=timeout)
+
+        if response.status_code == 304 and cached is not None:
+            cached.stored_at = time.time()
+            self._count('revalidated')
+            self._count('bytes_saved', cached.size)
+            with self.lock:
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+            return cached
+
+        cache_control = _parse_cache_control(response.headers.get('Cache-Control', ''))
+        entry = CachedResponse(
+            response.status_code,
+            response.content,
+            {name: response.headers[name]
+             for name in ('Content-Type', 'ETag', 'Last-Modified', 'X-WP-Total', 'X-WP-TotalPages')
+             if name in response.headers},
+            max_age=_seconds(cache_control.get('max-age'), self.default_ttl),
+            stale_ttl=_seconds(cache_control.get('stale-while-revalidate'), self.stale_ttl)
+        )
+        if response.status_code == 200 and 'no-store' not in cache_control:
+            self._store(key, entry)
+        return entry
+
+    def _revalidate_in_background(self, key, url, params, headers, timeout, cached):
+        with self.lock:
+            if key in self.refreshing:
+                return
+            self.refreshing.add(key)
+
+        def refresh():
+            try:
+                self._fetch(key, url, params, headers, timeout, cached)
+            except Exception as e:
+                print(f"{self.name} cache background refresh error: {e}")
+            finally:
+                with self.lock:
+                    self.refreshing.discard(key)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def get(self, url: str, params: Optional[Dict] = None, headers: Optional[Dict] = None,
+            timeout: float = 10) -> CachedResponse:
+        """GET through the cache. The result has status_code, content, json() and from_cache."""
+        key = self._key(url, params, headers)
+        with self.lock:
+            cached = self.entries.get(key)
+            if cached is not None:
+                self.entries.move_to_end(key)
+
+        if cached is not None and cached.is_fresh():
+            self._count('hits')
+            self._count('bytes_saved', cached.size)
+            return cached.served_from_cache()
+
+        if cached is not None and cached.is_usable_stale():
+            self._count('stale_hits')
+            self._count('bytes_saved', cached.size)
+            self._revalidate_in_background(key, url, params, headers, timeout, cached)
+            return cached.served_from_cache()
+
+        self._count('misses')
+        try:
+            entry = self._fetch(key, url, params, headers, timeout, cached)
+        except (requests.ConnectionError, requests.Timeout):
+            if cached is None:
+                raise
+            # Upstream down: an old answer beats no answer
+            self._count('errors_served_stale')
+            return cached.served_from_cache()
+
+        return entry.served_from_cache() if entry is cached else entry
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            return {**self.stats, 'entries': len(self.entries), 'bytes': self.total_bytes,
+                    'max_bytes': self.max_bytes}
@@ -0,0 +1,437 @@
+# interaction_log.py
+# One structured record per chat, voice or TTS request (language, intent, route,
+# cache hit, model, tokens, and time per pipeline stage) for offline analysis.
+#
+# The request thread only builds a flat dict and hands it to a bounded logging
+# QueueHandler; a QueueListener thread classifies the question's intent and
+# serializes the record as a JSON line into a per-process rotating file, so no
+# request waits on the parser or disk. When the queue is full the record is
+# dropped and counted rather than blocking.
+#
+# `python interaction_log.py compact` converts closed log files (rotated, or left by
+# a process that has exited) into one columnar file: Parquet or Arrow IPC with
+# pyarrow installed, else a compressed NumPy archive. Strings are dictionary-encoded,
+# and intents missing from the log are filled in once per distinct query.
+
+import os
+import re
+import sys
+import glob
+import json
+import time
+import queue
+import atexit
+import hashlib
+import logging
+import argparse
+import threading
+import logging.handlers
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+import telemetry
+from lazy_imports import lazy_import, module_available
+
+np = lazy_import('numpy')
+pa = lazy_import('pyarrow')
+pq = lazy_import('pyarrow.parquet')
+
+INTERACTION_LOG_ENABLED = os.getenv('INTERACTION_LOG_ENABLED', 'true').lower() == 'true'
+INTERACTION_LOG_DIR = os.getenv('INTERACTION_LOG_DIR', 'logs')
+# Size at which a process's log file is rotated, and rotated files kept before compaction
+INTERACTION_LOG_MAX_BYTES = int(os.getenv('INTERACTION_LOG_MAX_BYTES', 32 * 1024 * 1024))
+INTERACTION_LOG_BACKUPS = int(os.getenv('INTERACTION_LOG_BACKUPS', 20))
+# Records waiting for the writer thread; beyond this they are dropped
+INTERACTION_LOG_QUEUE_SIZE = int(os.getenv('INTERACTION_LOG_QUEUE_SIZE', 10000))
+# Characters of the question kept; the default 0 keeps only its fingerprint
+INTERACTION_LOG_QUERY_CHARS = int(os.getenv('INTERACTION_LOG_QUERY_CHARS', 0))
+# Request-path cost of record() that benchmarks/bench_interaction_log.py --check enforces (p99)
+INTERACTION_LOG_BUDGET_US = 50
+
+# Columns of a compacted file, in order; stage columns hold milliseconds
+SCHEMA = (
+    ('ts', 'float64'), ('endpoint', 'string'), ('status', 'int16'), ('language', 'string'),
+    ('intent', 'string'), ('route', 'string'), ('cache_hit', 'bool'), ('model', 'string'),
+    ('tier', 'string'), ('session', 'string'), ('fingerprint', 'string'), ('query', 'string'),
+    ('prompt_tokens', 'int32'), ('completion_tokens', 'int32'), ('total_ms', 'float32'),
+    ('asr_engine', 'string'), ('tts_engine', 'string'),
+) + tuple((f"ms_{stage}", 'float32') for stage in telemetry.STAGES)
+
+CACHE_ROUTES = frozenset(('cache', 'prefetch'))
+FORMATS = {'parquet': '.parquet', 'arrow': '.arrow', 'npz': '.npz'}
+LANGUAGE_NAMES = {'en': 'english', 'ha': 'hausa', 'ig': 'igbo', 'yo': 'yoruba'}
+LANGUAGE_CODES = {name: code for code, name in LANGUAGE_NAMES.items()}
+
+_LOG_FILE = re.compile(r'interactions\.(\d+)\.jsonl(?:\.(\d+))?$')
+
+
+class _JSONLines(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps(record.msg, ensure_ascii=False, separators=(',', ':'))
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queue entries without blocking; a full queue drops them"""
+
+    def __init__(self, records: queue.Queue, stats: Dict[str, int]):
+        super().__init__(records)
+        self.stats = stats
+
+    def enqueue(self, entry):
+        try:
+            self.queue.put_nowait(entry)
+        except queue.Full:
+            self.stats['dropped'] += 1
+
+
+class IntentClassifier:
+    """Intent type of a question from the live multilingual parser, memoized per (question, language)"""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self.intents = OrderedDict()
+        self.multilingual = None
+
+    def classify(self, query: str, language: str = 'en') -> Optional[str]:
+        key = (query, language)
+        intent = self.intents.get(key)
+        if intent is None:
+            if self.multilingual is None:
+                from multilingual_handler import MultilingualHandler
+                self.multilingual = MultilingualHandler()
+            intent = self.multilingual.extract_intent(query, LANGUAGE_NAMES.get(language, language)).get('type')
+            self.intents[key] = intent
+            while len(self.intents) > self.max_entries:
+                self.intents.popitem(last=False)
+        return intent
+
+
+class _EntryListener(logging.handlers.QueueListener):
+    """Turns queued entries into LogRecords on the writer thread rather than the request's
+
+    The question travels with the entry only this far: it is classified here, and
+    kept in the record only up to query_chars.
+    """
+
+    def __init__(self, records: queue.Queue, handler: logging.Handler, query_chars: int):
+        super().__init__(records, handler)
+        self.query_chars = query_chars
+        self.intents = IntentClassifier()
+
+    def prepare(self, entry) -> logging.LogRecord:
+        if isinstance(entry, logging.LogRecord):
+            return entry
+        query = entry.pop('_query', None)
+        if query:
+            if 'intent' not in entry:
+                intent = self.intents.classify(query, entry.get('language', 'en'))
+                if intent is not None:
+                    entry['intent'] = intent
+            if self.query_chars:
+                entry['query'] = query[:self.query_chars]
+        total, stages = entry.pop('_trace', (None, None))
+        if total is not None:
+            entry['total_ms'] = round(total, 2)
+            for stage, ms in stages.items():
+                entry[f"ms_{stage}"] = round(ms, 2)
+        return logging.LogRecord('farmdepot.interactions', logging.INFO, '', 0, entry, None, None)
+
+    def enqueue_sentinel(self):
+        # Wait for room: stopping with a full queue must still stop the thread
+        self.queue.put(self._sentinel)
+
+
+class InteractionLog:
+    """Per-process structured request log written by a background thread"""
+
+    def __init__(self, directory: str = INTERACTION_LOG_DIR, max_bytes: int = INTERACTION_LOG_MAX_BYTES,
+                 backups: int = INTERACTION_LOG_BACKUPS, queue_size: int = INTERACTION_LOG_QUEUE_SIZE,
+                 query_chars: int = INTERACTION_LOG_QUERY_CHARS):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"interactions.{os.getpid()}.jsonl")
+        self.query_chars = query_chars
+        self.stats = {'records': 0, 'dropped': 0}
+        self.file_handler = logging.handlers.RotatingFileHandler(self.path, maxBytes=max_bytes,
+                                                                 backupCount=backups, encoding='utf-8', delay=True)
+        self.file_handler.setFormatter(_JSONLines())
+        self.records = queue.Queue(queue_size)
+        self.handler = _DroppingQueueHandler(self.records, self.stats)
+        self.listener = _EntryListener(self.records, self.file_handler, query_chars)
+        self.close_lock = threading.Lock()
+        self.closed = False
+        self.listener.start()
+
+    def record(self, endpoint: str, status: int, query: Optional[str] = None, session_id: Optional[str] = None,
+               usage: Optional[Dict] = None, **fields):
+        """Log one request; call it on the request's thread so its trace's stages are included"""
+        entry = {'ts': time.time(), 'endpoint': endpoint, 'status': status}
+        for name, value in fields.items():
+            if value is not None:
+                entry[name] = value
+        if 'route' in entry:
+            entry['cache_hit'] = entry['route'] in CACHE_ROUTES
+        if query:
+            # Classified, and cut to query_chars, on the writer thread
+            entry['_query'] = query
+        if session_id:
+            entry['session'] = hashlib.blake2b(session_id.encode('utf-8'), digest_size=8).hexdigest()
+        if usage:
+            entry['prompt_tokens'] = usage.get('prompt_tokens')
+            entry['completion_tokens'] = usage.get('completion_tokens')
+        summary = telemetry.trace_summary()
+        if summary:
+            total, stages, engines = summary
+            entry['_trace'] = (total, stages)
+            if 'asr' in engines:
+                entry['asr_engine'] = engines['asr']
+            if 'tts_synthesis' in engines:
+                entry['tts_engine'] = engines['tts_synthesis']
+        self.stats['records'] += 1
+        # Straight onto the queue: the LogRecord is built, and the JSON written, by the listener
+        self.handler.enqueue(entry)
+
+    def close(self):
+        """Write out queued records and close the file"""
+        with self.close_lock:
+            if self.closed:
+                return
+            self.closed = True
+        self.listener.stop()
+        self.file_handler.close()
+
+    def get_stats(self) -> Dict:
+        return {**self.stats, 'queued': self.records.qsize(), 'path': self.path}
+
+
+_default_log = None
+_default_lock = threading.Lock()
+
+
+def load_default() -> Optional[InteractionLog]:
+    """The process's log in INTERACTION_LOG_DIR, or None when disabled or the directory can't be created"""
+    global _default_log
+    if _default_log is None and INTERACTION_LOG_ENABLED:
+        with _default_lock:
+            if _default_log is None:
+                try:
+                    _default_log = InteractionLog()
+                    atexit.register(_default_log.close)
+                except OSError as e:
+                    print(f"Interaction log unavailable: {e}")
+    return _default_log
+
+
+# Compaction
+
+class Categorical:
+    """A dictionary-encoded string column: codes index categories, -1 is missing"""
+
+    __slots__ = ('codes', 'categories')
+
+    def __init__(self, codes, categories):
+        self.codes = codes
+        self.categories = categories
+
+    def __len__(self):
+        return len(self.codes)
+
+    @classmethod
+    def encode(cls, values: List[Optional[str]]) -> 'Categorical':
+        array = np.array(['' if value is None else str(value) for value in values], dtype=object)
+        categories, codes = np.unique(array, return_inverse=True)
+        codes = codes.astype(np.int32)
+        missing = np.array([value is None for value in values], dtype=bool)
+        codes[missing] = -1
+        return cls(codes, categories.astype(str))
+
+    @classmethod
+    def concat(cls, columns: List['Categorical']) -> 'Categorical':
+        """One column over several, with the union of their categories"""
+        categories = np.unique(np.concatenate([column.categories for column in columns]))
+        codes = []
+        for column in columns:
+            mapping = np.searchsorted(categories, column.categories).astype(np.int32)
+            codes.append(np.where(column.codes >= 0, mapping[np.maximum(column.codes, 0)], -1).astype(np.int32))
+        return cls(np.concatenate(codes), categories)
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def closed_logs(directory: str = INTERACTION_LOG_DIR) -> List[str]:
+    """Log files no process writes to any more: rotated ones, and current ones of exited processes"""
+    paths = []
+    for path in glob.glob(os.path.join(directory, 'interactions.*.jsonl*')):
+        match = _LOG_FILE.search(os.path.basename(path))
+        if match and (match.group(2) or (int(match.group(1)) != os.getpid() and not _alive(int(match.group(1))))):
+            paths.append(path)
+    return sorted(paths)
+
+
+def read_records(paths: Iterable[str]) -> List[Dict]:
+    records = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        # A line cut short when a process died mid-write
+                        continue
+    return records
+
+
+def fill_intents(records: List[Dict]):
+    """Classify records that carry a question but no intent (logs written before intents were recorded)"""
+    intents = IntentClassifier()
+    for record in records:
+        if record.get('intent') is None and record.get('query'):
+            record['intent'] = intents.classify(record['query'], record.get('language', 'en'))
+
+
+def to_columns(records: List[Dict]) -> Dict:
+    """Columns per SCHEMA: NumPy arrays, with strings as Categorical"""
+    columns = {}
+    for name, kind in SCHEMA:
+        values = [record.get(name) for record in records]
+        if kind == 'string':
+            columns[name] = Categorical.encode(values)
+        elif kind == 'bool':
+            columns[name] = np.array([bool(value) for value in values], dtype=bool)
+        elif kind.startswith('float'):
+            columns[name] = np.array([np.nan if value is None else value for value in values], dtype=kind)
+        else:
+            columns[name] = np.array([-1 if value is None else value for value in values], dtype=kind)
+    return columns
+
+
+def write_columns(columns: Dict, path: str, fmt: str):
+    if fmt == 'npz':
+        arrays = {}
+        for name, column in columns.items():
+            if isinstance(column, Categorical):
+                arrays[f"{name}.codes"] = column.codes
+                arrays[f"{name}.categories"] = column.categories
+            else:
+                arrays[name] = column
+        with open(path, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+        return
+
+    fields = {}
+    for name, column in columns.items():
+        if isinstance(column, Categorical):
+            indices = pa.array(column.codes, type=pa.int32(), mask=column.codes < 0)
+            fields[name] = pa.DictionaryArray.from_arrays(indices, pa.array(column.categories, type=pa.string()))
+        else:
+            fields[name] = pa.array(column)
+    table = pa.table(fields)
+    if fmt == 'parquet':
+        pq.write_table(table, path, compression='zstd')
+    else:
+        with pa.OSFile(path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema,
+                                 options=pa.ipc.IpcWriteOptions(compression='zstd')) as writer:
+                writer.write_table(table)
+
+
+def read_columns(path: str) -> Dict:
+    """Columns of one compacted file, as written by write_columns"""
+    if path.endswith('.npz'):
+        with np.load(path) as archive:
+            names = set(archive.files)
+            return {name: Categorical(archive[f"{name}.codes"], archive[f"{name}.categories"])
+                    if f"{name}.codes" in names else archive[name]
+                    for name, _ in SCHEMA if name in names or f"{name}.codes" in names}
+
+    if path.endswith('.parquet'):
+        table = pq.read_table(path)
+    else:
+        with pa.memory_map(path, 'r') as source:
+            table = pa.ipc.open_file(source).read_all()
+    columns = {}
+    for name in table.column_names:
+        column = table.column(name).combine_chunks()
+        if pa.types.is_dictionary(column.type):
+            codes = column.indices.fill_null(-1).to_numpy().astype(np.int32)
+            columns[name] = Categorical(codes, np.array(column.dictionary.to_pylist(), dtype=str))
+        else:
+            columns[name] = column.to_numpy(zero_copy_only=False)
+    return columns
+
+
+def load_columns(paths: List[str]) -> Dict:
+    """Columns of several compacted files, concatenated"""
+    parts = [read_columns(path) for path in paths]
+    if not parts:
+        return {}
+    columns = {}
+    for name in parts[0]:
+        pieces = [part[name] for part in parts if name in part]
+        columns[name] = (Categorical.concat(pieces) if isinstance(pieces[0], Categorical)
+                         else np.concatenate(pieces))
+    return columns
+
+
+def default_format() -> str:
+    return 'parquet' if module_available('pyarrow') else 'npz'
+
+
+def compact(directory: str = INTERACTION_LOG_DIR, output: Optional[str] = None,
+            fmt: Optional[str] = None) -> Optional[Dict]:
+    """Turn the closed logs in directory into one columnar file and delete them. Returns a summary."""
+    fmt = fmt or default_format()
+    output = output or os.path.join(directory, 'compacted')
+    # Claim the files first, so a rotation happening meanwhile can't hand one out twice
+    claimed = glob.glob(os.path.join(directory, '*.claimed'))
+    stamp = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+    for path in closed_logs(directory):
+        target = f"{path}.{stamp}.claimed"
+        try:
+            os.rename(path, target)
+            claimed.append(target)
+        except OSError:
+            continue
+    if not claimed:
+        return None
+
+    start = time.perf_counter()
+    records = read_records(sorted(claimed))
+    fill_intents(records)
+    os.makedirs(output, exist_ok=True)
+    path = os.path.join(output, f"interactions-{stamp}{FORMATS[fmt]}")
+    write_columns(to_columns(records), path, fmt)
+    source_bytes = sum(os.path.getsize(p) for p in claimed)
+    for claimed_path in claimed:
+        os.remove(claimed_path)
+    return {'output': path, 'files': len(claimed), 'records': len(records), 'source_bytes': source_bytes,
+            'output_bytes': os.path.getsize(path), 'seconds': round(time.perf_counter() - start, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compact interaction logs into columnar files')
+    sub = parser.add_subparsers(dest='command', required=True)
+    compact_cmd = sub.add_parser('compact', help='convert closed log files and delete them')
+    compact_cmd.add_argument('--dir', default=INTERACTION_LOG_DIR)
+    compact_cmd.add_argument('--output', help='default: <dir>/compacted')
+    compact_cmd.add_argument('--format', choices=sorted(FORMATS), help='default: parquet if pyarrow is installed')
+    args = parser.parse_args()
+
+    fmt = args.format or default_format()
+    if fmt != 'npz' and not module_available('pyarrow'):
+        print(f"--format {fmt} needs pyarrow (pip install pyarrow); use --format npz without it")
+        sys.exit(1)
+    summary = compact(args.dir, args.output, fmt)
+    print(json.dumps(summary or {'records': 0}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,289 @@
+# knowledge_base.py
+# Retrieval over the curated crop guides in knowledge_base.json (and any files in
+# KNOWLEDGE_BASE_EXTRA_PATHS). Each guide section is a passage, indexed with BM25 in
+# memory: pure Python, built once at start-up.
+#
+# A question that names a crop, and that one passage of that crop's guide clearly
+# covers, is answered from the passage with no LLM call. For other questions the
+# few best passages are added to the system prompt, within a small token budget.
+# generate_fallback_response serves the whole guides when the LLM is unavailable.
+
+import os
+import re
+import json
+import math
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import telemetry
+from conversation_store import estimate_tokens
+from multilingual_handler import MultilingualHandler
+
+# JSON file of crop guides
+KNOWLEDGE_BASE_PATH = os.getenv('KNOWLEDGE_BASE_PATH',
+                                os.path.join(os.path.dirname(os.path.abspath(__file__)), 'knowledge_base.json'))
+# More guide files in the same format, separated by os.pathsep
+KNOWLEDGE_BASE_EXTRA_PATHS = [path for path in os.getenv('KNOWLEDGE_BASE_EXTRA_PATHS', '').split(os.pathsep) if path]
+# Answer without the LLM when the best passage covers this share of the question's
+# weighted terms, and covers more than the runner-up or outscores it by KB_ANSWER_MARGIN
+KB_ANSWER_MIN_COVERAGE = float(os.getenv('KB_ANSWER_MIN_COVERAGE', 0.75))
+KB_ANSWER_MARGIN = float(os.getenv('KB_ANSWER_MARGIN', 1.5))
+# Passages added to the LLM prompt, their minimum coverage and total token budget
+KB_CONTEXT_PASSAGES = int(os.getenv('KB_CONTEXT_PASSAGES', 3))
+KB_CONTEXT_MIN_COVERAGE = float(os.getenv('KB_CONTEXT_MIN_COVERAGE', 0.3))
+KB_CONTEXT_TOKENS = int(os.getenv('KB_CONTEXT_TOKENS', 160))
+
+# BM25 term-frequency saturation and length normalization
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_WORDS = re.compile(r'\w+')
+_MARKUP = re.compile(r'\*\*')
+_SUFFIXES = ('ations', 'ation', 'ings', 'ing', 'ers', 'er', 'ies', 'es', 'ed', 's')
+STOPWORDS = frozenset("""
+a about after all am an and any are as at be before best can could did do does for from get good
+has have how i if in is it its me my of on or our should so some than that the their them then
+there these they this to use using was we what when where which who why will with would you your
+""".split())
+
+# What a question asks about a crop, by word prefix (English, Hausa, Igbo, Yoruba)
+ASPECTS = {
+    'planting': ('plant', 'sow', 'seed', 'spacing', 'variet', 'shuka', 'gbin', 'kụọ'),
+    'fertilizer': ('fertili', 'npk', 'urea', 'manure', 'compost', 'taki', 'ajile'),
+    'pests': ('pest', 'insect', 'armyworm', 'weevil', 'disease', 'blight', 'spray', 'kwari', 'cuta',
+              'kokoro', 'arun', 'ahụhụ', 'ọrịa'),
+    'harvest': ('harvest', 'matur', 'girbi', 'kore', 'ikore', 'owuwe'),
+    'storage': ('store', 'storage', 'ajiya', 'adana', 'ipamọ', 'nchekwa'),
+    'market': ('price', 'sell', 'market', 'cost', 'kasuwa', 'farashi', 'ọja', 'owo', 'ahịa'),
+    'water': ('water', 'irrigat', 'rain', 'ruwa', 'omi', 'mmiri'),
+    'soil': ('soil', 'ƙasa', 'ilẹ', 'ala'),
+}
+
+CONTEXT_HEADER = "Reference notes from FarmDepot's crop guides (use them only where they fit the question):"
+
+
+def stem(word: str) -> str:
+    """Strip common English suffixes so planting/plants/plant and fertilizer/fertilization meet"""
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            word = word[:-len(suffix)] + ('y' if suffix == 'ies' else '')
+            break
+    return word[:-1] if word.endswith('e') and len(word) > 5 else word
+
+
+# Every prefix in one pattern, anchored at word starts; the group that matched names the aspect
+_ASPECT_PATTERN = re.compile(r'\b(?:' + '|'.join(
+    f"(?P<{name}>{'|'.join(map(re.escape, prefixes))})" for name, prefixes in ASPECTS.items()) + ')')
+
+
+def aspect_of(word: str) -> Optional[str]:
+    """The ASPECTS entry a lower-case word belongs to, if any"""
+    match = _ASPECT_PATTERN.match(word)
+    return match.lastgroup if match else None
+
+
+def first_aspect(text: str) -> Optional[str]:
+    """The aspect of the first word in lower-case text that has one"""
+    match = _ASPECT_PATTERN.search(text)
+    return match.lastgroup if match else None
+
+
+class Passage:
+    """One section of a crop guide"""
+
+    __slots__ = ('crop', 'language', 'aspect', 'title', 'text')
+
+    def __init__(self, crop: str, language: str, aspect: str, title: str, text: str):
+        self.crop = crop
+        self.language = language
+        self.aspect = aspect
+        self.title = title
+        self.text = text
+
+    def answer(self) -> str:
+        return f"{self.title}\n\n{self.text}"
+
+    def note(self) -> str:
+        return f"- {self.crop.capitalize()}: {_MARKUP.sub('', self.text)}"
+
+
+class Retrieval:
+    """What the knowledge base has for a question: a direct answer, or passages for the prompt"""
+
+    __slots__ = ('answer', 'passages', 'confidence')
+
+    def __init__(self, answer: Optional[str] = None, passages: Tuple[Passage, ...] = (), confidence: float = 0.0):
+        self.answer = answer
+        self.passages = passages
+        self.confidence = confidence
+
+    def prompt_context(self) -> Optional[str]:
+        """Text to append to the system prompt, or None"""
+        if not self.passages:
+            return None
+        return '\n'.join([CONTEXT_HEADER] + [passage.note() for passage in self.passages])
+
+
+class KnowledgeBase:
+    """BM25 index over guide passages, with crop names in every language mapped to one term"""
+
+    def __init__(self, guides: List[Dict]):
+        crops = MultilingualHandler().agricultural_terms['crops']
+        self.crop_words = {word: crop for terms in crops.values() for word, crop in terms.items() if ' ' not in word}
+        self.crop_names = set(self.crop_words.values())
+        self.guides = guides
+        self.languages = {guide.get('language', 'en') for guide in guides}
+        self.passages = []
+        self.postings = {}
+        self.lengths = []
+        for guide in guides:
+            for section in guide.get('sections', []):
+                passage = Passage(guide['crop'], guide.get('language', 'en'), section.get('aspect', ''),
+                                  guide['title'], section['text'])
+                terms = Counter(self.terms(f"{passage.crop} {passage.aspect} {passage.text}"))
+                for term, tf in terms.items():
+                    self.postings.setdefault(term, []).append((len(self.passages), tf))
+                self.passages.append(passage)
+                self.lengths.append(sum(terms.values()))
+        self.average_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+        count = len(self.passages)
+        self.idf = {term: math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+                    for term, docs in self.postings.items()}
+        # Weight of a question term no passage contains
+        self.unknown_idf = math.log(1 + (count + 0.5) / 0.5)
+        # language -> [(crop, whole guide)], served by generate_fallback_response
+        self.guide_index = {}
+        for guide in guides:
+            text = '\n\n'.join([guide['title']] + [section['text'] for section in guide.get('sections', [])])
+            self.guide_index.setdefault(guide.get('language', 'en'), []).append((guide['crop'], text))
+        self.lock = threading.Lock()
+        self.stats = {'lookups': 0, 'answered': 0, 'grounded': 0, 'no_context': 0, 'passages_added': 0}
+
+    @classmethod
+    def from_files(cls, paths: List[str]) -> 'KnowledgeBase':
+        guides = []
+        for path in paths:
+            with open(path, encoding='utf-8') as f:
+                guides.extend(json.load(f).get('guides', []))
+        return cls(guides)
+
+    def terms(self, text: str) -> List[str]:
+        """Index terms of passage text: crop names as the crop, other words stemmed"""
+        terms = []
+        for word in _WORDS.findall(text.lower()):
+            if word in self.crop_words:
+                terms.append(self.crop_words[word])
+            elif word not in STOPWORDS and not word.isdigit():
+                terms.append(stem(word))
+        return terms
+
+    def query_terms(self, message: str, language: str) -> List[str]:
+        """Terms of a question; words about an aspect also add the aspect's term, in any language
+
+        In a language with no guides of its own only crops and aspects are kept, as the
+        remaining words can't be told apart from filler and would never match.
+        """
+        foreign = language not in self.languages
+        terms = []
+        for word in _WORDS.findall(message.lower()):
+            if word in self.crop_words:
+                terms.append(self.crop_words[word])
+                continue
+            aspect = aspect_of(word)
+            if aspect:
+                terms.append(stem(aspect))
+            if foreign or word in STOPWORDS or word.isdigit():
+                continue
+            term = stem(word)
+            if not aspect or term in self.idf:
+                terms.append(term)
+        return terms
+
+    def search(self, terms: List[str], crop: Optional[str] = None) -> List[Tuple[float, float, Passage, set]]:
+        """(score, coverage, passage, matched terms) for passages matching any term, best first
+
+        coverage is the share of the question's idf weight the passage contains.
+        """
+        unique = set(terms)
+        total = sum(self.idf.get(term, self.unknown_idf) for term in unique)
+        scores, matched = {}, {}
+        for term in unique:
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for index, tf in self.postings[term]:
+                if crop and self.passages[index].crop != crop:
+                    continue
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[index] / self.average_length)
+                scores[index] = scores.get(index, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+                matched.setdefault(index, set()).add(term)
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        return [(scores[index], sum(self.idf[term] for term in matched[index]) / total, self.passages[index],
+                 matched[index]) for index in ranked]
+
+    def lookup(self, message: str, language: str = 'en') -> Retrieval:
+        """A direct answer when one passage clearly answers the question, else passages for the prompt"""
+        with telemetry.span('retrieval', language=language):
+            terms = self.query_terms(message, language)
+            crops = {term for term in terms if term in self.crop_names}
+            # Only the named crop's guide is relevant; passages about another crop would mislead
+            results = self.search(terms, next(iter(crops)) if len(crops) == 1 else None) if terms else []
+
+            retrieval = Retrieval()
+            if results:
+                score, coverage, best, _ = results[0]
+                runner_up = results[1] if len(results) > 1 else (0.0, 0.0, None, None)
+                retrieval.confidence = round(coverage, 3)
+                distinct = coverage > runner_up[1] or score >= runner_up[0] * KB_ANSWER_MARGIN
+                if (crops and best.language == language and len(set(terms)) >= 2
+                        and coverage >= KB_ANSWER_MIN_COVERAGE and distinct):
+                    retrieval.answer = best.answer()
+                else:
+                    # Sharing only the crop name says nothing about what the question asks
+                    topical = set(terms) - crops
+                    passages, budget = [], KB_CONTEXT_TOKENS
+                    for _, coverage, passage, matched in results[:KB_CONTEXT_PASSAGES]:
+                        cost = estimate_tokens(passage.note())
+                        if coverage < KB_CONTEXT_MIN_COVERAGE or not matched & topical or cost > budget:
+                            break
+                        passages.append(passage)
+                        budget -= cost
+                    retrieval.passages = tuple(passages)
+
+        outcome = 'answered' if retrieval.answer else 'grounded' if retrieval.passages else 'no_context'
+        with self.lock:
+            self.stats['lookups'] += 1
+            self.stats[outcome] += 1
+            self.stats['passages_added'] += len(retrieval.passages)
+        telemetry.registry.inc('farmdepot_knowledge_base_total', 1, 'Knowledge base lookups by outcome',
+                               outcome=outcome)
+        return retrieval
+
+    def guide_texts(self, language: str) -> List[Tuple[str, str]]:
+        """(crop, whole guide) for the language, in file order"""
+        return self.guide_index.get(language, [])
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            stats = dict(self.stats)
+        stats['passages'] = len(self.passages)
+        stats['llm_skip_rate'] = round(stats['answered'] / stats['lookups'], 3) if stats['lookups'] else None
+        return stats
+
+
+_default_kb = None
+_default_lock = threading.Lock()
+
+
+def load_default() -> Optional[KnowledgeBase]:
+    """The knowledge base for KNOWLEDGE_BASE_PATH and the extra paths, or None if they can't be read"""
+    global _default_kb
+    if _default_kb is None:
+        with _default_lock:
+            if _default_kb is None:
+                try:
+                    _default_kb = KnowledgeBase.from_files([KNOWLEDGE_BASE_PATH] + KNOWLEDGE_BASE_EXTRA_PATHS)
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"Knowledge base unavailable: {e}")
+    return _default_kb
@@ -0,0 +1,59 @@
+# lazy_imports.py
+# Deferred imports for heavy optional SDKs (speech, cloud TTS, audio playback)
+
+import importlib
+import importlib.util
+import threading
+from functools import lru_cache
+
+_import_lock = threading.Lock()
+
+
+class LazyModule:
+    """Stand-in for a module that is imported on first attribute access.
+
+    A missing package raises ImportError at that point instead of when the
+    importing module loads, so engines whose SDK is absent or unconfigured
+    cost nothing.
+    """
+
+    def __init__(self, name: str):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+
+    def _load(self):
+        module = self.__dict__['_module']
+        if module is None:
+            with _import_lock:
+                module = self.__dict__['_module']
+                if module is None:
+                    module = importlib.import_module(self.__dict__['_name'])
+                    self.__dict__['_module'] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    @property
+    def loaded(self) -> bool:
+        return self.__dict__['_module'] is not None
+
+    def __repr__(self):
+        state = 'loaded' if self.loaded else 'not loaded'
+        return f"<lazy module '{self.__dict__['_name']}' ({state})>"
+
+
+def lazy_import(name: str) -> LazyModule:
+    return LazyModule(name)
+
+
+@lru_cache(maxsize=None)
+def module_available(name: str) -> bool:
+    """Whether a module is installed, without importing it (parent packages may be imported)"""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
@@ -1,11 +1,28 @@
 # main.py - with OpenrouterAI
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, request, jsonify, render_template, g
 from flask_cors import CORS
 import logging
 import os
+import math
 import requests
+import time
+import threading
 import traceback
 from datetime import datetime
+from bulk_listings import BulkListingPoster, BatchTooLarge, parse_listings
+from http_cache import HTTPReadCache
+from conversation_store import create_conversation_store
+from response_cache import ResponseCache, query_fingerprint
+from model_router import ModelRouter
+from engine_registry import default_registry as tts_engine_registry
+from audio_delivery import VoiceDelivery, negotiate
+from admission import AdmissionController, client_address
+from voice_jobs import VoiceJobStore, VoiceJobWorkers, VoicePipeline, VOICE_JOB_MAX_UPLOAD_BYTES
+from streaming_asr import StreamRegistry, STREAM_SAMPLE_RATE
+from prefetcher import Prefetcher
+import knowledge_base
+import interaction_log
+import telemetry
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -17,10 +34,110 @@ logger = logging.getLogger(__name__)
 
 # OpenRouter configuration
 OPENROUTER_API_KEY = os.getenv('OPENROUTER_API_KEY')
-OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1/chat/completions"
-
-def call_openrouter_api(message, language='en', model="openai/gpt-4o-mini"):
-    """Call OpenRouter API directly"""
+OPENROUTER_API_BASE = os.getenv('OPENROUTER_API_BASE', 'https://openrouter.ai/api/v1').rstrip('/')
+OPENROUTER_BASE_URL = f"{OPENROUTER_API_BASE}/chat/completions"
+OPENROUTER_MODELS_URL = f"{OPENROUTER_API_BASE}/models"
+
+# The model list changes rarely; keep it for an hour and revalidate after
+models_cache = HTTPReadCache('openrouter_models', max_bytes=4 * 1024 * 1024,
+                             max_entry_bytes=4 * 1024 * 1024,
+                             default_ttl=int(os.getenv('MODELS_CACHE_TTL', 3600)))
+
+# Per-session conversation memory so follow-up questions keep their context
+conversation_store = create_conversation_store()
+
+# Answers to stand-alone questions, and the model tier chosen for each query
+response_cache = ResponseCache()
+model_router = ModelRouter()
+
+# Curated crop guides: direct answers, prompt notes, and the fallback when the LLM is down
+crop_knowledge = knowledge_base.load_default()
+
+# One structured record per request, written off the request thread (INTERACTION_LOG_ENABLED)
+interactions = interaction_log.load_default()
+
+# Per-client rate limits and a bounded, deadline-aware queue in front of the LLM
+admission = AdmissionController()
+ADMISSION_ADMIN_TOKEN = os.getenv('ADMISSION_ADMIN_TOKEN')
+
+# Spoken responses; TTS engines and the phrase bank load on the first request
+voice_delivery = None
+# Longest text /api/tts/synthesize will speak (a full chat answer fits comfortably)
+TTS_MAX_TEXT_CHARS = int(os.getenv('TTS_MAX_TEXT_CHARS', 3000))
+voice_delivery_lock = threading.Lock()
+# Chat language codes -> TTS language names
+TTS_LANGUAGES = {'en': 'english', 'ha': 'hausa', 'ig': 'igbo', 'yo': 'yoruba'}
+
+def get_voice_delivery():
+    global voice_delivery
+    if voice_delivery is None:
+        with voice_delivery_lock:
+            if voice_delivery is None:
+                from advanced_tts_handler import AdvancedTTSHandler
+                from production_tts_integration import TTSCache
+                import phrase_bank
+                voice_delivery = VoiceDelivery(AdvancedTTSHandler(), TTSCache(), phrase_bank.load_default())
+    return voice_delivery
+
+# Voice uploads are processed in the background; the store and workers start on the first upload or poll
+voice_jobs = None
+voice_jobs_lock = threading.Lock()
+# TTS language names -> chat language codes
+CHAT_LANGUAGES = {name: code for code, name in TTS_LANGUAGES.items()}
+
+def create_voice_pipeline():
+    """ASR -> intent -> answer -> TTS, as run by voice job workers"""
+    from voice_handler import SpeechRecognizer
+    from multilingual_handler import MultilingualHandler
+    recognizer = SpeechRecognizer()
+    multilingual = MultilingualHandler()
+    
+    def answer(text, language, session_id, call_info):
+        return process_farming_query(text, CHAT_LANGUAGES.get(language, language), session_id=session_id,
+                                     call_info=call_info)
+    
+    def speak(text, language):
+        return get_voice_delivery().source(text, TTS_LANGUAGES.get(language, language))
+    
+    return VoicePipeline(recognizer.transcribe, multilingual.parse_multilingual_command, answer, speak)
+
+def get_voice_jobs():
+    global voice_jobs
+    if voice_jobs is None:
+        with voice_jobs_lock:
+            if voice_jobs is None:
+                voice_jobs = VoiceJobWorkers(VoiceJobStore(), create_voice_pipeline(),
+                                             interactions=interactions).start()
+    return voice_jobs
+
+# Audio streamed in while the user speaks; the final transcript becomes a voice job
+voice_streams = None
+voice_streams_lock = threading.Lock()
+# Bytes read from a stream request body at a time (100ms of 16 kHz audio)
+STREAM_READ_BYTES = 3200
+
+def get_voice_streams():
+    global voice_streams
+    if voice_streams is None:
+        with voice_streams_lock:
+            if voice_streams is None:
+                from voice_handler import SpeechRecognizer
+                recognizer = SpeechRecognizer()
+                
+                def on_final(session):
+                    return get_voice_jobs().store.submit(None, session.language, session.session_id,
+                                                         transcript=session.transcript)
+                
+                voice_streams = StreamRegistry(recognizer.transcribe_samples, on_final)
+    return voice_streams
+
+def call_openrouter_api(message, language='en', model="openai/gpt-4o-mini", session_id=None, call_info=None,
+                        timeout=30, reference=None):
+    """Call OpenRouter API directly
+    
+    If call_info is a dict it receives the token 'usage' reported by OpenRouter.
+    reference is knowledge base text appended to the system prompt.
+    """
     
     if not OPENROUTER_API_KEY:
         logger.error("OPENROUTER_API_KEY not found in environment variables")
@@ -38,6 +155,8 @@ def call_openrouter_api(message, language='en', model="openai/gpt-4o-mini"):
     }
     
     system_prompt = system_prompts.get(language, system_prompts['en'])
+    if reference:
+        system_prompt += "\n\n" + reference
     
     try:
         headers = {
@@ -49,16 +168,7 @@ def call_openrouter_api(message, language='en', model="openai/gpt-4o-mini"):
         
         payload = {
             "model": model,
-            "messages": [
-                {
-                    "role": "system",
-                    "content": system_prompt
-                },
-                {
-                    "role": "user", 
-                    "content": f"Question: {message}"
-                }
-            ],
+            "messages": conversation_store.build_messages(session_id, system_prompt, message),
             "temperature": 0.7,
             "max_tokens": 500,
             "top_p": 1,
@@ -66,15 +176,20 @@ def call_openrouter_api(message, language='en', model="openai/gpt-4o-mini"):
             "presence_penalty": 0
         }
         
-        response = requests.post(
-            OPENROUTER_BASE_URL,
-            headers=headers,
-            json=payload,
-            timeout=30
-        )
+        # Only allow-listed models get their own metric label, keeping the series count bounded
+        metric_model = model if model in model_router.allowed_models else 'other'
+        with telemetry.span('llm_call', model=metric_model):
+            response = requests.post(
+                OPENROUTER_BASE_URL,
+                headers=headers,
+                json=payload,
+                timeout=timeout
+            )
         
         if response.status_code == 200:
             data = response.json()
+            if call_info is not None:
+                call_info['usage'] = data.get('usage')
             if 'choices' in data and len(data['choices']) > 0:
                 return data['choices'][0]['message']['content']
             else:
@@ -89,18 +204,95 @@ def call_openrouter_api(message, language='en', model="openai/gpt-4o-mini"):
         logger.error(traceback.format_exc())
         return None
 
-def process_farming_query(message, language='en'):
-    """Process farming query using OpenRouter"""
+def prefetch_answer(question, language, session_id):
+    """Answer a predicted follow-up in the session's context without recording a turn"""
+    retrieval = crop_knowledge.lookup(question, language) if crop_knowledge else None
+    if retrieval and retrieval.answer:
+        return retrieval.answer
+    decision = model_router.route(question, language=language)
+    call_info = {}
+    start = time.time()
+    response = call_openrouter_api(question, language, model=decision.model, session_id=session_id,
+                                   call_info=call_info, reference=retrieval and retrieval.prompt_context())
+    model_router.record(decision, bool(response), time.time() - start, call_info.get('usage'),
+                        language=language, prefetch=True)
+    return response
+
+def prefetch_speak(text, language):
+    """Warm the audio cache, but only in processes that already serve voice"""
+    if voice_delivery is None:
+        return None
+    return voice_delivery.source(text, TTS_LANGUAGES.get(language, language))
+
+# Likely follow-up questions answered ahead of time at idle LLM capacity (PREFETCH_ENABLED)
+prefetcher = Prefetcher(prefetch_answer, response_cache, admission, speak=prefetch_speak).load().start()
+
+def process_farming_query(message, language='en', session_id=None, model=None, call_info=None,
+                          deadline=None):
+    """Process farming query using OpenRouter
     
-    # Try OpenRouter API first
-    response = call_openrouter_api(message, language)
+    model is the client's requested model (None or 'auto' lets the router choose).
+    If call_info is a dict it receives the 'model' used, the query 'fingerprint' and the 'route'
+    taken ('cache', 'prefetch', 'knowledge_base', 'llm', 'fallback', or 'shed' when no LLM slot
+    was free in time).
+    deadline (time.monotonic()) bounds the wait for an LLM slot and the call itself.
+    """
+    if call_info is None:
+        call_info = {}
+    
+    # Answers to stand-alone questions can be reused; follow-ups depend on context
+    standalone = not conversation_store.has_history(session_id)
+    fingerprint = query_fingerprint(message, language)
+    call_info['fingerprint'] = fingerprint
+    response = response_cache.get(fingerprint) if standalone else prefetcher.take(session_id, message)
+    retrieval = crop_knowledge.lookup(message, language) if crop_knowledge and not response else None
     
     if response:
-        return response
+        call_info.update(route='cache' if standalone else 'prefetch', model=None)
+    elif retrieval and retrieval.answer:
+        # The question is answered by one passage of the crop guides
+        response = retrieval.answer
+        call_info.update(route='knowledge_base', model=None)
     else:
+        decision = model_router.route(
+            message,
+            language=language,
+            requested_model=model,
+            miss_count=response_cache.miss_count(fingerprint)
+        )
+        call_info.update(route='llm', model=decision.model, tier=decision.tier)
+        
+        # Try OpenRouter API first, if an LLM slot frees up before the deadline
+        with admission.llm_slot(deadline) as admitted:
+            if admitted:
+                start = time.time()
+                timeout = 30 if deadline is None else max(1.0, min(30, deadline - time.monotonic()))
+                response = call_openrouter_api(message, language, model=decision.model,
+                                               session_id=session_id, call_info=call_info, timeout=timeout,
+                                               reference=retrieval and retrieval.prompt_context())
+                model_router.record(decision, bool(response), time.time() - start,
+                                    call_info.get('usage'), language=language)
+            else:
+                call_info['shed'] = True
+        
+        if response and standalone:
+            response_cache.put(fingerprint, response, model=decision.model)
+    
+    if not response:
         # Fallback to keyword-based responses
-        logger.warning("OpenRouter failed, using fallback responses")
-        return generate_fallback_response(message, language)
+        if call_info.get('shed'):
+            call_info.update(route='shed', model=None)
+        else:
+            logger.warning("OpenRouter failed, using fallback responses")
+            call_info.update(route='fallback', model=None)
+        response = generate_fallback_response(message, language)
+    
+    if session_id:
+        conversation_store.add_turn(session_id, 'user', message)
+        conversation_store.add_turn(session_id, 'assistant', response)
+    
+    prefetcher.after_answer(session_id, message, language, call_info.get('route'))
+    return response
 
 def generate_fallback_response(message, language='en'):
     """Generate fallback response when OpenRouter is not available"""
@@ -109,46 +301,6 @@ def generate_fallback_response(message, language='en'):
     
     responses = {
         'en': {
-            'maize': """For maize cultivation in Nigeria:
-            
-🌱 **Planting**: Plant during rainy season (May-July) using improved varieties like SAMMAZ-15, SAMMAZ-16, or local varieties like Oba Super 2.
-
-📏 **Spacing**: 75cm between rows, 25cm between plants (about 53,000 plants per hectare).
-
-🌿 **Fertilization**: Apply NPK 20:10:10 at planting (2 bags/hectare), then top-dress with Urea after 4-6 weeks (1 bag/hectare).
-
-🌧️ **Water**: Needs 500-800mm of rainfall during growing season. Supplement with irrigation if rainfall is insufficient.""",
-            
-            'rice': """Rice cultivation guide for Nigeria:
-            
-🏞️ **Land**: Choose lowland (fadama) areas or prepare upland fields with good drainage.
-
-🌱 **Varieties**: Use FARO varieties (FARO-44, FARO-52) or local varieties like Ofada for better market value.
-
-💧 **Water Management**: For lowland rice, maintain 2-5cm water depth. For upland, ensure consistent moisture without waterlogging.
-
-🌾 **Harvesting**: Ready for harvest 90-120 days after planting when grains turn golden yellow.""",
-            
-            'cassava': """Cassava farming in Nigeria:
-            
-🌿 **Varieties**: Use improved varieties like TMS-30572, TME-419, or NR-8082 for better yields and disease resistance.
-
-🌱 **Planting**: Use 20cm stem cuttings, plant at 45° angle, 1m x 1m spacing (10,000 stands per hectare).
-
-🌧️ **Season**: Plant early in rainy season (April-May) for best establishment.
-
-⏰ **Harvest**: Ready after 12-18 months. Can leave in ground longer if needed as natural storage.""",
-            
-            'tomato': """Tomato production tips:
-            
-🌱 **Nursery**: Start seeds in nursery beds, transplant after 4-6 weeks when plants are 10-15cm tall.
-
-🏞️ **Land**: Choose well-drained soil, add compost or organic matter before planting.
-
-🌿 **Support**: Stake plants or use trellises for better growth and fruit quality.
-
-🐛 **Pest Control**: Watch for whiteflies, aphids, and blight. Use neem-based products or IPM practices.""",
-            
             'default': f"""Thank you for your farming question about '{message}'. 
 
 For specific advice on Nigerian agriculture, I can help with:
@@ -201,14 +353,51 @@ Fun alaye pipe, beere nipa irugbin kan pato tabi iṣoro ise agbe kan."""
         }
     }
     
-    lang_responses = responses.get(language, responses['en'])
+    guide_language = language if language in responses else 'en'
     
-    # Check for keywords
-    for keyword, response in lang_responses.items():
-        if keyword != 'default' and keyword in message_lower:
-            return response
+    # Whole crop guides from the knowledge base, for the crop the message names
+    if crop_knowledge:
+        for crop, guide in crop_knowledge.guide_texts(guide_language):
+            if crop in message_lower:
+                return guide
     
-    return lang_responses['default']
+    return responses[guide_language]['default']
+
+def rate_limited_response():
+    """A 429 response if the caller's IP or API key is over its rate limit, else None"""
+    limited = admission.check(client_address(request.remote_addr, request.headers.get('X-Forwarded-For')),
+                              request.headers.get('X-API-Key'))
+    if not limited:
+        return None
+    limit, retry_after = limited
+    response = jsonify({
+        'error': 'Too many requests, please slow down',
+        'limit': limit,
+        'retry_after': round(retry_after, 1),
+        'status': 'error'
+    })
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response, 429
+
+# Request tracing
+@app.before_request
+def start_request_trace():
+    if request.endpoint != 'metrics':
+        g.trace_token = telemetry.start_trace(request.endpoint or 'unknown')
+
+@app.after_request
+def record_interaction(response):
+    # Before teardown, so the request's trace is still open
+    fields = g.pop('interaction', None)
+    if fields is not None and interactions:
+        interactions.record(request.endpoint, response.status_code, **fields)
+    return response
+
+@app.teardown_request
+def finish_request_trace(error=None):
+    total = telemetry.finish_trace(g.pop('trace_token', None), path=request.path)
+    if total is not None and request.endpoint not in (None, 'metrics'):
+        telemetry.record_stage('response', total, endpoint=request.endpoint)
 
 # Routes
 @app.route('/')
@@ -223,9 +412,25 @@ def health_check():
         'status': 'healthy',
         'timestamp': datetime.now().isoformat(),
         'openrouter_configured': OPENROUTER_API_KEY is not None,
+        'http_cache': {'openrouter_models': models_cache.get_stats()},
+        'tts_engines': tts_engine_registry.get_state(),
+        'audio_delivery': voice_delivery.get_stats() if voice_delivery else None,
+        'text_prep': voice_delivery.tts.text_prep.get_stats() if voice_delivery and voice_delivery.tts.text_prep else None,
+        'admission': admission.get_state(),
+        'prefetch': prefetcher.get_stats(),
+        'knowledge_base': crop_knowledge.get_stats() if crop_knowledge else None,
+        'interaction_log': interactions.get_stats() if interactions else None,
+        'voice_jobs': voice_jobs.get_stats() if voice_jobs else None,
+        'voice_streams': voice_streams.get_stats() if voice_streams else None,
         'service': 'FarmDepot Voice Assistant'
     })
 
+@app.route('/metrics')
+def metrics():
+    """Pipeline stage histograms in Prometheus text format"""
+    return app.response_class(telemetry.registry.render_prometheus(),
+                              mimetype='text/plain; version=0.0.4')
+
 @app.route('/models', methods=['GET'])
 def available_models():
     """Get available OpenRouter models"""
@@ -238,25 +443,102 @@ def available_models():
             "Content-Type": "application/json"
         }
         
-        response = requests.get(
-            "https://openrouter.ai/api/v1/models",
+        response = models_cache.get(
+            OPENROUTER_MODELS_URL,
             headers=headers,
             timeout=10
         )
         
         if response.status_code == 200:
-            return response.json()
+            return app.response_class(response.content, mimetype='application/json')
         else:
             return jsonify({'error': 'Failed to fetch models'}), response.status_code
             
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/models/routing', methods=['GET'])
+def routing_stats():
+    """Per-model call counts, latency and token usage chosen by the model router"""
+    return jsonify({
+        'tiers': {'fast': model_router.fast_model, 'strong': model_router.strong_model},
+        'models': model_router.get_stats(),
+        'response_cache': response_cache.get_stats()
+    })
+
+@app.route('/admin/admission', methods=['GET', 'POST'])
+def admission_settings():
+    """Read or change admission limits at runtime (per worker process)"""
+    if not ADMISSION_ADMIN_TOKEN:
+        return jsonify({'error': 'ADMISSION_ADMIN_TOKEN is not configured'}), 403
+    if request.headers.get('X-Admin-Token') != ADMISSION_ADMIN_TOKEN:
+        return jsonify({'error': 'Invalid admin token'}), 401
+    if request.method == 'GET':
+        return jsonify(admission.get_state())
+    
+    try:
+        limits = {name: float(value) for name, value in (request.get_json(silent=True) or {}).items()}
+        return jsonify(admission.configure(**limits))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/products/bulk', methods=['POST'])
+def bulk_post_products():
+    """Post a batch of product listings (JSON or CSV) to WordPress as the calling user"""
+    # Listings are created with the caller's own WordPress token, never the site's
+    auth_header = request.headers.get('Authorization', '')
+    token = auth_header[7:].strip() if auth_header.startswith('Bearer ') else None
+    if not token:
+        return jsonify({'error': 'Authorization: Bearer <WordPress token> required'}), 401
+    
+    try:
+        uploaded = request.files.get('file')
+        try:
+            if uploaded:
+                # UnicodeDecodeError is a ValueError: a non-UTF-8 file is a bad payload
+                body = uploaded.read().decode('utf-8-sig')
+                content_type = 'text/csv' if (uploaded.filename or '').lower().endswith('.csv') else 'application/json'
+            else:
+                body = request.get_data(as_text=True)
+                content_type = request.content_type or 'application/json'
+            
+            if not body.strip():
+                return jsonify({'error': 'No listings received'}), 400
+            
+            listings = parse_listings(body, content_type)
+        except ValueError as e:
+            return jsonify({'error': f'Invalid listings payload: {str(e)}'}), 400
+        
+        poster = BulkListingPoster(
+            token=token,
+            language=request.args.get('language', 'english')
+        )
+        report = poster.post_all(listings)
+        
+        logger.info(f"Bulk post: {report['total']} listings, summary: {report['summary']}")
+        
+        report['timestamp'] = datetime.now().isoformat()
+        return jsonify(report)
+        
+    except BatchTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except Exception as e:
+        logger.error(f"Bulk post error: {str(e)}")
+        logger.error(traceback.format_exc())
+        return jsonify({'error': f'Server error: {str(e)}'}), 500
+
 @app.route('/', methods=['POST'])
 @app.route('/chat', methods=['POST'])
 @app.route('/api/chat', methods=['POST'])
 def chat():
     """Main chat endpoint for WordPress plugin"""
+    deadline = admission.deadline()
+    g.interaction = {}
+    limited = rate_limited_response()
+    if limited:
+        g.interaction['route'] = 'rate_limited'
+        return limited
+    
     try:
         # Get JSON data
         data = request.get_json()
@@ -275,18 +557,27 @@ def chat():
         
         # Extract language and model
         language = data.get('language', 'en')
-        model = data.get('model', 'openai/gpt-4o-mini')  # Default model
+        model = data.get('model')  # None or 'auto' lets the router pick
+        session_id = data.get('session_id') or data.get('conversation_id')
         
-        logger.info(f"Processing message: {message} (language: {language}, model: {model})")
+        logger.debug("Processing message: %s (language: %s, model: %s)", message, language, model or 'auto')
         
         # Process the farming query
-        response_text = process_farming_query(message, language)
+        call_info = {}
+        response_text = process_farming_query(message, language, session_id=session_id,
+                                              model=model, call_info=call_info, deadline=deadline)
+        g.interaction.update(language=language, query=message, session_id=session_id,
+                             route=call_info.get('route'), model=call_info.get('model'),
+                             tier=call_info.get('tier'), usage=call_info.get('usage'),
+                             fingerprint=call_info.get('fingerprint'))
         
         if response_text:
             return jsonify({
                 'response': response_text,
                 'language': language,
-                'model_used': model,
+                'model_used': call_info.get('model'),
+                'route': call_info.get('route'),
+                'session_id': session_id,
                 'timestamp': datetime.now().isoformat(),
                 'status': 'success'
             })
@@ -298,8 +589,7 @@ def chat():
             }), 500
         
     except Exception as e:
-        logger.error(f"Chat endpoint error: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception("Chat endpoint error: %s", e)
         
         return jsonify({
             'error': f'Server error: {str(e)}',
@@ -307,6 +597,144 @@ def chat():
             'status': 'error'
         }), 500
 
+@app.route('/api/tts/synthesize', methods=['GET', 'POST'])
+def tts_synthesize():
+    """Spoken text in the codec and bitrate negotiated from Accept, quality, Save-Data and ECT"""
+    limited = rate_limited_response()
+    if limited:
+        return limited
+    data = request.get_json(silent=True) or request.args
+    text = data.get('text')
+    if not text or not isinstance(text, str):
+        return jsonify({'error': 'No text found in request'}), 400
+    if len(text) > TTS_MAX_TEXT_CHARS:
+        return jsonify({'error': f'Text too long (max {TTS_MAX_TEXT_CHARS} characters)'}), 413
+    
+    language = data.get('language', 'english')
+    language = TTS_LANGUAGES.get(language, language)
+    g.interaction = {'language': CHAT_LANGUAGES.get(language, language)}
+    variants = negotiate(request.headers, data.get('quality'))
+    
+    try:
+        result = get_voice_delivery().deliver(text, language, variants, data.get('voice_style', 'friendly'))
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 406
+    if result is None:
+        return jsonify({'error': 'Speech synthesis failed'}), 503
+    
+    chunks, variant, duration = result
+    response = app.response_class(chunks, content_type=variant.content_type)
+    response.headers['Vary'] = 'Accept, Save-Data, ECT'
+    response.headers['X-Audio-Variant'] = variant.key
+    if duration:
+        response.headers['X-Audio-Duration'] = f"{duration:.3f}"
+    return response
+
+@app.route('/api/voice/jobs', methods=['POST'])
+def submit_voice_job():
+    """Queue an uploaded recording; returns a job id to poll for the transcript, answer and audio"""
+    limited = rate_limited_response()
+    if limited:
+        return limited
+    upload = request.files.get('audio')
+    data = upload.read(VOICE_JOB_MAX_UPLOAD_BYTES + 1) if upload else request.get_data()
+    if not data:
+        return jsonify({'error': 'No audio found in request'}), 400
+    if len(data) > VOICE_JOB_MAX_UPLOAD_BYTES:
+        return jsonify({'error': 'Audio upload too large'}), 413
+    
+    language = request.values.get('language')
+    job_id = get_voice_jobs().store.submit(data, TTS_LANGUAGES.get(language, language),
+                                           request.values.get('session_id'))
+    return jsonify({
+        'job_id': job_id,
+        'status': 'queued',
+        'poll_url': f"/api/voice/jobs/{job_id}",
+        'timestamp': datetime.now().isoformat()
+    }), 202
+
+@app.route('/api/voice/jobs/<job_id>', methods=['GET'])
+def get_voice_job(job_id):
+    """Job state; with ?after=<version> waits (up to ?wait= seconds) for the next change"""
+    store = get_voice_jobs().store
+    after = request.args.get('after', type=int)
+    if after is None:
+        job = store.get(job_id)
+    else:
+        job = store.wait(job_id, after, request.args.get('wait', type=float, default=20.0))
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job['audio_type']:
+        job['audio_url'] = f"/api/voice/jobs/{job_id}/audio"
+    return jsonify(job)
+
+@app.route('/api/voice/jobs/<job_id>/audio', methods=['GET'])
+def get_voice_job_audio(job_id):
+    """Spoken answer of a finished job"""
+    audio = get_voice_jobs().store.audio(job_id)
+    if audio is None:
+        return jsonify({'error': 'Audio not ready'}), 404
+    data, content_type = audio
+    return app.response_class(data, content_type=content_type)
+
+@app.route('/api/voice/streams', methods=['POST'])
+def open_voice_stream():
+    """Start a streamed utterance; audio then goes to audio_url as 16-bit mono PCM chunks"""
+    limited = rate_limited_response()
+    if limited:
+        return limited
+    data = request.get_json(silent=True) or request.values
+    language = data.get('language')
+    try:
+        sample_rate = int(data.get('sample_rate', STREAM_SAMPLE_RATE))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid sample_rate'}), 400
+    if not 8000 <= sample_rate <= 48000:
+        return jsonify({'error': 'sample_rate must be between 8000 and 48000'}), 400
+    
+    try:
+        session = get_voice_streams().open(TTS_LANGUAGES.get(language, language), data.get('session_id'),
+                                           sample_rate)
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 503
+    return jsonify({
+        'stream_id': session.id,
+        'audio_url': f"/api/voice/streams/{session.id}/audio",
+        'poll_url': f"/api/voice/streams/{session.id}",
+        'format': 's16le',
+        'sample_rate': sample_rate
+    }), 201
+
+@app.route('/api/voice/streams/<stream_id>/audio', methods=['POST'])
+def stream_voice_audio(stream_id):
+    """Append PCM to a stream (one chunk per request, or one long chunked body); ?end=1 closes it"""
+    streams = get_voice_streams()
+    session = streams.get(stream_id)
+    if session is None:
+        return jsonify({'error': 'Stream not found'}), 404
+    
+    # Fed as it arrives, so a chunked body is recognized while it is still being sent
+    while True:
+        chunk = request.stream.read(STREAM_READ_BYTES)
+        if not chunk:
+            break
+        streams.feed(session, chunk)
+    if request.args.get('end') in ('1', 'true'):
+        streams.feed(session, b'', end=True)
+    return jsonify(session.snapshot())
+
+@app.route('/api/voice/streams/<stream_id>', methods=['GET'])
+def get_voice_stream(stream_id):
+    """Interim and final transcripts; with ?after=<version> waits (up to ?wait= seconds) for the next one"""
+    session = get_voice_streams().get(stream_id)
+    if session is None:
+        return jsonify({'error': 'Stream not found'}), 404
+    after = request.args.get('after', type=int)
+    if after is None:
+        return jsonify(session.snapshot())
+    wait = min(request.args.get('wait', type=float, default=20.0), 20.0)
+    return jsonify(session.wait(after, wait))
+
 @app.route('/voice', methods=['POST'])
 def voice_chat():
     """Voice endpoint (currently same as text chat)"""
@@ -0,0 +1,538 @@
+# mock_servers.py
+# Local stand-ins for OpenRouter, WordPress, ElevenLabs and Azure TTS, for load tests and profiling.
+#
+# Usage:
+#   python mock_servers.py                                  # all services on ports 8101-8104
+#   python mock_servers.py --latency openrouter=lognormal:800,0.4 --error-rate 0.02 --max-rps 50
+#   python mock_servers.py --config mock_config.json --seed 7
+#
+# On start it prints the environment variables that point the app at the mocks.
+# Latency specs: "50" or "fixed:50" (ms), "uniform:20,80", "normal:100,20",
+# "lognormal:200,0.5" (median ms, sigma). Standard library only.
+
+import io
+import re
+import sys
+import json
+import math
+import time
+import wave
+import base64
+import random
+import struct
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from typing import Dict, Optional
+
+SERVICES = ('openrouter', 'wordpress', 'elevenlabs', 'azure')
+DEFAULT_PORTS = {'openrouter': 8101, 'wordpress': 8102, 'elevenlabs': 8103, 'azure': 8104}
+
+CANNED_ANSWERS = {
+    'maize': "For maize in Nigeria, plant at the start of the rains using SAMMAZ-15 or SAMMAZ-16. "
+             "Space rows 75cm apart and plants 25cm apart, apply NPK 20:10:10 at planting and "
+             "top-dress with urea after four to six weeks.",
+    'rice': "Use FARO-44 or FARO-52 in lowland fadama fields, keep 2-5cm of water, and harvest "
+            "90-120 days after planting when the grains turn golden.",
+    'cassava': "Plant 20cm stem cuttings of TMS-30572 or TME-419 at 1m x 1m early in the rains; "
+               "harvest after 12-18 months.",
+    'default': "Thank you for your farming question. Plant improved varieties at the start of the "
+               "rainy season, keep weeds down for the first six weeks and scout weekly for pests.",
+}
+
+SEED_PRODUCTS = [
+    ('Fresh Yellow Maize', 'grains', 25000, 'Kaduna'),
+    ('Ofada Rice 50kg', 'grains', 68000, 'Ogun'),
+    ('Cassava Tubers', 'roots', 15000, 'Benue'),
+    ('Yam Tubers (100)', 'roots', 90000, 'Benue'),
+    ('Roma Tomatoes Basket', 'vegetables', 12000, 'Kano'),
+    ('Dried Pepper Bag', 'vegetables', 30000, 'Kano'),
+    ('Plantain Bunch', 'fruits', 4500, 'Ondo'),
+    ('Live Goats', 'livestock', 55000, 'Sokoto'),
+    ('Knapsack Sprayer', 'equipment', 18000, 'Lagos'),
+]
+
+
+class LatencyDistribution:
+    """Samples a delay in seconds from a spec string"""
+
+    def __init__(self, spec: str = '0', rng: Optional[random.Random] = None):
+        self.spec = str(spec)
+        self.rng = rng or random.Random()
+        kind, _, args = self.spec.partition(':')
+        if not args:
+            kind, args = 'fixed', kind
+        self.kind = kind.strip().lower()
+        self.args = [float(a) for a in args.split(',') if a.strip()]
+        if self.kind not in ('fixed', 'uniform', 'normal', 'lognormal'):
+            raise ValueError(f"Unknown latency distribution: {self.spec}")
+
+    def sample(self) -> float:
+        if self.kind == 'fixed':
+            ms = self.args[0] if self.args else 0
+        elif self.kind == 'uniform':
+            ms = self.rng.uniform(self.args[0], self.args[1])
+        elif self.kind == 'normal':
+            ms = self.rng.gauss(self.args[0], self.args[1])
+        else:
+            ms = self.args[0] * math.exp(self.rng.gauss(0, self.args[1] if len(self.args) > 1 else 0.5))
+        return max(0.0, ms) / 1000.0
+
+
+class ServiceConfig:
+    """Latency, error and throughput behaviour of one mock service"""
+
+    def __init__(self, name: str, latency: str = '0', error_rate: float = 0.0,
+                 error_codes=(500, 503), max_rps: float = 0, token_latency: str = '0',
+                 seed: Optional[int] = None, max_concurrency: int = 0):
+        self.name = name
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.latency = LatencyDistribution(latency, self.rng)
+        self.token_latency = LatencyDistribution(token_latency, self.rng)
+        self.error_rate = error_rate
+        self.error_codes = tuple(error_codes)
+        self.max_rps = max_rps
+        self.tokens = max_rps
+        self.refilled_at = time.monotonic()
+        self.bucket_lock = threading.Lock()
+        # Requests worked on at once; the rest wait in line like at a saturated provider
+        self.slots = threading.Semaphore(max_concurrency) if max_concurrency else None
+        self.stats = {'requests': 0, 'errors_injected': 0, 'throttled': 0}
+
+    def count(self, key: str):
+        with self.bucket_lock:
+            self.stats[key] += 1
+
+    def delay(self) -> float:
+        with self.rng_lock:
+            return self.latency.sample()
+
+    def token_delay(self) -> float:
+        with self.rng_lock:
+            return self.token_latency.sample()
+
+    def injected_error(self) -> Optional[int]:
+        with self.rng_lock:
+            if self.error_rate and self.rng.random() < self.error_rate:
+                return self.rng.choice(self.error_codes)
+        return None
+
+    def admit(self) -> bool:
+        """Token bucket throughput cap; False means the request should get a 429"""
+        if not self.max_rps:
+            return True
+        with self.bucket_lock:
+            now = time.monotonic()
+            self.tokens = min(self.max_rps, self.tokens + (now - self.refilled_at) * self.max_rps)
+            self.refilled_at = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+# --- synthetic audio -------------------------------------------------------
+
+_audio_cache = {}
+
+
+def synthetic_pcm(seconds: float, sample_rate: int = 16000) -> bytes:
+    """16-bit mono tone of the given length (built from a cached one-second block)"""
+    key = sample_rate
+    if key not in _audio_cache:
+        frames = [int(0.25 * 32767 * math.sin(2 * math.pi * 220 * n / sample_rate)) for n in range(sample_rate)]
+        _audio_cache[key] = struct.pack(f'<{len(frames)}h', *frames)
+    block = _audio_cache[key]
+    total = int(seconds * sample_rate) * 2
+    return (block * (total // len(block) + 1))[:total]
+
+
+def synthetic_wav(seconds: float, sample_rate: int = 16000) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(synthetic_pcm(seconds, sample_rate))
+    return buffer.getvalue()
+
+
+def synthetic_mp3(seconds: float) -> bytes:
+    """MP3-shaped payload (frame headers + padding) sized like 32kbps speech; not decodable audio"""
+    frame = b'\xff\xf3\x44\xc4' + b'\x00' * 140
+    return frame * max(1, int(seconds * 27.8))
+
+
+def speech_seconds(text: str) -> float:
+    # Roughly 15 characters per second of speech
+    return max(0.5, len(text) / 15.0)
+
+
+# --- request handling ------------------------------------------------------
+
+class MockHandler(BaseHTTPRequestHandler):
+    """Shared plumbing: latency, injected errors, throughput caps and JSON replies"""
+
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; without this, keep-alive
+    # clients stall ~40ms per request on delayed ACKs
+    disable_nagle_algorithm = True
+    config: ServiceConfig = None
+
+    def log_message(self, *args):
+        pass
+
+    def _body(self) -> bytes:
+        length = int(self.headers.get('Content-Length', 0))
+        return self.rfile.read(length) if length else b''
+
+    def _reply(self, status: int, body, content_type: str = 'application/json', headers: Dict = None):
+        data = body if isinstance(body, bytes) else json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _gate(self) -> bool:
+        """Apply throughput cap, latency and error injection; False if the request was answered"""
+        self.config.count('requests')
+        if not self.config.admit():
+            self.config.count('throttled')
+            self._reply(429, {'error': 'rate limited'}, headers={'Retry-After': '1'})
+            return False
+        if self.config.slots:
+            with self.config.slots:
+                time.sleep(self.config.delay())
+        else:
+            time.sleep(self.config.delay())
+        status = self.config.injected_error()
+        if status:
+            self.config.count('errors_injected')
+            self._reply(status, {'error': 'injected failure'})
+            return False
+        return True
+
+    def _route(self, method: str):
+        body = self._body() if method == 'POST' else b''
+        parsed = urlparse(self.path)
+        if parsed.path == '/__stats':
+            self._reply(200, self.config.stats)
+            return
+        if not self._gate():
+            return
+        handler = getattr(self, f"handle_{method.lower()}", None)
+        if handler is None or handler(parsed.path, parse_qs(parsed.query), body) is False:
+            self._reply(404, {'error': 'not found'})
+
+    def do_GET(self):
+        self._route('GET')
+
+    def do_POST(self):
+        self._route('POST')
+
+
+class OpenRouterHandler(MockHandler):
+    """OpenAI-compatible chat completions (with SSE streaming) and model list"""
+
+    def handle_get(self, path, query, body):
+        if not path.endswith('/models'):
+            return False
+        etag = '"models-v1"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        models = [{'id': m, 'name': m} for m in ('openai/gpt-4o-mini', 'openai/gpt-4o',
+                                                 'meta-llama/llama-3.1-8b-instruct')]
+        self._reply(200, {'data': models}, headers={'ETag': etag, 'Cache-Control': 'max-age=60'})
+
+    def handle_post(self, path, query, body):
+        if not path.endswith('/chat/completions'):
+            return False
+        request = json.loads(body or b'{}')
+        messages = request.get('messages', [])
+        question = (messages[-1].get('content', '') if messages else '').lower()
+        answer = next((text for key, text in CANNED_ANSWERS.items() if key in question),
+                      CANNED_ANSWERS['default'])
+        prompt_tokens = sum(len(m.get('content', '')) for m in messages) // 4 + 1
+        usage = {'prompt_tokens': prompt_tokens, 'completion_tokens': len(answer) // 4 + 1,
+                 'total_tokens': prompt_tokens + len(answer) // 4 + 1}
+        model = request.get('model', 'openai/gpt-4o-mini')
+        completion_id = f"mock-{int(time.time() * 1000)}"
+
+        if not request.get('stream'):
+            self._reply(200, {
+                'id': completion_id, 'object': 'chat.completion', 'model': model,
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': answer},
+                             'finish_reason': 'stop'}],
+                'usage': usage
+            })
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        for word in re.findall(r'\S+\s*', answer):
+            chunk = {'id': completion_id, 'object': 'chat.completion.chunk', 'model': model,
+                     'choices': [{'index': 0, 'delta': {'content': word}, 'finish_reason': None}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+            time.sleep(self.config.token_delay())
+        final = {'id': completion_id, 'object': 'chat.completion.chunk', 'model': model,
+                 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}], 'usage': usage}
+        self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode('utf-8'))
+        self.wfile.flush()
+
+
+class WordPressHandler(MockHandler):
+    """Subset of the WP REST API: posts, categories, users and JWT auth"""
+
+    posts = None
+    posts_lock = threading.Lock()
+
+    def _posts(self):
+        cls = type(self)
+        with cls.posts_lock:
+            if cls.posts is None:
+                cls.posts = [
+                    {'id': i + 1, 'title': {'rendered': title},
+                     'content': {'rendered': f"Price: ₦{price:,}. Location: {location}."},
+                     'excerpt': {'rendered': f"{title} from {location}, ₦{price:,}. Contact seller for delivery."},
+                     'link': f"https://farmdepot.ng/?p={i + 1}", 'category': category}
+                    for i, (title, category, price, location) in enumerate(SEED_PRODUCTS)
+                ]
+            return cls.posts
+
+    def handle_get(self, path, query, body):
+        if path.endswith('/wp/v2/posts'):
+            search = query.get('search', [''])[0].lower()
+            per_page = int(query.get('per_page', ['10'])[0])
+            posts = self._posts()
+            matches = [p for p in posts if not search or search in p['title']['rendered'].lower()
+                       or search in p['excerpt']['rendered'].lower()][:per_page]
+            etag = f'"posts-{len(posts)}-{abs(hash(search)) % 10 ** 8}"'
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self._reply(200, matches, headers={'ETag': etag, 'X-WP-Total': str(len(matches))})
+        elif path.endswith('/wp/v2/categories'):
+            names = sorted({p['category'] for p in self._posts()})
+            self._reply(200, [{'id': i + 10, 'slug': name, 'name': name} for i, name in enumerate(names)])
+        else:
+            return False
+
+    def handle_post(self, path, query, body):
+        if path.endswith('/wp/v2/posts'):
+            payload = json.loads(body or b'{}')
+            posts = self._posts()
+            with type(self).posts_lock:
+                post_id = len(posts) + 1
+                posts.append({'id': post_id, 'title': {'rendered': payload.get('title', '')},
+                              'content': {'rendered': payload.get('content', '')},
+                              'excerpt': {'rendered': payload.get('content', '')[:120]},
+                              'link': f"https://farmdepot.ng/?p={post_id}", 'category': ''})
+            self._reply(201, {'id': post_id, 'status': payload.get('status', 'publish')})
+        elif path.endswith('/wp/v2/users'):
+            payload = json.loads(body or b'{}')
+            self._reply(201, {'id': abs(hash(payload.get('username', ''))) % 10 ** 6,
+                              'username': payload.get('username', '')})
+        elif path.endswith('/jwt-auth/v1/token'):
+            payload = json.loads(body or b'{}')
+            if not payload.get('password'):
+                self._reply(403, {'code': '[jwt_auth] incorrect_password'})
+                return
+            claims = base64.urlsafe_b64encode(json.dumps(
+                {'exp': int(time.time()) + 3600, 'user': payload.get('username')}).encode()).decode().rstrip('=')
+            self._reply(200, {'token': f"eyJhbGciOiJIUzI1NiJ9.{claims}.mock-signature",
+                              'user_nicename': payload.get('username')})
+        else:
+            return False
+
+
+class ElevenLabsHandler(MockHandler):
+    """ElevenLabs-like text-to-speech (MP3, or raw PCM via output_format=pcm_*)"""
+
+    def handle_get(self, path, query, body):
+        if not path.endswith('/models'):
+            return False
+        self._reply(200, [{'model_id': 'eleven_multilingual_v2', 'name': 'Eleven Multilingual v2'}])
+
+    def handle_post(self, path, query, body):
+        if '/text-to-speech/' not in path:
+            return False
+        text = json.loads(body or b'{}').get('text', '')
+        output_format = query.get('output_format', ['mp3_44100_128'])[0]
+        if output_format.startswith('pcm_'):
+            rate = int(output_format.split('_')[1])
+            self._reply(200, synthetic_pcm(speech_seconds(text), rate), content_type='audio/pcm')
+        else:
+            self._reply(200, synthetic_mp3(speech_seconds(text)), content_type='audio/mpeg')
+
+
+class AzureTTSHandler(MockHandler):
+    """Azure Speech REST-like endpoint: SSML in, audio out per X-Microsoft-OutputFormat"""
+
+    def handle_get(self, path, query, body):
+        if not path.endswith('/cognitiveservices/voices/list'):
+            return False
+        self._reply(200, [{'ShortName': name, 'Locale': name[:5]} for name in
+                          ('en-NG-EzinneNeural', 'en-NG-AbeoNeural')])
+
+    def handle_post(self, path, query, body):
+        if path.endswith('/sts/v1.0/issueToken'):
+            self._reply(200, b'mock-azure-token', content_type='text/plain')
+            return
+        if not path.endswith('/cognitiveservices/v1'):
+            return False
+        text = re.sub(r'<[^>]+>', ' ', body.decode('utf-8', errors='replace'))
+        seconds = speech_seconds(' '.join(text.split()))
+        output_format = self.headers.get('X-Microsoft-OutputFormat', 'riff-24khz-16bit-mono-pcm')
+        if output_format.startswith('riff-'):
+            rate = int(re.search(r'(\d+)khz', output_format).group(1)) * 1000
+            self._reply(200, synthetic_wav(seconds, rate), content_type='audio/wav')
+        elif output_format.startswith('raw-'):
+            rate = int(re.search(r'(\d+)khz', output_format).group(1)) * 1000
+            self._reply(200, synthetic_pcm(seconds, rate), content_type='audio/pcm')
+        else:
+            self._reply(200, synthetic_mp3(seconds), content_type='audio/mpeg')
+
+
+HANDLERS = {
+    'openrouter': OpenRouterHandler,
+    'wordpress': WordPressHandler,
+    'elevenlabs': ElevenLabsHandler,
+    'azure': AzureTTSHandler,
+}
+
+
+class MockServices:
+    """Run a set of mock services in background threads"""
+
+    def __init__(self, configs: Dict[str, ServiceConfig], host: str = '127.0.0.1',
+                 ports: Optional[Dict[str, int]] = None):
+        self.configs = configs
+        self.host = host
+        self.ports = ports or {}
+        self.servers = {}
+
+    def start(self) -> 'MockServices':
+        for name, config in self.configs.items():
+            handler = type(f"{HANDLERS[name].__name__}Configured", (HANDLERS[name],),
+                           {'config': config, 'posts': None})
+            server = ThreadingHTTPServer((self.host, self.ports.get(name, 0)), handler)
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self.servers[name] = server
+        return self
+
+    def stop(self):
+        for server in self.servers.values():
+            server.shutdown()
+            server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def url(self, name: str) -> str:
+        return f"http://{self.host}:{self.servers[name].server_address[1]}"
+
+    def environment(self) -> Dict[str, str]:
+        """Environment variables that point the app at the running mocks"""
+        env = {}
+        if 'openrouter' in self.servers:
+            env.update(OPENROUTER_API_KEY='mock-key', OPENROUTER_API_BASE=f"{self.url('openrouter')}/api/v1")
+        if 'wordpress' in self.servers:
+            env.update(WORDPRESS_URL=self.url('wordpress'), WORDPRESS_JWT_TOKEN='mock-token')
+        if 'elevenlabs' in self.servers:
+            env.update(
+                ELEVENLABS_API_KEY='mock-key',
+                ELEVENLABS_BASE_URL=f"{self.url('elevenlabs')}/v1",
+                ELEVENLABS_ENGLISH_NG_FEMALE_ID='mock-en',
+                ELEVENLABS_HAUSA_FEMALE_ID='mock-ha',
+                ELEVENLABS_IGBO_FEMALE_ID='mock-ig',
+                ELEVENLABS_YORUBA_FEMALE_ID='mock-yo',
+            )
+        if 'azure' in self.servers:
+            env.update(AZURE_SPEECH_KEY='mock-key', AZURE_SPEECH_ENDPOINT=self.url('azure'))
+        return env
+
+
+def build_configs(services, latency=None, error_rate=0.0, max_rps=0, token_latency='0',
+                  seed=None, overrides: Optional[Dict] = None) -> Dict[str, ServiceConfig]:
+    """ServiceConfig per service; 'overrides' maps service name to keyword arguments"""
+    latency = latency or {}
+    configs = {}
+    for index, name in enumerate(services):
+        kwargs = {
+            'latency': latency.get(name, latency.get('*', '0')),
+            'error_rate': error_rate,
+            'max_rps': max_rps,
+            'token_latency': token_latency,
+            'seed': None if seed is None else seed + index,
+        }
+        kwargs.update((overrides or {}).get(name, {}))
+        configs[name] = ServiceConfig(name, **kwargs)
+    return configs
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-ins for OpenRouter, WordPress, ElevenLabs and Azure TTS')
+    parser.add_argument('--services', default=','.join(SERVICES))
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--base-port', type=int, default=8100,
+                        help='openrouter, wordpress, elevenlabs, azure listen on base+1..base+4 (0 = ephemeral)')
+    parser.add_argument('--latency', action='append', default=[],
+                        help='service=spec, or just spec for all services (repeatable)')
+    parser.add_argument('--token-latency', default='0', help='delay between streamed chunks')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--max-rps', type=float, default=0)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--config', help='JSON file: {"openrouter": {"latency": "lognormal:800,0.4", ...}}')
+    args = parser.parse_args()
+
+    latency = {}
+    for item in args.latency:
+        name, _, spec = item.rpartition('=')
+        latency[name or '*'] = spec
+
+    overrides = {}
+    if args.config:
+        with open(args.config, encoding='utf-8') as f:
+            overrides = json.load(f)
+
+    services = [s.strip() for s in args.services.split(',') if s.strip()]
+    configs = build_configs(services, latency, args.error_rate, args.max_rps,
+                            args.token_latency, args.seed, overrides)
+    ports = {name: (args.base_port + SERVICES.index(name) + 1 if args.base_port else 0) for name in services}
+
+    mocks = MockServices(configs, args.host, ports).start()
+    print("Mock services running. Point the app at them with:")
+    for key, value in mocks.environment().items():
+        print(f"export {key}={value}")
+    sys.stdout.flush()
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        mocks.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,372 @@
+# model_host.py
+# A sidecar process that owns the heavy local models (Whisper and the native TTS
+# models) so gunicorn workers don't each load their own copy.
+#
+#   MODEL_HOST_SOCKET=/tmp/farmdepot_models.sock python model_host.py serve
+#
+# Workers talk to it over a Unix socket. Messages are small length-prefixed JSON
+# headers; audio never goes through the socket. Samples to transcribe are written
+# into a shared-memory arena owned by the worker's connection, and Whisper reads
+# them in place. Synthesized audio is written once into a new shared-memory segment
+# that the worker maps and unlinks, and the AudioBuffer it returns views that
+# mapping directly.
+#
+# With MODEL_HOST_SOCKET unset, everything runs in-process as before.
+# gunicorn.conf.py starts the host next to the workers when the variable is set.
+
+import os
+import sys
+import json
+import atexit
+import time
+import socket
+import struct
+import argparse
+import threading
+import socketserver
+from multiprocessing import shared_memory, resource_tracker
+from typing import Callable, Dict, Optional
+
+from lazy_imports import lazy_import
+
+np = lazy_import('numpy')
+
+# Unix socket the host listens on; unset keeps models in each process
+MODEL_HOST_SOCKET = os.getenv('MODEL_HOST_SOCKET', '')
+# Models the host loads at start-up (whisper, native_tts)
+MODEL_HOST_MODELS = os.getenv('MODEL_HOST_MODELS', 'whisper,native_tts')
+# Inference calls run at once; Whisper on CPU gains nothing from more
+MODEL_HOST_CONCURRENCY = int(os.getenv('MODEL_HOST_CONCURRENCY', 1))
+MODEL_HOST_TIMEOUT = float(os.getenv('MODEL_HOST_TIMEOUT', 120))
+# Initial shared-memory arena per worker connection (grown on demand); 4MB is ~60s of float32 16 kHz audio
+MODEL_HOST_ARENA_BYTES = int(os.getenv('MODEL_HOST_ARENA_BYTES', 4 * 1024 * 1024))
+
+HEADER = struct.Struct('>I')
+
+# True inside the host process, so engines there run their models instead of calling the host
+IN_HOST = False
+
+
+class ModelHostError(RuntimeError):
+    """The model host could not be reached or failed the call"""
+
+
+def _send(sock: socket.socket, message: Dict):
+    body = json.dumps(message).encode('utf-8')
+    sock.sendall(HEADER.pack(len(body)) + body)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError('model host connection closed')
+        data += chunk
+    return bytes(data)
+
+
+def _recv(sock: socket.socket) -> Dict:
+    (length,) = HEADER.unpack(_recv_exact(sock, HEADER.size))
+    return json.loads(_recv_exact(sock, length))
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Map a segment another process owns without this process's resource tracker claiming it"""
+    segment = shared_memory.SharedMemory(name=name)
+    resource_tracker.unregister(segment._name, 'shared_memory')
+    return segment
+
+
+def _detach(segment: shared_memory.SharedMemory, nbytes: int) -> memoryview:
+    """View of a segment's first nbytes that keeps the mapping alive after the SharedMemory object is gone"""
+    mapping = segment._mmap
+    segment._buf.release()
+    segment._buf, segment._mmap = None, None
+    segment.close()
+    return memoryview(mapping)[:nbytes]
+
+
+def _close(segment: shared_memory.SharedMemory):
+    try:
+        segment.close()
+    except BufferError:
+        pass  # A view is still alive; the mapping goes when it does
+
+
+# --- host -------------------------------------------------------------------
+
+def load_whisper_transcriber() -> Callable:
+    import whisper
+    from voice_handler import WHISPER_MODEL, WHISPER_LANGUAGES
+    model = whisper.load_model(WHISPER_MODEL)
+
+    def transcribe(samples, language: Optional[str] = None, prompt: str = '') -> str:
+        result = model.transcribe(samples, language=WHISPER_LANGUAGES.get(language), initial_prompt=prompt or None,
+                                  fp16=False, condition_on_previous_text=False)
+        return result['text'].strip()
+    return transcribe
+
+
+def load_native_synthesizer() -> Callable:
+    from advanced_tts_handler import NativeSpeechEngine
+    return NativeSpeechEngine().synthesize
+
+
+class ModelHost:
+    """Serves transcribe and synthesize calls to worker processes over a Unix socket"""
+
+    def __init__(self, path: str, transcriber: Optional[Callable] = None, synthesizer: Optional[Callable] = None,
+                 concurrency: int = MODEL_HOST_CONCURRENCY):
+        self.path = path
+        self.transcriber = transcriber
+        self.synthesizer = synthesizer
+        self.slots = threading.Semaphore(concurrency)
+        self.lock = threading.Lock()
+        self.stats = {'connections': 0, 'transcribe': 0, 'synthesize': 0, 'errors': 0}
+        self.server = None
+
+    def _count(self, key: str):
+        with self.lock:
+            self.stats[key] += 1
+
+    def handle(self, message: Dict, arenas: Dict[str, shared_memory.SharedMemory]) -> Dict:
+        op = message.get('op')
+        if op == 'ping':
+            with self.lock:
+                stats = dict(self.stats)
+            return {'pid': os.getpid(), 'transcribe': self.transcriber is not None,
+                    'synthesize': self.synthesizer is not None, 'stats': stats}
+
+        if op == 'transcribe':
+            if self.transcriber is None:
+                return {'error': 'no transcription model loaded'}
+            name = message['shm']
+            if name not in arenas:
+                # A worker replaces its arena when it outgrows it; drop the old mapping
+                for old in list(arenas):
+                    _close(arenas.pop(old))
+                arenas[name] = _attach(name)
+            samples = np.ndarray((message['samples'],), dtype=np.float32, buffer=arenas[name].buf)
+            try:
+                with self.slots:
+                    text = self.transcriber(samples, message.get('language'), message.get('prompt', ''))
+            finally:
+                del samples
+            self._count('transcribe')
+            return {'text': text}
+
+        if op == 'synthesize':
+            if self.synthesizer is None:
+                return {'audio': None}
+            with self.slots:
+                audio = self.synthesizer(message['text'], message['language'], message.get('voice_style', 'neutral'))
+            self._count('synthesize')
+            if not audio:
+                return {'audio': None}
+            data = audio.data
+            segment = shared_memory.SharedMemory(create=True, size=max(data.nbytes, 1))
+            segment.buf[:data.nbytes] = data
+            # Ownership passes to the worker, which unlinks the segment once mapped
+            resource_tracker.unregister(segment._name, 'shared_memory')
+            _close(segment)
+            return {'audio': {'shm': segment.name, 'nbytes': data.nbytes, 'codec': audio.codec,
+                              'sample_rate': audio.sample_rate, 'channels': audio.channels}}
+
+        return {'error': f"unknown op {op!r}"}
+
+    def serve_forever(self):
+        host = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                host._count('connections')
+                arenas = {}
+                try:
+                    while True:
+                        try:
+                            message = _recv(self.request)
+                        except (ConnectionError, OSError):
+                            return
+                        try:
+                            reply = host.handle(message, arenas)
+                        except Exception as e:
+                            host._count('errors')
+                            reply = {'error': str(e)}
+                        _send(self.request, reply)
+                finally:
+                    for segment in arenas.values():
+                        _close(segment)
+
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.server = socketserver.ThreadingUnixStreamServer(self.path, Handler)
+        self.server.daemon_threads = True
+        os.chmod(self.path, 0o600)
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+    def shutdown(self):
+        if self.server:
+            self.server.shutdown()
+
+
+# --- worker side -------------------------------------------------------------
+
+class ModelHostClient:
+    """Per-thread connection and shared-memory arena to the model host"""
+
+    def __init__(self, path: str, timeout: float = MODEL_HOST_TIMEOUT, arena_bytes: int = MODEL_HOST_ARENA_BYTES):
+        self.path = path
+        self.timeout = timeout
+        self.arena_bytes = arena_bytes
+        self.local = threading.local()
+        # Every thread's arena, so close() can unlink them all
+        self.arenas = set()
+        self.lock = threading.Lock()
+
+    def _connection(self) -> socket.socket:
+        sock = getattr(self.local, 'sock', None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.path)
+            except OSError as e:
+                sock.close()
+                raise ModelHostError(f"model host not reachable at {self.path}: {e}")
+            self.local.sock = sock
+        return sock
+
+    def _disconnect(self):
+        sock = getattr(self.local, 'sock', None)
+        if sock is not None:
+            sock.close()
+            self.local.sock = None
+
+    def _arena(self, nbytes: int) -> shared_memory.SharedMemory:
+        arena = getattr(self.local, 'arena', None)
+        if arena is None or arena.size < nbytes:
+            if arena is not None:
+                self._release(arena)
+            arena = shared_memory.SharedMemory(create=True, size=max(nbytes, self.arena_bytes))
+            with self.lock:
+                self.arenas.add(arena)
+            self.local.arena = arena
+        return arena
+
+    def _release(self, arena: shared_memory.SharedMemory):
+        with self.lock:
+            self.arenas.discard(arena)
+        _close(arena)
+        arena.unlink()
+
+    def close(self):
+        """Unlink the shared-memory arenas (sockets close with their threads)"""
+        self._disconnect()
+        for arena in list(self.arenas):
+            self._release(arena)
+
+    def call(self, message: Dict) -> Dict:
+        """Send one request; reconnects once if the host restarted"""
+        for attempt in (1, 2):
+            try:
+                sock = self._connection()
+                _send(sock, message)
+                reply = _recv(sock)
+                break
+            except (ConnectionError, BrokenPipeError, socket.timeout) as e:
+                self._disconnect()
+                if attempt == 2 or isinstance(e, socket.timeout):
+                    raise ModelHostError(f"model host call failed: {e}")
+        if 'error' in reply:
+            raise ModelHostError(reply['error'])
+        return reply
+
+    def ping(self) -> Dict:
+        return self.call({'op': 'ping'})
+
+    def transcribe(self, samples, language: Optional[str] = None, prompt: str = '') -> str:
+        """Whisper on float32 16 kHz samples, passed through shared memory"""
+        samples = np.asarray(samples, dtype=np.float32)
+        arena = self._arena(samples.nbytes)
+        view = np.ndarray(samples.shape, dtype=np.float32, buffer=arena.buf)
+        view[:] = samples
+        del view
+        return self.call({'op': 'transcribe', 'shm': arena.name, 'samples': len(samples),
+                          'language': language, 'prompt': prompt})['text']
+
+    def synthesize(self, text: str, language: str, voice_style: str = 'neutral'):
+        """AudioBuffer viewing the host's output in shared memory, or None"""
+        from audio_buffer import AudioBuffer
+        audio = self.call({'op': 'synthesize', 'text': text, 'language': language,
+                           'voice_style': voice_style})['audio']
+        if audio is None:
+            return None
+        segment = shared_memory.SharedMemory(name=audio['shm'])
+        # The name goes now; the memory is freed when the last view of the mapping is
+        segment.unlink()
+        data = _detach(segment, audio['nbytes'])
+        if audio['codec'] == 'pcm':
+            return AudioBuffer(data, 'pcm', audio['sample_rate'], audio['channels'])
+        return AudioBuffer(data, audio['codec'])
+
+
+_default_client = None
+_default_lock = threading.Lock()
+
+
+def default_client() -> Optional[ModelHostClient]:
+    """Client for MODEL_HOST_SOCKET, or None when models run in this process"""
+    global _default_client
+    if not MODEL_HOST_SOCKET or IN_HOST:
+        return None
+    if _default_client is None:
+        with _default_lock:
+            if _default_client is None:
+                _default_client = ModelHostClient(MODEL_HOST_SOCKET)
+                atexit.register(_default_client.close)
+    return _default_client
+
+
+def serve(path: str, models: str = MODEL_HOST_MODELS) -> ModelHost:
+    """Load the named models and build the host (call serve_forever() to run it)"""
+    global IN_HOST
+    IN_HOST = True
+    names = {name.strip() for name in models.split(',') if name.strip()}
+    transcriber = load_whisper_transcriber() if 'whisper' in names else None
+    synthesizer = load_native_synthesizer() if 'native_tts' in names else None
+    return ModelHost(path, transcriber, synthesizer)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve Whisper and local TTS models to app workers')
+    parser.add_argument('command', choices=['serve', 'ping'])
+    parser.add_argument('--socket', default=MODEL_HOST_SOCKET or '/tmp/farmdepot_models.sock')
+    parser.add_argument('--models', default=MODEL_HOST_MODELS)
+    args = parser.parse_args()
+
+    if args.command == 'ping':
+        print(json.dumps(ModelHostClient(args.socket).ping()))
+        return
+
+    start = time.perf_counter()
+    host = serve(args.socket, args.models)
+    print(f"Model host ready on {args.socket} in {time.perf_counter() - start:.1f}s "
+          f"(transcribe: {host.transcriber is not None}, synthesize: {host.synthesizer is not None})")
+    sys.stdout.flush()
+    try:
+        host.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    # Engines import model_host by name; without this they would get a second copy
+    # of the module whose IN_HOST is still False and call back into this very host
+    sys.modules.setdefault('model_host', sys.modules[__name__])
+    main()
@@ -0,0 +1,154 @@
+# model_router.py
+# Pick an OpenRouter model per query from cheap features, and record how each choice performed
+
+import os
+import re
+import json
+import time
+import threading
+from typing import Optional, Dict, Any
+
+from multilingual_handler import MultilingualHandler
+import telemetry
+
+# Model tiers (any OpenRouter model id)
+MODEL_TIER_FAST = os.getenv('MODEL_TIER_FAST', 'openai/gpt-4o-mini')
+MODEL_TIER_STRONG = os.getenv('MODEL_TIER_STRONG', 'openai/gpt-4o')
+# Models clients may request explicitly; empty means only the two tier models
+ROUTER_ALLOWED_MODELS = [m.strip() for m in os.getenv('ROUTER_ALLOWED_MODELS', '').split(',') if m.strip()]
+# Score at or above which the strong tier is used
+ROUTER_STRONG_THRESHOLD = int(os.getenv('ROUTER_STRONG_THRESHOLD', 2))
+# JSONL file of routing decisions and outcomes for offline tuning
+ROUTING_LOG_PATH = os.getenv('ROUTING_LOG_PATH')
+
+_QUESTION_WORDS = re.compile(r'\b(how|what|when|which|why|where|should|can)\b', re.IGNORECASE)
+
+
+class RoutingDecision:
+    """Chosen model plus the features that led to it"""
+
+    def __init__(self, model: str, tier: str, reason: str, features: Dict[str, Any]):
+        self.model = model
+        self.tier = tier
+        self.reason = reason
+        self.features = features
+        self.created_at = time.time()
+
+
+class ModelRouter:
+    """Route queries to a fast or strong model tier"""
+
+    def __init__(self, fast_model: str = MODEL_TIER_FAST, strong_model: str = MODEL_TIER_STRONG,
+                 allowed_models=None, strong_threshold: int = ROUTER_STRONG_THRESHOLD,
+                 log_path: Optional[str] = ROUTING_LOG_PATH):
+        self.fast_model = fast_model
+        self.strong_model = strong_model
+        if allowed_models is None:
+            allowed_models = ROUTER_ALLOWED_MODELS or [fast_model, strong_model]
+        self.allowed_models = set(allowed_models)
+        self.strong_threshold = strong_threshold
+        self.log_path = log_path
+        self.multilingual = MultilingualHandler()
+        self.lock = threading.Lock()
+        self.model_stats = {}
+
+    def extract_features(self, message: str, language: Optional[str] = None,
+                         miss_count: int = 0) -> Dict[str, Any]:
+        words = message.split()
+        with telemetry.span('language_detection'):
+            detected_language = self.multilingual.detect_language(message)
+        with telemetry.span('intent_extraction'):
+            intent = self.multilingual.extract_intent(message, detected_language)
+        # The client's language choice wins; detection fills in when none was sent
+        local_language = (language not in ('en', 'english') if language
+                          else detected_language != 'english')
+        return {
+            'words': len(words),
+            'questions': max(message.count('?'), len(_QUESTION_WORDS.findall(message))),
+            'language': language,
+            'detected_language': detected_language,
+            'local_language': local_language,
+            'intent': intent['type'],
+            'intent_confidence': intent['confidence'],
+            'cache_misses': miss_count,
+        }
+
+    def score(self, features: Dict[str, Any]) -> int:
+        """Higher means the query needs a stronger model"""
+        score = 0
+        if features['words'] > 40:
+            score += 2
+        elif features['words'] > 15:
+            score += 1
+        if features['questions'] > 1:
+            score += 1
+        if features['local_language']:
+            score += 1
+        if features['intent_confidence'] < 0.6:
+            score += 1
+        elif features['intent'] == 'search':
+            score -= 1
+        # Asked before without getting a cacheable answer: the cheap path didn't cut it
+        if features['cache_misses'] > 1:
+            score += 2
+        return score
+
+    def route(self, message: str, language: Optional[str] = None,
+              requested_model: Optional[str] = None, miss_count: int = 0) -> RoutingDecision:
+        """Honour an explicitly requested (allowed) model, otherwise choose a tier"""
+        features = self.extract_features(message, language, miss_count)
+
+        if requested_model and requested_model != 'auto':
+            if requested_model in self.allowed_models:
+                return RoutingDecision(requested_model, 'requested', 'requested by client', features)
+            # Anything off the allow-list is ignored and the query is routed as usual
+            features['ignored_model'] = requested_model
+
+        features['score'] = self.score(features)
+        if features['score'] >= self.strong_threshold:
+            return RoutingDecision(self.strong_model, 'strong', f"score {features['score']}", features)
+        return RoutingDecision(self.fast_model, 'fast', f"score {features['score']}", features)
+
+    def record(self, decision: RoutingDecision, success: bool, latency: float,
+               usage: Optional[Dict] = None, **extra):
+        """Record the outcome of a routed call for stats and the offline log"""
+        usage = usage or {}
+        with self.lock:
+            stats = self.model_stats.setdefault(decision.model, {
+                'calls': 0, 'failures': 0, 'latency_total': 0.0,
+                'prompt_tokens': 0, 'completion_tokens': 0
+            })
+            stats['calls'] += 1
+            stats['failures'] += 0 if success else 1
+            stats['latency_total'] += latency
+            stats['prompt_tokens'] += usage.get('prompt_tokens', 0) or 0
+            stats['completion_tokens'] += usage.get('completion_tokens', 0) or 0
+
+            if self.log_path:
+                record = {
+                    'timestamp': decision.created_at,
+                    'model': decision.model,
+                    'tier': decision.tier,
+                    'reason': decision.reason,
+                    'features': decision.features,
+                    'success': success,
+                    'latency_ms': round(latency * 1000, 1),
+                    'prompt_tokens': usage.get('prompt_tokens'),
+                    'completion_tokens': usage.get('completion_tokens'),
+                    **extra
+                }
+                try:
+                    with open(self.log_path, 'a', encoding='utf-8') as f:
+                        f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                except OSError as e:
+                    print(f"Routing log write error: {e}")
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            return {
+                model: {
+                    **stats,
+                    'avg_latency_ms': round(stats['latency_total'] / stats['calls'] * 1000, 1)
+                }
+                for model, stats in self.model_stats.items()
+            }
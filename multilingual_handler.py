@@ -1,9 +1,12 @@
 # multilingual_handler.py
 import re
 from typing import Dict, Tuple, Optional
-from gtts import gTTS
 import json
 import os
+import telemetry
+from lazy_imports import lazy_import
+
+gtts = lazy_import('gtts')
 
 class MultilingualHandler:
     """Handle multiple Nigerian languages for voice interactions"""
@@ -280,14 +283,16 @@ class MultilingualHandler:
     def parse_multilingual_command(self, text: str) -> Dict:
         """Parse command in any supported language"""
         # Detect language
-        detected_lang = self.detect_language(text)
+        with telemetry.span('language_detection'):
+            detected_lang = self.detect_language(text)
         self.current_language = detected_lang
         
         # Translate agricultural terms to English for processing
         translated_text = self.translate_agricultural_terms(text, detected_lang)
         
         # Parse command patterns in different languages
-        intent = self.extract_intent(text, detected_lang)
+        with telemetry.span('intent_extraction'):
+            intent = self.extract_intent(text, detected_lang)
         
         return {
             'original_text': text,
@@ -373,12 +378,12 @@ class MultilingualHandler:
         try:
             # For now, use English TTS for all languages
             # In production, you might want to use specialized TTS engines
-            tts = gTTS(text=text, lang='en', slow=False)
+            tts = gtts.gTTS(text=text, lang='en', slow=False)
             return tts
         except Exception as e:
             print(f"TTS Error: {e}")
             # Fallback TTS
-            tts = gTTS(text=text, lang='en', slow=False)
+            tts = gtts.gTTS(text=text, lang='en', slow=False)
             return tts
     
     def get_language_preference_from_request(self, user_agent: str = "", accept_language: str = "") -> str:
@@ -0,0 +1,312 @@
+# phrase_bank.py
+# Pre-rendered audio for the fixed phrases in MultilingualHandler.translations, packed into one
+# mmap-able archive so greetings, responses and categories are served without synthesis.
+#
+# Build (once per deploy, or whenever translations or voices change):
+#   python phrase_bank.py build --voices friendly --vocab-max 999
+#   python phrase_bank.py info
+#
+# Archive layout: MAGIC | u32 index length | JSON index | audio blobs.
+# Fixed phrases keep the engine's container (mp3 or wav) so they are served
+# as zero-copy slices of the map. Template segments and the number/currency
+# vocabulary are silence-trimmed 16-bit PCM with their loudness recorded, so
+# audio_splice can join them at request time (mp3 frames if ffmpeg was not
+# available to decode them at build time).
+
+import os
+import re
+import sys
+import json
+import mmap
+import time
+import struct
+import string
+import hashlib
+import argparse
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from audio_buffer import AudioBuffer, ffmpeg_available
+from audio_splice import (SpliceEngine, PRICE_PATTERN, VOCAB_MAX, vocabulary_texts,
+                          rms_dbfs, strip_id3, trim_silence)
+
+PHRASE_BANK_PATH = os.getenv('PHRASE_BANK_PATH', 'phrase_bank.fdpb')
+
+MAGIC = b'FDPB1\x00'
+INDEX_VERSION = 2
+SECTIONS = ('greetings', 'responses', 'product_categories')
+DEFAULT_VOICES = ('friendly',)
+_formatter = string.Formatter()
+
+
+def normalize_text(text: str) -> str:
+    return ' '.join(text.split())
+
+
+def phrase_id(language: str, voice: str, text: str) -> str:
+    digest = hashlib.sha1(normalize_text(text).encode('utf-8')).hexdigest()[:16]
+    return f"{language}/{voice}/{digest}"
+
+
+def template_parts(template: str) -> List[Tuple[str, Optional[str]]]:
+    """[(literal, field name or None), ...] for a str.format template"""
+    return [(literal, field) for literal, field, _, _ in _formatter.parse(template)]
+
+
+def iter_static_phrases(translations: Dict) -> Iterator[Tuple[str, str, str, str]]:
+    """(section, name, language, text) for every entry in the translation tables"""
+    for section in SECTIONS:
+        for language, entries in translations.get(section, {}).items():
+            for name, text in entries.items():
+                yield section, name, language, text
+
+
+class PhraseBank:
+    """Read-only view of a built archive; all lookups are slices of one mmap"""
+
+    def __init__(self, path: str = PHRASE_BANK_PATH):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a phrase bank archive")
+        index_length = struct.unpack_from('<I', self.map, len(MAGIC))[0]
+        index_start = len(MAGIC) + 4
+        self.index = json.loads(self.map[index_start:index_start + index_length].decode('utf-8'))
+        if self.index.get('version') != INDEX_VERSION:
+            self.close()
+            raise ValueError(f"{path} was built by an older version; rebuild it with `python phrase_bank.py build`")
+        self.data_start = index_start + index_length
+        self.view = memoryview(self.map)
+        self.entries = self.index['entries']
+        self.phrases = self.index['phrases']
+        self.patterns = self._compile_templates(self.index['templates'])
+        self.splicer = SpliceEngine(self)
+        self.stats = {'hits': 0, 'composed': 0, 'misses': 0}
+        self.lock = threading.Lock()
+
+    def _compile_templates(self, templates: Dict) -> Dict[str, List]:
+        """Per language: (regex, template id) for every template with fields"""
+        patterns = {}
+        for language, items in templates.items():
+            for template_id, template in items.items():
+                regex = ''
+                for literal, field in template_parts(template):
+                    regex += re.escape(normalize_text(literal))
+                    if field == 'price':
+                        regex += rf'\s*(?P<{field}>(?:₦\s*|Na[iị]ra\s+)?\d[\d,]*)\s*'
+                    elif field:
+                        regex += rf'\s*(?P<{field}>\d[\d,]*)\s*'
+                patterns.setdefault(language, []).append((re.compile(f'^{regex}$', re.IGNORECASE), template_id))
+        return patterns
+
+    def _count(self, key: str):
+        with self.lock:
+            self.stats[key] += 1
+
+    def get(self, key: str) -> Optional[Tuple[memoryview, Dict]]:
+        """Audio slice and metadata for an archive entry"""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        start = self.data_start + entry['offset']
+        return self.view[start:start + entry['length']], entry
+
+    def render(self, text: str, language: str, voice: str = DEFAULT_VOICES[0]) -> Optional[AudioBuffer]:
+        """Audio for text if it is a fixed phrase, an instance of a template, or a price.
+
+        Fixed phrases are views of the map (no copy); returns None when the
+        text has to be synthesized.
+        """
+        key = self.phrases.get(phrase_id(language, voice, text))
+        if key:
+            found = self.get(key)
+            if found:
+                self._count('hits')
+                return AudioBuffer.from_bytes(found[0], found[1]['format'])
+
+        normalized = normalize_text(text)
+        for pattern, template_id in self.patterns.get(language, []):
+            match = pattern.match(normalized)
+            if match:
+                audio = self.compose(template_id, language, voice, match.groupdict())
+                if audio:
+                    self._count('composed')
+                    return audio
+
+        if PRICE_PATTERN.match(normalized):
+            audio = self.splicer.render_price(normalized, language, voice)
+            if audio:
+                self._count('composed')
+                return audio
+        self._count('misses')
+        return None
+
+    def compose(self, template_id: str, language: str, voice: str,
+                values: Dict[str, str]) -> Optional[AudioBuffer]:
+        """Splice a template's pre-rendered segments with its numbers or prices"""
+        template = self.index['templates'].get(language, {}).get(template_id)
+        if template is None:
+            return None
+        return self.splicer.render_template(template_id, template_parts(template), language, voice, values)
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            stats = dict(self.stats)
+        return {**stats, 'entries': len(self.entries), 'bytes': len(self.map),
+                'built_at': self.index.get('built_at'), 'voices': self.index.get('voices')}
+
+    def close(self):
+        """Close the archive; if rendered audio still points into the map, it is unmapped once that audio is freed"""
+        view, self.view = getattr(self, 'view', None), None
+        try:
+            if view is not None:
+                view.release()
+            self.map.close()
+        except BufferError:
+            # Views handed out by render() keep the map alive until they are garbage-collected
+            pass
+        self.file.close()
+
+
+_default_bank = None
+_default_lock = threading.Lock()
+
+
+def load_default() -> Optional[PhraseBank]:
+    """The archive at PHRASE_BANK_PATH, or None if it has not been built"""
+    global _default_bank
+    if _default_bank is None and os.path.exists(PHRASE_BANK_PATH):
+        with _default_lock:
+            if _default_bank is None:
+                try:
+                    _default_bank = PhraseBank(PHRASE_BANK_PATH)
+                except (OSError, ValueError) as e:
+                    print(f"Phrase bank unavailable: {e}")
+    return _default_bank
+
+
+class PhraseBankBuilder:
+    """Renders every static translation (and template segments) through a TTS handler"""
+
+    def __init__(self, tts_handler, translations: Dict, voices=DEFAULT_VOICES, vocab_max: int = VOCAB_MAX):
+        self.tts = tts_handler
+        self.translations = translations
+        self.voices = tuple(voices)
+        self.vocab_max = vocab_max
+        self.blobs = []
+        self.size = 0
+        self.entries = {}
+        self.phrases = {}
+        self.templates = {}
+        self.failures = []
+
+
+    def _add(self, key: str, data: bytes, fmt: str, **meta):
+        self.entries[key] = {'offset': self.size, 'length': len(data), 'format': fmt, **meta}
+        self.blobs.append(data)
+        self.size += len(data)
+
+    def _add_segment(self, key: str, text: str, language: str, voice: str):
+        audio = self.tts.synthesize_speech(text, language, voice)
+        if not audio:
+            self.failures.append(key)
+            return
+        if not audio.is_pcm:
+            if not ffmpeg_available():
+                self._add(key, strip_id3(bytes(audio.data)), audio.codec)
+                return
+            # Decode once here so request-time splicing works on raw PCM
+            audio = audio.to_pcm()
+        pcm = trim_silence(audio.data, audio.channels) or bytes(audio.data)
+        self._add(key, pcm, 'pcm', sample_rate=audio.sample_rate, channels=audio.channels,
+                  dbfs=round(rms_dbfs(pcm), 2))
+
+    def build(self, output: str, progress=print) -> Dict:
+        languages = set()
+        for section, name, language, text in iter_static_phrases(self.translations):
+            languages.add(language)
+            parts = template_parts(text)
+            has_fields = any(field for _, field in parts)
+            for voice in self.voices:
+                if not has_fields:
+                    key = f"{language}/{voice}/{section}/{name}"
+                    audio = self.tts.synthesize_speech(text, language, voice)
+                    if not audio:
+                        self.failures.append(key)
+                        continue
+                    self._add(key, bytes(audio.container()), 'wav' if audio.is_pcm else audio.codec)
+                    self.phrases[phrase_id(language, voice, text)] = key
+                else:
+                    template_id = f"{section}.{name}"
+                    self.templates.setdefault(language, {})[template_id] = text
+                    for position, (literal, _) in enumerate(parts):
+                        if normalize_text(literal):
+                            self._add_segment(f"{language}/{voice}/segment/{template_id}/{position}",
+                                              normalize_text(literal), language, voice)
+            progress(f"{language}/{section}/{name}")
+
+        # Number and currency vocabulary for template fields and prices
+        for language in sorted(languages):
+            for voice in self.voices:
+                for token, text in vocabulary_texts(language, self.vocab_max).items():
+                    self._add_segment(f"{language}/{voice}/vocab/{token}", text, language, voice)
+            progress(f"{language} vocabulary (numbers 0-{self.vocab_max})")
+
+        index = json.dumps({
+            'version': INDEX_VERSION,
+            'built_at': time.time(),
+            'voices': list(self.voices),
+            'vocab_max': self.vocab_max,
+            'entries': self.entries,
+            'phrases': self.phrases,
+            'templates': self.templates,
+        }, ensure_ascii=False).encode('utf-8')
+
+        temp_path = f"{output}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(MAGIC)
+            f.write(struct.pack('<I', len(index)))
+            f.write(index)
+            for blob in self.blobs:
+                f.write(blob)
+        os.replace(temp_path, output)
+        return {'path': output, 'entries': len(self.entries), 'bytes': os.path.getsize(output),
+                'failures': self.failures}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or inspect the pre-rendered phrase bank')
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build')
+    build.add_argument('--output', default=PHRASE_BANK_PATH)
+    build.add_argument('--voices', default=','.join(DEFAULT_VOICES),
+                       help='voice styles passed to the TTS engines (friendly, neutral, professional)')
+    build.add_argument('--vocab-max', type=int, default=VOCAB_MAX,
+                       help='largest number rendered as one clip (larger ones are spliced from groups of 3 digits, '
+                            'so below 999 only numbers whose groups are all within it can be composed)')
+    info = sub.add_parser('info')
+    info.add_argument('--path', default=PHRASE_BANK_PATH)
+    args = parser.parse_args()
+
+    if args.command == 'info':
+        bank = PhraseBank(args.path)
+        print(json.dumps(bank.get_stats(), indent=2))
+        bank.close()
+        return
+
+    from advanced_tts_handler import AdvancedTTSHandler
+    from multilingual_handler import MultilingualHandler
+
+    builder = PhraseBankBuilder(AdvancedTTSHandler(), MultilingualHandler().translations,
+                                voices=[v.strip() for v in args.voices.split(',') if v.strip()],
+                                vocab_max=args.vocab_max)
+    report = builder.build(args.output, progress=lambda message: print(f"rendered {message}", file=sys.stderr))
+    print(json.dumps(report, indent=2))
+    if report['failures']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
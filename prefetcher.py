@@ -0,0 +1,425 @@
+# prefetcher.py
+# Speculative answers for the follow-up questions users usually ask next.
+#
+# Questions are reduced to a topic - the crop they mention and what they ask about
+# it (planting, fertilizer, pests, ...). For each language the prefetcher counts how
+# often one topic follows another within a session, and the commonest phrasing of
+# each topic. It learns online from live queries while enabled, and offline from a
+# conversation database or a JSONL log (python prefetcher.py learn).
+#
+# After an answer, the top-k likely next topics are queued. Background threads
+# answer them only when an LLM slot is idle with headroom left for live traffic,
+# within a calls-per-minute cap. A question outside a conversation warms the shared
+# response cache. Inside one, the answer depends on the conversation, so it is kept
+# for that session until its next question and served if that question matches. The
+# TTS audio cache is warmed for both. Hits are counted against LLM calls spent, so
+# /health shows whether prefetching pays for itself.
+
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from collections import Counter, OrderedDict, deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+import telemetry
+from admission import TokenBucket
+from response_cache import normalize_query, query_fingerprint
+from multilingual_handler import MultilingualHandler
+from knowledge_base import first_aspect
+
+# Off by default: every prefetch is an LLM call that may never be used
+PREFETCH_ENABLED = os.getenv('PREFETCH_ENABLED', 'false').lower() == 'true'
+# Learned transitions loaded at start-up (written by `python prefetcher.py learn`)
+PREFETCH_MODEL_PATH = os.getenv('PREFETCH_MODEL_PATH', 'prefetch_model.json')
+# Follow-ups prefetched per answer, and how likely and well-attested each must be
+PREFETCH_TOP_K = int(os.getenv('PREFETCH_TOP_K', 2))
+PREFETCH_MIN_PROBABILITY = float(os.getenv('PREFETCH_MIN_PROBABILITY', 0.25))
+PREFETCH_MIN_SUPPORT = int(os.getenv('PREFETCH_MIN_SUPPORT', 3))
+# Cost cap: prefetch LLM calls per minute per process
+PREFETCH_CALLS_PER_MINUTE = float(os.getenv('PREFETCH_CALLS_PER_MINUTE', 30))
+# LLM slots left free for live requests; prefetch never queues for a slot
+PREFETCH_HEADROOM = int(os.getenv('PREFETCH_HEADROOM', 2))
+PREFETCH_WORKERS = int(os.getenv('PREFETCH_WORKERS', 1))
+PREFETCH_MAX_QUEUE = int(os.getenv('PREFETCH_MAX_QUEUE', 64))
+# Seconds a queued prefetch waits for an idle slot before it is dropped
+PREFETCH_MAX_AGE = float(os.getenv('PREFETCH_MAX_AGE', 30))
+# Also synthesize prefetched answers into the TTS audio cache
+PREFETCH_AUDIO = os.getenv('PREFETCH_AUDIO', 'true').lower() == 'true'
+# Word overlap (Jaccard) at which a same-topic question counts as the prefetched one
+PREFETCH_MATCH_SIMILARITY = float(os.getenv('PREFETCH_MATCH_SIMILARITY', 0.5))
+# Sessions tracked for transitions and session-bound answers
+PREFETCH_MAX_SESSIONS = int(os.getenv('PREFETCH_MAX_SESSIONS', 10000))
+# Phrasings remembered per topic
+PREFETCH_MAX_PHRASINGS = 20
+
+_WORDS = re.compile(r'\w+')
+
+
+class TopicModel:
+    """Topic extraction plus follow-up transition and phrasing counts per language"""
+
+    def __init__(self):
+        crops = MultilingualHandler().agricultural_terms['crops']
+        self.crops = {word: crop for terms in crops.values() for word, crop in terms.items() if ' ' not in word}
+        # language -> topic -> Counter of next topics
+        self.transitions = {}
+        # language -> aspect -> Counter of next aspects (the same crop assumed), for rarely seen crops
+        self.aspect_transitions = {}
+        # language -> topic -> Counter of normalized questions, and an original wording of each
+        self.phrasings = {}
+        self.wordings = {}
+
+    def topic(self, message: str) -> Optional[str]:
+        """'crop/aspect', or None when no crop is mentioned"""
+        lowered = message.lower()
+        crop = next((self.crops[word] for word in _WORDS.findall(lowered) if word in self.crops), None)
+        if crop is None:
+            return None
+        # The first aspect word decides: "how do I store maize after harvest" is about storage
+        aspect = first_aspect(lowered) or 'general'
+        return f"{crop}/{aspect}"
+
+    def learn(self, language: str, previous: Optional[str], topic: str, message: str):
+        phrasings = self.phrasings.setdefault(language, {}).setdefault(topic, Counter())
+        normalized = normalize_query(message)
+        phrasings[normalized] += 1
+        self.wordings.setdefault(language, {})[normalized] = message.strip()
+        if len(phrasings) > PREFETCH_MAX_PHRASINGS:
+            for rare, _ in phrasings.most_common()[PREFETCH_MAX_PHRASINGS:]:
+                del phrasings[rare]
+                self.wordings[language].pop(rare, None)
+        if previous and previous != topic:
+            self.transitions.setdefault(language, {}).setdefault(previous, Counter())[topic] += 1
+            if previous.split('/')[0] == topic.split('/')[0]:
+                self.aspect_transitions.setdefault(language, {}).setdefault(
+                    previous.split('/')[1], Counter())[topic.split('/')[1]] += 1
+
+    def phrasing(self, language: str, topic: str) -> Optional[str]:
+        phrasings = self.phrasings.get(language, {}).get(topic)
+        if not phrasings:
+            return None
+        return self.wordings[language].get(phrasings.most_common(1)[0][0])
+
+    def predict(self, language: str, topic: str, k: int = PREFETCH_TOP_K, min_probability: float = PREFETCH_MIN_PROBABILITY,
+                min_support: int = PREFETCH_MIN_SUPPORT) -> List[Tuple[str, float, str]]:
+        """Likely next topics as (topic, probability, question), best first"""
+        counts = self.transitions.get(language, {}).get(topic)
+        if not counts or sum(counts.values()) < min_support:
+            # Back off to what usually follows this aspect for any crop
+            crop, aspect = topic.split('/')
+            aspects = self.aspect_transitions.get(language, {}).get(aspect)
+            if not aspects or sum(aspects.values()) < min_support:
+                return []
+            counts = Counter({f"{crop}/{next_aspect}": n for next_aspect, n in aspects.items()})
+        total = sum(counts.values())
+        predictions = []
+        for next_topic, n in counts.most_common():
+            if len(predictions) >= k or n / total < min_probability:
+                break
+            question = self.phrasing(language, next_topic)
+            if question:
+                predictions.append((next_topic, n / total, question))
+        return predictions
+
+    def to_dict(self) -> Dict:
+        return {'transitions': self.transitions, 'aspect_transitions': self.aspect_transitions,
+                'phrasings': self.phrasings, 'wordings': self.wordings}
+
+    def load_dict(self, data: Dict):
+        for name in ('transitions', 'aspect_transitions', 'phrasings'):
+            setattr(self, name, {language: {key: Counter(counts) for key, counts in table.items()}
+                                 for language, table in data.get(name, {}).items()})
+        self.wordings = data.get('wordings', {})
+
+
+class PrefetchJob:
+    __slots__ = ('session_id', 'turn', 'language', 'topic', 'question', 'queued_at')
+
+    def __init__(self, session_id, turn, language, topic, question):
+        self.session_id = session_id
+        self.turn = turn
+        self.language = language
+        self.topic = topic
+        self.question = question
+        self.queued_at = time.monotonic()
+
+
+class Prefetcher:
+    """Learns follow-up topics and answers the likely ones ahead of time, at idle LLM capacity.
+
+    generate(question, language, session_id) returns an answer without recording a
+    turn; speak(text, language) synthesizes into the audio cache.
+    """
+
+    def __init__(self, generate: Callable, response_cache, admission, speak: Optional[Callable] = None,
+                 model: Optional[TopicModel] = None, enabled: bool = PREFETCH_ENABLED,
+                 workers: int = PREFETCH_WORKERS, calls_per_minute: float = PREFETCH_CALLS_PER_MINUTE,
+                 headroom: int = PREFETCH_HEADROOM):
+        self.generate = generate
+        self.response_cache = response_cache
+        self.admission = admission
+        self.speak = speak
+        self.model = model or TopicModel()
+        self.enabled = enabled
+        self.workers = workers
+        self.calls_per_minute = calls_per_minute
+        self.headroom = headroom
+        self.budget = TokenBucket(max(1.0, calls_per_minute / 6))
+        self.queue = deque()
+        self.condition = threading.Condition()
+        # session_id -> [turn, last topic, {normalized question: (topic, answer)}]
+        self.sessions = OrderedDict()
+        self.threads = []
+        self.stopping = False
+        self.stats = {'observed': 0, 'queued': 0, 'dropped': 0, 'expired': 0, 'skipped_cached': 0,
+                      'llm_calls': 0, 'failed': 0, 'audio': 0, 'session_hits': 0, 'session_unused': 0}
+
+    def _count(self, key: str, n: int = 1):
+        self.stats[key] += n
+        telemetry.registry.inc('farmdepot_prefetch_total', n, 'Prefetch outcomes', outcome=key)
+
+    def load(self, path: str = PREFETCH_MODEL_PATH) -> 'Prefetcher':
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    self.model.load_dict(json.load(f))
+            except (OSError, ValueError) as e:
+                print(f"Prefetch model unavailable: {e}")
+        return self
+
+    def start(self) -> 'Prefetcher':
+        with self.condition:
+            if self.threads or not self.enabled:
+                return self
+            self.stopping = False
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"prefetch-{index}", daemon=True)
+                thread.start()
+                self.threads.append(thread)
+        return self
+
+    def stop(self):
+        with self.condition:
+            self.stopping = True
+            self.condition.notify_all()
+        for thread in self.threads:
+            thread.join(timeout=5)
+        self.threads = []
+
+    def take(self, session_id: Optional[str], message: str) -> Optional[str]:
+        """The answer prefetched in this session for a question like message, if any"""
+        if not session_id:
+            return None
+        with self.condition:
+            state = self.sessions.get(session_id)
+            if not state or not state['answers']:
+                return None
+            normalized = normalize_query(message)
+            match = normalized if normalized in state['answers'] else None
+            if match is None:
+                topic = self.model.topic(message)
+                words = set(normalized.split())
+                for question, (prefetched_topic, _) in state['answers'].items():
+                    other = set(question.split())
+                    if topic == prefetched_topic and len(words & other) / len(words | other) >= PREFETCH_MATCH_SIMILARITY:
+                        match = question
+                        break
+            if match is None:
+                return None
+            self._count('session_hits')
+            return state['answers'].pop(match)[1]
+
+    def after_answer(self, session_id: Optional[str], message: str, language: str, route: Optional[str] = None):
+        """Learn from an answered question, then queue its likely follow-ups"""
+        if not self.enabled:
+            return
+        topic = self.model.topic(message)
+        with self.condition:
+            self.stats['observed'] += 1
+            previous, turn = None, 0
+            if session_id:
+                state = self.sessions.pop(session_id, None) or {'turn': 0, 'topic': None, 'answers': {}}
+                # Answers prefetched for the previous turn are stale now
+                if state['answers']:
+                    self._count('session_unused', len(state['answers']))
+                previous, turn = state['topic'], state['turn'] + 1
+                self.sessions[session_id] = {'turn': turn, 'topic': topic or previous, 'answers': {}}
+                while len(self.sessions) > PREFETCH_MAX_SESSIONS:
+                    self.sessions.popitem(last=False)
+            if not topic:
+                return
+            self.model.learn(language, previous, topic, message)
+            if route in ('fallback', 'shed'):
+                return
+            for next_topic, _, question in self.model.predict(language, topic):
+                if not session_id and self.response_cache.contains(query_fingerprint(question, language)):
+                    self._count('skipped_cached')
+                    continue
+                if len(self.queue) >= PREFETCH_MAX_QUEUE:
+                    self.queue.popleft()
+                    self._count('dropped')
+                self.queue.append(PrefetchJob(session_id, turn, language, next_topic, question))
+                self._count('queued')
+            self.condition.notify()
+
+    def _stale(self, job: PrefetchJob) -> bool:
+        """Whether the session has moved on since the job was queued"""
+        if not job.session_id:
+            return False
+        state = self.sessions.get(job.session_id)
+        return state is None or state['turn'] != job.turn
+
+    def _next_job(self) -> Optional[PrefetchJob]:
+        """Wait for a job, a spare call in the budget and an idle LLM slot"""
+        with self.condition:
+            while not self.stopping:
+                while self.queue and time.monotonic() - self.queue[0].queued_at > PREFETCH_MAX_AGE:
+                    self.queue.popleft()
+                    self._count('expired')
+                # Newest first: the sessions that asked last are the likeliest to ask again soon
+                while self.queue and self._stale(self.queue[-1]):
+                    self.queue.pop()
+                    self._count('expired')
+                if self.queue:
+                    allowed, _ = self.budget.take(self.calls_per_minute / 60, max(1.0, self.calls_per_minute / 6),
+                                                  time.monotonic())
+                    if allowed:
+                        return self.queue.pop()
+                self.condition.wait(0.25)
+        return None
+
+    def _run(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            try:
+                self._execute(job)
+            except Exception as e:
+                self._count('failed')
+                print(f"Prefetch error: {e}")
+
+    def _execute(self, job: PrefetchJob):
+        # Wait for idle capacity, but only as long as the follow-up is still likely to come
+        while True:
+            with self.admission.idle_llm_slot(self.headroom) as admitted:
+                if admitted:
+                    self._count('llm_calls')
+                    answer = self.generate(job.question, job.language, job.session_id)
+                    break
+            with self.condition:
+                if self.stopping or self._stale(job) or time.monotonic() - job.queued_at > PREFETCH_MAX_AGE:
+                    self._count('expired')
+                    return
+            time.sleep(0.2)
+        if not answer:
+            self._count('failed')
+            return
+
+        if job.session_id:
+            with self.condition:
+                if self._stale(job):
+                    # The user already asked their next question
+                    self._count('session_unused')
+                    return
+                self.sessions[job.session_id]['answers'][normalize_query(job.question)] = (job.topic, answer)
+        else:
+            self.response_cache.put(query_fingerprint(job.question, job.language), answer, prefetched=True)
+
+        if self.speak and PREFETCH_AUDIO:
+            if self.speak(answer, job.language):
+                self._count('audio')
+
+    def get_stats(self) -> Dict:
+        with self.condition:
+            stats = dict(self.stats)
+            queued = len(self.queue)
+        saved = stats['session_hits'] + self.response_cache.get_stats().get('prefetch_hits', 0)
+        return {
+            'enabled': self.enabled,
+            'queue': queued,
+            'sessions': len(self.sessions),
+            **stats,
+            'llm_calls_saved': saved,
+            # LLM calls saved per call spent; below 1 the feature costs more than it saves
+            'payoff': round(saved / stats['llm_calls'], 3) if stats['llm_calls'] else None,
+        }
+
+
+def read_history(path: str):
+    """(session_id, message, language) per user question from a conversation database or a JSONL log"""
+    if path.endswith('.db'):
+        # Conversation turns carry no language, so it is detected
+        multilingual = MultilingualHandler()
+        codes = {'english': 'en', 'hausa': 'ha', 'igbo': 'ig', 'yoruba': 'yo'}
+        conn = sqlite3.connect(path)
+        for session_id, content in conn.execute(
+                "SELECT session_id, content FROM turns WHERE role = 'user' ORDER BY session_id, seq"):
+            message = content[len('Question: '):] if content.startswith('Question: ') else content
+            yield session_id, message, codes.get(multilingual.detect_language(message), 'en')
+        conn.close()
+        return
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            message = record.get('message') or record.get('query')
+            if message:
+                yield record.get('session_id'), message, record.get('language', 'en')
+
+
+def learn(records, model: Optional[TopicModel] = None) -> TopicModel:
+    """Count topic transitions in time-ordered (session_id, message, language) records"""
+    model = model or TopicModel()
+    last = {}
+    for session_id, message, language in records:
+        topic = model.topic(message)
+        if topic:
+            model.learn(language, last.get(session_id) if session_id else None, topic, message)
+            if session_id:
+                last[session_id] = topic
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Learn and inspect follow-up transitions for prefetching')
+    sub = parser.add_subparsers(dest='command', required=True)
+    learn_cmd = sub.add_parser('learn', help='count transitions in conversation databases or JSONL logs')
+    learn_cmd.add_argument('sources', nargs='+')
+    learn_cmd.add_argument('--output', default=PREFETCH_MODEL_PATH)
+    show = sub.add_parser('predict', help='show the follow-ups predicted for a question')
+    show.add_argument('question')
+    show.add_argument('--language', default='en')
+    show.add_argument('--model', default=PREFETCH_MODEL_PATH)
+    args = parser.parse_args()
+
+    if args.command == 'learn':
+        model = TopicModel()
+        for source in args.sources:
+            learn(read_history(source), model)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(model.to_dict(), f, ensure_ascii=False)
+        print(json.dumps({language: sum(sum(c.values()) for c in table.values())
+                          for language, table in model.transitions.items()}))
+        return
+
+    model = TopicModel()
+    with open(args.model, encoding='utf-8') as f:
+        model.load_dict(json.load(f))
+    topic = model.topic(args.question)
+    if topic is None:
+        print('No crop recognised in the question')
+        sys.exit(1)
+    print(json.dumps({'topic': topic, 'follow_ups': [
+        {'topic': t, 'probability': round(p, 3), 'question': q} for t, p, q in model.predict(args.language, topic)
+    ]}, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
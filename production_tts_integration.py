@@ -1,11 +1,17 @@
 # production_tts_integration.py
 # Integration file to replace the basic TTS in your existing system
 
+import io
 import os
 import asyncio
+import threading
 from typing import Optional
 from advanced_tts_handler import AdvancedTTSHandler
+from audio_buffer import AudioBuffer
 from multilingual_handler import MultilingualHandler
+import phrase_bank
+import model_host
+import telemetry
 
 class ProductionVoiceHandler:
     """Production-ready voice handler with advanced TTS"""
@@ -13,17 +19,20 @@ class ProductionVoiceHandler:
     def __init__(self):
         # Initialize existing components
         import speech_recognition as sr
-        import whisper
         import pygame
         
         self.recognizer = sr.Recognizer()
         self.microphone = sr.Microphone()
-        self.whisper_model = whisper.load_model("base")
+        self._whisper_model = None
+        self._whisper_lock = threading.Lock()
         self.multilingual = MultilingualHandler()
         
         # Initialize advanced TTS
         self.advanced_tts = AdvancedTTSHandler()
         self.tts_cache = TTSCache()
+        self.phrase_bank = phrase_bank.load_default()
+        # Open TTS connections in the background so the first reply skips connection setup
+        threading.Thread(target=self.advanced_tts.warm_up, daemon=True).start()
         
         pygame.mixer.init()
         
@@ -33,30 +42,44 @@ class ProductionVoiceHandler:
             self.recognizer.adjust_for_ambient_noise(source)
             print("Microphone calibrated!")
     
+    @property
+    def whisper_model(self):
+        """Whisper model, loaded the first time Google recognition falls through"""
+        if self._whisper_model is None:
+            with self._whisper_lock:
+                if self._whisper_model is None:
+                    import whisper
+                    self._whisper_model = whisper.load_model(os.getenv('WHISPER_MODEL', 'base'))
+        return self._whisper_model
+    
     def text_to_speech_production(self, text: str, language: str = None) -> bool:
         """Production TTS with caching and fallbacks"""
         if language is None:
             language = self.multilingual.current_language
         
         try:
-            # Check cache first
+            # Fixed and templated phrases come pre-rendered from the phrase bank
+            if self.phrase_bank:
+                with telemetry.span('tts_synthesis', engine='phrase_bank', language=language):
+                    rendered = self.phrase_bank.render(text, language, 'friendly')
+                if rendered:
+                    return self.advanced_tts.play_audio(rendered)
+            
+            # Check cache next
             cached_audio = self.tts_cache.get_cached_audio(text, language)
             if cached_audio:
                 print(f"Using cached audio for: {text[:50]}...")
-                return self.play_cached_audio(cached_audio)
-            
-            # Adapt text for Nigerian context
-            adapted_text = self.adapt_text_for_nigerian_context(text, language)
+                return self.advanced_tts.play_audio(cached_audio)
             
-            # Generate speech with advanced TTS
-            audio_file = self.advanced_tts.synthesize_speech(adapted_text, language, 'friendly')
+            # Generate speech with advanced TTS, which adapts the text for Nigerian context (memoized)
+            audio = self.advanced_tts.synthesize_speech(text, language, 'friendly')
             
-            if audio_file:
+            if audio:
                 # Cache the generated audio
-                self.tts_cache.cache_audio(text, language, audio_file)
+                self.tts_cache.cache_audio(text, language, audio)
                 
                 # Play audio
-                return self.advanced_tts.play_audio(audio_file)
+                return self.advanced_tts.play_audio(audio)
             else:
                 # Fallback to basic TTS
                 print(f"Advanced TTS failed, falling back to basic TTS for language: {language}")
@@ -68,86 +91,14 @@ class ProductionVoiceHandler:
             return self.basic_text_to_speech(text, language)
     
     def adapt_text_for_nigerian_context(self, text: str, language: str) -> str:
-        """Adapt text for Nigerian context and culture"""
-        import re
-        
-        adapted_text = text
-        
-        # Currency formatting
-        adapted_text = re.sub(r'\$(\d+)', r'₦\1', adapted_text)
-        adapted_text = re.sub(r'(\d+)\s*dollars?', r'₦\1', adapted_text, flags=re.IGNORECASE)
-        
-        # Nigerian English adaptations
-        if language == 'english':
-            adaptations = {
-                'gasoline': 'petrol',
-                'elevator': 'lift',
-                'apartment': 'flat',
-                'truck': 'lorry',
-                'corn': 'maize'
-            }
-            for american, nigerian in adaptations.items():
-                adapted_text = re.sub(rf'\b{american}\b', nigerian, adapted_text, flags=re.IGNORECASE)
-        
-        # Add appropriate greetings based on time of day
-        import datetime
-        current_hour = datetime.datetime.now().hour
-        
-        if adapted_text.lower().startswith('welcome'):
-            greetings = {
-                'english': 'Welcome' if 6 <= current_hour < 18 else 'Good evening, welcome',
-                'hausa': 'Sannu da zuwa' if 6 <= current_hour < 18 else 'Barka da yamma, sannu da zuwa',
-                'igbo': 'Ndewo' if 6 <= current_hour < 18 else 'Mgbede ọma, ndewo',
-                'yoruba': 'Eku abo' if 6 <= current_hour < 18 else 'Eku ale, eku abo'
-            }
-            
-            if language in greetings:
-                adapted_text = adapted_text.replace('Welcome', greetings[language], 1)
-        
-        # Apply pronunciation improvements
-        adapted_text = self.apply_pronunciation_rules(adapted_text, language)
-        
-        return adapted_text
-    
-    def apply_pronunciation_rules(self, text: str, language: str) -> str:
-        """Apply pronunciation rules for better TTS output"""
-        
-        # Nigerian place names pronunciation
-        place_pronunciations = {
-            'Lagos': 'LAY-gos',
-            'Abuja': 'ah-BOO-jah',
-            'Kano': 'KAH-no',
-            'Ibadan': 'ee-bah-DAHN',
-            'Kaduna': 'kah-DOO-nah'
-        }
-        
-        for place, pronunciation in place_pronunciations.items():
-            if place in text:
-                # Use SSML phoneme for better pronunciation
-                text = text.replace(place, f'<phoneme alphabet="ipa" ph="{pronunciation}">{place}</phoneme>')
-        
-        # Nigerian currency pronunciation
-        text = re.sub(r'₦(\d+)', r'<say-as interpret-as="currency" language="en-NG">NGN \1</say-as>', text)
-        
-        # Agricultural terms with better pronunciation
-        agricultural_terms = {
-            'cassava': 'kah-SAH-vah',
-            'plantain': 'PLAN-tin',
-            'yam': 'YAHM'
-        }
-        
-        for term, pronunciation in agricultural_terms.items():
-            if term in text.lower():
-                pattern = re.compile(rf'\b{term}\b', re.IGNORECASE)
-                text = pattern.sub(f'<phoneme alphabet="ipa" ph="{pronunciation}">{term}</phoneme>', text)
-        
-        return text
+        """Adapt text for Nigerian context and culture, as SSML (rules in pronunciation_rules.json)"""
+        text_prep = self.advanced_tts.text_prep
+        return text_prep.prepare(text, language, 'friendly').ssml if text_prep else text
     
     def basic_text_to_speech(self, text: str, language: str) -> bool:
         """Fallback to basic TTS (your original implementation)"""
         try:
             from gtts import gTTS
-            import tempfile
             import pygame
             import time
             
@@ -162,28 +113,24 @@ class ProductionVoiceHandler:
             lang_code = lang_codes.get(language, 'en')
             tts = gTTS(text=text, lang=lang_code, slow=False)
             
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as tmp_file:
-                tts.save(tmp_file.name)
-                
-                pygame.mixer.music.load(tmp_file.name)
+            audio = io.BytesIO()
+            with telemetry.span('tts_synthesis', engine='gtts'):
+                tts.write_to_fp(audio)
+            audio.seek(0)
+            
+            with telemetry.span('playback'):
+                pygame.mixer.music.load(audio, 'mp3')
                 pygame.mixer.music.play()
                 
                 while pygame.mixer.music.get_busy():
                     time.sleep(0.1)
-                
-                os.unlink(tmp_file.name)
-                return True
+            
+            return True
                 
         except Exception as e:
             print(f"Basic TTS error: {e}")
             return False
     
-    def play_cached_audio(self, audio_file: str) -> bool:
-        """Play cached audio file"""
-        if os.path.exists(audio_file):
-            return self.advanced_tts.play_audio(audio_file)
-        return False
-    
     # Keep all your existing methods for speech recognition
     def listen_for_wake_word(self, wake_word: str = "hey farmdepot") -> bool:
         """Your existing implementation"""
@@ -206,21 +153,22 @@ class ProductionVoiceHandler:
         try:
             # Try Google Speech Recognition first
             try:
-                text = self.recognizer.recognize_google(audio)
+                with telemetry.span('asr', engine='google'):
+                    text = self.recognizer.recognize_google(audio)
                 return text
             except:
                 pass
             
-            # Fallback to Whisper
-            import tempfile
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp_file:
-                tmp_file.write(audio.get_wav_data())
-                tmp_file.flush()
-                
-                result = self.whisper_model.transcribe(tmp_file.name)
-                os.unlink(tmp_file.name)
-                
-                return result["text"].strip() if result["text"].strip() else None
+            # Fallback to Whisper, fed 16 kHz float samples directly instead of a temp WAV
+            with telemetry.span('asr', engine='whisper'):
+                samples = AudioBuffer.from_pcm(audio.get_raw_data(convert_rate=16000, convert_width=2), 16000)
+                host = model_host.default_client()
+                if host:
+                    text = host.transcribe(samples.to_float32())
+                else:
+                    text = self.whisper_model.transcribe(samples.to_float32())["text"].strip()
+            
+            return text or None
                 
         except Exception as e:
             print(f"Speech recognition error: {e}")
@@ -228,7 +176,7 @@ class ProductionVoiceHandler:
 
 
 class TTSCache:
-    """Redis-based caching for TTS audio files"""
+    """Redis-based caching for synthesized TTS audio"""
     
     def __init__(self):
         try:
@@ -246,49 +194,41 @@ class TTSCache:
             self.redis_client = None
             self.cache_enabled = False
     
-    def get_cached_audio(self, text: str, language: str) -> Optional[str]:
-        """Get cached audio file path"""
+    def _cache_key(self, text: str, language: str, variant: Optional[str] = None) -> str:
+        import hashlib
+        cache_key = f"tts:{hashlib.md5(f'{text}:{language}'.encode()).hexdigest()}"
+        # Transcoded copies (e.g. "opus-20k") live next to the synthesized source
+        return f"{cache_key}:{variant}" if variant else cache_key
+    
+    def get_cached_audio(self, text: str, language: str, variant: Optional[str] = None) -> Optional[AudioBuffer]:
+        """Get cached audio, or one transcoded variant of it"""
         if not self.cache_enabled or not self.redis_client:
             return None
         
         try:
-            import hashlib
-            cache_key = f"tts:{hashlib.md5(f'{text}:{language}'.encode()).hexdigest()}"
-            cached_path = self.redis_client.get(cache_key)
+            cache_key = self._cache_key(text, language, variant)
+            cached = self.redis_client.get(cache_key)
             
-            if cached_path:
-                cached_path = cached_path.decode()
-                if os.path.exists(cached_path):
-                    return cached_path
-                else:
-                    # Remove stale cache entry
+            if cached:
+                if cached.endswith(b'.mp3'):
+                    # Entry from the old file-path cache; let it be re-synthesized
                     self.redis_client.delete(cache_key)
+                    return None
+                return AudioBuffer.from_bytes(cached)
             
             return None
         except Exception as e:
             print(f"Cache retrieval error: {e}")
             return None
     
-    def cache_audio(self, text: str, language: str, audio_path: str):
-        """Cache audio file path"""
+    def cache_audio(self, text: str, language: str, audio: AudioBuffer, variant: Optional[str] = None):
+        """Store the clip itself in Redis (WAV for PCM, the encoded bytes otherwise)"""
         if not self.cache_enabled or not self.redis_client:
             return
         
         try:
-            import hashlib
-            cache_key = f"tts:{hashlib.md5(f'{text}:{language}'.encode()).hexdigest()}"
-            
-            # Create permanent cache directory
-            cache_dir = os.path.join('static', 'tts_cache')
-            os.makedirs(cache_dir, exist_ok=True)
-            
-            # Copy file to cache directory
-            import shutil
-            cached_file = os.path.join(cache_dir, f"{cache_key.split(':')[1]}.mp3")
-            shutil.copy2(audio_path, cached_file)
-            
-            # Store in Redis
-            self.redis_client.setex(cache_key, self.ttl, cached_file)
+            cache_key = self._cache_key(text, language, variant)
+            self.redis_client.setex(cache_key, self.ttl, audio.container())
             
         except Exception as e:
             print(f"Cache storage error: {e}")
@@ -344,9 +284,12 @@ class AsyncTTSHandler:
             ]
         }
         
+        bank = self.voice_handler.phrase_bank
         tasks = []
         for language, phrases in common_phrases.items():
             for phrase in phrases:
+                if bank and bank.render(phrase, language, 'friendly'):
+                    continue  # Already pre-rendered
                 task = self.synthesize_async(phrase, language)
                 tasks.append(task)
         
@@ -0,0 +1,78 @@
+# response_cache.py
+# In-process cache of LLM answers for stand-alone (context-free) questions
+
+import os
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict
+
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', 2000))
+RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', 6 * 3600))
+
+_NON_WORD = re.compile(r'[^\w\s]+')
+
+
+def normalize_query(message: str) -> str:
+    """Lower-case, strip punctuation and collapse whitespace so trivial variants share an entry"""
+    return ' '.join(_NON_WORD.sub(' ', message.lower()).split())
+
+
+def query_fingerprint(message: str, language: str) -> str:
+    return hashlib.sha1(f"{language}:{normalize_query(message)}".encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """Bounded LRU of answers with a TTL, plus per-query miss counts for routing"""
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE, ttl: int = RESPONSE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.misses = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'prefetch_hits': 0}
+
+    def get(self, fingerprint: str) -> Optional[str]:
+        with self.lock:
+            entry = self.entries.get(fingerprint)
+            if entry and time.time() - entry['stored_at'] < self.ttl:
+                self.entries.move_to_end(fingerprint)
+                self.stats['hits'] += 1
+                if entry.get('prefetched'):
+                    self.stats['prefetch_hits'] += 1
+                return entry['response']
+
+            if entry:
+                del self.entries[fingerprint]
+            self.stats['misses'] += 1
+            self.misses[fingerprint] = self.misses.pop(fingerprint, 0) + 1
+            while len(self.misses) > self.max_entries:
+                self.misses.popitem(last=False)
+            return None
+
+    def put(self, fingerprint: str, response: str, **metadata):
+        with self.lock:
+            self.entries[fingerprint] = {'response': response, 'stored_at': time.time(), **metadata}
+            self.entries.move_to_end(fingerprint)
+            # The query got an answer; only misses after this one should count against it
+            self.misses.pop(fingerprint, None)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def contains(self, fingerprint: str) -> bool:
+        """Whether a fresh answer is cached, without counting a hit or miss"""
+        with self.lock:
+            entry = self.entries.get(fingerprint)
+            return bool(entry) and time.time() - entry['stored_at'] < self.ttl
+
+    def miss_count(self, fingerprint: str) -> int:
+        """How many times this query has missed the cache since it was last answered"""
+        with self.lock:
+            return self.misses.get(fingerprint, 0)
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            return {**self.stats, 'entries': len(self.entries)}
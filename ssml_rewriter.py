@@ -0,0 +1,163 @@
+# ssml_rewriter.py
+# Turns answer text into the SSML fragment the TTS engines speak: amounts read as
+# naira, Nigerian English words, phonemes for place names and crops, and a greeting
+# that suits the time of day.
+#
+# The rules live in pronunciation_rules.json. For each language they are compiled
+# once into a single alternation, and the text is scanned left to right. Plain text
+# between matches is XML-escaped, and markup is only ever emitted for the original
+# text, so a rule never re-matches a tag another rule inserted.
+
+import os
+import re
+import json
+import datetime
+import threading
+from typing import Dict, Optional
+from xml.sax.saxutils import escape, quoteattr
+
+# JSON file of currency, lexicon, phoneme and greeting rules
+PRONUNCIATION_RULES_PATH = os.getenv('PRONUNCIATION_RULES_PATH',
+                                     os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                  'pronunciation_rules.json'))
+
+# Digits with optional thousands separators and decimals, not a trailing comma
+AMOUNT = r'(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?'
+
+
+def _alternation(words) -> str:
+    # Longest first, so "dollars" wins over "dollar"
+    return '|'.join(re.escape(word) for word in sorted(words, key=len, reverse=True))
+
+
+def _match_case(source: str, replacement: str) -> str:
+    if len(source) > 1 and source.isupper():
+        return replacement.upper()
+    if source[:1].isupper():
+        return replacement[:1].upper() + replacement[1:]
+    return replacement
+
+
+class CompiledRules:
+    """One language's rules: the combined pattern and the lookups its groups resolve through"""
+
+    def __init__(self, rules: Dict, language: str):
+        currency = rules.get('currency', {})
+        self.currency_code = currency.get('code', 'NGN')
+        self.currency_language = currency.get('language', 'en-NG')
+
+        phonemes = rules.get('phonemes', {})
+        self.alphabet = phonemes.get('alphabet', 'ipa')
+        self.exact, self.folded = {}, {}
+        for group in phonemes.get('groups', {}).values():
+            if group.get('ignore_case'):
+                self.folded.update({word.lower(): ph for word, ph in group['words'].items()})
+            else:
+                self.exact.update(group['words'])
+        self.lexicon = {word.lower(): target for word, target in rules.get('lexicon', {}).get(language, {}).items()}
+
+        greetings = rules.get('greetings', {})
+        self.greeting = greetings.get('languages', {}).get(language)
+
+        parts, starts = [], set()
+        if currency.get('symbols'):
+            parts.append(rf"(?P<symbol>{_alternation(currency['symbols'])})\s?(?P<amount>{AMOUNT})")
+            starts.update(symbol[:1] for symbol in currency['symbols'])
+        if currency.get('words'):
+            parts.append(rf"\b(?P<spelled>{AMOUNT})\s*(?i:{_alternation(currency['words'])})\b")
+            starts.update('0123456789')
+        folded_words = set(self.folded) | set(self.lexicon)
+        if self.greeting:
+            opening = greetings.get('opening', 'welcome')
+            parts.append(rf"\A(?P<greeting>(?i:{re.escape(opening)}))\b")
+            folded_words.add(opening)
+        if self.exact:
+            parts.append(rf"\b(?P<exact>{_alternation(self.exact)})\b")
+            starts.update(word[:1] for word in self.exact)
+        if self.folded or self.lexicon:
+            parts.append(rf"\b(?P<folded>(?i:{_alternation(set(self.folded) | set(self.lexicon))}))\b")
+        for word in folded_words:
+            starts.update((word[:1].lower(), word[:1].upper()))
+        # Checking the first character up front lets most positions fail without trying each alternative
+        first = re.escape(''.join(sorted(starts)))
+        self.pattern = re.compile(f"(?=[{first}])(?:{'|'.join(parts)})") if parts else None
+
+    def word(self, word: str) -> str:
+        """A word as SSML: wrapped in a phoneme if there is one for it"""
+        ph = self.exact.get(word) or self.folded.get(word.lower())
+        if ph is None:
+            return escape(word)
+        return f'<phoneme alphabet={quoteattr(self.alphabet)} ph={quoteattr(ph)}>{escape(word)}</phoneme>'
+
+    def currency(self, amount: str) -> str:
+        return (f'<say-as interpret-as="currency" language={quoteattr(self.currency_language)}>'
+                f'{escape(self.currency_code)} {amount}</say-as>')
+
+
+class SSMLRewriter:
+    """Rewrites text into an SSML fragment using rules compiled once per language"""
+
+    def __init__(self, rules: Dict):
+        self.rules = rules
+        self.compiled = {}
+
+    @classmethod
+    def from_file(cls, path: str = PRONUNCIATION_RULES_PATH) -> 'SSMLRewriter':
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def compile(self, language: str) -> CompiledRules:
+        compiled = self.compiled.get(language)
+        if compiled is None:
+            compiled = self.compiled[language] = CompiledRules(self.rules, language)
+        return compiled
+
+    def daypart(self, hour: Optional[int] = None) -> str:
+        """'day' or 'evening': which greeting rewrite() uses at this hour (defaulting to now)"""
+        if hour is None:
+            hour = datetime.datetime.now().hour
+        start, end = self.rules.get('greetings', {}).get('day_hours', [6, 18])
+        return 'day' if start <= hour < end else 'evening'
+
+    def rewrite(self, text: str, language: str, hour: Optional[int] = None) -> str:
+        """SSML fragment (no <speak> root) for text; hour picks the greeting, defaulting to now"""
+        rules = self.compile(language)
+        if rules.pattern is None:
+            return escape(text)
+
+        out, position = [], 0
+        for match in rules.pattern.finditer(text):
+            out.append(escape(text[position:match.start()]))
+            position = match.end()
+            kind = match.lastgroup
+            if kind in ('amount', 'symbol'):
+                out.append(rules.currency(match.group('amount')))
+            elif kind == 'spelled':
+                out.append(rules.currency(match.group('spelled')))
+            elif kind == 'greeting':
+                out.append(escape(rules.greeting[self.daypart(hour)]))
+            elif kind == 'exact':
+                out.append(rules.word(match.group()))
+            else:
+                word = match.group()
+                target = rules.lexicon.get(word.lower())
+                out.append(rules.word(_match_case(word, target) if target else word))
+        out.append(escape(text[position:]))
+        return ''.join(out)
+
+
+_default_rewriter = None
+_default_lock = threading.Lock()
+
+
+def load_default() -> Optional[SSMLRewriter]:
+    """The rewriter for PRONUNCIATION_RULES_PATH, or None if the rules can't be read"""
+    global _default_rewriter
+    if _default_rewriter is None:
+        with _default_lock:
+            if _default_rewriter is None:
+                try:
+                    _default_rewriter = SSMLRewriter.from_file(PRONUNCIATION_RULES_PATH)
+                except (OSError, ValueError) as e:
+                    print(f"Pronunciation rules unavailable: {e}")
+    return _default_rewriter
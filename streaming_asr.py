@@ -0,0 +1,341 @@
+# streaming_asr.py
+# Streaming speech input: the client posts PCM chunks while the user is still talking.
+# An energy VAD tracks speech and pauses, Whisper decodes a sliding window of the
+# audio not yet committed to produce interim transcripts, and speech before a pause
+# is committed (decoded for the last time) as the utterance goes on. When the VAD hears the speech end (or the client
+# says it has), only that uncommitted tail is decoded, so the wait after the user
+# stops talking is one short decode rather than transcribing the whole recording.
+#
+# Sessions live in the process that opened them; clients must send every chunk of a
+# stream to the same worker (one gunicorn worker with threads, or sticky sessions).
+
+import os
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import telemetry
+from audio_buffer import resample
+from lazy_imports import lazy_import
+
+np = lazy_import('numpy')
+
+# Rate Whisper works at; chunks at other rates are resampled on arrival
+STREAM_SAMPLE_RATE = 16000
+# VAD frame length, and how far above the tracked noise floor counts as speech
+STREAM_VAD_FRAME_MS = int(os.getenv('STREAM_VAD_FRAME_MS', 30))
+STREAM_VAD_MARGIN_DB = float(os.getenv('STREAM_VAD_MARGIN_DB', 12))
+# Frames quieter than this are never speech, however low the noise floor goes
+STREAM_VAD_MIN_DBFS = float(os.getenv('STREAM_VAD_MIN_DBFS', -50))
+# Speech needed before an utterance starts, and silence that ends it
+STREAM_MIN_SPEECH_MS = int(os.getenv('STREAM_MIN_SPEECH_MS', 150))
+STREAM_END_SILENCE_MS = int(os.getenv('STREAM_END_SILENCE_MS', 700))
+# A gap this long is a pause the decoder may commit audio at
+STREAM_PAUSE_MS = int(os.getenv('STREAM_PAUSE_MS', 200))
+# Audio before a pause is committed (decoded for the last time) once it is this long
+STREAM_COMMIT_SECONDS = float(os.getenv('STREAM_COMMIT_SECONDS', 2))
+# Most uncommitted audio decoded for an interim; past it audio is committed even without a pause
+STREAM_WINDOW_SECONDS = float(os.getenv('STREAM_WINDOW_SECONDS', 8))
+# New speech between interim transcripts
+STREAM_INTERIM_SECONDS = float(os.getenv('STREAM_INTERIM_SECONDS', 1.0))
+STREAM_MAX_SECONDS = float(os.getenv('STREAM_MAX_SECONDS', 60))
+# Streams with no chunk for this long are dropped
+STREAM_IDLE_SECONDS = float(os.getenv('STREAM_IDLE_SECONDS', 30))
+STREAM_MAX_ACTIVE = int(os.getenv('STREAM_MAX_ACTIVE', 32))
+# Whisper decodes run on this many threads, shared by all streams
+STREAM_DECODE_THREADS = int(os.getenv('STREAM_DECODE_THREADS', 2))
+
+FINISHED = ('final', 'failed')
+
+
+class EnergyVAD:
+    """Frame-energy voice activity detection against an adaptive noise floor"""
+
+    def __init__(self, sample_rate: int = STREAM_SAMPLE_RATE, frame_ms: int = STREAM_VAD_FRAME_MS,
+                 margin_db: float = STREAM_VAD_MARGIN_DB):
+        self.frame = sample_rate * frame_ms // 1000
+        self.frame_ms = frame_ms
+        self.margin_db = margin_db
+        self.noise_db = None
+        self.pending = np.zeros(0, dtype='<i2')
+        self.position = 0  # Samples classified so far
+        self.speech_ms = 0
+        self.run_ms = 0  # Length of the current run of speech or silence
+        self.in_speech = False
+        self.started = False
+        self.ended = False
+        self.last_pause = None  # Sample index inside the most recent pause
+        self.last_speech = 0  # Sample index where the most recent speech frame ends
+
+    def push(self, samples: 'np.ndarray'):
+        data = np.concatenate([self.pending, samples]) if len(self.pending) else samples
+        count = len(data) // self.frame
+        self.pending = data[count * self.frame:]
+        if not count:
+            return
+        frames = data[:count * self.frame].reshape(count, self.frame).astype(np.float32)
+        levels = 10 * np.log10(np.mean(frames * frames, axis=1) / (32768.0 ** 2) + 1e-12)
+
+        for level in levels:
+            level = float(level)
+            # The floor drops at once to quieter frames and rises slowly, so speech doesn't become noise
+            if self.noise_db is None or level < self.noise_db:
+                self.noise_db = level
+            else:
+                self.noise_db += 0.002 * (level - self.noise_db)
+            speech = level > max(self.noise_db + self.margin_db, STREAM_VAD_MIN_DBFS)
+
+            self.run_ms = self.run_ms + self.frame_ms if speech == self.in_speech else self.frame_ms
+            self.in_speech = speech
+            self.position += self.frame
+            if speech:
+                self.speech_ms += self.frame_ms
+                self.last_speech = self.position
+                if self.run_ms >= STREAM_MIN_SPEECH_MS:
+                    self.started = True
+            elif self.started:
+                if self.run_ms >= STREAM_PAUSE_MS:
+                    self.last_pause = self.position - (self.run_ms // 2) * self.frame // self.frame_ms
+                if self.run_ms >= STREAM_END_SILENCE_MS:
+                    self.ended = True
+
+
+class StreamSession:
+    """One utterance being streamed in: VAD state, uncommitted audio and transcripts.
+
+    Chunks are appended under the session's condition; the decode thread copies
+    the uncommitted audio, runs Whisper without the lock and then commits or
+    publishes the text. At most one decode per session is in flight.
+    """
+
+    def __init__(self, language: Optional[str] = None, session_id: Optional[str] = None,
+                 sample_rate: int = STREAM_SAMPLE_RATE):
+        self.id = uuid.uuid4().hex
+        self.language = language
+        self.session_id = session_id
+        self.sample_rate = sample_rate
+        self.vad = EnergyVAD()
+        self.condition = threading.Condition()
+        self.chunks: List['np.ndarray'] = []
+        self.offset = 0  # Sample index of the first uncommitted sample
+        self.samples = 0  # Samples received
+        self.committed: List[str] = []
+        self.odd_byte = b''
+        self.state = 'listening'
+        self.version = 0
+        self.interim = ''
+        self.transcript = None
+        self.job_id = None
+        self.error = None
+        self.decoding = False
+        self.since_interim = 0
+        self.ended_at = None
+        self.final_decode_seconds = None
+        self.updated = time.monotonic()
+
+    def _bump(self):
+        self.version += 1
+        self.condition.notify_all()
+
+    def append(self, data: bytes, end: bool = False) -> bool:
+        """Add a chunk of 16-bit mono PCM; returns True when a decode should be scheduled"""
+        data = self.odd_byte + data
+        self.odd_byte = data[len(data) & ~1:]
+        samples = np.frombuffer(data, dtype='<i2', count=len(data) // 2)
+        if self.sample_rate != STREAM_SAMPLE_RATE and len(samples):
+            samples = resample(samples.reshape(-1, 1), self.sample_rate, STREAM_SAMPLE_RATE)[:, 0]
+
+        with self.condition:
+            self.updated = time.monotonic()
+            if self.state in FINISHED or self.state == 'finalizing':
+                return False
+            if len(samples):
+                self.vad.push(samples)
+                self.chunks.append(samples)
+                self.samples += len(samples)
+                self.since_interim += len(samples)
+            if self.vad.started and self.state == 'listening':
+                self.state = 'speaking'
+                self._bump()
+            if end or self.vad.ended or self.samples >= STREAM_MAX_SECONDS * STREAM_SAMPLE_RATE:
+                self.state = 'finalizing'
+                self.ended_at = time.monotonic()
+                self._bump()
+            due = self.state == 'finalizing' or (
+                self.vad.started and self.since_interim >= STREAM_INTERIM_SECONDS * STREAM_SAMPLE_RATE)
+            if due and not self.decoding:
+                self.decoding = True
+                return True
+            return False
+
+    def uncommitted(self) -> 'np.ndarray':
+        """Audio after the last commit (call with the condition held)"""
+        if len(self.chunks) > 1:
+            self.chunks = [np.concatenate(self.chunks)]
+        return self.chunks[0] if self.chunks else np.zeros(0, dtype='<i2')
+
+    def commit(self, samples: int, text: str):
+        """Drop the first samples of uncommitted audio, whose transcript is text"""
+        audio = self.uncommitted()
+        self.chunks = [audio[samples:]]
+        self.offset += samples
+        if text:
+            self.committed.append(text)
+
+    def prompt(self) -> str:
+        return ' '.join(self.committed)[-200:]
+
+    def snapshot(self) -> Dict:
+        with self.condition:
+            return {
+                'stream_id': self.id,
+                'state': self.state,
+                'version': self.version,
+                'interim': self.interim,
+                'transcript': self.transcript,
+                'job_id': self.job_id,
+                'error': self.error,
+                'speech_ms': self.vad.speech_ms,
+                'received_ms': int(self.samples * 1000 / STREAM_SAMPLE_RATE),
+                'final_decode_ms': None if self.final_decode_seconds is None
+                else round(self.final_decode_seconds * 1000, 1),
+            }
+
+    def wait(self, after: int, timeout: float) -> Dict:
+        with self.condition:
+            self.condition.wait_for(lambda: self.version > after or self.state in FINISHED, timeout)
+        return self.snapshot()
+
+
+class StreamRegistry:
+    """Open streams in this process and the decode threads that serve them.
+
+    transcribe(float32 samples, language, prompt) -> text is the recognizer;
+    on_final(session) runs once a stream has its final transcript and may
+    return a job id for the rest of the pipeline (intent, answer, TTS).
+    """
+
+    def __init__(self, transcribe: Callable, on_final: Optional[Callable] = None,
+                 decode_threads: int = STREAM_DECODE_THREADS, max_active: int = STREAM_MAX_ACTIVE):
+        self.transcribe = transcribe
+        self.on_final = on_final
+        self.max_active = max_active
+        self.executor = ThreadPoolExecutor(decode_threads, thread_name_prefix='stream-asr')
+        self.sessions: Dict[str, StreamSession] = {}
+        self.lock = threading.Lock()
+        self.stats = {'opened': 0, 'finished': 0, 'failed': 0, 'expired': 0, 'interim_decodes': 0,
+                      'commits': 0}
+
+    def _expire(self):
+        now = time.monotonic()
+        for stream_id, session in list(self.sessions.items()):
+            if now - session.updated > STREAM_IDLE_SECONDS:
+                del self.sessions[stream_id]
+                if session.state not in FINISHED:
+                    self.stats['expired'] += 1
+
+    def open(self, language: Optional[str] = None, session_id: Optional[str] = None,
+             sample_rate: int = STREAM_SAMPLE_RATE) -> StreamSession:
+        """New stream; raises RuntimeError when max_active streams are already open"""
+        with self.lock:
+            self._expire()
+            active = sum(1 for s in self.sessions.values() if s.state not in FINISHED)
+            if active >= self.max_active:
+                raise RuntimeError('Too many open voice streams')
+            session = StreamSession(language, session_id, sample_rate)
+            self.sessions[session.id] = session
+            self.stats['opened'] += 1
+        return session
+
+    def get(self, stream_id: str) -> Optional[StreamSession]:
+        with self.lock:
+            return self.sessions.get(stream_id)
+
+    def feed(self, session: StreamSession, data: bytes, end: bool = False):
+        if session.append(data, end):
+            self.executor.submit(self._decode, session)
+
+    def _count(self, key: str):
+        with self.lock:
+            self.stats[key] += 1
+
+    def _decode(self, session: StreamSession):
+        """Decode until the session has nothing new; run on the executor"""
+        try:
+            while True:
+                with session.condition:
+                    final = session.state == 'finalizing'
+                    audio = session.uncommitted()
+                    pause = (session.vad.last_pause or 0) - session.offset
+                    session.since_interim = 0
+                    window = int(STREAM_WINDOW_SECONDS * STREAM_SAMPLE_RATE)
+                    # Commit speech up to a pause (or half the window when there is none), keeping the tail short
+                    commit = 0
+                    if not final:
+                        if pause >= STREAM_COMMIT_SECONDS * STREAM_SAMPLE_RATE:
+                            commit = min(pause, len(audio))
+                        elif len(audio) > window:
+                            commit = window // 2
+                        segment = audio[:commit] if commit else audio
+                    else:
+                        # The trailing silence that ended the utterance has nothing to decode
+                        speech_end = session.vad.last_speech - session.offset + STREAM_PAUSE_MS * STREAM_SAMPLE_RATE // 1000
+                        segment = audio[:max(0, min(len(audio), speech_end))]
+                    prompt = session.prompt()
+
+                start = time.perf_counter()
+                with telemetry.span('asr', engine='whisper_stream'):
+                    text = self.transcribe(segment.astype(np.float32) / 32768.0, session.language, prompt) \
+                        if len(segment) else ''
+                elapsed = time.perf_counter() - start
+
+                with session.condition:
+                    if commit:
+                        session.commit(commit, text)
+                        self._count('commits')
+                        continue  # Decode the rest of the window for the interim
+                    if final:
+                        session.commit(len(audio), text)
+                        session.transcript = ' '.join(session.committed).strip()
+                        session.final_decode_seconds = elapsed
+                        break
+                    session.interim = ' '.join(session.committed + [text]).strip()
+                    self._count('interim_decodes')
+                    session._bump()
+                    # More speech (or the end) arrived while decoding
+                    if session.state != 'finalizing' and \
+                            session.since_interim < STREAM_INTERIM_SECONDS * STREAM_SAMPLE_RATE:
+                        session.decoding = False
+                        return
+            self._finish(session)
+        except Exception as e:
+            print(f"Streaming recognition failed: {e}")
+            with session.condition:
+                session.state = 'failed'
+                session.error = str(e)
+                session.decoding = False
+                session._bump()
+            self._count('failed')
+
+    def _finish(self, session: StreamSession):
+        telemetry.registry.observe('farmdepot_stream_final_decode_seconds', session.final_decode_seconds,
+                                   'Decode time between the end of speech and the final transcript')
+        job_id, error = None, None
+        if not session.transcript:
+            error = 'No speech detected'
+        elif self.on_final:
+            job_id = self.on_final(session)
+        with session.condition:
+            session.state = 'failed' if error else 'final'
+            session.error = error
+            session.job_id = job_id
+            session.decoding = False
+            session._bump()
+        self._count('failed' if error else 'finished')
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            active = sum(1 for s in self.sessions.values() if s.state not in FINISHED)
+            return {**self.stats, 'active': active}
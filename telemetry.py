@@ -0,0 +1,230 @@
+# telemetry.py
+# Per-stage latency spans and histograms for the chat/voice pipeline, exported in Prometheus text format
+
+import os
+import json
+import time
+import uuid
+import bisect
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Pipeline stages, in the order a voice request goes through them
+STAGES = (
+    'audio_capture', 'vad', 'asr', 'language_detection', 'intent_extraction',
+    'retrieval', 'llm_call', 'text_prep', 'tts_engine_selection', 'tts_synthesis', 'playback', 'response'
+)
+
+# Seconds; covers sub-millisecond text processing up to slow cloud calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0)
+
+TELEMETRY_ENABLED = os.getenv('TELEMETRY_ENABLED', 'true').lower() == 'true'
+# Dump the full span list of any request slower than this (0 disables)
+TRACE_SLOW_MS = float(os.getenv('TRACE_SLOW_MS', 0))
+# Where slow traces go (JSON lines); logged as warnings when unset
+TRACE_DUMP_PATH = os.getenv('TRACE_DUMP_PATH')
+
+_current_trace = contextvars.ContextVar('farmdepot_trace', default=None)
+
+
+class Histogram:
+    """Fixed-bucket histogram for one label set"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self) -> Tuple[List[int], float, int]:
+        with self.lock:
+            return list(self.counts), self.sum, self.count
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in labels]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class MetricsRegistry:
+    """Process-local histograms, counters and gauges.
+
+    Each gunicorn worker keeps its own registry; scrape every worker or run
+    with one worker per container to aggregate.
+    """
+
+    def __init__(self):
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+        self.help = {}
+        self.lock = threading.Lock()
+
+    def _labels(self, labels: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+        return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+    def observe(self, name: str, value: float, help_text: str = '', **labels):
+        key = (name, self._labels(labels))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(key, Histogram())
+                self.help.setdefault(name, help_text)
+        histogram.observe(value)
+
+    def inc(self, name: str, amount: float = 1, help_text: str = '', **labels):
+        key = (name, self._labels(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+            self.help.setdefault(name, help_text)
+
+    def set_gauge(self, name: str, value: float, help_text: str = '', **labels):
+        key = (name, self._labels(labels))
+        with self.lock:
+            self.gauges[key] = value
+            self.help.setdefault(name, help_text)
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+            gauges = sorted(self.gauges.items())
+            help_texts = dict(self.help)
+
+        def header(name, kind):
+            lines.append(f"# HELP {name} {help_texts.get(name) or name}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        last_name = None
+        for (name, labels), histogram in histograms:
+            if name != last_name:
+                header(name, 'histogram')
+                last_name = name
+            counts, total, count = histogram.snapshot()
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.buckets, counts):
+                cumulative += bucket_count
+                bucket_labels = _format_labels(labels, 'le="%s"' % bound)
+                lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+            inf_labels = _format_labels(labels, 'le="+Inf"')
+            lines.append(f"{name}_bucket{inf_labels} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+        for kind, items in (('counter', counters), ('gauge', gauges)):
+            last_name = None
+            for (name, labels), value in items:
+                if name != last_name:
+                    header(name, kind)
+                    last_name = name
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def record_stage(stage: str, seconds: float, **labels):
+    """Record a stage duration measured elsewhere (e.g. reported by a worker process)"""
+    if not TELEMETRY_ENABLED:
+        return
+    registry.observe('farmdepot_stage_duration_seconds', seconds,
+                     'Time spent in each pipeline stage', stage=stage, **labels)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace['spans'].append({
+            'stage': stage,
+            'ms': round(seconds * 1000, 2),
+            'offset_ms': round((time.perf_counter() - seconds - trace['start']) * 1000, 2),
+            **{k: v for k, v in labels.items() if v is not None}
+        })
+
+
+@contextmanager
+def span(stage: str, **labels):
+    """Time a block as one pipeline stage.
+
+    Labels must be low-cardinality (engine, model, language), never user text.
+    """
+    if not TELEMETRY_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start, **labels)
+
+
+def start_trace(name: str, trace_id: Optional[str] = None):
+    """Begin collecting spans for one request in the current context"""
+    if not TELEMETRY_ENABLED:
+        return None
+    trace = {'id': trace_id or uuid.uuid4().hex[:16], 'name': name,
+             'start': time.perf_counter(), 'spans': []}
+    return _current_trace.set(trace)
+
+
+def trace_summary() -> Optional[Tuple[float, Dict[str, float], Dict[str, str]]]:
+    """Elapsed ms of the current trace, ms per stage so far, and the engine each stage last used"""
+    trace = _current_trace.get()
+    if trace is None:
+        return None
+    stages, engines = {}, {}
+    for span in trace['spans']:
+        stage = span['stage']
+        stages[stage] = stages.get(stage, 0.0) + span['ms']
+        if 'engine' in span:
+            engines[stage] = span['engine']
+    return (time.perf_counter() - trace['start']) * 1000, stages, engines
+
+
+def finish_trace(token, **attributes) -> Optional[float]:
+    """End the current trace; dumps it when slower than TRACE_SLOW_MS. Returns total seconds."""
+    trace = _current_trace.get()
+    if token is None or trace is None:
+        return None
+    _current_trace.reset(token)
+
+    total = time.perf_counter() - trace['start']
+    if TRACE_SLOW_MS and total * 1000 >= TRACE_SLOW_MS:
+        dump = {
+            'trace_id': trace['id'],
+            'name': trace['name'],
+            'total_ms': round(total * 1000, 2),
+            'timestamp': time.time(),
+            'spans': trace['spans'],
+            **attributes
+        }
+        if TRACE_DUMP_PATH:
+            try:
+                with open(TRACE_DUMP_PATH, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(dump) + '\n')
+            except OSError as e:
+                logger.error(f"Slow trace dump failed: {e}")
+        else:
+            logger.warning(f"Slow request trace: {json.dumps(dump)}")
+    return total
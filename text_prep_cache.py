@@ -0,0 +1,82 @@
+# text_prep_cache.py
+# TTS-ready text for answers, memoized. Cached and repeated LLM answers are spoken
+# again and again, and each time the text would be rewritten to SSML (ssml_rewriter)
+# before synthesis. This keeps the result in a bounded LRU keyed by a hash of the
+# answer, language, voice style and greeting time of day, so a repeated answer
+# skips all text processing.
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import telemetry
+import ssml_rewriter
+
+# Prepared answers kept per process
+TEXT_PREP_CACHE_SIZE = int(os.getenv('TEXT_PREP_CACHE_SIZE', 1000))
+
+
+class PreparedText:
+    """An answer as the engines want it: the text as written and its SSML fragment"""
+
+    __slots__ = ('text', 'language', 'ssml')
+
+    def __init__(self, text: str, language: str, ssml: str):
+        self.text = text
+        self.language = language
+        self.ssml = ssml
+
+
+class TextPrepCache:
+    """Bounded LRU of PreparedText keyed by a hash of the answer, language, style and daypart"""
+
+    def __init__(self, rewriter: ssml_rewriter.SSMLRewriter, max_entries: int = TEXT_PREP_CACHE_SIZE):
+        self.rewriter = rewriter
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def prepare(self, text: str, language: str, voice_style: str = 'neutral') -> PreparedText:
+        daypart = self.rewriter.daypart()
+        key = hashlib.sha1(f"{language}:{voice_style}:{daypart}:{text}".encode('utf-8')).digest()
+        with self.lock:
+            prepared = self.entries.get(key)
+            if prepared is not None:
+                self.entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return prepared
+            self.stats['misses'] += 1
+
+        with telemetry.span('text_prep', language=language):
+            ssml = self.rewriter.rewrite(text, language)
+            prepared = PreparedText(text, language, ssml)
+        if self.max_entries > 0:
+            with self.lock:
+                self.entries[key] = prepared
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+        return prepared
+
+    def get_stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {**self.stats, 'entries': len(self.entries), 'max_entries': self.max_entries}
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def load_default() -> Optional[TextPrepCache]:
+    """The process-wide cache over the default pronunciation rules, or None if they can't be read"""
+    global _default_cache
+    if _default_cache is None:
+        rewriter = ssml_rewriter.load_default()
+        if rewriter is None:
+            return None
+        with _default_lock:
+            if _default_cache is None:
+                _default_cache = TextPrepCache(rewriter)
+    return _default_cache
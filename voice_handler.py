@@ -1,21 +1,93 @@
 # voice_handler.py
-import speech_recognition as sr
-import whisper
-from gtts import gTTS
-import pygame
 import io
-import tempfile
 import os
 from typing import Optional, Tuple
 import threading
 import time
 from multilingual_handler import MultilingualHandler
+import telemetry
+import model_host
+from lazy_imports import lazy_import
+
+# Speech SDKs load on first use; Whisper only if Google recognition ever falls through
+sr = lazy_import('speech_recognition')
+whisper = lazy_import('whisper')
+pygame = lazy_import('pygame')
+
+WHISPER_MODEL = os.getenv('WHISPER_MODEL', 'base')
+# Whisper language codes; Igbo has none, so it is left to Whisper's detection
+WHISPER_LANGUAGES = {'english': 'en', 'hausa': 'ha', 'yoruba': 'yo'}
+
+class SpeechRecognizer:
+    """Google recognition with a Whisper fallback; needs no microphone, so servers can use it"""
+    def __init__(self, recognizer=None):
+        self.recognizer = recognizer or sr.Recognizer()
+        self._whisper_model = None
+        self._whisper_lock = threading.Lock()
+    
+    @property
+    def whisper_model(self):
+        """Whisper model, loaded the first time it is needed"""
+        if self._whisper_model is None:
+            with self._whisper_lock:
+                if self._whisper_model is None:
+                    self._whisper_model = whisper.load_model(WHISPER_MODEL)
+        return self._whisper_model
+    
+    def recognize(self, audio) -> Optional[str]:
+        """Recognize speech using both SpeechRecognition and Whisper"""
+        try:
+            # First try with Google Speech Recognition (faster)
+            try:
+                with telemetry.span('asr', engine='google'):
+                    text = self.recognizer.recognize_google(audio)
+                return text
+            except sr.UnknownValueError:
+                pass
+            except sr.RequestError:
+                pass
+            
+            # Fallback to Whisper (more accurate, works offline), fed samples rather than a temp WAV
+            from audio_buffer import AudioBuffer
+            samples = AudioBuffer.from_pcm(audio.get_raw_data(convert_rate=16000, convert_width=2), 16000)
+            host = model_host.default_client()
+            with telemetry.span('asr', engine='whisper'):
+                if host:
+                    text = host.transcribe(samples.to_float32())
+                else:
+                    text = self.whisper_model.transcribe(samples.to_float32())["text"].strip()
+            
+            return text or None
+                
+        except Exception as e:
+            print(f"Speech recognition error: {e}")
+            return None
+    
+    def transcribe_samples(self, samples, language: str = None, prompt: str = '') -> str:
+        """Whisper on float32 16 kHz samples; prompt carries the text decoded before them"""
+        host = model_host.default_client()
+        if host:
+            return host.transcribe(samples, language, prompt)
+        result = self.whisper_model.transcribe(samples, language=WHISPER_LANGUAGES.get(language),
+                                               initial_prompt=prompt or None, fp16=False,
+                                               condition_on_previous_text=False)
+        return result["text"].strip()
+    
+    def transcribe(self, data) -> Optional[str]:
+        """Recognize an uploaded recording (WAV as-is; mp3, ogg and webm decoded with ffmpeg)"""
+        from audio_buffer import AudioBuffer, sniff_codec
+        codec = sniff_codec(data)
+        if codec == 'pcm':
+            raise ValueError('Unsupported audio format; upload WAV, MP3, Ogg or WebM')
+        with telemetry.span('audio_capture', source='upload'):
+            audio = AudioBuffer.from_bytes(data, codec).to_pcm(channels=1)
+        return self.recognize(sr.AudioData(bytes(audio.data), audio.sample_rate, 2))
 
 class VoiceHandler:
     def __init__(self):
-        self.recognizer = sr.Recognizer()
+        self.speech = SpeechRecognizer()
+        self.recognizer = self.speech.recognizer
         self.microphone = sr.Microphone()
-        self.whisper_model = whisper.load_model("base")
         self.multilingual = MultilingualHandler()
         pygame.mixer.init()
         
@@ -25,6 +97,10 @@ class VoiceHandler:
             self.recognizer.adjust_for_ambient_noise(source)
             print("Microphone calibrated!")
     
+    @property
+    def whisper_model(self):
+        return self.speech.whisper_model
+    
     def listen_for_wake_word(self, wake_word: str = "hey farmdepot") -> bool:
         """Listen for wake word continuously"""
         try:
@@ -50,7 +126,8 @@ class VoiceHandler:
                 print("Listening for command...")
                 # Play a beep to indicate listening
                 self.play_beep()
-                audio = self.recognizer.listen(source, timeout=timeout, phrase_time_limit=10)
+                with telemetry.span('audio_capture', source='microphone'):
+                    audio = self.recognizer.listen(source, timeout=timeout, phrase_time_limit=10)
                 
             command_text = self.recognize_speech(audio)
             if command_text:
@@ -70,29 +147,7 @@ class VoiceHandler:
     
     def recognize_speech(self, audio) -> Optional[str]:
         """Recognize speech using both SpeechRecognition and Whisper"""
-        try:
-            # First try with Google Speech Recognition (faster)
-            try:
-                text = self.recognizer.recognize_google(audio)
-                return text
-            except sr.UnknownValueError:
-                pass
-            except sr.RequestError:
-                pass
-            
-            # Fallback to Whisper (more accurate, works offline)
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp_file:
-                tmp_file.write(audio.get_wav_data())
-                tmp_file.flush()
-                
-                result = self.whisper_model.transcribe(tmp_file.name)
-                os.unlink(tmp_file.name)
-                
-                return result["text"].strip() if result["text"].strip() else None
-                
-        except Exception as e:
-            print(f"Speech recognition error: {e}")
-            return None
+        return self.speech.recognize(audio)
     
     def text_to_speech(self, text: str, language: str = None) -> bool:
         """Convert text to speech with multilingual support"""
@@ -100,18 +155,20 @@ class VoiceHandler:
             # Use multilingual TTS generation
             tts = self.multilingual.generate_multilingual_tts(text, language)
             
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as tmp_file:
-                tts.save(tmp_file.name)
-                
-                pygame.mixer.music.load(tmp_file.name)
+            audio = io.BytesIO()
+            with telemetry.span('tts_synthesis', engine='gtts'):
+                tts.write_to_fp(audio)
+            audio.seek(0)
+            
+            with telemetry.span('playback'):
+                pygame.mixer.music.load(audio, 'mp3')
                 pygame.mixer.music.play()
                 
                 # Wait for playback to complete
                 while pygame.mixer.music.get_busy():
                     time.sleep(0.1)
-                
-                os.unlink(tmp_file.name)
-                return True
+            
+            return True
                 
         except Exception as e:
             print(f"Text-to-speech error: {e}")
@@ -189,8 +246,9 @@ class VoiceWebInterface:
     def process_voice_input(self, audio_file_path: str) -> dict:
         """Process uploaded voice file with multilingual analysis"""
         try:
-            with sr.AudioFile(audio_file_path) as source:
-                audio = self.voice_handler.recognizer.record(source)
+            with telemetry.span('audio_capture', source='upload'):
+                with sr.AudioFile(audio_file_path) as source:
+                    audio = self.voice_handler.recognizer.record(source)
             
             text = self.voice_handler.recognize_speech(audio)
             if text:
@@ -225,7 +283,8 @@ class VoiceWebInterface:
             timestamp = int(time.time())
             output_file = f"{output_dir}/response_{timestamp}.mp3"
             
-            tts.save(output_file)
+            with telemetry.span('tts_synthesis', engine='gtts'):
+                tts.save(output_file)
             return output_file
         except Exception as e:
             print(f"Error generating voice response: {e}")
@@ -0,0 +1,341 @@
+# voice_jobs.py
+# Background processing of voice uploads. An upload is stored as a job in SQLite and
+# answered with its id straight away; worker threads (in the web process, or
+# `python voice_jobs.py worker` on its own) run ASR -> intent -> answer -> TTS and
+# write each result as soon as it exists, so a client long-polling the job sees the
+# transcript first, then the text answer, then the audio.
+#
+# The queue is a table in a local SQLite file, so every gunicorn worker and any
+# separate worker process on the host share it. A job whose worker died is picked
+# up again once its lease runs out.
+
+import os
+import sys
+import json
+import time
+import uuid
+import sqlite3
+import argparse
+import threading
+from typing import Callable, Dict, List, Optional
+
+import telemetry
+from interaction_log import LANGUAGE_CODES
+
+VOICE_JOBS_DB = os.getenv('VOICE_JOBS_DB', 'voice_jobs.db')
+# Worker threads started in each web process (0 when separate worker processes run the jobs)
+VOICE_JOB_WORKERS = int(os.getenv('VOICE_JOB_WORKERS', 2))
+# Seconds a worker may hold a job before another worker takes it over
+VOICE_JOB_LEASE_SECONDS = float(os.getenv('VOICE_JOB_LEASE_SECONDS', 120))
+VOICE_JOB_MAX_ATTEMPTS = int(os.getenv('VOICE_JOB_MAX_ATTEMPTS', 2))
+# Finished jobs, with their audio, are deleted after this long
+VOICE_JOB_RETENTION_SECONDS = int(os.getenv('VOICE_JOB_RETENTION_SECONDS', 3600))
+# Longest long-poll; kept under gunicorn's 30s worker timeout
+VOICE_JOB_POLL_SECONDS = float(os.getenv('VOICE_JOB_POLL_SECONDS', 20))
+VOICE_JOB_MAX_UPLOAD_BYTES = int(os.getenv('VOICE_JOB_MAX_UPLOAD_BYTES', 10 * 1024 * 1024))
+
+# A job moves through these in order; 'failed' can follow any of them
+STAGES = ('queued', 'transcribing', 'answering', 'synthesizing', 'done')
+FINISHED = ('done', 'failed')
+
+# How often waiters re-read the table for changes made by other processes
+CHECK_INTERVAL = 0.2
+
+# Job fields returned to clients (the upload and audio blobs are served separately)
+PUBLIC_FIELDS = ('id', 'status', 'version', 'language', 'session_id', 'transcript', 'detected_language',
+                 'intent', 'response', 'route', 'audio_type', 'error', 'attempts', 'created_at', 'updated_at')
+
+
+class VoiceJobStore:
+    """SQLite-backed job table shared by all processes on the host"""
+
+    def __init__(self, path: str = VOICE_JOBS_DB):
+        self.path = path
+        self.local = threading.local()
+        # Wakes waiters in this process as soon as a job here changes
+        self.changed = threading.Condition()
+
+        self._conn().executescript("""
+            CREATE TABLE IF NOT EXISTS voice_jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                version INTEGER NOT NULL DEFAULT 0,
+                language TEXT,
+                session_id TEXT,
+                upload BLOB,
+                transcript TEXT,
+                detected_language TEXT,
+                intent TEXT,
+                response TEXT,
+                route TEXT,
+                audio BLOB,
+                audio_type TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                lease_until REAL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS voice_jobs_status ON voice_jobs (status, created_at);
+        """)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn = conn
+        return conn
+
+    def _notify(self):
+        with self.changed:
+            self.changed.notify_all()
+
+    def submit(self, upload: Optional[bytes], language: Optional[str] = None, session_id: Optional[str] = None,
+               transcript: Optional[str] = None) -> str:
+        """Queue a recording, or a transcript already recognized (e.g. from a stream)"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._conn().execute(
+            'INSERT INTO voice_jobs (id, status, language, session_id, upload, transcript, created_at, updated_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (job_id, 'queued', language, session_id, upload, transcript, now, now)
+        )
+        self._notify()
+        return job_id
+
+    def claim(self) -> Optional[Dict]:
+        """Take the oldest queued job (or one whose worker's lease ran out) and lease it"""
+        conn = self._conn()
+        now = time.time()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            while True:
+                row = conn.execute(
+                    "SELECT id, attempts, language, session_id, upload, transcript FROM voice_jobs "
+                    "WHERE status = 'queued' OR (status NOT IN ('done', 'failed') AND lease_until < ?) "
+                    "ORDER BY created_at LIMIT 1",
+                    (now,)
+                ).fetchone()
+                if row is None:
+                    return None
+                job_id, attempts, language, session_id, upload, transcript = row
+                if attempts >= VOICE_JOB_MAX_ATTEMPTS:
+                    conn.execute(
+                        "UPDATE voice_jobs SET status = 'failed', error = ?, upload = NULL, "
+                        "version = version + 1, updated_at = ? WHERE id = ?",
+                        ('Gave up after the worker stopped responding', now, job_id)
+                    )
+                    continue
+                conn.execute(
+                    "UPDATE voice_jobs SET status = 'transcribing', attempts = attempts + 1, lease_until = ?, "
+                    "version = version + 1, updated_at = ? WHERE id = ?",
+                    (now + VOICE_JOB_LEASE_SECONDS, now, job_id)
+                )
+                break
+        self._notify()
+        return {'id': job_id, 'attempts': attempts + 1, 'language': language,
+                'session_id': session_id, 'upload': upload, 'transcript': transcript}
+
+    def update(self, job_id: str, **fields):
+        """Record results of a stage; every update bumps the version long-polls wait on"""
+        if fields.get('status') in FINISHED:
+            fields.update(upload=None, lease_until=None)
+        if isinstance(fields.get('intent'), dict):
+            fields['intent'] = json.dumps(fields['intent'])
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        self._conn().execute(
+            f"UPDATE voice_jobs SET {assignments}, version = version + 1, updated_at = ? WHERE id = ?",
+            (*fields.values(), time.time(), job_id)
+        )
+        self._notify()
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        row = self._conn().execute(
+            f"SELECT {', '.join(PUBLIC_FIELDS)} FROM voice_jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(PUBLIC_FIELDS, row))
+        job['intent'] = json.loads(job['intent']) if job['intent'] else None
+        return job
+
+    def audio(self, job_id: str):
+        """(audio bytes, content type) once the job is done, else None"""
+        row = self._conn().execute(
+            'SELECT audio, audio_type FROM voice_jobs WHERE id = ? AND audio IS NOT NULL', (job_id,)
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def wait(self, job_id: str, after: int = -1, timeout: float = VOICE_JOB_POLL_SECONDS) -> Optional[Dict]:
+        """The job once its version is past 'after' or it has finished, or as it is at the timeout"""
+        deadline = time.monotonic() + max(0.0, min(timeout, VOICE_JOB_POLL_SECONDS))
+        while True:
+            job = self.get(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job['version'] > after or job['status'] in FINISHED or remaining <= 0:
+                return job
+            with self.changed:
+                self.changed.wait(min(remaining, CHECK_INTERVAL))
+
+    def wait_for_work(self, timeout: float):
+        """Sleep until something is submitted in this process, or timeout"""
+        with self.changed:
+            self.changed.wait(timeout)
+
+    def purge(self, retention: int = VOICE_JOB_RETENTION_SECONDS) -> int:
+        cursor = self._conn().execute(
+            "DELETE FROM voice_jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+            (time.time() - retention,)
+        )
+        return cursor.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        rows = self._conn().execute('SELECT status, COUNT(*) FROM voice_jobs GROUP BY status').fetchall()
+        return {status: count for status, count in rows}
+
+
+class VoicePipeline:
+    """The stages a voice job runs, as callables so web and worker processes wire them the same way.
+
+    transcribe(upload bytes) -> text; understand(text) -> parsed command with
+    'detected_language'; answer(text, language, session_id, call_info) -> text;
+    speak(text, language) -> AudioBuffer.
+    """
+
+    def __init__(self, transcribe: Callable, understand: Callable, answer: Callable, speak: Callable):
+        self.transcribe = transcribe
+        self.understand = understand
+        self.answer = answer
+        self.speak = speak
+
+
+class VoiceJobWorkers:
+    """Threads that claim jobs from the store and run them through the pipeline"""
+
+    def __init__(self, store: VoiceJobStore, pipeline: VoicePipeline, threads: int = VOICE_JOB_WORKERS,
+                 interactions=None):
+        self.store = store
+        self.pipeline = pipeline
+        self.threads = threads
+        # An interaction_log.InteractionLog that gets a record per finished job
+        self.interactions = interactions
+        self.stopping = threading.Event()
+        self.workers: List[threading.Thread] = []
+        self.lock = threading.Lock()
+        self.stats = {'processed': 0, 'failed': 0, 'retried': 0}
+
+    def start(self) -> 'VoiceJobWorkers':
+        for index in range(self.threads):
+            worker = threading.Thread(target=self._run, name=f"voice-job-{index}", daemon=True)
+            worker.start()
+            self.workers.append(worker)
+        return self
+
+    def stop(self, timeout: float = 5.0):
+        self.stopping.set()
+        self.store._notify()
+        for worker in self.workers:
+            worker.join(timeout)
+
+    def _count(self, key: str):
+        with self.lock:
+            self.stats[key] += 1
+
+    def _run(self):
+        last_purge = 0.0
+        while not self.stopping.is_set():
+            if time.monotonic() - last_purge > 60:
+                last_purge = time.monotonic()
+                self.store.purge()
+            job = self.store.claim()
+            if job is None:
+                self.store.wait_for_work(1.0)
+                continue
+            self.process(job)
+
+    def process(self, job: Dict):
+        job_id = job['id']
+        start = time.perf_counter()
+        trace_token = telemetry.start_trace('voice_job', job_id)
+        interaction = {'language': job['language'], 'session_id': job['session_id']}
+        try:
+            text = job['transcript'] or self.pipeline.transcribe(job['upload'])
+            if not text:
+                self.store.update(job_id, status='failed', error='Could not understand the audio')
+                self._count('failed')
+                interaction['status'] = 422
+                return
+            parsed = self.pipeline.understand(text)
+            language = parsed.get('detected_language') or job['language']
+            interaction.update(language=language, query=text, intent=(parsed.get('intent') or {}).get('type'))
+            self.store.update(job_id, status='answering', transcript=text, detected_language=language,
+                              intent=parsed.get('intent'))
+
+            call_info = {}
+            response = self.pipeline.answer(text, language, job['session_id'], call_info)
+            self.store.update(job_id, status='synthesizing', response=response, route=call_info.get('route'))
+            interaction.update(route=call_info.get('route'), model=call_info.get('model'),
+                               tier=call_info.get('tier'), usage=call_info.get('usage'),
+                               fingerprint=call_info.get('fingerprint'))
+
+            audio = self.pipeline.speak(response, language)
+            if audio:
+                self.store.update(job_id, status='done', audio=bytes(audio.container()),
+                                  audio_type='audio/wav' if audio.is_pcm else audio.content_type)
+            else:
+                # The text answer stands on its own; the client shows it without audio
+                self.store.update(job_id, status='done', error='Speech synthesis failed')
+            self._count('processed')
+            interaction['status'] = 200
+        except Exception as e:
+            retry = job['attempts'] < VOICE_JOB_MAX_ATTEMPTS and not isinstance(e, ValueError)
+            print(f"Voice job {job_id} failed{' (will retry)' if retry else ''}: {e}")
+            self.store.update(job_id, status='queued' if retry else 'failed', error=str(e))
+            self._count('retried' if retry else 'failed')
+        finally:
+            telemetry.registry.observe('farmdepot_voice_job_seconds', time.perf_counter() - start,
+                                       'Time to run a voice job once a worker has claimed it')
+            if self.interactions:
+                language = interaction['language']
+                interaction['language'] = LANGUAGE_CODES.get(language, language)
+                self.interactions.record('voice_job', interaction.pop('status', 500), **interaction)
+            telemetry.finish_trace(trace_token)
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            stats = dict(self.stats)
+        return {**stats, 'threads': self.threads, 'jobs': self.store.counts()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run voice job workers outside the web process')
+    parser.add_argument('command', choices=['worker', 'status', 'purge'])
+    parser.add_argument('--threads', type=int, default=max(VOICE_JOB_WORKERS, 1))
+    parser.add_argument('--db', default=VOICE_JOBS_DB)
+    args = parser.parse_args()
+
+    store = VoiceJobStore(args.db)
+    if args.command == 'status':
+        print(json.dumps(store.counts()))
+        return
+    if args.command == 'purge':
+        print(f"Deleted {store.purge()} finished jobs")
+        return
+
+    # The pipeline is the app's own (same LLM routing, admission limits and TTS engines)
+    import main as app_main
+    workers = VoiceJobWorkers(store, app_main.create_voice_pipeline(), args.threads,
+                              interactions=app_main.interactions).start()
+    print(f"Processing voice jobs from {args.db} with {args.threads} threads")
+    sys.stdout.flush()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        workers.stop()
+
+
+if __name__ == '__main__':
+    main()
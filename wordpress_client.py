@@ -0,0 +1,129 @@
+# wordpress_client.py
+# Shared HTTP helpers for talking to the FarmDepot.ng WordPress REST API
+
+import os
+import time
+import random
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError, MaxRetryError
+from typing import Optional, Dict, Any
+
+# Timeouts and retry policy for WordPress calls
+WORDPRESS_TIMEOUT = float(os.getenv('WORDPRESS_TIMEOUT', 15))
+WORDPRESS_MAX_RETRIES = int(os.getenv('WORDPRESS_MAX_RETRIES', 3))
+WORDPRESS_BACKOFF = float(os.getenv('WORDPRESS_BACKOFF', 0.5))
+
+# Status codes worth retrying (rate limiting and transient server errors)
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+# For requests that aren't idempotent (POST): statuses that mean the server didn't act on it
+UNPROCESSED_STATUS_CODES = {429, 503}
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+
+def get_wordpress_url() -> str:
+    """Base URL of the WordPress site"""
+    return os.getenv('WORDPRESS_URL', 'https://farmdepot.ng').rstrip('/')
+
+
+def api_url(path: str) -> str:
+    """Build a full REST API URL from a path like 'wp/v2/posts'"""
+    return f"{get_wordpress_url()}/wp-json/{path.lstrip('/')}"
+
+
+def create_session(pool_size: int = 10) -> requests.Session:
+    """Create a requests session with a connection pool sized for the workers using it"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def _retry_delay(attempt: int, backoff: float, response: Optional[requests.Response] = None) -> float:
+    """Exponential backoff with jitter, honouring Retry-After when the server sends it"""
+    if response is not None:
+        retry_after = response.headers.get('Retry-After')
+        if retry_after:
+            try:
+                return min(float(retry_after), 30.0)
+            except ValueError:
+                pass
+    return backoff * (2 ** attempt) * (0.5 + random.random())
+
+
+def _not_sent(error: requests.RequestException) -> bool:
+    """Whether the request failed before a connection was made, so the server never saw it"""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = error.args[0] if error.args else None
+    # Refused, unreachable and DNS failures (NewConnectionError is a ConnectTimeoutError)
+    return isinstance(reason, MaxRetryError) and isinstance(reason.reason, ConnectTimeoutError)
+
+
+def request_with_retry(method: str, url: str, max_retries: Optional[int] = None,
+                       backoff: Optional[float] = None, timeout: Optional[float] = None,
+                       session: Optional[requests.Session] = None, idempotent: Optional[bool] = None,
+                       **kwargs) -> requests.Response:
+    """Send an HTTP request, retrying transient failures with exponential backoff.
+
+    A request that isn't idempotent (by default, any POST) is only retried when the
+    server can't have acted on it: the connection was never made, or it answered
+    429 or 503. A read timeout or other 5xx may follow a post that was created.
+
+    Returns the last response received; raises the last network error if no
+    response was ever received.
+    """
+    if max_retries is None:
+        max_retries = WORDPRESS_MAX_RETRIES
+    if backoff is None:
+        backoff = WORDPRESS_BACKOFF
+    if timeout is None:
+        timeout = WORDPRESS_TIMEOUT
+
+    if idempotent is None:
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+    retryable = RETRYABLE_STATUS_CODES if idempotent else UNPROCESSED_STATUS_CODES
+
+    sender = session or requests
+    last_error = None
+
+    for attempt in range(max_retries + 1):
+        response = None
+        try:
+            response = sender.request(method, url, timeout=timeout, **kwargs)
+            if response.status_code not in retryable:
+                response.attempts = attempt + 1
+                return response
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if not idempotent and not _not_sent(e):
+                raise
+            last_error = e
+
+        if attempt < max_retries:
+            time.sleep(_retry_delay(attempt, backoff, response))
+        elif response is not None:
+            response.attempts = attempt + 1
+            return response
+
+    raise last_error
+
+
+def create_post(post_payload: Dict[str, Any], token: Optional[str] = None,
+                idempotency_key: Optional[str] = None,
+                session: Optional[requests.Session] = None, **retry_kwargs) -> requests.Response:
+    """Create a WordPress post with timeout and retry"""
+    headers = {}
+    if token:
+        headers['Authorization'] = f"Bearer {token}"
+    if idempotency_key:
+        headers['Idempotency-Key'] = idempotency_key
+
+    return request_with_retry(
+        'POST',
+        api_url('wp/v2/posts'),
+        json=post_payload,
+        headers=headers,
+        session=session,
+        **retry_kwargs
+    )
@@ -0,0 +1,245 @@
+# wordpress_sessions.py
+# Per-user JWT session cache for WordPress authentication
+
+import os
+import json
+import time
+import base64
+import hashlib
+import hmac
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Optional, Dict
+
+import wordpress_client
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines
+    fcntl = None
+
+# Refresh tokens this many seconds before they expire
+WP_TOKEN_REFRESH_MARGIN = int(os.getenv('WP_TOKEN_REFRESH_MARGIN', 300))
+# Lifetime to assume when a token carries no readable 'exp' claim
+WP_TOKEN_DEFAULT_TTL = int(os.getenv('WP_TOKEN_DEFAULT_TTL', 3600))
+# Seconds between passes that drop expired sessions from memory
+WP_SESSION_SWEEP_INTERVAL = 60
+
+
+def token_expiry(token: str, default_ttl: int = WP_TOKEN_DEFAULT_TTL) -> float:
+    """Read the 'exp' claim from a JWT without verifying it (the server does that)"""
+    try:
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload))
+        return float(claims['exp'])
+    except Exception:
+        return time.time() + default_ttl
+
+
+def password_verifier(password: str, salt: str) -> str:
+    """Salted hash used to check a repeated login against the cached session"""
+    return hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), bytes.fromhex(salt), 10000).hex()
+
+
+class EncryptedSessionFile:
+    """Encrypted on-disk copy of the session cache, shared by all workers on the host"""
+
+    def __init__(self, path: str, secret: str):
+        from cryptography.fernet import Fernet
+
+        key = base64.urlsafe_b64encode(hashlib.sha256(secret.encode('utf-8')).digest())
+        self.fernet = Fernet(key)
+        self.path = path
+        self.lock_path = f"{path}.lock"
+
+    def _locked(self):
+        lock_file = open(self.lock_path, 'a')
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file
+
+    def _read(self) -> Dict[str, Dict]:
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, 'rb') as f:
+            return json.loads(self.fernet.decrypt(f.read()))
+
+    def load(self) -> Dict[str, Dict]:
+        try:
+            with self._locked():
+                return self._read()
+        except Exception as e:
+            print(f"Session file read error: {e}")
+            return {}
+
+    def merge(self, updates: Dict[str, Optional[Dict]]):
+        """Apply updates (None deletes) on top of what other workers have written"""
+        try:
+            with self._locked():
+                sessions = self._read()
+                for username, session in updates.items():
+                    if session is None:
+                        sessions.pop(username, None)
+                    else:
+                        sessions[username] = session
+
+                now = time.time()
+                sessions = {user: s for user, s in sessions.items() if s['expires_at'] > now}
+
+                directory = os.path.dirname(os.path.abspath(self.path))
+                fd, tmp_path = tempfile.mkstemp(dir=directory)
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(self.fernet.encrypt(json.dumps(sessions).encode('utf-8')))
+                os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"Session file write error: {e}")
+
+
+def conversation_key(conversation_id: str) -> str:
+    # ':' can't appear in a WordPress username, so these never collide with a user's entry
+    return f"conversation:{conversation_id}"
+
+
+class WordPressSessionStore:
+    """Cache WordPress JWTs per user so repeated tool calls skip the auth round trip
+
+    A login can be bound to the conversation it happened in; tools acting for that
+    conversation then get the user's token through conversation_session(), never
+    from a username the caller names.
+    """
+
+    def __init__(self, refresh_margin: int = WP_TOKEN_REFRESH_MARGIN,
+                 persist_path: Optional[str] = None, secret: Optional[str] = None):
+        self.refresh_margin = refresh_margin
+        self.sessions = {}
+        self.lock = threading.Lock()
+        # username -> [lock, logins holding or waiting for it]; dropped when the count reaches 0
+        self.user_locks = {}
+        self.next_sweep = 0.0
+        self.persistence = None
+
+        persist_path = persist_path or os.getenv('WP_SESSION_STORE_PATH')
+        secret = secret or os.getenv('WP_SESSION_SECRET')
+        if persist_path and secret:
+            try:
+                self.persistence = EncryptedSessionFile(persist_path, secret)
+            except ImportError:
+                print("cryptography not available, keeping WordPress sessions in memory only")
+
+    @contextmanager
+    def _user_lock(self, username: str):
+        with self.lock:
+            entry = self.user_locks.setdefault(username, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self.lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self.user_locks[username]
+
+    def _sweep(self):
+        """Drop expired sessions and conversation bindings of users who never came back"""
+        now = time.time()
+        if now < self.next_sweep:
+            return
+        self.next_sweep = now + WP_SESSION_SWEEP_INTERVAL
+        for key, session in list(self.sessions.items()):
+            if session['expires_at'] <= now:
+                self.sessions.pop(key, None)
+
+    def _lookup(self, username: str) -> Optional[Dict]:
+        session = self.sessions.get(username)
+        if session is None and self.persistence:
+            # Another worker may have logged this user in
+            session = self.persistence.load().get(username)
+            if session:
+                self.sessions[username] = session
+        if session and session['expires_at'] <= time.time():
+            self.sessions.pop(username, None)
+            return None
+        return session
+
+    def _is_fresh(self, session: Optional[Dict]) -> bool:
+        return bool(session) and session['expires_at'] - self.refresh_margin > time.time()
+
+    def get_token(self, username: str) -> Optional[str]:
+        """Return a cached, unexpired token for the user, or None if they must log in"""
+        session = self._lookup(username)
+        return session['token'] if session else None
+
+    def login(self, username: str, password: str, conversation_id: Optional[str] = None) -> Optional[Dict]:
+        """Return a session for the user, authenticating only when the cached token is near expiry.
+
+        A cached token is only reused when the password matches the one it was
+        issued for. The returned dict has 'token', 'expires_at' and 'cached'
+        (True when no auth request was made). With conversation_id, the
+        conversation is bound to the user until the token expires.
+        """
+        with self._user_lock(username):
+            session = self._lookup(username)
+            if self._is_fresh(session) and hmac.compare_digest(
+                    session['verifier'], password_verifier(password, session['salt'])):
+                result = {'token': session['token'], 'expires_at': session['expires_at'], 'cached': True}
+            else:
+                session = self._authenticate(username, password)
+                if session is None:
+                    return None
+                result = {'token': session['token'], 'expires_at': session['expires_at'], 'cached': False}
+
+        if conversation_id:
+            binding = {'username': username, 'expires_at': result['expires_at']}
+            self.sessions[conversation_key(conversation_id)] = binding
+            if self.persistence:
+                self.persistence.merge({conversation_key(conversation_id): binding})
+        return result
+
+    def _authenticate(self, username: str, password: str) -> Optional[Dict]:
+        response = wordpress_client.request_with_retry(
+            'POST',
+            wordpress_client.api_url('jwt-auth/v1/token'),
+            json={'username': username, 'password': password},
+            max_retries=1,
+            idempotent=True
+        )
+        if response.status_code != 200:
+            return None
+
+        token = response.json().get('token')
+        if not token:
+            return None
+
+        salt = os.urandom(16).hex()
+        session = {
+            'token': token,
+            'expires_at': token_expiry(token),
+            'salt': salt,
+            'verifier': password_verifier(password, salt)
+        }
+        self.sessions[username] = session
+        self._sweep()
+        if self.persistence:
+            self.persistence.merge({username: session})
+        return session
+
+    def conversation_session(self, conversation_id: str) -> Optional[Dict]:
+        """The user logged in within this conversation and their token, as {'username', 'token'}, or None"""
+        binding = self._lookup(conversation_key(conversation_id))
+        if not binding:
+            return None
+        token = self.get_token(binding['username'])
+        return {'username': binding['username'], 'token': token} if token else None
+
+    def invalidate(self, username: str):
+        """Forget a user's token, e.g. after WordPress rejects it"""
+        self.sessions.pop(username, None)
+        if self.persistence:
+            self.persistence.merge({username: None})
+
+
+# Shared by all tool instances in this process
+session_store = WordPressSessionStore()